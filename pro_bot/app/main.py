@@ -4,7 +4,7 @@ from datetime import datetime, timedelta, timezone
 from pro_bot.config import settings
 from pro_bot.core.client import get_client
 from pro_bot.core.ws import start_streams
-from pro_bot.core.execution import enter_position, refresh_open_positions_cache
+from pro_bot.core.execution import enter_position, start_positions_cache_refresher
 from pro_bot.core.binance_klines import fetch_klines
 from pro_ml.core.features.microstructure import build_features
 from pro_ml.core.live.inference import LiveModel
@@ -40,7 +40,7 @@ def ws_thread():
     except KeyboardInterrupt: twm.stop()
 def main():
     get_client()
-    refresh_open_positions_cache()
+    start_positions_cache_refresher()
     t=threading.Thread(target=ws_thread, daemon=True); t.start()
     global DF
     while True:
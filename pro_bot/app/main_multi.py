@@ -1,6 +1,8 @@
 
 import os
 import logging
+import threading
+import time
 import yaml
 import pandas as pd
 from collections import defaultdict
@@ -14,8 +16,15 @@ from pro_bot.core.sl_tp_manager import SLTPManager
 from pro_bot.core.execution import (
     has_open_position, 
     open_positions_count,
+    start_positions_cache_refresher,
+    note_price,
+    warm_entry_caches,
     _can_open_new_position
 )
+from pro_bot.core.pretrade_gate import get_gate
+from pro_bot.core.risk_loop import MarkPriceRiskLoop
+from pro_bot.core.risk_guard import RiskGuard
+from pro_bot.core.portfolio import PortfolioRisk
 
 from pro_ml.core.features.microstructure import build_features
 from pro_ml.core.live.inference_multi import LiveModel
@@ -43,6 +52,8 @@ lm = LiveModel(
 
 DF = defaultdict(lambda: pd.DataFrame(columns=['open','high','low','close','volume']))
 PM = {}
+PORTFOLIO = PortfolioRisk(**cfg.get('portfolio', {}))
+get_gate().attach_portfolio(PORTFOLIO)
 
 # Restaurar MAX_SYMBOLS para funcionalidad completa
 MAX_SYMBOLS = int(os.getenv("MAX_SYMBOLS", "19"))
@@ -51,6 +62,7 @@ MAX_SYMBOLS = int(os.getenv("MAX_SYMBOLS", "19"))
 def _ensure_pm(sym):
     if sym not in PM:
         PM[sym] = SLTPManager(cfg, sym)  # Pasar símbolo como parámetro
+        get_gate().register_cooldown(sym, PM[sym].is_in_cooldown)
     return PM[sym]
 
 def _on_msg(msg):
@@ -109,6 +121,7 @@ def _on_msg(msg):
         dfi = DF[sym]
         dfi.loc[datetime.fromtimestamp(ts)] = row
         DF[sym] = dfi
+        PORTFOLIO.on_bar(sym, ts, row["close"])
 
         # Solo procesar si tenemos suficientes datos
         if len(dfi) < 150:
@@ -124,6 +137,7 @@ def _on_msg(msg):
             return
             
         last_close = float(dfi.iloc[-1]['close'])
+        note_price(sym, last_close)
         atr = float(latest['atr']) if 'atr' in latest and pd.notnull(latest['atr']) else 0.0
 
         try:
@@ -180,12 +194,35 @@ def warmup_symbol(symbol: str, interval: str, lookback_min: int = 1500):
     except Exception as e:
         log.error(f"[{symbol}] Warmup error: {e}")
 
+def _start_risk_guard():
+    """Kill switch diario enganchado a la puerta pre-trade (equity por stream; REST cada 60s sin stream)"""
+    try:
+        guard = RiskGuard(max_daily_dd=float(cfg.get("risk", {}).get("max_daily_dd", 0.03)))
+    except Exception as e:
+        log.warning(f"RiskGuard no disponible: {e}")
+        return None
+    get_gate().attach_risk_guard(guard)
+
+    def _loop():
+        while True:
+            time.sleep(60)
+            try:
+                guard.on_loop()
+            except Exception as e:
+                log.warning(f"RiskGuard loop error: {e}")
+
+    threading.Thread(target=_loop, daemon=True).start()
+    return guard
+
 def main():
     get_client()
     
-    # Log de posiciones abiertas al inicio (sin cache)
+    # Estado de cuenta (user-data stream) y puerta pre-trade
+    # Sin user-data stream la puerta lee este cache: refresco REST periódico
+    start_positions_cache_refresher()
+    guard = _start_risk_guard()
     open_count = open_positions_count()
-    log.info(f"Open positions: {open_count}/5")
+    log.info(f"Open positions: {open_count}/{settings.max_open_positions}")
     
     # Usar símbolos fijos del archivo .env
     symbols_env = os.getenv("SYMBOLS", "").strip()
@@ -205,8 +242,18 @@ def main():
     for symbol in syms:
         warmup_symbol(symbol, interval, lookback)
     
+    warm_entry_caches(syms)
+    PORTFOLIO.seed({s: [(t.value // 10**9, float(c)) for t, c in DF[s]['close'].items()] for s in syms if len(DF[s])})
     log.info(f"Warmup completed for {len(syms)} symbols. Starting real-time processing...")
     
+    if settings.risk_loop:
+        # Break-even y trailing por tick (1s) para todas las posiciones activas
+        loop = MarkPriceRiskLoop(PM)
+        if guard is not None:
+            loop.add_listener(guard.on_prices)
+        loop.add_listener(PORTFOLIO.on_prices)
+        loop.start()
+    
     twm = start_kline_multiplex(syms, interval=interval, callback=_on_msg)
     try:
         twm.join()
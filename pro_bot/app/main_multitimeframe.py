@@ -5,21 +5,24 @@ Main multitimeframe bot - Análisis de múltiples timeframes con confirmaciones
 
 import asyncio
 import logging
+import os
 import signal
 import sys
 import time
-import threading
 from pathlib import Path
 
+import yaml
+
 # Agregar el directorio raíz al path
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from pro_bot.config import settings
 from pro_bot.core.client import get_client
 from pro_bot.core.symbols import get_trading_symbols
-from pro_bot.core.execution import TradingEngine
+from pro_bot.core.execution import TradingEngine, get_all_open_positions, note_price
+from pro_bot.core.user_stream import get_account_state
 from pro_bot.core.ws_multitimeframe import start_multitimeframe_websocket
-from pro_bot.core.multitimeframe_manager import MultitimeframeDecisionManager
+from pro_bot.core.multitimeframe_manager import MultitimeframeDecisionManager, SignalDeduplicator
+from pro_bot.core.pretrade_gate import REASON_POSITION_OPEN
 from pro_ml.live.inference_multi import MLInferenceEngine
 
 # Configurar logging
@@ -30,6 +33,16 @@ logging.basicConfig(
 )
 log = logging.getLogger("main_multitf")
 
+CFG_PATH = os.getenv("ML_CFG", "configs/ml.yaml")
+with open(CFG_PATH, "r") as f:
+    cfg = yaml.safe_load(f)
+
+# Estrategias de combinación de timeframes
+STRATEGY_VOTE = "vote"    # un modelo por TF + votación en MultitimeframeDecisionManager
+STRATEGY_FUSED = "fused"  # un único modelo sobre el vector 1m/3m/5m concatenado
+FUSED_BUFFER_SIZE = 300   # velas 1m retenidas (5m necesita 20 velas agregadas)
+POSITION_WATCH_SECONDS = 30  # comprobación de cierres para rearmar señales
+
 class MultitimeframeTradingBot:
     """Bot de trading con análisis multitimeframe"""
     
@@ -37,25 +50,41 @@ class MultitimeframeTradingBot:
         self.client = get_client()
         self.running = False
         
-        # Configuración multitimeframe
-        self.timeframes = settings.get('multitimeframe', {}).get('timeframes', ['1m', '3m', '5m'])
-        self.min_confirmations = settings.get('multitimeframe', {}).get('min_confirmations', 2)
-        self.enabled = settings.get('multitimeframe', {}).get('enabled', True)
+        # Configuración multitimeframe (sección multitimeframe de configs/ml.yaml)
+        mtf_cfg = cfg.get('multitimeframe', {}) or {}
+        self.timeframes = mtf_cfg.get('timeframes', ['1m', '3m', '5m'])
+        self.min_confirmations = mtf_cfg.get('min_confirmations', 2)
+        self.rearm_seconds = mtf_cfg.get('rearm_seconds', 900)
+        self.enabled = mtf_cfg.get('enabled', True)
+        self.strategy = os.getenv("MTF_STRATEGY", mtf_cfg.get('strategy', STRATEGY_VOTE))
         
         if not self.enabled:
             log.error("❌ Multitimeframe not enabled in config!")
             sys.exit(1)
+        if self.strategy not in (STRATEGY_VOTE, STRATEGY_FUSED):
+            log.error(f"❌ Unknown multitimeframe strategy: {self.strategy}")
+            sys.exit(1)
+            
+        # En modo fusionado solo se escucha 1m: 3m/5m se agregan localmente
+        self.stream_timeframes = ['1m'] if self.strategy == STRATEGY_FUSED else list(self.timeframes)
             
         log.info(f"🎯 Multitimeframe Bot Configuration:")
+        log.info(f"  └─ Strategy: {self.strategy}")
         log.info(f"  └─ Timeframes: {self.timeframes}")
-        log.info(f"  └─ Min confirmations: {self.min_confirmations}")
+        if self.strategy == STRATEGY_VOTE:
+            log.info(f"  └─ Min confirmations: {self.min_confirmations}")
         
         # Componentes principales
         self.symbols = []
         self.trading_engine = None
         self.ml_engine = None
         self.decision_manager = None
+        self.fused_dedup = SignalDeduplicator(self.rearm_seconds)
+        
+        # Símbolos con señal emitida y posición abierta: se rearman al cerrarse
+        self._awaiting_close = set()
         self.websocket = None
+        self.loop = None
         
         # Buffers de datos por timeframe
         self.kline_buffers = {}
@@ -87,17 +116,19 @@ class MultitimeframeTradingBot:
         await self.ml_engine.initialize()
         log.info("✅ ML inference engine initialized")
         
-        # 4. Inicializar decision manager
-        self.decision_manager = MultitimeframeDecisionManager(
-            timeframes=self.timeframes,
-            min_confirmations=self.min_confirmations
-        )
-        log.info("✅ Multitimeframe decision manager initialized")
+        # 4. Inicializar decision manager (solo en modo votación)
+        if self.strategy == STRATEGY_VOTE:
+            self.decision_manager = MultitimeframeDecisionManager(
+                timeframes=self.timeframes,
+                min_confirmations=self.min_confirmations,
+                rearm_seconds=self.rearm_seconds
+            )
+            log.info("✅ Multitimeframe decision manager initialized")
         
         # 5. Inicializar buffers de klines
         for symbol in self.symbols:
             self.kline_buffers[symbol] = {}
-            for tf in self.timeframes:
+            for tf in self.stream_timeframes:
                 self.kline_buffers[symbol][tf] = []
         log.info("✅ Kline buffers initialized")
         
@@ -109,7 +140,7 @@ class MultitimeframeTradingBot:
         
         self.websocket = start_multitimeframe_websocket(
             symbols=self.symbols,
-            timeframes=self.timeframes,
+            timeframes=self.stream_timeframes,
             callback=self._on_kline_received
         )
         
@@ -117,7 +148,16 @@ class MultitimeframeTradingBot:
         
     def _on_kline_received(self, symbol: str, timeframe: str, kline_data: dict):
         """
-        Callback cuando se recibe un kline de cualquier timeframe
+        Callback cuando se recibe un kline de cualquier timeframe (hilo del WebSocket).
+        Solo reenvía al event loop: buffers y decision manager se mutan en un único hilo.
+        """
+        if self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self._handle_kline, symbol, timeframe, kline_data)
+        
+    def _handle_kline(self, symbol: str, timeframe: str, kline_data: dict):
+        """
+        Procesar un kline cerrado dentro del event loop
         
         Args:
             symbol: Símbolo del activo
@@ -126,14 +166,16 @@ class MultitimeframeTradingBot:
         """
         try:
             self.stats['klines_received'] += 1
+            note_price(symbol, float(kline_data['c']))
             
             # Agregar kline al buffer
             if symbol in self.kline_buffers and timeframe in self.kline_buffers[symbol]:
                 buffer = self.kline_buffers[symbol][timeframe]
                 buffer.append(kline_data)
                 
-                # Mantener solo los últimos 100 klines
-                if len(buffer) > 100:
+                # Mantener solo los últimos klines (más en modo fusionado)
+                max_len = FUSED_BUFFER_SIZE if self.strategy == STRATEGY_FUSED else 100
+                if len(buffer) > max_len:
                     buffer.pop(0)
                     
             # Log cada 100 klines recibidos
@@ -141,7 +183,10 @@ class MultitimeframeTradingBot:
                 log.debug(f"📈 Received {self.stats['klines_received']} klines")
                 
             # Procesar con ML si tenemos suficientes datos
-            asyncio.create_task(self._process_ml_prediction(symbol, timeframe))
+            if self.strategy == STRATEGY_FUSED:
+                asyncio.create_task(self._process_fused_prediction(symbol))
+            else:
+                asyncio.create_task(self._process_ml_prediction(symbol, timeframe))
             
         except Exception as e:
             log.error(f"❌ Error processing kline for {symbol} {timeframe}: {e}")
@@ -165,6 +210,7 @@ class MultitimeframeTradingBot:
             signal = prediction.get('signal', 'HOLD')
             confidence = prediction.get('confidence', 0.0)
             price = float(buffer[-1].get('c', 0))  # Precio de cierre del último kline
+            bar_time = int(buffer[-1].get('T', 0)) or None  # Cierre de la vela (reloj del manager)
             
             # Agregar decisión al manager
             confirmed_signal = self.decision_manager.add_decision(
@@ -172,7 +218,8 @@ class MultitimeframeTradingBot:
                 timeframe=timeframe,
                 signal=signal,
                 confidence=confidence,
-                price=price
+                price=price,
+                bar_time=bar_time
             )
             
             # Si hay señal confirmada, ejecutar trade
@@ -183,6 +230,40 @@ class MultitimeframeTradingBot:
         except Exception as e:
             log.error(f"❌ Error in ML prediction for {symbol} {timeframe}: {e}")
             
+    async def _process_fused_prediction(self, symbol: str):
+        """Una inferencia por símbolo y minuto con el vector 1m/3m/5m fusionado"""
+        try:
+            buffer = self.kline_buffers.get(symbol, {}).get('1m', [])
+            prediction = await self.ml_engine.predict_fused(symbol, buffer, timeframes=self.timeframes)
+            if not prediction:
+                return
+                
+            self.stats['ml_predictions'] += 1
+            
+            signal = prediction.get('signal', 'HOLD')
+            if signal not in ('BUY', 'SELL'):
+                return
+                
+            # Mismo formato que las señales confirmadas por votación:
+            # el modelo fusionado ya ve todos los timeframes a la vez
+            price = float(buffer[-1].get('c', 0))
+            bar_time = int(buffer[-1].get('T', 0)) or int(time.time() * 1000)
+            if not self.fused_dedup.admit(symbol, signal, bar_time):
+                return
+            confirmed_signal = {
+                'symbol': symbol,
+                'signal': signal,
+                'confidence': prediction.get('confidence', 0.0),
+                'avg_price': price,
+                'confirmations': len(self.timeframes),
+                'confirming_tfs': list(self.timeframes),
+            }
+            self.stats['confirmed_signals'] += 1
+            await self._execute_confirmed_signal(confirmed_signal)
+            
+        except Exception as e:
+            log.error(f"❌ Error in fused ML prediction for {symbol}: {e}")
+            
     async def _execute_confirmed_signal(self, confirmed_signal: dict):
         """Ejecutar una señal confirmada"""
         try:
@@ -196,13 +277,7 @@ class MultitimeframeTradingBot:
             log.info(f"  └─ Avg price: {avg_price}")
             log.info(f"  └─ Confirming TFs: {', '.join(confirmed_signal['confirming_tfs'])}")
             
-            # Verificar si ya tenemos posición
-            position = await self.trading_engine.get_position(symbol)
-            if position and position.get('positionAmt', 0) != 0:
-                log.info(f"⚠️ Already have position in {symbol}, skipping")
-                return
-                
-            # Ejecutar la entrada
+            # Ejecutar la entrada (posición abierta, cooldown y slots los decide la puerta pre-trade en memoria)
             if signal == 'BUY':
                 result = await self.trading_engine.enter_long_position(symbol)
             elif signal == 'SELL':
@@ -212,19 +287,66 @@ class MultitimeframeTradingBot:
                 
             if result and result.get('success'):
                 self.stats['trades_executed'] += 1
+                self._awaiting_close.add(symbol)
                 log.info(f"✅ Trade executed successfully for {symbol}")
+            elif result and result.get('reason') == REASON_POSITION_OPEN:
+                # El episodio sigue consumido hasta que se cierre la posición
+                log.info(f"⚠️ Already have position in {symbol}, skipping")
+                self._awaiting_close.add(symbol)
             else:
                 log.error(f"❌ Failed to execute trade for {symbol}")
+                self._rearm_signal(symbol, signal)
                 
         except Exception as e:
             log.error(f"❌ Error executing confirmed signal: {e}")
+            self._rearm_signal(confirmed_signal.get('symbol'), confirmed_signal.get('signal'))
+            
+    def _rearm_signal(self, symbol: str, signal: str):
+        """La entrada no se hizo (gate, error): el episodio no cuenta y la señal puede volver"""
+        if self.decision_manager:
+            self.decision_manager.rearm(symbol, signal)
+        self.fused_dedup.rearm(symbol, signal)
             
-    def start_statistics_thread(self):
-        """Iniciar hilo de estadísticas"""
-        def log_stats():
+    def _rearm(self, symbol: str):
+        """Permitir de nuevo señales del símbolo (posición cerrada)"""
+        self._awaiting_close.discard(symbol)
+        if self.decision_manager:
+            self.decision_manager.rearm(symbol)
+        self.fused_dedup.rearm(symbol)
+        log.debug(f"🔔 {symbol}: signals re-armed")
+        
+    def _on_account_event(self, event, payload):
+        """Listener del user-data stream (hilo del WebSocket): cierre -> rearme inmediato"""
+        if event == "position":
+            symbol, _old, new = payload
+            if new == 0 and symbol in self._awaiting_close:
+                self.loop.call_soon_threadsafe(self._rearm, symbol)
+
+    def start_position_watch_task(self):
+        """Rearmar señales cuando se cierran las posiciones abiertas por el bot"""
+        get_account_state().add_listener(self._on_account_event)
+
+        async def watch():
             while self.running:
+                await asyncio.sleep(POSITION_WATCH_SECONDS)
+                if not self._awaiting_close:
+                    continue
                 try:
-                    time.sleep(300)  # Log cada 5 minutos
+                    # Una sola consulta para todos los símbolos pendientes
+                    open_symbols = set(await asyncio.to_thread(get_all_open_positions))
+                    for symbol in list(self._awaiting_close - open_symbols):
+                        self._rearm(symbol)
+                except Exception as e:
+                    log.error(f"❌ Error in position watch: {e}")
+                    
+        self.loop.create_task(watch())
+        
+    def start_statistics_task(self):
+        """Iniciar la tarea de estadísticas (en el event loop, sin hilos extra)"""
+        async def log_stats():
+            while self.running:
+                try:
+                    await asyncio.sleep(300)  # Log cada 5 minutos
                     
                     runtime = time.time() - self.stats['start_time']
                     hours = runtime / 3600
@@ -233,19 +355,18 @@ class MultitimeframeTradingBot:
                     log.info(f"  └─ Klines received: {self.stats['klines_received']}")
                     log.info(f"  └─ ML predictions: {self.stats['ml_predictions']}")
                     log.info(f"  └─ Confirmed signals: {self.stats['confirmed_signals']}")
+                    if self.strategy == STRATEGY_FUSED:
+                        log.info(f"  └─ Suppressed repeats: {self.fused_dedup.suppressed}")
                     log.info(f"  └─ Trades executed: {self.stats['trades_executed']}")
                     
-                    # Log estadísticas del decision manager
-                    self.decision_manager.log_status()
-                    
-                    # Cleanup de decisiones antiguas
-                    self.decision_manager.cleanup_old_decisions()
+                    # Log estadísticas del decision manager (la caducidad la lleva su rueda de timers)
+                    if self.decision_manager:
+                        self.decision_manager.log_status()
                     
                 except Exception as e:
-                    log.error(f"❌ Error in statistics thread: {e}")
+                    log.error(f"❌ Error in statistics task: {e}")
                     
-        stats_thread = threading.Thread(target=log_stats, daemon=True)
-        stats_thread.start()
+        self.loop.create_task(log_stats())
         
     def setup_signal_handlers(self):
         """Configurar manejadores de señales para cierre graceful"""
@@ -260,6 +381,7 @@ class MultitimeframeTradingBot:
         """Ejecutar el bot principal"""
         try:
             self.running = True
+            self.loop = asyncio.get_running_loop()
             self.setup_signal_handlers()
             
             # Inicializar componentes
@@ -268,8 +390,9 @@ class MultitimeframeTradingBot:
             # Iniciar WebSocket
             self.start_websocket()
             
-            # Iniciar hilo de estadísticas
-            self.start_statistics_thread()
+            # Iniciar tareas de estadísticas y rearme de señales
+            self.start_statistics_task()
+            self.start_position_watch_task()
             
             log.info("🚀 Multitimeframe Trading Bot is running!")
             log.info("Press Ctrl+C to stop...")
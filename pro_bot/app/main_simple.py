@@ -10,7 +10,7 @@ import time
 from pro_bot.config import settings
 from pro_bot.core.client import get_client
 from pro_bot.core.ws_multi import start_kline_multiplex
-from pro_bot.core.execution import refresh_open_positions_cache
+from pro_bot.core.execution import start_positions_cache_refresher
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("main_simple")
@@ -69,7 +69,7 @@ def main():
     
     # Inicializar cliente
     get_client()
-    refresh_open_positions_cache()
+    start_positions_cache_refresher()
     
     # Usar símbolos fijos del .env
     symbols_env = os.getenv("SYMBOLS", "").strip()
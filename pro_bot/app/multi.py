@@ -13,10 +13,8 @@ from pro_bot.core.client import get_client
 from pro_bot.core.ws_multi import start_kline_multiplex
 from pro_bot.core.execution import (
     enter_position,
-    _can_open_new_position,
-    refresh_open_positions_cache,
-    has_open_position,
-    open_positions_count,
+    note_price,
+    start_positions_cache_refresher,
 )
 
 # ML
@@ -79,6 +77,7 @@ def worker(symbol: str):
 
         idx = datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).replace(tzinfo=None)
         DF[symbol].loc[idx] = row
+        note_price(symbol, row["close"])
 
         feats_df = build_features(DF[symbol], cfg)
         if len(feats_df) < 10:
@@ -90,17 +89,13 @@ def worker(symbol: str):
         log.info(f"[{symbol}] ML Decision: {decision} p={prob:.3f}")
 
         if decision in ("LONG", "SHORT"):
-            # bloqueos: una por símbolo + máximo global
-            if not _can_open_new_position(symbol):
-                log.info(f"[{symbol}] ya tiene posición abierta; no abriré otra.")
-                continue
-            max_open = int(getattr(settings, "max_open_positions", 5))
-            if open_positions_count() >= max_open:
-                log.info(f"[{symbol}] límite global de posiciones ({max_open}) alcanzado; se omite entrada.")
-                continue
+            # bloqueos (una por símbolo + máximo global): enter_position reserva
+            # hueco en la puerta pre-trade de forma atómica entre workers
             try:
                 log.info(f"[{symbol}] Entering {decision} via LIMIT")
-                enter_position(decision, use_limit=True, symbol=symbol)
+                res = enter_position(decision, use_limit=True, symbol=symbol)
+                if not res.get("success"):
+                    log.info(f"[{symbol}] entrada omitida: {res.get('error')}")
             except Exception as e:
                 log.warning(f"[{symbol}] enter error: {e}")
 
@@ -158,9 +153,7 @@ def main():
         workers.append(t)
 
     # Cache refresh
-    refresh_open_positions_cache()
-    t_refresh = threading.Thread(target=refresh_open_positions_cache, daemon=True)
-    t_refresh.start()
+    start_positions_cache_refresher()
 
     log.info("Bot started. Ctrl+C to stop.")
     try:
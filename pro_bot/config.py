@@ -20,4 +20,8 @@ class Settings(BaseModel):
     warmup_lookback_min: int = int(os.getenv("WARMUP_LOOKBACK_MIN", 1500))
     train_interval: str = os.getenv("TRAIN_INTERVAL", "1m")
     train_lookback_days: int = int(os.getenv("TRAIN_LOOKBACK_DAYS", 30))
+    user_stream: bool = os.getenv("USER_STREAM", "true").lower() == "true"
+    order_transport: str = os.getenv("ORDER_TRANSPORT", "rest").lower()   # rest | ws
+    ws_api_url: str = os.getenv("WS_API_URL", "wss://ws-fapi.binance.com/ws-fapi/v1")
+    risk_loop: bool = os.getenv("RISK_LOOP", "true").lower() == "true"   # BE/trailing por tick de mark price
 settings = Settings()
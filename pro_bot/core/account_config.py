@@ -0,0 +1,217 @@
+"""
+Caché de configuración de cuenta por símbolo (leverage, tipo de margen) y
+modo de posición.
+
+Se carga de un solo GET /fapi/v1/symbolConfig, que trae leverage y
+marginType de todos los símbolos (positionRisk v3 ya no los incluye y solo
+lista símbolos con posición u órdenes), y el modo de posición de
+/fapi/v1/accountConfig. Los eventos ACCOUNT_CONFIG_UPDATE la mantienen al día
+y después solo se actualiza con los cambios confirmados por el exchange. Las llamadas futures_change_leverage
+y futures_change_margin_type salen solo si el estado cacheado difiere del
+deseado. La pasada de arranque sobre todo el universo corre con paralelismo
+acotado.
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from .client import get_client
+
+log = logging.getLogger("account_cfg")
+
+NO_CHANGE_MARGIN = -4046      # "No need to change margin type."
+NO_CHANGE_POSITION_MODE = -4059
+STARTUP_CONCURRENCY = 8
+
+
+def _norm_margin(value: str) -> str:
+    v = str(value or "").upper()
+    return "CROSSED" if v in ("CROSS", "CROSSED") else "ISOLATED" if v == "ISOLATED" else v
+
+
+class AccountConfigCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.leverage: Dict[str, int] = {}
+        self.margin_type: Dict[str, str] = {}
+        self.dual_side: Optional[bool] = None
+        self.loaded = False
+        self.cli = None          # binance.Client explícito (FuturesClient lo fija al construirse)
+        self.stats = {"skipped": 0, "changed": 0, "errors": 0}
+
+    # --- estado ---------------------------------------------------------
+    def apply_symbol_config(self, rows: Iterable[dict]) -> int:
+        """
+        Carga leverage/marginType por símbolo (filas de symbolConfig o de
+        positionRisk v2). Solo marca la caché como cargada si alguna fila
+        traía configuración: las de positionRisk v3 no la traen.
+        """
+        n = 0
+        with self._lock:
+            for p in rows:
+                sym = p.get("symbol")
+                if not sym:
+                    continue
+                has_cfg = False
+                if p.get("leverage") not in (None, ""):
+                    self.leverage[sym] = int(p["leverage"])
+                    has_cfg = True
+                if p.get("marginType"):
+                    self.margin_type[sym] = _norm_margin(p["marginType"])
+                    has_cfg = True
+                n += has_cfg
+            if n:
+                self.loaded = True
+        return n
+
+    def on_config_update(self, msg: dict) -> None:
+        """Evento ACCOUNT_CONFIG_UPDATE del user-data stream."""
+        ac = msg.get("ac")
+        if ac and ac.get("s") and ac.get("l") is not None:
+            self.mark_leverage(ac["s"], int(ac["l"]))
+
+    def _cli(self):
+        return self.cli if self.cli is not None else get_client().client
+
+    def load(self) -> None:
+        cli = self._cli()
+        n = self.apply_symbol_config(cli.futures_symbol_config())
+        try:
+            self.dual_side = bool(cli.futures_account_config().get("dualSidePosition"))
+        except Exception as e:
+            log.debug(f"account config: {e}")
+        log.info(f"📋 Config de cuenta cacheada: {n} símbolos")
+
+    def ensure_loaded(self) -> None:
+        if not self.loaded:
+            try:
+                self.load()
+            except Exception as e:
+                log.warning(f"⚠️ No se pudo cargar la config de cuenta (se llamará al exchange): {e}")
+
+    def leverage_is(self, symbol: str, leverage: int) -> bool:
+        return self.leverage.get(symbol) == leverage
+
+    def margin_is(self, symbol: str, margin_type: str) -> bool:
+        return self.margin_type.get(symbol) == _norm_margin(margin_type)
+
+    def mark_leverage(self, symbol: str, leverage: int) -> None:
+        with self._lock:
+            self.leverage[symbol] = leverage
+
+    def mark_margin(self, symbol: str, margin_type: str) -> None:
+        with self._lock:
+            self.margin_type[symbol] = _norm_margin(margin_type)
+
+    # --- cambios (síncronos) -------------------------------------------
+    def ensure_leverage(self, symbol: str, leverage: int) -> bool:
+        """True si hubo que cambiarlo en el exchange."""
+        self.ensure_loaded()
+        if self.leverage_is(symbol, leverage):
+            self.stats["skipped"] += 1
+            return False
+        self._cli().futures_change_leverage(symbol=symbol, leverage=leverage)
+        self.mark_leverage(symbol, leverage)
+        self.stats["changed"] += 1
+        log.info(f"[{symbol}] leverage set to {leverage}")
+        return True
+
+    def ensure_margin_type(self, symbol: str, margin_type: str) -> bool:
+        self.ensure_loaded()
+        if self.margin_is(symbol, margin_type):
+            self.stats["skipped"] += 1
+            return False
+        try:
+            self._cli().futures_change_margin_type(symbol=symbol, marginType=margin_type)
+        except Exception as e:
+            if getattr(e, "code", None) != NO_CHANGE_MARGIN:
+                raise
+        self.mark_margin(symbol, margin_type)
+        self.stats["changed"] += 1
+        log.info(f"[{symbol}] ✅ Margen configurado: {margin_type}")
+        return True
+
+    def ensure_position_mode(self, dual: bool) -> bool:
+        self.ensure_loaded()
+        if self.dual_side == dual:
+            return False
+        try:
+            self._cli().futures_change_position_mode(dualSidePosition="true" if dual else "false")
+        except Exception as e:
+            if getattr(e, "code", None) != NO_CHANGE_POSITION_MODE:
+                raise
+        self.dual_side = dual
+        return True
+
+    def configure_symbols(self, symbols: Iterable[str], margin_type: str, leverage: Optional[int] = None,
+                          max_workers: int = STARTUP_CONCURRENCY) -> int:
+        """Pasada de arranque: solo los símbolos que difieren, con hasta `max_workers` en paralelo."""
+        self.ensure_loaded()
+        todo = [s for s in sorted(set(symbols))
+                if not self.margin_is(s, margin_type) or (leverage is not None and not self.leverage_is(s, leverage))]
+        self.stats["skipped"] += len(set(symbols)) - len(todo)
+
+        def _one(sym: str) -> bool:
+            try:
+                self.ensure_margin_type(sym, margin_type)
+                if leverage is not None:
+                    self.ensure_leverage(sym, leverage)
+                return True
+            except Exception as e:
+                self.stats["errors"] += 1
+                log.warning(f"⚠️ {sym}: Error configurando cuenta: {e}")
+                return False
+
+        if todo:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="acct-cfg") as pool:
+                ok = sum(pool.map(_one, todo))
+        else:
+            ok = 0
+        log.info(f"🎯 Config {margin_type}: {ok}/{len(todo)} cambios, {len(set(symbols)) - len(todo)} ya correctos")
+        return ok
+
+    # --- cambios (async, cliente aiohttp) ------------------------------
+    async def ensure_leverage_async(self, aclient, symbol: str, leverage: int) -> bool:
+        if self.leverage_is(symbol, leverage):
+            self.stats["skipped"] += 1
+            return False
+        await aclient.change_leverage(symbol, leverage)
+        self.mark_leverage(symbol, leverage)
+        self.stats["changed"] += 1
+        return True
+
+    async def configure_symbols_async(self, aclient, symbols: Iterable[str], margin_type: str,
+                                      concurrency: int = STARTUP_CONCURRENCY) -> int:
+        if not self.loaded:
+            self.apply_symbol_config(await aclient.symbol_config())
+        syms = sorted(set(symbols))
+        todo = [s for s in syms if not self.margin_is(s, margin_type)]
+        self.stats["skipped"] += len(syms) - len(todo)
+        sem = asyncio.Semaphore(concurrency)
+
+        async def _one(sym: str) -> bool:
+            async with sem:
+                try:
+                    await aclient.change_margin_type(sym, margin_type)
+                except Exception as e:
+                    if getattr(e, "code", None) != NO_CHANGE_MARGIN:
+                        self.stats["errors"] += 1
+                        log.warning(f"⚠️ {sym}: Error cambiando margen: {e}")
+                        return False
+                self.mark_margin(sym, margin_type)
+                self.stats["changed"] += 1
+                return True
+
+        ok: List[bool] = await asyncio.gather(*(_one(s) for s in todo))
+        log.info(f"🎯 Config {margin_type}: {sum(ok)}/{len(todo)} cambios, {len(syms) - len(todo)} ya correctos")
+        return sum(ok)
+
+
+_cache = AccountConfigCache()
+
+
+def get_account_config() -> AccountConfigCache:
+    return _cache
@@ -0,0 +1,194 @@
+"""
+Cliente REST asíncrono (aiohttp) para los endpoints de Futuros que usa el bot.
+
+Una sola ClientSession con pool keep-alive por proceso: las peticiones
+concurrentes no pasan por el executor de hilos ni pagan un handshake TLS por
+llamada. Firma HMAC-SHA256 como python-binance, offset de hora compartido con
+FuturesClient.sync_time (y resync automático ante -1021) y un ping periódico
+para que el pool no se quede frío entre órdenes.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+
+import aiohttp
+
+from ..config import settings
+from . import client as sync_client
+from .rate_governor import classify, endpoint_weight, get_governor
+
+log = logging.getLogger("aclient")
+
+FUTURES_BASE_URL = "https://fapi.binance.com"
+WARM_INTERVAL_SECONDS = 20.0
+
+
+class AsyncAPIError(Exception):
+    def __init__(self, status: int, code: Optional[int], msg: str):
+        super().__init__(f"APIError(code={code}): {msg}")
+        self.status = status
+        self.code = code
+        self.msg = msg
+
+
+class AsyncFuturesClient:
+    def __init__(self, api_key: Optional[str] = None, api_secret: Optional[str] = None,
+                 base_url: str = FUTURES_BASE_URL, pool_size: int = 100, timeout: float = 10.0,
+                 warm_interval: float = WARM_INTERVAL_SECONDS):
+        self.api_key = api_key if api_key is not None else settings.api_key
+        self.api_secret = (api_secret if api_secret is not None else settings.api_secret).encode()
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.warm_interval = warm_interval
+        self.time_offset = 0
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._warm_task: Optional[asyncio.Task] = None
+        self.last_headers: Dict[str, str] = {}
+
+    async def start(self) -> "AsyncFuturesClient":
+        if self.session is not None:
+            return self
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(
+            connector=connector, headers={"X-MBX-APIKEY": self.api_key},
+            timeout=aiohttp.ClientTimeout(total=self.timeout))
+        # Reusar el offset del cliente síncrono si ya se sincronizó
+        if sync_client.client_singleton is not None:
+            self.time_offset = int(getattr(sync_client.client_singleton.client, "_timestamp_offset", 0) or 0)
+        else:
+            await self.sync_time()
+        self._warm_task = asyncio.create_task(self._keep_warm())
+        log.info(f"✅ Cliente REST async listo (pool={self.pool_size}, offset={self.time_offset} ms)")
+        return self
+
+    async def close(self) -> None:
+        if self._warm_task:
+            self._warm_task.cancel()
+            self._warm_task = None
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def sync_time(self) -> None:
+        data = await self._request("GET", "/fapi/v1/time")
+        self.time_offset = int(data["serverTime"]) - int(time.time() * 1000)
+        log.info(f"Time sync OK (async). Offset: {self.time_offset} ms")
+
+    async def _keep_warm(self) -> None:
+        while True:
+            await asyncio.sleep(self.warm_interval)
+            try:
+                await self._request("GET", "/fapi/v1/ping")
+            except Exception as e:
+                log.debug(f"ping keep-alive falló: {e}")
+
+    # --- núcleo ---------------------------------------------------------
+    def _sign(self, params: dict) -> str:
+        params = {k: v for k, v in params.items() if v is not None}
+        params["timestamp"] = int(time.time() * 1000) + self.time_offset
+        params.setdefault("recvWindow", settings.recv_window)
+        query = urlencode(params)
+        sig = hmac.new(self.api_secret, query.encode(), hashlib.sha256).hexdigest()
+        return f"{query}&signature={sig}"
+
+    async def _request(self, method: str, path: str, signed: bool = False,
+                       params: Optional[dict] = None, _retry: bool = True):
+        if self.session is None:
+            await self.start()
+        params = dict(params or {})
+        if signed:
+            query = self._sign(params)
+        else:
+            query = urlencode({k: v for k, v in params.items() if v is not None})
+        url = f"{self.base_url}{path}" + (f"?{query}" if query else "")
+        gov = get_governor()
+        weight, orders = endpoint_weight(method, path, params)
+        await gov.acquire_async(classify(method, path, params), weight, orders)
+        async with self.session.request(method, url) as resp:
+            self.last_headers = dict(resp.headers)
+            gov.observe(resp.status, resp.headers)
+            data = await resp.json(content_type=None)
+            if resp.status >= 400 or (isinstance(data, dict) and data.get("code", 0) < 0 and "msg" in data):
+                code = data.get("code") if isinstance(data, dict) else None
+                if code == -1021 and _retry:
+                    # Timestamp fuera de recvWindow: resincronizar y reintentar una vez
+                    await self.sync_time()
+                    return await self._request(method, path, signed, params, _retry=False)
+                raise AsyncAPIError(resp.status, code, data.get("msg", "") if isinstance(data, dict) else str(data))
+            return data
+
+    # --- endpoints ------------------------------------------------------
+    async def create_order(self, **params) -> dict:
+        return await self._request("POST", "/fapi/v1/order", True, params)
+
+    async def get_order(self, symbol: str, orig_client_order_id: str) -> dict:
+        return await self._request("GET", "/fapi/v1/order", True,
+                                   {"symbol": symbol, "origClientOrderId": orig_client_order_id})
+
+    async def cancel_order(self, symbol: str, order_id: int) -> dict:
+        return await self._request("DELETE", "/fapi/v1/order", True, {"symbol": symbol, "orderId": order_id})
+
+    async def cancel_all_open_orders(self, symbol: str) -> dict:
+        return await self._request("DELETE", "/fapi/v1/allOpenOrders", True, {"symbol": symbol})
+
+    async def place_batch_orders(self, orders: List[dict]) -> List[dict]:
+        """Hasta 5 órdenes; la respuesta trae una entrada (orden o error) por pata."""
+        payload = json.dumps([{k: str(v) for k, v in o.items()} for o in orders], separators=(",", ":"))
+        return await self._request("POST", "/fapi/v1/batchOrders", True, {"batchOrders": payload})
+
+    async def position_information(self, symbol: Optional[str] = None) -> List[dict]:
+        return await self._request("GET", "/fapi/v2/positionRisk", True, {"symbol": symbol})
+
+    async def symbol_config(self, symbol: Optional[str] = None) -> List[dict]:
+        """Leverage y marginType por símbolo (todos si no se indica)."""
+        return await self._request("GET", "/fapi/v1/symbolConfig", True, {"symbol": symbol})
+
+    async def open_orders(self, symbol: Optional[str] = None) -> List[dict]:
+        return await self._request("GET", "/fapi/v1/openOrders", True, {"symbol": symbol})
+
+    async def klines(self, symbol: str, interval: str, limit: int = 500,
+                     start_time: Optional[int] = None, end_time: Optional[int] = None) -> List[list]:
+        return await self._request("GET", "/fapi/v1/klines", False, {
+            "symbol": symbol, "interval": interval, "limit": limit,
+            "startTime": start_time, "endTime": end_time})
+
+    async def ticker_price(self, symbol: str) -> dict:
+        return await self._request("GET", "/fapi/v1/ticker/price", False, {"symbol": symbol})
+
+    async def exchange_info(self) -> dict:
+        return await self._request("GET", "/fapi/v1/exchangeInfo")
+
+    async def account(self) -> dict:
+        return await self._request("GET", "/fapi/v2/account", True)
+
+    async def change_leverage(self, symbol: str, leverage: int) -> dict:
+        return await self._request("POST", "/fapi/v1/leverage", True, {"symbol": symbol, "leverage": leverage})
+
+    async def change_margin_type(self, symbol: str, margin_type: str) -> dict:
+        return await self._request("POST", "/fapi/v1/marginType", True, {"symbol": symbol, "marginType": margin_type})
+
+
+_aclient: Optional[AsyncFuturesClient] = None
+
+
+async def get_async_client() -> AsyncFuturesClient:
+    """Cliente async del proceso (se crea y arranca en el primer uso, dentro del event loop)."""
+    global _aclient
+    if _aclient is None:
+        _aclient = AsyncFuturesClient()
+    await _aclient.start()
+    return _aclient
+
+
+async def close_async_client() -> None:
+    global _aclient
+    if _aclient is not None:
+        await _aclient.close()
+        _aclient = None
@@ -1,14 +1,32 @@
 import time, logging
+from typing import Optional
 from binance.client import Client
 from ..config import settings
+from .rate_governor import install_on_client
 log = logging.getLogger("client")
 FUTURES_MAIN_URL = "https://fapi.binance.com/fapi"
+ORDER_NOT_FOUND = -2013   # "Order does not exist."
+
+def find_order(cli, symbol: str, client_order_id: str) -> Optional[dict]:
+    """
+    Orden por su newClientOrderId. None solo si el exchange confirma que no
+    existe (-2013); cualquier otro error se propaga: sin saber si la orden
+    llegó, no se puede reenviar sin arriesgar un duplicado.
+    """
+    try:
+        return cli.futures_get_order(symbol=symbol, origClientOrderId=client_order_id)
+    except Exception as e:
+        if getattr(e, "code", None) == ORDER_NOT_FOUND:
+            return None
+        raise
 
 class FuturesClient:
     def __init__(self):
         self.client = Client(settings.api_key, settings.api_secret)
         # Forzar URL de Futuros correcta
         self.client.FUTURES_URL = FUTURES_MAIN_URL
+        # Todas las peticiones REST pasan por el gobernador de peso
+        install_on_client(self.client)
 
         # Sincronía de tiempo
         self.sync_time()
@@ -37,30 +55,34 @@ class FuturesClient:
                 log.warning(f"Time sync failed (attempt {a}): {e}"); time.sleep(1*a)
         raise RuntimeError("No se pudo sincronizar hora con Binance.")
     def _configure_account(self):
+        # Solo se envían los cambios que difieren del snapshot de positionRisk
+        from .account_config import get_account_config
+        cfg = get_account_config()
+        cfg.cli = self.client
         sym = settings.symbol
-        try: self.client.futures_change_margin_type(symbol=sym, marginType=settings.margin_type)
+        try: cfg.ensure_margin_type(sym, settings.margin_type)
         except Exception as e: log.info(f"margin_type: {e}")
-        try: self.client.futures_change_leverage(symbol=sym, leverage=settings.leverage)
+        try: cfg.ensure_leverage(sym, settings.leverage)
         except Exception as e: log.info(f"leverage: {e}")
-        try:
-            dual = "true" if settings.position_mode.upper() == "HEDGE" else "false"
-            self.client.futures_change_position_mode(dualSidePosition=dual)
+        try: cfg.ensure_position_mode(settings.position_mode.upper() == "HEDGE")
         except Exception as e: log.info(f"position_mode: {e}")
     
     def configure_margin_for_symbol(self, symbol: str):
         """Configura el tipo de margen para un símbolo específico"""
+        from .account_config import get_account_config
         try:
-            self.client.futures_change_margin_type(symbol=symbol, marginType=settings.margin_type)
-            log.info(f"[{symbol}] ✅ Margen configurado: {settings.margin_type}")
+            get_account_config().ensure_margin_type(symbol, settings.margin_type)
         except Exception as e:
             log.warning(f"[{symbol}] ⚠️ Error configurando margen: {e}")
     
     def standardize_margin_for_all_symbols(self, symbols: list):
         """Estandariza el tipo de margen para todos los símbolos de la lista"""
+        from .account_config import get_account_config
         log.info(f"🔧 Estandarizando margen {settings.margin_type} para {len(symbols)} símbolos...")
-        for symbol in symbols:
-            self.configure_margin_for_symbol(symbol)
-    def exchange_info(self): return self.client.futures_exchange_info()
+        get_account_config().configure_symbols(symbols, settings.margin_type)
+    def exchange_info(self):
+        from .exchange_info import get_exchange_info   # snapshot compartido (TTL + disco)
+        return get_exchange_info().raw()
     def account(self): return self.client.futures_account()
     def ticker_price(self, symbol: str): return self.client.futures_symbol_ticker(symbol=symbol)
 client_singleton=None
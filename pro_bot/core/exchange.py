@@ -1,24 +1,62 @@
 import math
 from decimal import Decimal, ROUND_FLOOR, ROUND_CEILING, getcontext
-from .client import get_client
+from .exchange_info import get_exchange_info
 
 getcontext().prec = 28
 
 def _decimals_from_step(step: str) -> int:
-    # "0.01000000" -> 2 ; "1.00000000" -> 0
-    s = str(step)
-    if "." not in s:
-        return 0
-    return len(s.split(".")[1].rstrip("0"))
+    # "0.01000000" -> 2 ; "1.00000000" -> 0 ; "1E-7" (str de Decimal) -> 7
+    exp = Decimal(str(step)).normalize().as_tuple().exponent
+    return max(0, -exp)
+
+_POW10 = [10 ** i for i in range(40)]
+
+def _scaled_int(x, decimals: int, ceil: bool = False) -> int:
+    """
+    floor/ceil(x * 10**decimals) exacto con enteros. Parte de str(x), que es la
+    misma representación que usa Decimal(str(x)), así que el resultado coincide
+    con el camino Decimal sin construir ningún Decimal.
+    """
+    if type(x) is float:
+        # Lejos de un entero el error de x*10**d (< 1e-6 para |v| < 1e9) no cambia el resultado
+        v = x * _POW10[decimals]
+        if -1e9 < v < 1e9:
+            fl = math.floor(v)
+            if 1e-6 < v - fl < 1 - 1e-6:
+                return fl + 1 if ceil else fl
+    s = str(x)
+    if "e" in s or "E" in s:
+        m, e = s.lower().split("e")
+        ip, _, fp = m.partition(".")
+        n = len(fp) - int(e)
+    else:
+        ip, _, fp = s.partition(".")
+        n = len(fp)
+    v = int(ip + fp)                  # "-0" + "5" -> -5
+    if n <= decimals:
+        return v * 10 ** (decimals - n)
+    q = _POW10[n - decimals] if n - decimals < 40 else 10 ** (n - decimals)
+    return -((-v) // q) if ceil else v // q
+
+def _fmt_units(units: int, decimals: int) -> str:
+    """units / 10**decimals con exactamente `decimals` decimales."""
+    if decimals == 0:
+        return str(units)
+    if units < 0:
+        return "-" + _fmt_units(-units, decimals)
+    s = str(units)
+    if len(s) <= decimals:
+        s = "0" * (decimals + 1 - len(s)) + s
+    return s[:-decimals] + "." + s[-decimals:]
 
 class SymbolFilters:
     def __init__(self, symbol: str):
-        info = get_client().exchange_info()
-        sym = next(s for s in info["symbols"] if s["symbol"] == symbol)
+        sym = get_exchange_info().symbol(symbol)
         self.symbol = symbol
         self.price_step = None
         self.qty_step = None
         self.min_notional = None
+        self.min_qty = Decimal("0")
         self.max_leverage = int(sym.get("leverageFilter", {}).get("maxLeverage", 125)) if "leverageFilter" in sym else 125
 
         for f in sym["filters"]:
@@ -41,6 +79,53 @@ class SymbolFilters:
         self.price_decimals = _decimals_from_step(str(self.price_step))
         self.qty_decimals = _decimals_from_step(str(self.qty_step))
 
+        # Camino rápido: precios/cantidades como enteros escalados (valor = units / 10**decimals)
+        self.price_scale = 10 ** self.price_decimals
+        self.qty_scale = 10 ** self.qty_decimals
+        self.price_step_units = int(self.price_step * self.price_scale)
+        self.qty_step_units = int(self.qty_step * self.qty_scale)
+        # Mínimos en enteros para el cálculo de qty (risk.decide_qty_for_margin)
+        self.min_qty_units = self.qty_units(self.min_qty, up=True)
+        self.min_notional_decimals = _decimals_from_step(str(self.min_notional))
+        self.min_notional_units = _scaled_int(self.min_notional, self.min_notional_decimals, ceil=True)
+
+    # ---- camino rápido con enteros (sin Decimal) ----
+    def price_ticks(self, price: float, up: bool = False) -> int:
+        """Precio redondeado a tick, en unidades de 10**-price_decimals."""
+        u = _scaled_int(price, self.price_decimals, ceil=up)
+        step = self.price_step_units
+        if step == 1:
+            return u
+        return (-((-u) // step) if up else u // step) * step
+
+    def qty_units(self, qty: float, up: bool = False) -> int:
+        u = _scaled_int(qty, self.qty_decimals, ceil=up)
+        step = self.qty_step_units
+        if step == 1:
+            return u
+        return (-((-u) // step) if up else u // step) * step
+
+    def fmt_price_units(self, units: int) -> str:
+        return _fmt_units(units, self.price_decimals)
+
+    def fmt_price_down(self, price: float) -> str:
+        return _fmt_units(self.price_ticks(price), self.price_decimals)
+
+    def fmt_price_up(self, price: float) -> str:
+        return _fmt_units(self.price_ticks(price, up=True), self.price_decimals)
+
+    def fmt_qty_units(self, units: int) -> str:
+        return _fmt_units(units, self.qty_decimals)
+
+    def fmt_qty_down(self, qty: float) -> str:
+        return _fmt_units(self.qty_units(qty), self.qty_decimals)
+
+    def qty_down(self, qty: float) -> float:
+        return self.qty_units(qty) / self.qty_scale
+
+    def price_down(self, price: float) -> float:
+        return self.price_ticks(price) / self.price_scale
+
     # ---- helpers de redondeo/format ----
     def _floor_step(self, x: Decimal, step: Decimal) -> Decimal:
         return (x / step).to_integral_value(rounding=ROUND_FLOOR) * step
@@ -48,20 +133,21 @@ class SymbolFilters:
     def _ceil_step(self, x: Decimal, step: Decimal) -> Decimal:
         return (x / step).to_integral_value(rounding=ROUND_CEILING) * step
 
+    # Mismo resultado que _floor_step/_ceil_step sobre Decimal(str(x)), calculado con enteros
     def round_price_down(self, price: float) -> Decimal:
-        return self._floor_step(Decimal(str(price)), self.price_step)
+        return Decimal(self.price_ticks(price) // self.price_step_units) * self.price_step
 
     def round_price_up(self, price: float) -> Decimal:
-        return self._ceil_step(Decimal(str(price)), self.price_step)
+        return Decimal(self.price_ticks(price, up=True) // self.price_step_units) * self.price_step
 
     def round_qty_down(self, qty: float) -> Decimal:
-        return self._floor_step(Decimal(str(qty)), self.qty_step)
+        return Decimal(self.qty_units(qty) // self.qty_step_units) * self.qty_step
 
     def round_qty_up(self, qty: float) -> Decimal:
-        return self._ceil_step(Decimal(str(qty)), self.qty_step)
+        return Decimal(self.qty_units(qty, up=True) // self.qty_step_units) * self.qty_step
 
     def ensure_min_qty(self, qty: Decimal) -> Decimal:
-        if hasattr(self, "min_qty") and qty < self.min_qty:
+        if qty < self.min_qty:
             return self._ceil_step(self.min_qty, self.qty_step)
         return qty
 
@@ -80,6 +166,8 @@ class SymbolFilters:
         return qty
 
 _filters_cache = {}
+# Tras un refresco de exchangeInfo se reconstruyen los filtros en el siguiente uso
+get_exchange_info().add_listener(_filters_cache.clear)
 
 def get_filters(symbol: str) -> SymbolFilters:
     f = _filters_cache.get(symbol)
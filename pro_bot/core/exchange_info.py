@@ -0,0 +1,166 @@
+"""
+Snapshot compartido de exchangeInfo de Futuros, indexado por símbolo.
+
+Se descarga una sola vez por proceso (el JSON completo pesa cientos de KB),
+se indexa por símbolo y se guarda en outputs/runtime/exchange_info.json para
+que un arranque en frío no tenga que esperar a la descarga. Pasado el TTL se
+sigue sirviendo la copia en memoria mientras un hilo la refresca en segundo
+plano (una sola descarga en vuelo). Una copia en disco de más de
+DISK_MAX_AGE_SECONDS no se usa: se descarga de forma síncrona. Un símbolo
+desconocido fuerza una descarga; si sigue sin aparecer se recuerda durante
+MISSING_TTL_SECONDS y las consultas siguientes lanzan KeyError sin red.
+
+SymbolFilters y la selección de universo (symbols, top_symbols, universe)
+leen de aquí en lugar de llamar a futures_exchange_info por su cuenta.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from .client import get_client
+
+log = logging.getLogger("exchange_info")
+
+RUNTIME_DIR = "outputs/runtime"
+EXCHANGE_INFO_FILE = os.path.join(RUNTIME_DIR, "exchange_info.json")
+EXCHANGE_INFO_TTL_SECONDS = 60 * 60
+DISK_MAX_AGE_SECONDS = 24 * 60 * 60
+MISSING_TTL_SECONDS = 60.0
+
+
+def is_usdt_perpetual(sym: dict) -> bool:
+    return sym.get("contractType") == "PERPETUAL" and sym.get("quoteAsset") == "USDT" and sym.get("status") == "TRADING"
+
+
+class ExchangeInfoService:
+    def __init__(self, ttl: float = EXCHANGE_INFO_TTL_SECONDS, path: Optional[str] = EXCHANGE_INFO_FILE,
+                 fetch: Optional[Callable[[], dict]] = None, missing_ttl: float = MISSING_TTL_SECONDS):
+        self.ttl = ttl
+        self.path = path
+        self.missing_ttl = missing_ttl
+        self._missing: Dict[str, float] = {}   # símbolo -> monotonic hasta el que no se vuelve a descargar
+        self._fetch = fetch or (lambda: get_client().client.futures_exchange_info())
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()   # primera carga: una sola descarga aunque llamen varios hilos
+        self._refreshing = False
+        self._by_symbol: Dict[str, dict] = {}
+        self._raw: Optional[dict] = None
+        self.fetched_at = 0.0
+        self._listeners: List[Callable[[], None]] = []
+        self.stats = {"downloads": 0, "disk_loads": 0}
+
+    def add_listener(self, fn: Callable[[], None]) -> None:
+        """fn() se llama tras cada refresco (p. ej. para invalidar filtros cacheados)."""
+        self._listeners.append(fn)
+
+    # --- carga ----------------------------------------------------------
+    def _apply(self, info: dict, fetched_at: float) -> None:
+        by_symbol = {s["symbol"]: s for s in info.get("symbols", [])}
+        with self._lock:
+            self._raw, self._by_symbol, self.fetched_at = info, by_symbol, fetched_at
+        for fn in list(self._listeners):
+            try:
+                fn()
+            except Exception as e:
+                log.debug(f"listener exchangeInfo: {e}")
+
+    def _load_disk(self) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r") as f:
+                doc = json.load(f)
+            if time.time() - float(doc["fetched_at"]) > DISK_MAX_AGE_SECONDS:
+                return False
+            self._apply(doc["info"], float(doc["fetched_at"]))
+            self.stats["disk_loads"] += 1
+            log.info(f"📦 exchangeInfo desde disco ({len(self._by_symbol)} símbolos, "
+                     f"{(time.time() - self.fetched_at) / 60:.0f} min)")
+            return True
+        except Exception as e:
+            log.warning(f"⚠️ Copia de exchangeInfo en disco ilegible: {e}")
+            return False
+
+    def _save_disk(self, info: dict, fetched_at: float) -> None:
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"fetched_at": fetched_at, "info": info}, f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except Exception as e:
+            log.warning(f"⚠️ No se pudo guardar exchangeInfo: {e}")
+
+    def refresh(self) -> None:
+        """Descarga síncrona y persistencia en disco."""
+        info = self._fetch()
+        now = time.time()
+        self.stats["downloads"] += 1
+        self._apply(info, now)
+        self._save_disk(info, now)
+        log.info(f"🔄 exchangeInfo actualizado ({len(self._by_symbol)} símbolos)")
+
+    def _refresh_background(self) -> None:
+        try:
+            self.refresh()
+        except Exception as e:
+            log.warning(f"⚠️ Refresco de exchangeInfo falló (se sigue con la copia actual): {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def ensure(self) -> None:
+        """Garantiza un snapshot; si ha vencido el TTL lo refresca en segundo plano."""
+        if self._raw is None:
+            with self._load_lock:
+                if self._raw is None and not self._load_disk():
+                    self.refresh()
+        if time.time() - self.fetched_at > self.ttl:
+            with self._lock:
+                if self._refreshing:
+                    return
+                self._refreshing = True
+            threading.Thread(target=self._refresh_background, name="exchange-info", daemon=True).start()
+
+    # --- consultas ------------------------------------------------------
+    def symbol(self, symbol: str) -> dict:
+        """Entrada de exchangeInfo del símbolo; KeyError si el exchange no lo lista."""
+        self.ensure()
+        sym = self._by_symbol.get(symbol)
+        if sym is not None:
+            return sym
+        with self._load_lock:
+            sym = self._by_symbol.get(symbol)
+            if sym is None and self._missing.get(symbol, 0.0) <= time.monotonic():
+                # Listado nuevo posterior al snapshot: una descarga síncrona y reintento
+                self.refresh()
+                sym = self._by_symbol.get(symbol)
+                if sym is None:
+                    self._missing[symbol] = time.monotonic() + self.missing_ttl
+        if sym is None:
+            raise KeyError(symbol)
+        return sym
+
+    def symbols(self) -> List[dict]:
+        self.ensure()
+        return list(self._by_symbol.values())
+
+    def raw(self) -> dict:
+        self.ensure()
+        return self._raw
+
+    def usdt_perpetuals(self) -> Dict[str, dict]:
+        return {s["symbol"]: s for s in self.symbols() if is_usdt_perpetual(s)}
+
+
+_service = ExchangeInfoService()
+
+
+def get_exchange_info() -> ExchangeInfoService:
+    return _service
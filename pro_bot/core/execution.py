@@ -2,12 +2,19 @@ import asyncio
 import logging
 import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from ..config import settings
-from .client import get_client
+from .client import ORDER_NOT_FOUND, find_order, get_client
 from .exchange import get_filters
-from .risk import decide_qty_for_margin
+from .async_client import AsyncAPIError, close_async_client, get_async_client
+from .account_config import get_account_config
+from .risk import decide_qty_for_margin, set_leverage_if_needed
+from .pretrade_gate import get_gate
+from .user_stream import live_account_state, start_user_stream
+from .ws_api import get_ws_transport
 
 log = logging.getLogger("exec")
 
@@ -61,8 +68,6 @@ def cancel_pending_limit_orders():
 
 def set_all_symbols_to_crossed_margin(extra_symbols: Optional[List[str]] = None):
     """Configura todos los símbolos activos para usar margen cruzado"""
-    client = get_client()
-
     # Obtener símbolos con posiciones abiertas
     active_symbols = get_all_open_positions()
 
@@ -79,25 +84,23 @@ def set_all_symbols_to_crossed_margin(extra_symbols: Optional[List[str]] = None)
     all_symbols = list(merged)
 
     log.info(f"🔧 Configurando {len(all_symbols)} símbolos para margen CROSSED...")
-    
-    success_count = 0
-    for symbol in all_symbols:
-        try:
-            client.client.futures_change_margin_type(symbol=symbol, marginType="CROSSED")
-            log.info(f"✅ {symbol}: Margen cambiado a CROSSED")
-            success_count += 1
-        except Exception as e:
-            # Es normal que algunos ya estén en CROSSED
-            if "No need to change margin type" in str(e) or "marginType is invalid" in str(e):
-                log.info(f"ℹ️ {symbol}: Ya está en CROSSED")
-                success_count += 1
-            else:
-                log.warning(f"⚠️ {symbol}: Error cambiando margen: {e}")
-    
-    log.info(f"🎯 Configuración completada: {success_count}/{len(all_symbols)} símbolos en CROSSED")
+    # Solo los que difieren del snapshot, en paralelo acotado
+    get_account_config().configure_symbols(all_symbols, "CROSSED")
 
 def get_all_open_positions_info():
     """Obtiene todas las posiciones abiertas y su información usando la API de Binance."""
+    state = live_account_state()
+    if state is not None:
+        return [PositionInfo(
+            symbol=p.symbol,
+            positionAmt=float(p.amount),
+            entryPrice=float(p.entry_price),
+            markPrice=float(p.mark_price),
+            unrealizedProfit=float(p.unrealized_pnl),
+            leverage=p.leverage or 1,
+            liquidationPrice=float(p.liquidation_price),
+            side=p.side,
+        ) for p in list(state.positions.values())]
     client = get_client().client
     positions = client.futures_position_information()
     open_positions = []
@@ -121,59 +124,102 @@ def last_price(symbol: str) -> float:
     p = get_client().ticker_price(symbol)
     return float(p["price"])
 
-def market_order(side: str, symbol: str, qty_str: str, reduce_only: bool = False):
+# --- caches del camino crítico de entrada ---
+# Los bots alimentan el precio con cada vela cerrada (note_price); solo si está
+# viejo se pide el ticker por REST.
+PRICE_MAX_AGE_SECONDS = 90.0
+_price_cache: Dict[str, tuple] = {}
+_post_trade = ThreadPoolExecutor(max_workers=2, thread_name_prefix="post-trade")
+
+def note_price(symbol: str, price: float) -> None:
+    _price_cache[symbol] = (float(price), time.monotonic())
+
+def cached_price(symbol: str, max_age: float = PRICE_MAX_AGE_SECONDS) -> float:
+    hit = _price_cache.get(symbol)
+    if hit is not None and time.monotonic() - hit[1] <= max_age:
+        return hit[0]
+    px = last_price(symbol)
+    note_price(symbol, px)
+    return px
+
+def warm_entry_caches(symbols: List[str]) -> None:
+    """Precarga filtros y leverage para que la primera entrada no pague REST extra."""
+    for sym in symbols:
+        try:
+            get_filters(sym)
+            set_leverage_if_needed(sym, min(int(settings.leverage), int(get_filters(sym).max_leverage)))
+        except Exception as e:
+            log.warning(f"[{sym}] warmup de caches de entrada falló: {e}")
+
+def create_order(**params) -> dict:
+    """Crea una orden por la WebSocket API (ORDER_TRANSPORT=ws, con fallback REST) o por REST."""
+    transport = get_ws_transport()
+    if transport is not None:
+        return transport.place_order(params)
+    params.setdefault("recvWindow", settings.recv_window)
+    return get_client().client.futures_create_order(**params)
+
+async def create_order_async(aclient, **params) -> dict:
+    transport = get_ws_transport()
+    if transport is not None:
+        return await transport.place_order_async(params)
+    return await aclient.create_order(**params)
+
+def market_order(side: str, symbol: str, qty_str: str, reduce_only: bool = False, resp_type: Optional[str] = None):
     params = dict(symbol=symbol, side=side, type="MARKET", quantity=qty_str, recvWindow=settings.recv_window)
     if reduce_only:
         params["reduceOnly"] = "true"
-    return get_client().client.futures_create_order(**params)
+    if resp_type:
+        params["newOrderRespType"] = resp_type   # RESULT -> avgPrice/executedQty en la respuesta
+    return create_order(**params)
 
 def limit_order(side: str, symbol: str, qty_str: str, price_str: str, tif: str="GTC", reduce_only: bool=False):
     params = dict(symbol=symbol, side=side, type="LIMIT", quantity=qty_str, price=price_str, timeInForce=tif, recvWindow=settings.recv_window)
     if reduce_only:
         params["reduceOnly"] = "true"
-    return get_client().client.futures_create_order(**params)
+    return create_order(**params)
 
-def place_tp_sl(symbol: str, side_open: str, tp_price: Optional[Decimal], sl_price: Optional[Decimal]):
-    """ Coloca TP/SL en MARK_PRICE con pequeño buffer para no disparar inmediato """
+def tp_sl_legs(symbol: str, side_open: str, tp_price: Optional[Decimal], sl_price: Optional[Decimal]) -> List[dict]:
+    """Parámetros de TP/SL en MARK_PRICE con pequeño buffer para no disparar inmediato"""
     opposite = "SELL" if side_open == "BUY" else "BUY"
-    cli = get_client().client
     f = get_filters(symbol)
 
     def _safe(px: Optional[Decimal], above: bool) -> Optional[str]:
         if px is None: return None
-        # buffer = 2 ticks en la dirección correcta
-        buf = f.price_step * Decimal("2")
-        px = f.round_price_up(float(px)) if above else f.round_price_down(float(px))
-        px = px + buf if above else px - buf
-        return f.fmt_price(px)
+        # buffer = 2 ticks en la dirección correcta (aritmética entera de ticks)
+        buf = 2 * f.price_step_units
+        units = f.price_ticks(float(px), up=above)
+        return f.fmt_price_units(units + buf if above else units - buf)
 
     tp_str = _safe(tp_price, above=True) if tp_price is not None else None
     sl_str = _safe(sl_price, above=False) if sl_price is not None else None
 
+    legs = []
     if tp_str:
-        try:
-            cli.futures_create_order(
-                symbol=symbol, side=opposite, type="TAKE_PROFIT_MARKET",
-                stopPrice=tp_str, closePosition="true",
-                workingType="MARK_PRICE", recvWindow=settings.recv_window
-            )
-        except Exception as e:
-            log.warning(f"TP error: {e}")
-
+        legs.append(dict(symbol=symbol, side=opposite, type="TAKE_PROFIT_MARKET",
+                         stopPrice=tp_str, closePosition="true", workingType="MARK_PRICE"))
     if sl_str:
+        legs.append(dict(symbol=symbol, side=opposite, type="STOP_MARKET",
+                         stopPrice=sl_str, closePosition="true", workingType="MARK_PRICE"))
+    return legs
+
+def place_tp_sl(symbol: str, side_open: str, tp_price: Optional[Decimal], sl_price: Optional[Decimal]):
+    """ Coloca TP/SL en MARK_PRICE con pequeño buffer para no disparar inmediato """
+    for leg in tp_sl_legs(symbol, side_open, tp_price, sl_price):
         try:
-            cli.futures_create_order(
-                symbol=symbol, side=opposite, type="STOP_MARKET",
-                stopPrice=sl_str, closePosition="true",
-                workingType="MARK_PRICE", recvWindow=settings.recv_window
-            )
+            create_order(**leg)
         except Exception as e:
-            log.warning(f"SL error: {e}")
+            log.warning(f"{'TP' if leg['type'] == 'TAKE_PROFIT_MARKET' else 'SL'} error: {e}")
 
-# --- control de posiciones abiertas (consulta directa API) ---
+# --- control de posiciones abiertas ---
+# Con el user-data stream sincronizado se responde desde el estado local (O(1));
+# si no, se consulta la API como antes.
 
 def has_open_position(symbol: str) -> bool:
-    """Verificar si hay posición abierta consultando Binance directamente"""
+    """Verificar si hay posición abierta (estado local o Binance)"""
+    state = live_account_state()
+    if state is not None:
+        return state.has_position(symbol)
     try:
         position_info = get_client().client.futures_position_information(symbol=symbol)
         if position_info:
@@ -186,7 +232,20 @@ def has_open_position(symbol: str) -> bool:
     return False
 
 def get_position_details(symbol: str):
-    """Obtener detalles completos de la posición desde Binance"""
+    """Obtener detalles completos de la posición (estado local o Binance)"""
+    state = live_account_state()
+    if state is not None:
+        pos = state.position(symbol)
+        if pos is None:
+            return None
+        return {
+            "symbol": symbol,
+            "positionAmt": pos.amount,
+            "entryPrice": pos.entry_price,
+            "unrealizedPnl": pos.unrealized_pnl,
+            "percentage": Decimal("0"),
+            "side": pos.side,
+        }
     try:
         position_info = get_client().client.futures_position_information(symbol=symbol)
         if position_info:
@@ -206,7 +265,10 @@ def get_position_details(symbol: str):
     return None
 
 def get_all_open_positions():
-    """Obtener todas las posiciones abiertas desde Binance API"""
+    """Obtener todas las posiciones abiertas (estado local o Binance API)"""
+    state = live_account_state()
+    if state is not None:
+        return state.open_symbols()
     try:
         with _cache_lock:
             if _open_positions_cache and (time.time() - _last_cache_refresh) < 60:
@@ -227,7 +289,10 @@ def get_all_open_positions():
         return []
 
 def get_pending_limit_orders():
-    """Obtener órdenes LIMIT pendientes desde Binance API"""
+    """Obtener órdenes LIMIT pendientes (estado local o Binance API)"""
+    state = live_account_state()
+    if state is not None:
+        return state.pending_limit_symbols()
     try:
         orders = get_client().client.futures_get_open_orders()
         pending_symbols = []
@@ -263,7 +328,12 @@ def _refresh_caches_once(open_positions: Optional[List[PositionInfo]] = None,
     )
 
 def refresh_open_positions_cache(poll_interval: int = 30):
-    """Actualiza el cache de posiciones. En hilos daemon corre en bucle."""
+    """
+    Actualiza el cache de posiciones. En hilos daemon corre en bucle.
+    Arranca el user-data stream si no lo está; con el stream sincronizado el
+    cache se rellena desde memoria y la reconciliación REST la hace el stream.
+    """
+    start_user_stream()
 
     def _update():
         try:
@@ -278,6 +348,24 @@ def refresh_open_positions_cache(poll_interval: int = 30):
     else:
         _update()
 
+_refresher: Optional[threading.Thread] = None
+_refresher_lock = threading.Lock()
+
+def start_positions_cache_refresher(poll_interval: int = 30) -> threading.Thread:
+    """
+    Primer refresco síncrono y bucle periódico en un hilo daemon (uno por
+    proceso). Sin user-data stream sincronizado la puerta pre-trade lee este
+    cache, así que todas las apps deben arrancarlo.
+    """
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None or not _refresher.is_alive():
+            refresh_open_positions_cache(poll_interval)
+            _refresher = threading.Thread(target=refresh_open_positions_cache, args=(poll_interval,),
+                                          name="positions-cache", daemon=True)
+            _refresher.start()
+        return _refresher
+
 def get_cached_open_positions() -> List[str]:
     """Devuelve símbolos del cache actual."""
     with _cache_lock:
@@ -287,6 +375,11 @@ def get_cached_pending_orders() -> List[str]:
     with _cache_lock:
         return sorted(_pending_limit_orders_cache)
 
+def get_cached_positions_info() -> Tuple[float, List[PositionInfo]]:
+    """(time.time() del último refresco, posiciones) del cache; 0.0 si aún no se ha refrescado."""
+    with _cache_lock:
+        return _last_cache_refresh, list(_open_positions_cache.values())
+
 def get_active_trading_symbols():
     """Obtener símbolos con posiciones abiertas (ya no incluye órdenes LIMIT)"""
     open_positions = get_all_open_positions()
@@ -294,7 +387,10 @@ def get_active_trading_symbols():
     return sorted(open_positions)
 
 def open_positions_count() -> int:
-    """Retorna el número de posiciones abiertas consultando API directamente"""
+    """Retorna el número de posiciones abiertas"""
+    state = live_account_state()
+    if state is not None:
+        return state.open_count()
     return len(get_all_open_positions())
 
 def active_trading_count() -> int:
@@ -303,6 +399,9 @@ def active_trading_count() -> int:
 
 def has_pending_limit_order(symbol: str) -> bool:
     """Verificar si hay una orden LIMIT pendiente para un símbolo"""
+    state = live_account_state()
+    if state is not None:
+        return state.has_pending_limit(symbol)
     try:
         with _cache_lock:
             if _pending_limit_orders_cache and (time.time() - _last_cache_refresh) < 60:
@@ -318,91 +417,66 @@ def has_pending_limit_order(symbol: str) -> bool:
         return False
 
 def _can_open_new_position(symbol: str) -> bool:
-    """Verifica si se puede abrir una nueva posición para el símbolo"""
-    # No abrir si ya hay posición en este símbolo
-    if has_open_position(symbol):
-        return False
-    
-    # No abrir si ya hay una orden LIMIT pendiente para este símbolo
-    if has_pending_limit_order(symbol):
-        log.info(f"[{symbol}] Ya hay orden LIMIT pendiente, no se abre nueva posición")
-        return False
-    
-    # Verificar límite máximo de posiciones abiertas + órdenes pendientes
-    max_positions = 5  # Límite fijo de 5 posiciones/órdenes activas
-    current_active = active_trading_count()
-    open_positions = get_all_open_positions()
-    pending_orders = get_pending_limit_orders()
-    
-    if current_active >= max_positions:
-        log.info(f"Límite alcanzado: {current_active}/{max_positions} posiciones/órdenes activas")
-        log.info(f"  Posiciones abiertas ({len(open_positions)}): {open_positions}")
-        log.info(f"  Órdenes LIMIT pendientes ({len(pending_orders)}): {pending_orders}")
-        return False
-    
-    return True
+    """Verifica (sin reservar) si se puede abrir una nueva posición para el símbolo"""
+    ok, _reason = get_gate().check(symbol)
+    return ok
 
 # --- entrada principal ---
 def enter_position(direction: str, use_limit: bool = True, limit_offset_bps: int = 3,
-                   tp_rr: float = 1.5, sl_rr: float = 1.0, symbol: Optional[str] = None) -> Dict[str, object]:
-    """Abre una nueva posición y devuelve detalles de la orden."""
+                   tp_rr: float = 1.5, sl_rr: float = 1.0, symbol: Optional[str] = None,
+                   protect: bool = True) -> Dict[str, object]:
+    """
+    Abre una nueva posición y devuelve detalles de la orden.
+    En el camino crítico solo van la orden MARKET y sus TP/SL: precio, filtros,
+    leverage y estado de posiciones salen de caches, y la reconciliación corre
+    después en segundo plano. result["timings"] tiene los ms de cada etapa.
+    Con protect=False no se colocan TP/SL: el llamador pone su propia protección.
+    """
     sym = symbol or settings.symbol
-    result: Dict[str, object] = {
-        "success": False,
-        "symbol": sym,
-        "direction": direction,
-    }
-
+    t0 = time.perf_counter()
+    timings: Dict[str, float] = {}
+    gate = get_gate()
+    ok, reason = gate.try_reserve(sym)
+    timings["gate"] = (time.perf_counter() - t0) * 1000
+    if not ok:
+        return {"success": False, "symbol": sym, "direction": direction, "error": f"[{sym}] {reason}",
+                "reason": reason, "timings": timings}
+
+    result: Dict[str, object] = {}
     try:
-        max_positions = int(getattr(settings, "max_open_positions", 5))
-    except Exception:
-        max_positions = 5
-
-    current_positions = get_all_open_positions_info()
-    current_active = len(current_positions)
-    if current_active >= max_positions:
-        msg = f"Límite de {max_positions} posiciones activas alcanzado. No se abre {sym}. Activas: {current_active}"
-        log.info(msg)
-        result["error"] = msg
-        return result
-
-    if has_open_position(sym):
-        msg = f"[{sym}] ya hay posición abierta; se omite nueva entrada."
-        log.info(msg)
-        result["error"] = msg
-        return result
-
-    if has_pending_limit_order(sym):
-        msg = f"[{sym}] orden LIMIT pendiente detectada; no se abre nueva posición"
-        log.info(msg)
-        result["error"] = msg
-        return result
-
-    try:
-        px = Decimal(str(last_price(sym)))
-    except Exception as exc:
-        msg = f"[{sym}] error obteniendo precio: {exc}"
-        log.error(msg)
-        result["error"] = msg
-        return result
+        result = _enter_reserved(sym, direction, tp_rr, sl_rr, timings, protect)
+    finally:
+        if result.get("success"):
+            # La reserva se suelta tras reconciliar (o al llegar la posición por el stream)
+            _post_trade.submit(_post_trade_reconcile, sym, result.get("filled_qty", 0.0))
+        else:
+            gate.release(sym)
+    timings["total"] = (time.perf_counter() - t0) * 1000
+    result["timings"] = timings
+    if result.get("success"):
+        log.info(f"[{sym}] ⏱️ Entrada: " + " | ".join(f"{k}={v:.1f}ms" for k, v in timings.items()))
+    return result
 
+def _plan_entry(sym: str, direction: str, px: Decimal, tp_rr: float, sl_rr: float,
+                set_leverage: bool = True) -> Dict[str, object]:
+    """Cantidad, lado y TP/SL de la entrada (sin red salvo el leverage). {'error': ...} si no es viable o no hay margen."""
     f = get_filters(sym)
-
     try:
-        qty, lev = decide_qty_for_margin(sym, float(px))
+        qty, lev = decide_qty_for_margin(sym, float(px), set_leverage=set_leverage)
     except Exception as exc:
-        msg = f"[{sym}] error calculando cantidad: {exc}"
-        log.error(msg)
-        result["error"] = msg
-        return result
+        return {"error": f"[{sym}] error calculando cantidad: {exc}"}
 
     if qty <= 0:
-        msg = f"[{sym}] Qty inválida para MIN_NOTIONAL: {f.min_notional}"
-        log.error(msg)
-        result["error"] = msg
-        return result
+        return {"error": f"[{sym}] Qty inválida para MIN_NOTIONAL: {f.min_notional}"}
 
-    qty_str = f.fmt_qty(qty)
+    # Margen libre desde memoria (RiskGuard): evita el -2019 del exchange
+    ok, reason = get_gate().check_margin(sym, float(qty * px), int(lev))
+    if not ok:
+        return {"error": f"[{sym}] {reason}"}
+    # Riesgo marginal de cartera (correlación / exposición beta)
+    ok, reason = get_gate().check_portfolio(sym, direction, float(qty * px))
+    if not ok:
+        return {"error": f"[{sym}] {reason}"}
 
     if direction == "LONG":
         side_open = SIDE["BUY"]
@@ -413,120 +487,361 @@ def enter_position(direction: str, use_limit: bool = True, limit_offset_bps: int
         tp = px * (Decimal("1") - Decimal("0.03") * Decimal(str(tp_rr)))
         sl = px * (Decimal("1") + Decimal("0.02") * Decimal(str(sl_rr)))
     else:
-        msg = f"[{sym}] señal NEUTRAL; no se abre posición"
-        log.info(msg)
+        return {"error": f"[{sym}] señal NEUTRAL; no se abre posición", "neutral": True}
+
+    return {"qty": qty, "qty_str": f.fmt_qty(qty), "leverage": lev, "side": side_open, "tp": tp, "sl": sl}
+
+def _fill_result(result: Dict[str, object], ord_resp: dict, plan: Dict[str, object], px: Decimal) -> None:
+    """Completa el resultado con la respuesta RESULT de la orden MARKET."""
+    result.update({
+        "order": ord_resp,
+        "side": plan["side"],
+        "qty": float(plan["qty"]),
+        "qty_str": plan["qty_str"],
+        "leverage": plan["leverage"],
+        "tp_price": float(plan["tp"]),
+        "sl_price": float(plan["sl"]),
+    })
+    # Precio medio y cantidad ejecutada vienen en la respuesta RESULT
+    avg_price = float(ord_resp.get("avgPrice") or 0)
+    executed = float(ord_resp.get("executedQty") or 0)
+    result.update({
+        "entry_price": avg_price if avg_price > 0 else float(px),
+        "filled_qty": executed if executed > 0 else float(plan["qty"]),
+        "success": True,
+    })
+    note_price(result["symbol"], result["entry_price"])
+
+def _enter_reserved(sym: str, direction: str, tp_rr: float, sl_rr: float,
+                    timings: Dict[str, float], protect: bool = True) -> Dict[str, object]:
+    """Entrada con el hueco ya reservado en la puerta pre-trade."""
+    result: Dict[str, object] = {
+        "success": False,
+        "symbol": sym,
+        "direction": direction,
+    }
+
+    t = time.perf_counter()
+    try:
+        px = Decimal(str(cached_price(sym)))
+    except Exception as exc:
+        msg = f"[{sym}] error obteniendo precio: {exc}"
+        log.error(msg)
         result["error"] = msg
         return result
+    timings["price"] = (time.perf_counter() - t) * 1000
+
+    t = time.perf_counter()
+    plan = _plan_entry(sym, direction, px, tp_rr, sl_rr)
+    timings["sizing"] = (time.perf_counter() - t) * 1000
+    if "error" in plan:
+        (log.info if plan.get("neutral") else log.error)(plan["error"])
+        result["error"] = plan["error"]
+        return result
 
+    t = time.perf_counter()
     try:
-        ord_resp = market_order(side_open, sym, qty_str)
+        ord_resp = market_order(plan["side"], sym, plan["qty_str"], resp_type="RESULT")
     except Exception as exc:
         msg = f"[{sym}] error creando orden MARKET: {exc}"
         log.error(msg)
         result["error"] = msg
         return result
+    timings["order"] = (time.perf_counter() - t) * 1000
 
-    order_id = ord_resp.get("orderId", "?")
-    log.info(f"[{sym}] MARKET order placed: {order_id}")
-
-    result.update({
-        "order": ord_resp,
-        "side": side_open,
-        "qty": float(qty),
-        "qty_str": qty_str,
-        "leverage": lev,
-        "tp_price": float(tp),
-        "sl_price": float(sl),
-    })
-
-    place_tp_sl(sym, side_open, tp, sl)
+    log.info(f"[{sym}] MARKET order placed: {ord_resp.get('orderId', '?')}")
+    _fill_result(result, ord_resp, plan, px)
+    if not protect:
+        return result
 
-    position_details = get_position_details(sym)
-    if position_details:
-        entry_price = float(position_details["entryPrice"])
-        filled_qty = abs(float(position_details["positionAmt"]))
-    else:
-        entry_price = float(px)
-        filled_qty = float(qty)
+    t = time.perf_counter()
+    try:
+        place_tp_sl(sym, plan["side"], plan["tp"], plan["sl"])
+    except Exception as exc:
+        log.error(f"[{sym}] ❌ error colocando TP/SL tras la entrada: {exc}")
+    timings["protection"] = (time.perf_counter() - t) * 1000
+    return result
 
-    result.update({
-        "entry_price": entry_price,
-        "filled_qty": filled_qty,
-        "success": True,
-    })
+async def enter_position_async(direction: str, symbol: str, tp_rr: float = 1.5,
+                               sl_rr: float = 1.0) -> Dict[str, object]:
+    """
+    Igual que enter_position pero con el cliente REST async: sin saltos de
+    hilo y con TP+SL en una sola petición batch.
+    """
+    aclient = await get_async_client()
+    sym = symbol
+    t0 = time.perf_counter()
+    timings: Dict[str, float] = {}
+    gate = get_gate()
+    ok, reason = gate.try_reserve(sym)
+    timings["gate"] = (time.perf_counter() - t0) * 1000
+    result: Dict[str, object] = {"success": False, "symbol": sym, "direction": direction}
+    if not ok:
+        result.update({"error": f"[{sym}] {reason}", "reason": reason, "timings": timings})
+        return result
 
-    # Refrescar caches tras la operación
-    _refresh_caches_once()
+    try:
+        t = time.perf_counter()
+        hit = _price_cache.get(sym)
+        if hit is not None and time.monotonic() - hit[1] <= PRICE_MAX_AGE_SECONDS:
+            px = Decimal(str(hit[0]))
+        else:
+            px = Decimal((await aclient.ticker_price(sym))["price"])
+            note_price(sym, float(px))
+        timings["price"] = (time.perf_counter() - t) * 1000
+
+        t = time.perf_counter()
+        plan = _plan_entry(sym, direction, px, tp_rr, sl_rr, set_leverage=False)
+        if "error" not in plan:
+            await get_account_config().ensure_leverage_async(aclient, sym, plan["leverage"])
+        timings["sizing"] = (time.perf_counter() - t) * 1000
+        if "error" in plan:
+            (log.info if plan.get("neutral") else log.error)(plan["error"])
+            result["error"] = plan["error"]
+            return result
 
+        t = time.perf_counter()
+        ord_resp = await create_order_async(aclient, symbol=sym, side=plan["side"], type="MARKET",
+                                              quantity=plan["qty_str"], newOrderRespType="RESULT")
+        timings["order"] = (time.perf_counter() - t) * 1000
+        log.info(f"[{sym}] MARKET order placed: {ord_resp.get('orderId', '?')}")
+        # Hay posición: la entrada cuenta como hecha pase lo que pase con la protección
+        _fill_result(result, ord_resp, plan, px)
+
+        t = time.perf_counter()
+        legs = [_with_client_id(leg) for leg in tp_sl_legs(sym, plan["side"], plan["tp"], plan["sl"])]
+        unknown = False
+        try:
+            responses = await aclient.place_batch_orders(legs)
+        except Exception as e:
+            log.warning(f"[{sym}] batchOrders falló ({e}); se envía cada pata por separado")
+            responses, unknown = [{"msg": str(e)}] * len(legs), True
+        for leg, r in zip(legs, responses):
+            if "orderId" not in r:
+                log.warning(f"[{sym}] {leg['type']} error: {r.get('msg')}; reintento individual")
+                try:
+                    # El lote pudo llegar al exchange: no duplicar patas ya creadas
+                    if unknown and await _find_order_async(aclient, sym, leg["newClientOrderId"]) is not None:
+                        continue
+                    await create_order_async(aclient, **leg)
+                except Exception as e:
+                    log.error(f"[{sym}] ❌ {leg['type']} falló: {e}")
+        timings["protection"] = (time.perf_counter() - t) * 1000
+    except Exception as exc:
+        msg = f"[{sym}] error en entrada async: {exc}"
+        log.error(msg)
+        result["error"] = msg
+    finally:
+        if result.get("success"):
+            _post_trade.submit(_post_trade_reconcile, sym, result.get("filled_qty", 0.0))
+        else:
+            gate.release(sym)
+    timings["total"] = (time.perf_counter() - t0) * 1000
+    result["timings"] = timings
+    if result.get("success"):
+        log.info(f"[{sym}] ⏱️ Entrada: " + " | ".join(f"{k}={v:.1f}ms" for k, v in timings.items()))
     return result
 
+def _post_trade_reconcile(symbol: str, filled_qty: float) -> None:
+    """Fuera del camino crítico: contrastar la posición y refrescar caches."""
+    try:
+        details = get_position_details(symbol)
+        if details and filled_qty and abs(abs(float(details["positionAmt"])) - filled_qty) > 1e-12:
+            log.warning(f"[{symbol}] ⚠️ Posición {details['positionAmt']} != ejecutado {filled_qty}")
+        if live_account_state() is None:
+            _refresh_caches_once()
+    except Exception as e:
+        log.warning(f"[{symbol}] reconciliación post-trade falló: {e}")
+    finally:
+        get_gate().release(symbol, opened=True)
 
-# Funciones adicionales para SLTPManager
-def enter_basic(symbol: str, direction: str) -> dict:
-    """Función básica de entrada de posición para SLTPManager (solo MARKET)"""
-    return enter_position(direction, use_limit=False, symbol=symbol)
 
-def stop_market(symbol: str, side: str, stop_price: float, qty: Optional[str] = None, close_position: bool = False):
-    """Crear orden stop market"""
-    cli = get_client().client
+# Funciones adicionales para SLTPManager
+def enter_basic(symbol: str, direction: str, protect: bool = True) -> dict:
+    """
+    Función básica de entrada de posición para SLTPManager (solo MARKET).
+    SLTPManager pasa protect=False: coloca su SL y sus TP en un batch, y un
+    segundo STOP_MARKET closePosition del mismo lado se rechazaría (-4130).
+    """
+    return enter_position(direction, use_limit=False, symbol=symbol, protect=protect)
+
+def _conditional_params(order_type: str, symbol: str, side: str, stop_price: float,
+                        qty: Optional[str] = None, close_position: bool = False) -> dict:
+    """Parámetros de STOP_MARKET / TAKE_PROFIT_MARKET (sin recvWindow, válidos para batch)"""
     params = {
         "symbol": symbol,
         "side": side,
-        "type": "STOP_MARKET",
+        "type": order_type,
         "stopPrice": str(stop_price),
-        "recvWindow": settings.recv_window
     }
-    
     if close_position:
         params["closePosition"] = "true"
     elif qty:
+        # CRÍTICO: NO usar closePosition cuando se especifica cantidad exacta;
+        # reduceOnly para que un TP parcial nunca abra posición en sentido contrario
         params["quantity"] = qty
+        params["reduceOnly"] = "true"
     else:
         # Si no se especifica qty y no es close_position, usar la posición actual
+        if order_type == "TAKE_PROFIT_MARKET":
+            log.warning(f"take_profit_market: No qty specified and close_position=False, defaulting to closePosition=true")
         params["closePosition"] = "true"
-    
+    return params
+
+def stop_market_params(symbol: str, side: str, stop_price: float, qty: Optional[str] = None,
+                       close_position: bool = False) -> dict:
+    return _conditional_params("STOP_MARKET", symbol, side, stop_price, qty, close_position)
+
+def take_profit_market_params(symbol: str, side: str, stop_price: float, qty: Optional[str] = None,
+                              close_position: bool = False) -> dict:
+    return _conditional_params("TAKE_PROFIT_MARKET", symbol, side, stop_price, qty, close_position)
+
+# callbackRate admitido por Binance para TRAILING_STOP_MARKET (en %, paso 0.1)
+TRAILING_CALLBACK_MIN = 0.1
+TRAILING_CALLBACK_MAX = 10.0
+
+def trailing_callback_rate(trail_distance: float, price: float) -> float:
+    """Distancia de trailing en precio -> callbackRate (%) válido para el exchange."""
+    rate = round(100.0 * trail_distance / price, 1) if price > 0 else TRAILING_CALLBACK_MIN
+    return min(max(rate, TRAILING_CALLBACK_MIN), TRAILING_CALLBACK_MAX)
+
+def trailing_stop_market_params(symbol: str, side: str, qty: str, callback_rate: float,
+                                activation_price: Optional[str] = None) -> dict:
+    """TRAILING_STOP_MARKET reduceOnly (no admite closePosition); sin activationPrice se activa ya."""
+    params = {
+        "symbol": symbol,
+        "side": side,
+        "type": "TRAILING_STOP_MARKET",
+        "quantity": qty,
+        "callbackRate": f"{callback_rate:.1f}",
+        "reduceOnly": "true",
+        "workingType": "MARK_PRICE",
+    }
+    if activation_price:
+        params["activationPrice"] = activation_price
+    return params
+
+def stop_market(symbol: str, side: str, stop_price: float, qty: Optional[str] = None, close_position: bool = False):
+    """Crear orden stop market"""
+    params = stop_market_params(symbol, side, stop_price, qty, close_position)
     try:
-        return cli.futures_create_order(**params)
+        return create_order(**params)
     except Exception as e:
         log.error(f"Error creating stop market order: {e}")
         return None
 
 def take_profit_market(symbol: str, side: str, stop_price: float, qty: Optional[str] = None, close_position: bool = False):
     """Crear orden take profit market"""
-    cli = get_client().client
-    params = {
-        "symbol": symbol,
-        "side": side,
-        "type": "TAKE_PROFIT_MARKET",
-        "stopPrice": str(stop_price),
-        "recvWindow": settings.recv_window
-    }
-    
-    if close_position:
-        params["closePosition"] = "true"
-    elif qty:
-        params["quantity"] = qty
-        # CRÍTICO: NO usar closePosition cuando se especifica cantidad exacta
-    else:
-        # Solo si no se especifica qty NI close_position, usar close_position
-        log.warning(f"take_profit_market: No qty specified and close_position=False, defaulting to closePosition=true")
-        params["closePosition"] = "true"
-    
+    params = take_profit_market_params(symbol, side, stop_price, qty, close_position)
     try:
-        return cli.futures_create_order(**params)
+        return create_order(**params)
     except Exception as e:
         log.error(f"Error creating take profit market order: {e}")
         return None
 
+# --- órdenes en lote (POST /fapi/v1/batchOrders, máx. 5 por petición) ---
+BATCH_MAX_ORDERS = 5
+
+def _with_client_id(params: dict) -> dict:
+    """Fija newClientOrderId en la pata para poder buscarla antes de reenviarla."""
+    params.setdefault("newClientOrderId", f"bt{uuid.uuid4().hex[:30]}")
+    return params
+
+async def _find_order_async(aclient, symbol: str, client_order_id: str) -> Optional[dict]:
+    """Como client.find_order con el cliente async: None solo ante -2013."""
+    try:
+        return await aclient.get_order(symbol, client_order_id)
+    except AsyncAPIError as e:
+        if e.code == ORDER_NOT_FOUND:
+            return None
+        raise
+
+@dataclass
+class LegResult:
+    """Resultado de una pata del lote: respuesta del exchange o error."""
+    params: dict
+    response: Optional[dict] = None
+    error: Optional[str] = None
+    attempts: int = 1
+    unknown: bool = False    # el envío falló sin respuesta: la orden pudo llegar al exchange
+
+    @property
+    def ok(self) -> bool:
+        return self.response is not None and self.error is None
+
+    @property
+    def order_id(self) -> Optional[int]:
+        return self.response.get("orderId") if self.response else None
+
+def _send_batch(cli, legs: List[dict]) -> list:
+    # La librería toca las dicts que recibe: pasar copias. Sin más kwargs:
+    # futures_place_batch_order arma batchOrders con urlencode(params)[12:]
+    # y cualquier otro parámetro (recvWindow) acabaría dentro de su valor
+    return cli.futures_place_batch_order(batchOrders=[dict(o) for o in legs])
+
+def place_batch_orders(orders: List[dict], retries: int = 2) -> List[LegResult]:
+    """
+    Envía `orders` (parámetros sin recvWindow) en lotes de BATCH_MAX_ORDERS.
+    El lote no es atómico: cada pata trae su respuesta o su error, y las que
+    fallan se reintentan una a una hasta `retries` veces. Cada pata lleva su
+    newClientOrderId (se fija en `orders`); si un envío falló sin respuesta,
+    antes de reintentar se busca la orden por ese id y solo se reenvía si el
+    exchange contesta -2013. Devuelve un LegResult por orden, en el mismo orden.
+    """
+    cli = get_client().client
+    results: List[LegResult] = []
+    for k in range(0, len(orders), BATCH_MAX_ORDERS):
+        chunk = [_with_client_id(o) for o in orders[k:k + BATCH_MAX_ORDERS]]
+        try:
+            resp = _send_batch(cli, chunk)
+        except Exception as e:
+            log.warning(f"batchOrders falló entero ({e}); se reintenta por pata")
+            resp = [{"code": None, "msg": str(e)}] * len(chunk)
+            unknown = True
+        else:
+            unknown = False
+        for params, r in zip(chunk, resp):
+            if isinstance(r, dict) and "orderId" in r:
+                results.append(LegResult(params, response=r))
+            else:
+                msg = r.get("msg") if isinstance(r, dict) else str(r)
+                results.append(LegResult(params, unknown=unknown,
+                                         error=f"{r.get('code') if isinstance(r, dict) else ''} {msg}".strip()))
+
+    for leg in results:
+        while not leg.ok and leg.attempts <= retries:
+            leg.attempts += 1
+            try:
+                found = find_order(cli, leg.params["symbol"], leg.params["newClientOrderId"]) if leg.unknown else None
+                if found is not None:
+                    log.info(f"[{leg.params['symbol']}] {leg.params['type']} ya estaba en el exchange: {found.get('orderId')}")
+                    r = found
+                else:
+                    # Reintento como lote de una pata: conserva el newClientOrderId en
+                    # todas las rutas (create_order REST lo cambia en las condicionales)
+                    r = _send_batch(cli, [leg.params])[0]
+            except Exception as e:
+                leg.error, leg.unknown = str(e), True
+                continue
+            leg.unknown = False     # hubo respuesta: orden creada o rechazo explícito
+            if isinstance(r, dict) and "orderId" in r:
+                leg.response, leg.error = r, None
+            else:
+                leg.error = f"{r.get('code')} {r.get('msg')}" if isinstance(r, dict) else str(r)
+        if not leg.ok:
+            log.error(f"[{leg.params.get('symbol')}] ❌ {leg.params.get('type')} falló tras {leg.attempts} intentos: {leg.error}")
+    return results
+
 
 class TradingEngine:
-    """Motor de ejecución asincrónico utilizado por el bot multitimeframe."""
+    """Motor de ejecución asincrónico utilizado por el bot multitimeframe (REST vía aiohttp)."""
 
     def __init__(self, client, cfg_path: str = "configs/ml.yaml"):
         self.client = client
         self.cfg_path = cfg_path
         self.symbols: List[str] = []
         self.initialized = False
+        self.http = None
         self._locks_guard = asyncio.Lock()
         self._symbol_locks: Dict[str, asyncio.Lock] = {}
 
@@ -535,20 +850,43 @@ class TradingEngine:
         if symbols is not None:
             self.symbols = list(symbols)
 
-        await asyncio.to_thread(refresh_open_positions_cache)
-        extra = self.symbols if self.symbols else None
-        await asyncio.to_thread(set_all_symbols_to_crossed_margin, extra)
-        await asyncio.to_thread(cancel_pending_limit_orders)
+        self.http = await get_async_client()
+        # Arranca el user-data stream (hilos propios) y deja el estado de cuenta en memoria
+        await asyncio.to_thread(start_positions_cache_refresher)
+        await self._set_crossed_margin(self.symbols)
+        await self._cancel_pending_limit_orders()
+        # Filtros (exchangeInfo) y leverage: una vez al arrancar
+        await asyncio.to_thread(warm_entry_caches, self.symbols)
         self.initialized = True
         log.info("✅ TradingEngine ready (margen CROSSED verificado)")
 
     async def cleanup(self) -> None:
         """Limpieza al detener el motor."""
-        await asyncio.to_thread(cancel_pending_limit_orders)
-        await asyncio.to_thread(refresh_open_positions_cache)
+        await self._cancel_pending_limit_orders()
+        await close_async_client()
+        self.http = None
         self._symbol_locks.clear()
         self.initialized = False
 
+    async def _set_crossed_margin(self, symbols: List[str]) -> None:
+        targets = sorted(set(symbols) | set(get_all_open_positions()))
+        # Un snapshot de positionRisk y solo los cambios necesarios, con concurrencia acotada
+        await get_account_config().configure_symbols_async(self.http, targets, "CROSSED")
+
+    async def _cancel_pending_limit_orders(self) -> None:
+        try:
+            orders = [o for o in await self.http.open_orders() if o.get("type") == "LIMIT"]
+        except Exception as e:
+            log.error(f"Error getting open orders: {e}")
+            return
+        results = await asyncio.gather(
+            *(self.http.cancel_order(o["symbol"], o["orderId"]) for o in orders), return_exceptions=True)
+        for o, r in zip(orders, results):
+            if isinstance(r, Exception):
+                log.error(f"❌ Failed to cancel LIMIT order for {o['symbol']}: {r}")
+        if orders:
+            log.info(f"🧹 Cancelled {sum(not isinstance(r, Exception) for r in results)} LIMIT orders")
+
     async def _get_symbol_lock(self, symbol: str) -> asyncio.Lock:
         async with self._locks_guard:
             lock = self._symbol_locks.get(symbol)
@@ -558,7 +896,21 @@ class TradingEngine:
             return lock
 
     async def get_position(self, symbol: str) -> Optional[dict]:
-        details = await asyncio.to_thread(get_position_details, symbol)
+        if live_account_state() is not None:
+            details = get_position_details(symbol)
+        else:
+            details = None
+            for pos in await self.http.position_information(symbol):
+                amt = Decimal(pos.get("positionAmt", "0"))
+                if amt != 0:
+                    details = {
+                        "symbol": symbol,
+                        "positionAmt": amt,
+                        "entryPrice": Decimal(pos.get("entryPrice", "0")),
+                        "unrealizedPnl": Decimal(pos.get("unRealizedProfit", "0")),
+                        "percentage": Decimal("0"),
+                        "side": "LONG" if amt > 0 else "SHORT",
+                    }
         if not details:
             return None
 
@@ -575,15 +927,7 @@ class TradingEngine:
         lock = await self._get_symbol_lock(symbol)
         async with lock:
             try:
-                result = await asyncio.to_thread(
-                    enter_position,
-                    direction,
-                    False,
-                    3,
-                    1.5,
-                    1.0,
-                    symbol,
-                )
+                result = await enter_position_async(direction, symbol, 1.5, 1.0)
             except Exception as exc:
                 log.error(f"[{symbol}] error ejecutando entrada {direction}: {exc}")
                 return {
@@ -1,11 +1,16 @@
 import logging
+import threading
 import time
 from collections import defaultdict, deque
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from pro_bot.core.timer_wheel import Timer, TimerWheel
 
 log = logging.getLogger("multitf_manager")
 
+VOTE_SIGNALS = ('BUY', 'SELL')
+
 @dataclass
 class TimeframeDecision:
     """Decisión de un timeframe específico"""
@@ -13,71 +18,187 @@ class TimeframeDecision:
     timeframe: str
     signal: str  # 'BUY', 'SELL', 'HOLD'
     confidence: float
-    timestamp: float
+    timestamp: float  # tiempo de la vela en segundos
     price: float
+    bar_time: int = 0  # tiempo de la vela en ms (reloj del manager)
+
+@dataclass
+class _SymbolVotes:
+    """Votos vigentes de un símbolo con contadores incrementales"""
+    active: Dict[str, TimeframeDecision] = field(default_factory=dict)
+    timers: Dict[str, Timer] = field(default_factory=dict)
+    counts: Dict[str, int] = field(default_factory=lambda: {s: 0 for s in VOTE_SIGNALS})
+    conf_sum: Dict[str, float] = field(default_factory=lambda: {s: 0.0 for s in VOTE_SIGNALS})
+    price_sum: Dict[str, float] = field(default_factory=lambda: {s: 0.0 for s in VOTE_SIGNALS})
+
+class SignalDeduplicator:
+    """
+    Una señal confirmada por episodio (símbolo, dirección). Las repeticiones se
+    suprimen hasta que la dirección confirmada cambia, se llama a rearm(symbol)
+    (p.ej. al cerrarse la posición) o pasan `rearm_seconds` de tiempo de vela
+    (0 = sin rearme por tiempo).
+    """
+
+    def __init__(self, rearm_seconds: float = 0):
+        self._rearm_ms = int(rearm_seconds * 1000)
+        self._episodes: Dict[str, tuple] = {}  # symbol -> (signal, bar_time emitido)
+        self.suppressed = 0
+        self.suppressed_by_symbol: Dict[str, int] = defaultdict(int)
+
+    def admit(self, symbol: str, signal: str, bar_time: int) -> bool:
+        """True si la señal abre un episodio nuevo (y debe emitirse)"""
+        ep = self._episodes.get(symbol)
+        if ep is not None and ep[0] == signal and (not self._rearm_ms or bar_time - ep[1] < self._rearm_ms):
+            self.suppressed += 1
+            self.suppressed_by_symbol[symbol] += 1
+            return False
+        self._episodes[symbol] = (signal, bar_time)
+        return True
+
+    def rearm(self, symbol: str, signal: Optional[str] = None) -> bool:
+        """
+        Cierra el episodio del símbolo: la próxima confirmación se emite. Con
+        `signal` solo si el episodio abierto es de esa dirección (p.ej. la
+        entrada de esa señal no llegó a ejecutarse).
+        """
+        ep = self._episodes.get(symbol)
+        if ep is None or (signal is not None and ep[0] != signal):
+            return False
+        del self._episodes[symbol]
+        return True
+
+    def active_episodes(self) -> Dict[str, str]:
+        return {s: ep[0] for s, ep in self._episodes.items()}
 
 class MultitimeframeDecisionManager:
-    """Gestor de decisiones multitimeframe"""
-    
-    def __init__(self, timeframes: List[str], min_confirmations: int = 2, 
-                 decision_window: int = 300):  # 5 minutos de ventana
+    """
+    Gestor de decisiones multitimeframe.
+
+    El reloj es el tiempo de las velas (bar_time, ms), no el reloj de pared:
+    cada decisión caduca `decision_window` segundos de vela después, mediante
+    una rueda de temporizadores (O(1) por decisión). Los contadores BUY/SELL
+    por símbolo se actualizan al entrar, reemplazar o caducar un voto, así que
+    confirmar es O(1). Todas las mutaciones deben hacerse desde un único hilo
+    (el primero que llama a add_decision); los demás solo pueden leer stats.
+
+    Cada confirmación se emite una vez por episodio (símbolo, dirección); ver
+    SignalDeduplicator.
+    """
+
+    def __init__(self, timeframes: List[str], min_confirmations: int = 2,
+                 decision_window: int = 300,  # 5 minutos de ventana
+                 rearm_seconds: float = 0):
         """
         Args:
             timeframes: Lista de timeframes ["1m", "3m", "5m"]
             min_confirmations: Mínimo de timeframes que deben coincidir
-            decision_window: Ventana de tiempo en segundos para considerar decisiones válidas
+            decision_window: Ventana en segundos (tiempo de vela) para considerar decisiones válidas
+            rearm_seconds: Tiempo de vela tras el que se vuelve a emitir la misma señal (0 = nunca)
         """
         self.timeframes = timeframes
         self.min_confirmations = min_confirmations
         self.decision_window = decision_window
-        
-        # Almacenar las últimas decisiones por símbolo y timeframe
-        self.decisions: Dict[str, Dict[str, TimeframeDecision]] = defaultdict(dict)
-        
+        self._window_ms = int(decision_window * 1000)
+
+        # Votos vigentes por símbolo y su caducidad
+        self._votes: Dict[str, _SymbolVotes] = {}
+        self._wheel = TimerWheel(tick=60_000, slots=max(64, 4 * (self._window_ms // 60_000 + 1)))
+        self._clock = 0  # último bar_time visto (ms)
+        self._owner: Optional[int] = None
+        self.dedup = SignalDeduplicator(rearm_seconds)
+
         # Historia de decisiones para análisis
         self.decision_history: Dict[str, deque] = defaultdict(lambda: deque(maxlen=100))
-        
+
         # Estadísticas
         self.stats = {
             'total_decisions': 0,
             'confirmed_signals': 0,
             'buy_signals': 0,
             'sell_signals': 0,
+            'expired_decisions': 0,
             'by_timeframe': defaultdict(int)
         }
-        
+
         log.info(f"🎯 MultitimeframeDecisionManager initialized")
         log.info(f"📊 Timeframes: {timeframes} | Min confirmations: {min_confirmations}")
-        
-    def add_decision(self, symbol: str, timeframe: str, signal: str, 
-                    confidence: float, price: float):
+
+    @property
+    def decisions(self) -> Dict[str, Dict[str, TimeframeDecision]]:
+        """Decisiones vigentes por símbolo y timeframe (copia)"""
+        return {s: dict(v.active) for s, v in self._votes.items() if v.active}
+
+    def _check_owner(self):
+        ident = threading.get_ident()
+        if self._owner is None:
+            self._owner = ident
+        elif self._owner != ident:
+            raise RuntimeError("MultitimeframeDecisionManager mutated from a second thread")
+
+    def _vote(self, votes: _SymbolVotes, d: TimeframeDecision, sign: int):
+        if d.signal in VOTE_SIGNALS:
+            votes.counts[d.signal] += sign
+            votes.conf_sum[d.signal] += sign * d.confidence
+            votes.price_sum[d.signal] += sign * d.price
+
+    def _advance(self, bar_time: int):
+        """Avanza el reloj de velas y retira los votos caducados"""
+        self._clock = max(self._clock, bar_time)
+        for symbol, tf, decision in self._wheel.advance(self._clock):
+            votes = self._votes.get(symbol)
+            if votes is None or votes.active.get(tf) is not decision:
+                continue
+            del votes.active[tf]
+            votes.timers.pop(tf, None)
+            self._vote(votes, decision, -1)
+            self.stats['expired_decisions'] += 1
+            if not votes.active:
+                del self._votes[symbol]
+
+    def add_decision(self, symbol: str, timeframe: str, signal: str,
+                    confidence: float, price: float, bar_time: Optional[int] = None):
         """
         Agregar una nueva decisión de timeframe
-        
+
         Args:
             symbol: Símbolo del activo
             timeframe: Timeframe de la decisión
             signal: 'BUY', 'SELL', 'HOLD'
             confidence: Nivel de confianza [0-1]
             price: Precio actual
+            bar_time: Cierre de la vela en ms (kline 'T'); por defecto, reloj de pared
         """
-        timestamp = time.time()
-        
+        self._check_owner()
+        if bar_time is None:
+            bar_time = int(time.time() * 1000)
+        bar_time = int(bar_time)
+        self._advance(bar_time)
+
         decision = TimeframeDecision(
             symbol=symbol,
             timeframe=timeframe,
             signal=signal,
             confidence=confidence,
-            timestamp=timestamp,
-            price=price
+            timestamp=bar_time / 1000.0,
+            price=price,
+            bar_time=bar_time
         )
-        
-        # Almacenar la decisión
-        self.decisions[symbol][timeframe] = decision
-        
+
+        # Reemplazar el voto anterior del timeframe
+        votes = self._votes.get(symbol)
+        if votes is None:
+            votes = self._votes[symbol] = _SymbolVotes()
+        old = votes.active.get(timeframe)
+        if old is not None:
+            self._vote(votes, old, -1)
+            TimerWheel.cancel(votes.timers.get(timeframe))
+        votes.active[timeframe] = decision
+        self._vote(votes, decision, +1)
+        votes.timers[timeframe] = self._wheel.schedule(bar_time + self._window_ms, (symbol, timeframe, decision))
+
         # Agregar a la historia
         self.decision_history[symbol].append(decision)
-        
+
         # Actualizar estadísticas
         self.stats['total_decisions'] += 1
         self.stats['by_timeframe'][timeframe] += 1
@@ -85,70 +206,62 @@ class MultitimeframeDecisionManager:
             self.stats['buy_signals'] += 1
         elif signal == 'SELL':
             self.stats['sell_signals'] += 1
-            
+
         log.debug(f"📝 {symbol} {timeframe}: {signal} (conf={confidence:.2f}, price={price})")
-        
+
         # Verificar si hay una señal confirmada
-        confirmed_signal = self._check_confirmation(symbol)
+        confirmed_signal = self._check_confirmation(symbol, prefer=signal)
+        if confirmed_signal and not self.dedup.admit(symbol, confirmed_signal['signal'], self._clock):
+            log.debug(f"🔇 {symbol}: {confirmed_signal['signal']} already emitted in this episode")
+            return None
         if confirmed_signal:
             self.stats['confirmed_signals'] += 1
             log.info(f"✅ {symbol}: CONFIRMED {confirmed_signal['signal']} signal!")
             log.info(f"  └─ Confirmations: {confirmed_signal['confirmations']}/{len(self.timeframes)}")
             log.info(f"  └─ Timeframes: {', '.join(confirmed_signal['confirming_tfs'])}")
             return confirmed_signal
-            
+
         return None
-        
-    def _check_confirmation(self, symbol: str) -> Optional[Dict]:
+
+    def _check_confirmation(self, symbol: str, prefer: Optional[str] = None) -> Optional[Dict]:
         """
-        Verificar si hay confirmación suficiente para una señal
-        
+        Verificar si hay confirmación suficiente para una señal (O(1) con los contadores)
+
         Returns:
             Dict con información de la señal confirmada o None
         """
-        current_time = time.time()
-        symbol_decisions = self.decisions.get(symbol, {})
-        
-        # Filtrar decisiones recientes y válidas
-        valid_decisions = {}
-        for tf, decision in symbol_decisions.items():
-            if (current_time - decision.timestamp) <= self.decision_window:
-                if decision.signal in ['BUY', 'SELL']:  # Ignorar HOLD
-                    valid_decisions[tf] = decision
-                    
-        if len(valid_decisions) < self.min_confirmations:
+        votes = self._votes.get(symbol)
+        if votes is None:
             return None
-            
-        # Contar señales por tipo
-        signal_counts = defaultdict(list)
-        for tf, decision in valid_decisions.items():
-            signal_counts[decision.signal].append((tf, decision))
-            
-        # Verificar si alguna señal tiene suficientes confirmaciones
-        for signal, decisions_list in signal_counts.items():
-            if len(decisions_list) >= self.min_confirmations:
-                # Calcular confianza promedio y precio promedio
-                avg_confidence = sum(d[1].confidence for d in decisions_list) / len(decisions_list)
-                avg_price = sum(d[1].price for d in decisions_list) / len(decisions_list)
-                confirming_tfs = [d[0] for d in decisions_list]
-                
-                return {
-                    'symbol': symbol,
-                    'signal': signal,
-                    'confirmations': len(decisions_list),
-                    'avg_confidence': avg_confidence,
-                    'avg_price': avg_price,
-                    'confirming_tfs': confirming_tfs,
-                    'timestamp': current_time
-                }
-                
-        return None
-        
+
+        # Con empate gana la señal de la última decisión
+        order = sorted(VOTE_SIGNALS, key=lambda s: (votes.counts[s], s == prefer), reverse=True)
+        signal = order[0]
+        n = votes.counts[signal]
+        if n < self.min_confirmations:
+            return None
+
+        return {
+            'symbol': symbol,
+            'signal': signal,
+            'confirmations': n,
+            'avg_confidence': votes.conf_sum[signal] / n,
+            'avg_price': votes.price_sum[signal] / n,
+            'confirming_tfs': [tf for tf, d in votes.active.items() if d.signal == signal],
+            'timestamp': self._clock / 1000.0,
+            'bar_time': self._clock
+        }
+
+    def rearm(self, symbol: str, signal: Optional[str] = None) -> bool:
+        """Permitir de nuevo la señal del símbolo (p.ej. al cerrarse su posición)"""
+        self._check_owner()
+        return self.dedup.rearm(symbol, signal)
+
     def get_current_status(self, symbol: str) -> Dict:
         """Obtener el estado actual de las decisiones para un símbolo"""
-        symbol_decisions = self.decisions.get(symbol, {})
-        current_time = time.time()
-        
+        votes = self._votes.get(symbol)
+        symbol_decisions = dict(votes.active) if votes else {}
+
         status = {
             'symbol': symbol,
             'timeframes': {},
@@ -160,72 +273,65 @@ class MultitimeframeDecisionManager:
                 'hold_count': 0
             }
         }
-        
+
         for tf in self.timeframes:
             if tf in symbol_decisions:
                 decision = symbol_decisions[tf]
-                age = current_time - decision.timestamp
-                
-                if age <= self.decision_window:
-                    status['timeframes'][tf] = {
-                        'signal': decision.signal,
-                        'confidence': decision.confidence,
-                        'price': decision.price,
-                        'age_seconds': age
-                    }
-                    status['summary']['active_tfs'] += 1
-                    
-                    if decision.signal == 'BUY':
-                        status['summary']['buy_count'] += 1
-                    elif decision.signal == 'SELL':
-                        status['summary']['sell_count'] += 1
-                    else:
-                        status['summary']['hold_count'] += 1
-                        
+                status['timeframes'][tf] = {
+                    'signal': decision.signal,
+                    'confidence': decision.confidence,
+                    'price': decision.price,
+                    'age_seconds': (self._clock - decision.bar_time) / 1000.0
+                }
+                status['summary']['active_tfs'] += 1
+
+                if decision.signal == 'BUY':
+                    status['summary']['buy_count'] += 1
+                elif decision.signal == 'SELL':
+                    status['summary']['sell_count'] += 1
+                else:
+                    status['summary']['hold_count'] += 1
+
         return status
-        
+
     def get_statistics(self) -> Dict:
         """Obtener estadísticas del manager"""
         total_decisions = self.stats['total_decisions']
         confirmed_ratio = (self.stats['confirmed_signals'] / max(total_decisions, 1)) * 100
-        
+
         return {
             'total_decisions': total_decisions,
             'confirmed_signals': self.stats['confirmed_signals'],
             'confirmation_rate': confirmed_ratio,
             'buy_signals': self.stats['buy_signals'],
             'sell_signals': self.stats['sell_signals'],
+            'expired_decisions': self.stats['expired_decisions'],
+            'suppressed_signals': self.dedup.suppressed,
             'by_timeframe': dict(self.stats['by_timeframe']),
-            'active_symbols': len(self.decisions)
+            'active_symbols': len(self._votes)
         }
-        
-    def cleanup_old_decisions(self):
-        """Limpiar decisiones antiguas"""
-        current_time = time.time()
-        cleanup_count = 0
-        
-        for symbol in list(self.decisions.keys()):
-            for tf in list(self.decisions[symbol].keys()):
-                decision = self.decisions[symbol][tf]
-                if (current_time - decision.timestamp) > (self.decision_window * 2):
-                    del self.decisions[symbol][tf]
-                    cleanup_count += 1
-                    
-            # Si no quedan decisiones para el símbolo, eliminarlo
-            if not self.decisions[symbol]:
-                del self.decisions[symbol]
-                
+
+    def cleanup_old_decisions(self, bar_time: Optional[int] = None):
+        """
+        Compatibilidad: la caducidad ya la gestiona la rueda de temporizadores.
+        Solo avanza el reloj (p.ej. al final de un replay); mismo hilo que add_decision.
+        """
+        self._check_owner()
+        before = self.stats['expired_decisions']
+        self._advance(int(bar_time) if bar_time is not None else self._clock)
+        cleanup_count = self.stats['expired_decisions'] - before
         if cleanup_count > 0:
             log.debug(f"🧹 Cleaned up {cleanup_count} old decisions")
-            
+
     def log_status(self):
         """Log del estado actual"""
         stats = self.get_statistics()
         log.info(f"📊 Multitimeframe Stats:")
         log.info(f"  └─ Total decisions: {stats['total_decisions']}")
         log.info(f"  └─ Confirmed signals: {stats['confirmed_signals']} ({stats['confirmation_rate']:.1f}%)")
+        log.info(f"  └─ Suppressed repeats: {stats['suppressed_signals']}")
         log.info(f"  └─ Active symbols: {stats['active_symbols']}")
-        
+
         if stats['by_timeframe']:
             tf_stats = ", ".join([f"{tf}:{count}" for tf, count in stats['by_timeframe'].items()])
             log.info(f"  └─ By timeframe: {tf_stats}")
@@ -0,0 +1,201 @@
+"""
+Motor OCO del lado cliente para las patas SL/TP de cada posición.
+
+Se alimenta de los eventos del user-data stream (AccountState): cuando la
+posición de un símbolo registrado queda plana (SL, TP final o cierre manual)
+cancela de inmediato todas las órdenes hermanas del símbolo; cuando una pata
+TP se llena (total o parcialmente) o la posición se reduce por otra vía,
+acumula lo realizado y, si las TP que quedan suman más que la posición
+restante, las reduce empezando por la más lejana. El SL es closePosition=true, así que se ajusta solo a la cantidad
+restante y no hace falta reemplazarlo. Tras cada redimensionado se avisa a
+on_resize con la posición restante (el TRAILING_STOP_MARKET lleva cantidad fija).
+
+Las cancelaciones y reemplazos salen por un pool propio: los listeners corren
+en el hilo del WebSocket y no deben bloquearse con REST.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional
+
+from .client import get_client
+from .execution import create_order, take_profit_market_params
+from .rate_governor import PROTECT, lane
+from .user_stream import AccountState, OrderState, get_account_state
+
+log = logging.getLogger("oco")
+
+FILL_STATUSES = ("PARTIALLY_FILLED", "FILLED")
+
+
+@dataclass
+class TpLeg:
+    order_id: int
+    qty: Decimal
+    stop_price: str
+    filled: Decimal = Decimal("0")
+    close_position: bool = False
+
+    @property
+    def remaining(self) -> Decimal:
+        return self.qty - self.filled
+
+
+@dataclass
+class OcoGroup:
+    symbol: str
+    close_side: str
+    qty: Decimal
+    legs: List[TpLeg] = field(default_factory=list)
+    sl_order_id: Optional[int] = None
+    realized: Decimal = Decimal("0")
+    on_fill: Optional[Callable[[Decimal, Decimal], None]] = None   # (delta, realizado total)
+    on_flat: Optional[Callable[[], None]] = None
+    on_resize: Optional[Callable[[Decimal], None]] = None          # (posición restante) tras redimensionar
+    fmt_qty: Callable[[Decimal], str] = str
+    closing: bool = False
+
+
+class OcoEngine:
+    def __init__(self, state: Optional[AccountState] = None, max_workers: int = 2,
+                 cancel_all=None, cancel=None, place=None):
+        self.state = state or get_account_state()
+        self.groups: Dict[str, OcoGroup] = {}
+        self._lock = threading.RLock()
+        self._resize_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="oco")
+        self._cancel_all = cancel_all or (lambda s: get_client().client.futures_cancel_all_open_orders(symbol=s))
+        self._cancel = cancel or (lambda s, oid: get_client().client.futures_cancel_order(symbol=s, orderId=oid))
+        self._place = place or (lambda params: create_order(**params))
+        self.stats = {"flat_cancels": 0, "tp_fills": 0, "resized": 0}
+        self.state.add_listener(self._on_event)
+
+    # --- registro -------------------------------------------------------
+    def register(self, group: OcoGroup) -> None:
+        with self._lock:
+            self.groups[group.symbol] = group
+        log.info(f"[{group.symbol}] 🔗 OCO: SL {group.sl_order_id} + {len(group.legs)} TP")
+
+    def unregister(self, symbol: str) -> Optional[OcoGroup]:
+        with self._lock:
+            return self.groups.pop(symbol, None)
+
+    def close(self, symbol: str) -> bool:
+        """Posición plana: cancelar hermanas (también desde el polling sin stream)."""
+        with self._lock:
+            g = self.groups.get(symbol)
+            if g is None or g.closing:
+                return False
+            g.closing = True
+            self.groups.pop(symbol, None)
+        self._pool.submit(self._cancel_siblings, g)
+        return True
+
+    # --- eventos --------------------------------------------------------
+    def _on_event(self, event: str, payload) -> None:
+        if event == "position":
+            symbol, old, new = payload
+            if new == 0:
+                self.close(symbol)
+            elif abs(new) < abs(old):
+                # Reducción fuera de las TP (cierre parcial manual, ADL...)
+                g = self.groups.get(symbol)
+                if g is not None and not g.closing:
+                    self._pool.submit(self._resize, g)
+        elif event == "order":
+            self._on_order(payload)
+
+    def _on_order(self, o: OrderState) -> None:
+        with self._lock:
+            g = self.groups.get(o.symbol)
+            if g is None or g.closing:
+                return
+            if o.order_id == g.sl_order_id and o.status == "FILLED":
+                flat = True
+            else:
+                leg = next((l for l in g.legs if l.order_id == o.order_id), None)
+                if leg is None or o.status not in FILL_STATUSES or o.executed_qty <= leg.filled:
+                    return
+                delta = o.executed_qty - leg.filled
+                leg.filled = o.executed_qty
+                g.realized += delta
+                self.stats["tp_fills"] += 1
+                flat = (leg.close_position and o.status == "FILLED") or g.realized >= g.qty
+                if g.on_fill:
+                    g.on_fill(delta, g.realized)
+                log.info(f"[{o.symbol}] 🎯 TP {o.order_id} +{delta} (realizado {g.realized}/{g.qty})")
+                if not flat:
+                    self._pool.submit(self._resize, g)
+        if flat:
+            self.close(o.symbol)
+
+    # --- acciones (pool) ------------------------------------------------
+    def _cancel_siblings(self, g: OcoGroup) -> None:
+        try:
+            with lane(PROTECT):
+                self._cancel_all(g.symbol)
+            self.stats["flat_cancels"] += 1
+            log.info(f"[{g.symbol}] 🧹 Posición plana: órdenes hermanas canceladas")
+        except Exception as e:
+            log.error(f"[{g.symbol}] ❌ OCO no pudo cancelar hermanas: {e}")
+        if g.on_flat:
+            try:
+                g.on_flat()
+            except Exception as e:
+                log.error(f"[{g.symbol}] ❌ on_flat: {e}")
+
+    def _resize(self, g: OcoGroup) -> None:
+        # Un redimensionado a la vez: dos eventos seguidos no deben recortar la misma pata dos veces
+        with self._resize_lock:
+            self._resize_locked(g)
+
+    def _resize_locked(self, g: OcoGroup) -> None:
+        """Reduce las TP abiertas (de la más lejana a la más cercana) a la posición restante."""
+        if g.closing:
+            return
+        pos = self.state.position(g.symbol)
+        remaining_pos = abs(pos.amount) if pos is not None else g.qty - g.realized
+        with self._lock:
+            open_legs = [l for l in g.legs if l.remaining > 0 and not l.close_position]
+            excess = sum((l.remaining for l in open_legs), Decimal("0")) - remaining_pos
+            plan = []
+            for leg in reversed(open_legs):
+                if excess <= 0:
+                    break
+                cut = min(excess, leg.remaining)
+                excess -= cut
+                plan.append((leg, leg.remaining - cut))
+        for leg, new_qty in plan:
+            try:
+                with lane(PROTECT):
+                    self._cancel(g.symbol, leg.order_id)
+                    if new_qty > 0:
+                        resp = self._place(take_profit_market_params(
+                            g.symbol, side=g.close_side, stop_price=leg.stop_price, qty=g.fmt_qty(new_qty)))
+                        leg.order_id, leg.qty, leg.filled = resp.get("orderId"), new_qty, Decimal("0")
+                    else:
+                        leg.qty = leg.filled
+                self.stats["resized"] += 1
+                log.info(f"[{g.symbol}] ✂️ TP @ {leg.stop_price} redimensionada a {new_qty}")
+            except Exception as e:
+                log.error(f"[{g.symbol}] ❌ No se pudo redimensionar TP {leg.order_id}: {e}")
+        if g.on_resize and remaining_pos > 0:
+            try:
+                g.on_resize(remaining_pos)
+            except Exception as e:
+                log.error(f"[{g.symbol}] ❌ on_resize: {e}")
+
+
+_engine: Optional[OcoEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_oco_engine() -> OcoEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = OcoEngine()
+        return _engine
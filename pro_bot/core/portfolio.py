@@ -0,0 +1,231 @@
+"""
+Riesgo de cartera: covarianza EWMA de retornos y exposición de las posiciones.
+
+La covarianza de retornos logarítmicos por vela se actualiza de forma
+incremental con cada vela cerrada (una pasada O(n²) por vela, sin rehacer la
+ventana): los retornos de un mismo timestamp se acumulan y se aplican juntos
+en cuanto han llegado todos los símbolos (o empieza la vela siguiente). Las
+posiciones salen del AccountState del user-data stream y los precios de las
+velas cerradas o del risk loop. Sin stream sincronizado (USER_STREAM=false o
+reconectando) las cantidades se toman del cache de posiciones que refresca
+execution por REST; si ese cache tampoco existe, la puerta no bloquea y lo avisa.
+
+check_entry(symbol, direction, notional) decide con O(n) operaciones sobre
+los arrays en memoria si la entrada añade demasiado riesgo: correlación del
+candidato con la cartera actual y exposición neta ponderada por beta (frente
+a `benchmark`) como fracción de la equity de la cuenta (`max_beta_equity`;
+sin equity conocida, tope fijo `max_beta_usdt` en USDT). Así cinco largos en
+altcoins correladas no cuentan igual que cinco posiciones independientes.
+"""
+
+import heapq
+import logging
+import math
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from .user_stream import get_account_state
+
+log = logging.getLogger("portfolio")
+
+INITIAL_CAPACITY = 32
+
+
+class PortfolioRisk:
+    def __init__(self, halflife_bars: int = 240, min_bars: int = 60, max_corr: float = 0.7,
+                 max_beta_equity: float = 1.5, max_beta_usdt: float = 0.0, benchmark: str = "BTCUSDT",
+                 account_state=None):
+        self.lam = 0.5 ** (1.0 / max(int(halflife_bars), 1))
+        self.min_bars = int(min_bars)
+        self.max_corr = float(max_corr)
+        self.max_beta_equity = float(max_beta_equity)
+        self.max_beta_usdt = float(max_beta_usdt)
+        self.benchmark = benchmark
+        self._lock = threading.Lock()
+        self.index: Dict[str, int] = {}
+        self.symbols: List[str] = []
+        cap = INITIAL_CAPACITY
+        self.cov = np.zeros((cap, cap))
+        self.nobs = np.zeros(cap, dtype=np.int64)
+        self.last_close = np.zeros(cap)
+        self.qty = np.zeros(cap)
+        self.price = np.zeros(cap)
+        self._bar_ts = None
+        self._row: Dict[int, float] = {}            # idx -> retorno de la vela en curso
+        self._ready = 0                             # símbolos con cierre previo (dan retorno)
+        self.stats = {"bars": 0, "rejected": 0}
+        self._cache_at = None                       # refresco del cache REST aplicado (sin stream)
+        self.state = account_state or get_account_state()
+        for sym, pos in list(self.state.positions.items()):
+            i = self._idx(sym)
+            self.qty[i] = float(pos.amount)
+            self.price[i] = float(pos.mark_price) or float(pos.entry_price)
+        self.state.add_listener(self._on_account_event)
+
+    # --- universo -------------------------------------------------------
+    def _idx(self, symbol: str) -> int:
+        i = self.index.get(symbol)
+        if i is not None:
+            return i
+        i = len(self.symbols)
+        if i == len(self.nobs):
+            self._grow(2 * i)
+        self.index[symbol] = i
+        self.symbols.append(symbol)
+        return i
+
+    def _grow(self, cap: int) -> None:
+        n = len(self.nobs)
+        cov = np.zeros((cap, cap))
+        cov[:n, :n] = self.cov
+        self.cov = cov
+        for name in ("nobs", "last_close", "qty", "price"):
+            old = getattr(self, name)
+            new = np.zeros(cap, dtype=old.dtype)
+            new[:n] = old
+            setattr(self, name, new)
+
+    # --- velas cerradas ---------------------------------------------------
+    def on_bar(self, symbol: str, ts: int, close: float) -> None:
+        """Vela cerrada de `symbol` (ts de apertura); actualiza la covarianza."""
+        with self._lock:
+            i = self._idx(symbol)
+            if self._bar_ts is None or ts > self._bar_ts:
+                self._flush()
+                self._bar_ts = ts
+            prev = self.last_close[i]
+            self.last_close[i] = close
+            self.price[i] = close
+            if prev <= 0:
+                self._ready += 1
+                return
+            if close <= 0:
+                return
+            ret = math.log(close / prev)
+            if ts < self._bar_ts:
+                # Vela atrasada (la siguiente ya empezó): se aplica sola
+                self._apply(np.array([i]), np.array([ret]))
+                return
+            self._row[i] = ret
+            if len(self._row) >= self._ready:
+                self._flush()
+
+    def _apply(self, ix: np.ndarray, r: np.ndarray) -> None:
+        sub = np.ix_(ix, ix)
+        self.cov[sub] = self.lam * self.cov[sub] + (1.0 - self.lam) * np.outer(r, r)
+        self.nobs[ix] += 1
+        self.stats["bars"] += 1
+
+    def _flush(self) -> None:
+        if not self._row:
+            return
+        self._apply(np.fromiter(self._row.keys(), dtype=np.int64, count=len(self._row)),
+                    np.fromiter(self._row.values(), dtype=float, count=len(self._row)))
+        self._row.clear()
+
+    def seed(self, bars: Dict[str, Iterable[Tuple[int, float]]]) -> None:
+        """Carga el histórico de warmup: {symbol: [(ts, close), ...]} en orden temporal."""
+        streams = [[(ts, sym, close) for ts, close in rows] for sym, rows in bars.items()]
+        for ts, sym, close in heapq.merge(*streams):
+            self.on_bar(sym, ts, close)
+        with self._lock:
+            self._flush()
+        log.info(f"📐 Covarianza de cartera inicializada: {len(self.symbols)} símbolos, {self.stats['bars']} velas")
+
+    # --- posiciones y precios ---------------------------------------------
+    def _on_account_event(self, event, payload) -> None:
+        if event == "position":
+            symbol, _old, new = payload
+            with self._lock:
+                i = self._idx(symbol)
+                self.qty[i] = float(new)
+                pos = self.state.position(symbol)
+                if pos is not None and self.price[i] <= 0:
+                    self.price[i] = float(pos.entry_price)
+
+    def _sync_positions(self) -> None:
+        """Sin stream sincronizado: cantidades desde el cache de posiciones de execution (sin REST)."""
+        if self.state.synced:
+            self._cache_at = None
+            return
+        from . import execution  # cache del hilo de refresco
+        refreshed_at, positions = execution.get_cached_positions_info()
+        if refreshed_at == self._cache_at:
+            return
+        if not refreshed_at:
+            if self._cache_at is None:
+                log.warning("⚠️ Sin user-data stream ni cache de posiciones: la puerta de cartera no bloquea")
+            self._cache_at = refreshed_at
+            return
+        with self._lock:
+            self.qty[:len(self.symbols)] = 0.0
+            for p in positions:
+                i = self._idx(p.symbol)
+                self.qty[i] = float(p.positionAmt)
+                px = float(p.markPrice) or float(p.entryPrice)
+                if px > 0:
+                    self.price[i] = px
+            self._cache_at = refreshed_at
+
+    def on_prices(self, prices: Dict[str, float]) -> None:
+        """Mark prices (risk loop) para las posiciones abiertas."""
+        n = len(self.symbols)
+        for i in np.flatnonzero(self.qty[:n]):
+            px = prices.get(self.symbols[i])
+            if px is not None:
+                self.price[i] = px
+
+    # --- métricas ---------------------------------------------------------
+    def _betas(self, n: int) -> np.ndarray:
+        b = self.index.get(self.benchmark)
+        if b is None or b >= n or self.cov[b, b] <= 0:
+            return np.ones(n)
+        return self.cov[:n, b] / self.cov[b, b]
+
+    def exposures(self) -> Dict[str, float]:
+        """Exposición neta, bruta y ponderada por beta (USDT) y volatilidad por vela de la cartera."""
+        n = len(self.symbols)
+        w = self.qty[:n] * self.price[:n]
+        var = float(w @ self.cov[:n, :n] @ w)
+        return {"net": float(w.sum()), "gross": float(np.abs(w).sum()),
+                "beta": float(w @ self._betas(n)), "vol": math.sqrt(max(var, 0.0))}
+
+    def marginal_risk(self, symbol: str, direction: str, notional: float) -> Dict[str, float]:
+        """Efecto de añadir `notional` en `symbol`: correlación con la cartera, beta y Δvol."""
+        n = len(self.symbols)
+        i = self.index[symbol]
+        dw = notional if direction in ("LONG", "BUY") else -notional
+        w = self.qty[:n] * self.price[:n]
+        cw = self.cov[:n, :n] @ w                          # Σw
+        sw = float(cw[i])
+        var_p = float(w @ cw)
+        var_i = float(self.cov[i, i])
+        beta = self._betas(n)
+        beta_now = float(w @ beta)
+        corr = (math.copysign(1.0, dw) * sw / math.sqrt(var_i * var_p)) if var_i > 0 and var_p > 0 else 0.0
+        vol_after = math.sqrt(max(var_p + 2.0 * dw * sw + dw * dw * var_i, 0.0))
+        return {"corr": corr, "beta_now": beta_now, "beta_after": beta_now + dw * float(beta[i]),
+                "vol_now": math.sqrt(max(var_p, 0.0)), "vol_after": vol_after}
+
+    def beta_limit(self, equity: float = 0.0) -> float:
+        """Tope de |exposición beta| en USDT (0 = sin tope)."""
+        return self.max_beta_equity * equity if equity > 0 else self.max_beta_usdt
+
+    def check_entry(self, symbol: str, direction: str, notional: float, equity: float = 0.0) -> Tuple[bool, str]:
+        """(ok, motivo). Sin historial suficiente o sin posiciones abiertas no bloquea."""
+        self._sync_positions()
+        with self._lock:
+            i = self.index.get(symbol)
+            if i is None or self.nobs[i] < self.min_bars or notional <= 0 or not self.qty[:len(self.symbols)].any():
+                return True, ""
+            m = self.marginal_risk(symbol, direction, notional)
+        if m["corr"] > self.max_corr:
+            reason = f"correlación {m['corr']:.2f} con la cartera (máx {self.max_corr:.2f})"
+        elif 0 < (limit := self.beta_limit(equity)) < abs(m["beta_after"]) and abs(m["beta_after"]) > abs(m["beta_now"]):
+            reason = f"exposición beta {m['beta_after']:.2f} USDT > {limit:.2f} USDT"
+        else:
+            return True, ""
+        self.stats["rejected"] += 1
+        return False, reason
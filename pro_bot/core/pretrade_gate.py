@@ -0,0 +1,155 @@
+"""
+Puerta única pre-trade: límite global, posición/LIMIT pendiente por símbolo,
+cooldowns de SLTPManager, kill switch y margen libre de RiskGuard y riesgo
+marginal de cartera (PortfolioRisk), todo desde memoria.
+
+Las posiciones y LIMIT pendientes salen del AccountState del user-data stream
+(o del cache de execution si el stream no está sincronizado). try_reserve
+comprueba y reserva hueco bajo un lock, así que varios workers no pueden
+superar max_open_positions. Una reserva se libera al fallar la entrada o,
+si se abrió, cuando el stream confirma la posición (o vence el TTL).
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from ..config import settings
+from .user_stream import get_account_state, live_account_state
+
+log = logging.getLogger("gate")
+
+RESERVATION_TTL_SECONDS = 30.0
+REASON_POSITION_OPEN = "ya hay posición abierta"
+
+
+class PreTradeGate:
+    def __init__(self, max_open: Optional[int] = None, reservation_ttl: float = RESERVATION_TTL_SECONDS):
+        self.max_open = int(max_open if max_open is not None else settings.max_open_positions)
+        self.reservation_ttl = reservation_ttl
+        self._lock = threading.Lock()
+        self._reserved: Dict[str, float] = {}               # symbol -> vencimiento (monotonic)
+        self._cooldowns: Dict[str, Callable] = {}           # symbol -> is_in_cooldown()
+        self._risk_guard = None
+        self._portfolio = None
+        self.stats = {"reserved": 0, "rejected": 0}
+        get_account_state().add_listener(self._on_account_event)
+
+    # --- registro -------------------------------------------------------
+    def register_cooldown(self, symbol: str, is_in_cooldown: Callable) -> None:
+        """is_in_cooldown() -> (bool, motivo), como SLTPManager.is_in_cooldown."""
+        self._cooldowns[symbol] = is_in_cooldown
+
+    def attach_risk_guard(self, guard) -> None:
+        self._risk_guard = guard
+
+    def attach_portfolio(self, portfolio) -> None:
+        self._portfolio = portfolio
+
+    def _on_account_event(self, event, payload) -> None:
+        # Posición confirmada por el stream: la reserva ya cuenta como posición
+        if event == "position":
+            symbol, _old, new = payload
+            if new != 0:
+                with self._lock:
+                    self._reserved.pop(symbol, None)
+
+    # --- estado ---------------------------------------------------------
+    @staticmethod
+    def _book() -> Tuple[Set[str], Set[str]]:
+        state = live_account_state()
+        if state is not None:
+            return set(state.positions), set(state.pending_limit_symbols())
+        from . import execution  # cache del hilo de refresco (sin REST)
+        return set(execution.get_cached_open_positions()), set(execution.get_cached_pending_orders())
+
+    def _expire(self, now: float) -> None:
+        for sym in [s for s, t in self._reserved.items() if t <= now]:
+            del self._reserved[sym]
+
+    def _check(self, symbol: str) -> Tuple[bool, str]:
+        if self._risk_guard is not None and self._risk_guard.is_tripped():
+            return False, "kill switch activo"
+        cooldown = self._cooldowns.get(symbol)
+        if cooldown is not None:
+            in_cooldown, reason = cooldown()
+            if in_cooldown:
+                return False, f"cooldown ({reason})"
+        if symbol in self._reserved:
+            return False, "entrada en curso"
+        open_syms, pending = self._book()
+        if symbol in open_syms:
+            return False, REASON_POSITION_OPEN
+        if symbol in pending:
+            return False, "orden LIMIT pendiente"
+        active = len(open_syms | pending | set(self._reserved))
+        if active >= self.max_open:
+            return False, f"límite de {self.max_open} posiciones activas alcanzado ({active})"
+        return True, ""
+
+    def check(self, symbol: str) -> Tuple[bool, str]:
+        """Consulta sin reservar."""
+        with self._lock:
+            self._expire(time.monotonic())
+            return self._check(symbol)
+
+    def check_margin(self, symbol: str, notional: float, leverage: int) -> Tuple[bool, str]:
+        """Margen libre estimado por RiskGuard (sin REST) para una entrada de `notional`."""
+        guard = self._risk_guard
+        if guard is None or guard.has_margin_for(notional, leverage):
+            return True, ""
+        reason = f"margen insuficiente ({notional / max(int(leverage), 1):.2f} > {guard.available_margin():.2f} USDT)"
+        self.stats["rejected"] += 1
+        log.info(f"[{symbol}] 🚧 Entrada bloqueada: {reason}")
+        return False, reason
+
+    def check_portfolio(self, symbol: str, direction: str, notional: float) -> Tuple[bool, str]:
+        """Correlación y exposición beta de la cartera con la entrada (PortfolioRisk)."""
+        if self._portfolio is None:
+            return True, ""
+        equity = self._risk_guard.equity if self._risk_guard is not None else 0.0
+        ok, reason = self._portfolio.check_entry(symbol, direction, notional, equity=equity)
+        if not ok:
+            self.stats["rejected"] += 1
+            log.info(f"[{symbol}] 🚧 Entrada bloqueada: {reason}")
+        return ok, reason
+
+    def try_reserve(self, symbol: str) -> Tuple[bool, str]:
+        """Comprueba y reserva hueco de forma atómica."""
+        with self._lock:
+            self._expire(time.monotonic())
+            ok, reason = self._check(symbol)
+            if ok:
+                self._reserved[symbol] = time.monotonic() + self.reservation_ttl
+                self.stats["reserved"] += 1
+            else:
+                self.stats["rejected"] += 1
+        if not ok:
+            log.info(f"[{symbol}] 🚧 Entrada bloqueada: {reason}")
+        return ok, reason
+
+    def release(self, symbol: str, opened: bool = False) -> None:
+        """
+        Libera la reserva. Con opened=True se mantiene hasta que el stream
+        confirme la posición (o venza el TTL) para no contar de menos.
+        """
+        with self._lock:
+            if symbol not in self._reserved:
+                return
+            if opened and live_account_state() is not None and not get_account_state().has_position(symbol):
+                self._reserved[symbol] = time.monotonic() + self.reservation_ttl
+            else:
+                del self._reserved[symbol]
+
+
+_gate: Optional[PreTradeGate] = None
+_gate_lock = threading.Lock()
+
+
+def get_gate() -> PreTradeGate:
+    global _gate
+    with _gate_lock:
+        if _gate is None:
+            _gate = PreTradeGate()
+        return _gate
@@ -0,0 +1,255 @@
+"""
+Gobernador de peso de peticiones (X-MBX-USED-WEIGHT-1M / X-MBX-ORDER-COUNT-1M)
+con carriles de prioridad.
+
+Cada petición REST (cliente python-binance y cliente aiohttp) pide permiso
+con su peso antes de salir. El uso del minuto en curso es el máximo entre la
+estimación local y lo que devuelve el servidor en las cabeceras. Cada carril
+solo puede consumir hasta una fracción del límite, de modo que el backfill de
+velas y el polling se frenan (o se descartan) mucho antes de que una orden de
+protección tenga que esperar:
+
+  PROTECT (SL/TP, batch)  100%  nunca se descarta
+  ENTRY   (entradas)       90%  espera como mucho 2 s
+  POSITION (positionRisk)  75%  espera como mucho 5 s
+  MARKET_DATA (klines)     60%  espera como mucho 60 s
+
+Con carriles de mayor prioridad esperando, los de menor no adelantan. Un
+429/418 (Retry-After) bloquea todo hasta que vence.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+log = logging.getLogger("rate_gov")
+
+PROTECT, ENTRY, POSITION, MARKET_DATA = 0, 1, 2, 3
+LANE_NAMES = ("protect", "entry", "position", "market_data")
+LANE_CAP = (1.0, 0.9, 0.75, 0.6)
+LANE_MAX_WAIT = (None, 2.0, 5.0, 60.0)
+
+WEIGHT_LIMIT_1M = 2400
+ORDER_LIMIT_1M = 1200
+
+PROTECTIVE_TYPES = ("STOP_MARKET", "TAKE_PROFIT_MARKET", "TRAILING_STOP_MARKET", "STOP", "TAKE_PROFIT")
+
+_lane_override: contextvars.ContextVar = contextvars.ContextVar("rate_lane", default=None)
+
+
+class RateLimitShed(Exception):
+    """La petición de baja prioridad se descarta para preservar el presupuesto."""
+
+
+@contextlib.contextmanager
+def lane(value: int):
+    """Fuerza el carril de las peticiones hechas dentro del bloque."""
+    token = _lane_override.set(value)
+    try:
+        yield
+    finally:
+        _lane_override.reset(token)
+
+
+def endpoint_weight(method: str, path: str, params: Optional[dict] = None) -> Tuple[int, int]:
+    """(peso IP, nº de órdenes) de una petición de Futuros USDⓈ-M."""
+    params = params or {}
+    method = method.upper()
+    if path.endswith("/batchOrders"):
+        # python-binance ya lo envía url-encoded ({ -> %7B)
+        raw = str(params.get("batchOrders", ""))
+        n = max(1, raw.count("{") + raw.upper().count("%7B"))
+        return 5, n if method == "POST" else 0
+    if path.endswith("/order"):
+        return 1, 1 if method == "POST" else 0
+    if path.endswith("/klines") or path.endswith("Klines"):
+        limit = int(params.get("limit", 500))
+        return (1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10), 0
+    if path.endswith("/positionRisk") or path.endswith("/account") or path.endswith("/balance"):
+        return 5, 0
+    if path.endswith("/openOrders") or path.endswith("/allOpenOrders"):
+        return (1 if params.get("symbol") else 40), 0
+    if path.endswith("/ticker/price"):
+        return (1 if params.get("symbol") else 2), 0
+    if path.endswith("/ticker/24hr"):
+        return (1 if params.get("symbol") else 40), 0
+    return 1, 0
+
+
+def classify(method: str, path: str, params: Optional[dict] = None) -> int:
+    """Carril por defecto según endpoint y tipo de orden."""
+    override = _lane_override.get()
+    if override is not None:
+        return override
+    params = params or {}
+    method = method.upper()
+    if path.endswith("/batchOrders"):
+        return PROTECT
+    if path.endswith("/order") and method == "POST":
+        protective = params.get("type") in PROTECTIVE_TYPES or str(params.get("reduceOnly", "")).lower() == "true" \
+            or str(params.get("closePosition", "")).lower() == "true"
+        return PROTECT if protective else ENTRY
+    if path.endswith("/order") or path.endswith("/leverage") or path.endswith("/marginType"):
+        return ENTRY
+    if any(path.endswith(p) for p in ("/positionRisk", "/openOrders", "/allOpenOrders", "/account",
+                                       "/balance", "/listenKey")):
+        return POSITION
+    return MARKET_DATA
+
+
+class RateGovernor:
+    def __init__(self, weight_limit: int = WEIGHT_LIMIT_1M, order_limit: int = ORDER_LIMIT_1M,
+                 clock=time.time):
+        self.weight_limit = weight_limit
+        self.order_limit = order_limit
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._minute = self._current_minute()
+        self.used_weight = 0
+        self.used_orders = 0
+        self._waiting = [0, 0, 0, 0]
+        self.banned_until = 0.0
+        self.stats = {name: {"granted": 0, "shed": 0, "waited_s": 0.0} for name in LANE_NAMES}
+
+    def _current_minute(self) -> int:
+        return int(self._clock() // 60)
+
+    def _roll(self) -> None:
+        m = self._current_minute()
+        if m != self._minute:
+            self._minute = m
+            self.used_weight = 0
+            self.used_orders = 0
+
+    def _wait_needed(self, lane_id: int, weight: int, orders: int) -> float:
+        """0 si puede salir ya; si no, segundos a esperar (aprox.)."""
+        now = self._clock()
+        if now < self.banned_until:
+            return self.banned_until - now
+        self._roll()
+        until_reset = (self._minute + 1) * 60 - now
+        if any(self._waiting[h] for h in range(lane_id)):
+            return min(0.05, until_reset)
+        cap = LANE_CAP[lane_id]
+        if self.used_weight + weight > self.weight_limit * cap:
+            return until_reset
+        if orders and self.used_orders + orders > self.order_limit * cap:
+            return until_reset
+        return 0.0
+
+    def _take(self, lane_id: int, weight: int, orders: int, waited: float) -> None:
+        self.used_weight += weight
+        self.used_orders += orders
+        st = self.stats[LANE_NAMES[lane_id]]
+        st["granted"] += 1
+        st["waited_s"] += waited
+
+    def _shed(self, lane_id: int, weight: int, wait: float) -> None:
+        self.stats[LANE_NAMES[lane_id]]["shed"] += 1
+        raise RateLimitShed(f"{LANE_NAMES[lane_id]}: peso {weight} descartado "
+                            f"(uso {self.used_weight}/{self.weight_limit}, espera {wait:.1f}s)")
+
+    def acquire(self, lane_id: int, weight: int = 1, orders: int = 0,
+                max_wait: Optional[float] = -1.0) -> None:
+        """Bloquea (hilos) hasta que hay presupuesto para el carril o lanza RateLimitShed."""
+        max_wait = LANE_MAX_WAIT[lane_id] if max_wait == -1.0 else max_wait
+        start = self._clock()
+        with self._cond:
+            wait = self._wait_needed(lane_id, weight, orders)
+            if wait <= 0:
+                self._take(lane_id, weight, orders, 0.0)
+                return
+            self._waiting[lane_id] += 1
+            try:
+                while wait > 0:
+                    waited = self._clock() - start
+                    if max_wait is not None and waited + wait > max_wait:
+                        self._shed(lane_id, weight, wait)
+                    self._cond.wait(timeout=min(wait, 1.0))
+                    wait = self._wait_needed(lane_id, weight, orders)
+                self._take(lane_id, weight, orders, self._clock() - start)
+            finally:
+                self._waiting[lane_id] -= 1
+                self._cond.notify_all()
+
+    async def acquire_async(self, lane_id: int, weight: int = 1, orders: int = 0,
+                            max_wait: Optional[float] = -1.0) -> None:
+        """Igual que acquire pero sin bloquear el event loop."""
+        max_wait = LANE_MAX_WAIT[lane_id] if max_wait == -1.0 else max_wait
+        start = self._clock()
+        with self._cond:
+            wait = self._wait_needed(lane_id, weight, orders)
+            if wait <= 0:
+                self._take(lane_id, weight, orders, 0.0)
+                return
+            self._waiting[lane_id] += 1
+        try:
+            while True:
+                with self._cond:
+                    waited = self._clock() - start
+                    if max_wait is not None and waited + wait > max_wait:
+                        self._shed(lane_id, weight, wait)
+                await asyncio.sleep(min(wait, 1.0))
+                with self._cond:
+                    wait = self._wait_needed(lane_id, weight, orders)
+                    if wait <= 0:
+                        self._take(lane_id, weight, orders, self._clock() - start)
+                        return
+        finally:
+            with self._cond:
+                self._waiting[lane_id] -= 1
+                self._cond.notify_all()
+
+    def observe(self, status: int, headers) -> None:
+        """Ajusta el uso con las cabeceras del servidor y registra baneos 429/418."""
+        with self._cond:
+            self._roll()
+            w = headers.get("X-MBX-USED-WEIGHT-1M") or headers.get("x-mbx-used-weight-1m")
+            if w is not None:
+                self.used_weight = max(self.used_weight, int(w))
+            o = headers.get("X-MBX-ORDER-COUNT-1M") or headers.get("x-mbx-order-count-1m")
+            if o is not None:
+                self.used_orders = max(self.used_orders, int(o))
+            if status in (418, 429):
+                retry = float(headers.get("Retry-After") or headers.get("retry-after") or 60)
+                self.banned_until = max(self.banned_until, self._clock() + retry)
+                log.error(f"🚫 HTTP {status}: peticiones bloqueadas {retry:.0f}s (uso {self.used_weight}/{self.weight_limit})")
+            self._cond.notify_all()
+
+    def summary(self) -> Dict[str, object]:
+        with self._cond:
+            self._roll()
+            return {"used_weight": self.used_weight, "used_orders": self.used_orders,
+                    "banned_for_s": max(0.0, self.banned_until - self._clock()), "lanes": self.stats}
+
+
+_governor = RateGovernor()
+
+
+def get_governor() -> RateGovernor:
+    return _governor
+
+
+def install_on_client(client) -> None:
+    """Engancha el gobernador a un binance.Client (python-binance, síncrono)."""
+    from urllib.parse import urlparse
+
+    if getattr(client, "_rate_governed", False):
+        return
+    gov = get_governor()
+    orig = client._request
+
+    def governed(method, uri, signed, force_params=False, **kwargs):
+        path = urlparse(uri).path
+        params = kwargs.get("data") or kwargs.get("params") or {}
+        weight, orders = endpoint_weight(method, path, params)
+        gov.acquire(classify(method, path, params), weight, orders)
+        return orig(method, uri, signed, force_params, **kwargs)
+
+    client._request = governed
+    client.session.hooks["response"].append(lambda r, *a, **k: gov.observe(r.status_code, r.headers))
+    client._rate_governed = True
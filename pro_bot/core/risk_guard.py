@@ -1,96 +1,263 @@
+"""
+Kill switch diario y control de margen disponible, alimentados por streams.
+
+La equity (wallet USDT + PnL no realizado) se mantiene en memoria con los
+eventos del user-data stream (balances y posiciones) y los mark prices del
+risk loop; la cuenta se lee por REST al arrancar y en on_loop si el stream
+no está vivo o no llegan mark prices (RISK_LOOP=false): sin ellos el PnL no
+realizado solo cambiaría con ACCOUNT_UPDATE. La base diaria (UTC), el
+drawdown y el kill switch se calculan en cada actualización, de modo que can_trade/is_tripped son O(1) y
+no tocan disco: la persistencia (equity_baseline.json y kill_switch.lock) la
+hace un hilo en segundo plano cuando algo cambia. La base no se fija ni se
+guarda hasta tener una lectura de equity buena (REST o balance del stream):
+una base 0 desactivaría el kill switch.
+
+has_margin_for(notional, leverage) estima el margen libre (equity menos el
+margen inicial de las posiciones abiertas) para no enviar órdenes que el
+exchange rechazaría por margen insuficiente (-2019).
+"""
 
 import json
-import os
 import logging
+import os
+import threading
+import time
 from datetime import datetime, timezone
+from typing import Dict
+
+from ..config import settings
+from .account_config import get_account_config
 from .client import get_client
+from .user_stream import get_account_state, live_account_state
 
 log = logging.getLogger("risk_guard")
 
 RUNTIME_DIR = "outputs/runtime"
 BASELINE_FILE = os.path.join(RUNTIME_DIR, "equity_baseline.json")
 LOCK_FILE = os.path.join(RUNTIME_DIR, "kill_switch.lock")
+QUOTE_ASSET = "USDT"
+MARGIN_BUFFER = 1.05          # comisiones y deslizamiento sobre el margen inicial
+PRICES_MAX_AGE_SECONDS = 10.0  # mark prices más viejos: on_loop vuelve a REST
+
 
 def _today_key():
     return datetime.now(timezone.utc).strftime("%Y-%m-%d")
 
+
+def _day_index() -> int:
+    return int(time.time() // 86400)
+
+
 def _ensure_dirs():
     os.makedirs(RUNTIME_DIR, exist_ok=True)
 
-def _get_equity_usdt():
-    # Futures account wallet balance (USDT-M)
+
+def _get_account_usdt() -> Dict[str, float]:
+    # Futures account (USDT-M): wallet, PnL no realizado y margen disponible
     acct = get_client().client.futures_account()
-    # Prefer totalWalletBalance in USDT
-    eq = float(acct.get("totalWalletBalance", 0.0))
-    return eq
+    return {"wallet": float(acct.get("totalWalletBalance", 0.0)),
+            "unrealized": float(acct.get("totalUnrealizedProfit", 0.0)),
+            "available": float(acct.get("availableBalance", 0.0))}
+
 
 class RiskGuard:
-    def __init__(self, max_daily_dd: float = 0.03):
+    def __init__(self, max_daily_dd: float = 0.03, account_state=None, persist: bool = True):
         _ensure_dirs()
         self.max_daily_dd = max_daily_dd
+        self.state = account_state or get_account_state()
+        self.persist = persist
+        self._lock = threading.Lock()
+        self.wallet = 0.0
+        self.unrealized = 0.0
+        self.equity = 0.0
+        self.drawdown = 0.0
+        self.baseline = 0.0
+        self._equity_ok = False        # hay al menos una lectura de equity válida
+        self._marks: Dict[str, float] = {}
+        self._upnl: Dict[str, float] = {}
+        self._prices_at = 0.0          # último tick de mark prices (monotonic)
+        self._dirty = threading.Event()
         self._load_or_init()
+        self.state.add_listener(self._on_account_event)
+        if persist:
+            threading.Thread(target=self._writer, name="risk-guard-io", daemon=True).start()
 
+    # --- arranque (único acceso a disco/REST síncrono) ------------------
     def _load_or_init(self):
         self.today = _today_key()
+        self._day = _day_index()
         self.tripped = os.path.exists(LOCK_FILE)
-        self.baseline = None
+        data = {}
         if os.path.exists(BASELINE_FILE):
             try:
                 data = json.load(open(BASELINE_FILE, "r"))
             except Exception:
                 data = {}
-        else:
-            data = {}
+        try:
+            acct = _get_account_usdt()
+            self.wallet, self.unrealized = acct["wallet"], acct["unrealized"]
+            self.equity = self.wallet + self.unrealized
+            self._equity_ok = True
+        except Exception as e:
+            log.warning(f"[RiskGuard] No se pudo leer equity inicial: {e}")
+        get_account_config().ensure_loaded()      # leverage por símbolo para used_margin
         if data.get("date") != self.today:
-            # new day -> set new baseline
-            eq = _get_equity_usdt()
-            data = {"date": self.today, "baseline_equity": eq}
-            json.dump(data, open(BASELINE_FILE, "w"))
-            # reset kill switch for new day
-            if os.path.exists(LOCK_FILE):
-                os.remove(LOCK_FILE)
-            self.tripped = False
-            log.info(f"[RiskGuard] Nueva sesión {self.today}. Equity base: {eq:.2f} USDT")
-        self.baseline = float(data.get("baseline_equity", 0.0))
+            self._new_day()
+        elif float(data.get("baseline_equity", 0.0)) > 0:
+            self.baseline = float(data["baseline_equity"])
+        self._evaluate()
+
+    def _new_day(self):
+        self.today = _today_key()
+        self._day = _day_index()
+        self.baseline = 0.0
+        # reset kill switch for new day
+        self.tripped = False
+        self._dirty.set()
+        log.info(f"[RiskGuard] Nueva sesión {self.today}")
+        self._set_baseline()
+
+    def _set_baseline(self) -> None:
+        """Base del día con la equity actual; sin lectura válida queda sin fijar (kill switch inactivo)."""
+        if not self._equity_ok or self.equity <= 0:
+            return
+        self.baseline = self.equity
+        self._dirty.set()
+        log.info(f"[RiskGuard] Equity base {self.today}: {self.baseline:.2f} USDT")
 
+    # --- actualización en memoria ---------------------------------------
+    def _on_account_event(self, event, payload) -> None:
+        if event == "balance":
+            if QUOTE_ASSET in payload:
+                with self._lock:
+                    self.wallet = float(payload[QUOTE_ASSET])
+                    self._equity_ok = True
+                    self._evaluate()
+        elif event == "position":
+            symbol = payload[0]
+            with self._lock:
+                self._update_upnl(symbol)
+                self._evaluate()
+
+    def on_prices(self, prices: Dict[str, float]) -> None:
+        """Mark prices (risk loop): recalcula el PnL no realizado de las posiciones abiertas."""
+        open_syms = list(self.state.positions)
+        self._prices_at = time.monotonic()
+        with self._lock:
+            changed = False
+            for sym in open_syms:
+                px = prices.get(sym)
+                if px is not None:
+                    self._marks[sym] = px
+                    self._update_upnl(sym)
+                    changed = True
+            if changed:
+                self._evaluate()
+
+    def _update_upnl(self, symbol: str) -> None:
+        if self._upnl.pop("_rest", None) is not None:
+            # El stream manda sobre la última lectura REST: rehacer el resto de posiciones
+            for sym in list(self.state.positions):
+                if sym != symbol:
+                    self._set_upnl(sym)
+        self._set_upnl(symbol)
+        self.unrealized = sum(self._upnl.values())
+
+    def _set_upnl(self, symbol: str) -> None:
+        pos = self.state.position(symbol)
+        if pos is None:
+            self._upnl.pop(symbol, None)
+            self._marks.pop(symbol, None)
+        else:
+            mark = self._marks.get(symbol)
+            self._upnl[symbol] = (float(pos.amount) * (mark - float(pos.entry_price)) if mark is not None
+                                  else float(pos.unrealized_pnl))
+
+    def _evaluate(self) -> None:
+        self.equity = self.wallet + self.unrealized
+        if _day_index() != self._day:
+            self._new_day()
+        if self.baseline <= 0:
+            self._set_baseline()
+            return
+        self.drawdown = (self.equity - self.baseline) / self.baseline
+        if self.drawdown <= -abs(self.max_daily_dd) and not self.tripped:
+            self.trip()
+
+    # --- API ------------------------------------------------------------
     def is_tripped(self) -> bool:
+        if _day_index() != self._day:
+            with self._lock:
+                if _day_index() != self._day:
+                    self._new_day()
         return self.tripped
 
     def trip(self):
-        open(LOCK_FILE, "w").write(self.today)
         self.tripped = True
-        log.error("[RiskGuard] KILL-SWITCH ACTIVADO. Bloqueando nuevas entradas.")
+        self._dirty.set()
+        log.error(f"[RiskGuard] KILL-SWITCH ACTIVADO (DD {self.drawdown:.2%}). Bloqueando nuevas entradas.")
+
+    def prices_live(self) -> bool:
+        return time.monotonic() - self._prices_at <= PRICES_MAX_AGE_SECONDS
 
     def on_loop(self):
-        # Check date rollover or baseline existence
-        if _today_key() != self.today or self.baseline is None:
-            self._load_or_init()
+        """Refresca la equity por REST salvo que stream y mark prices estén vivos."""
+        if live_account_state() is not None and self.prices_live():
+            self.is_tripped()
             return
         try:
-            eq = _get_equity_usdt()
+            acct = _get_account_usdt()
         except Exception as e:
             log.warning(f"[RiskGuard] No se pudo leer equity: {e}")
             return
-        if self.baseline <= 0:
-            return
-        dd = (eq - self.baseline) / self.baseline
-        if dd <= -abs(self.max_daily_dd):
-            self.trip()
-        # (Opcional) podrías registrar métricas aquí
+        with self._lock:
+            self.wallet = acct["wallet"]
+            self._upnl = {"_rest": acct["unrealized"]}
+            self.unrealized = acct["unrealized"]
+            self._equity_ok = True
+            self._evaluate()
 
     def can_trade(self) -> bool:
-        """
-        Check if trading is allowed based on risk guard status.
-        Returns False if kill switch is tripped or there are other risk conditions.
-        """
-        # First update the risk status
-        self.on_loop()
-        
-        # Return False if kill switch is active
-        if self.is_tripped():
-            return False
-            
-        # Add any additional risk checks here if needed
-        # For now, just check if we're not tripped
-        return True
+        """O(1) desde memoria: False si el kill switch está activo."""
+        return not self.is_tripped()
+
+    def used_margin(self) -> float:
+        """Margen inicial estimado de las posiciones abiertas (|qty| × mark / leverage)."""
+        total = 0.0
+        leverage = get_account_config().leverage
+        for sym, pos in list(self.state.positions.items()):
+            mark = self._marks.get(sym) or float(pos.mark_price) or float(pos.entry_price)
+            # positionRisk v3 no trae leverage: el de symbolConfig (caché de cuenta)
+            lev = int(pos.leverage or leverage.get(sym) or settings.leverage)
+            total += abs(float(pos.amount)) * mark / max(lev, 1)
+        return total
+
+    def available_margin(self) -> float:
+        return self.equity - self.used_margin()
+
+    def has_margin_for(self, notional: float, leverage: int) -> bool:
+        if self.equity <= 0:
+            return True      # sin datos de equity: que decida el exchange
+        return notional / max(int(leverage), 1) * MARGIN_BUFFER <= self.available_margin()
+
+    # --- persistencia en segundo plano ----------------------------------
+    def _writer(self) -> None:
+        while True:
+            self._dirty.wait()
+            self._dirty.clear()
+            try:
+                self._flush()
+            except Exception as e:
+                log.warning(f"[RiskGuard] No se pudo persistir estado: {e}")
+            time.sleep(1.0)
 
+    def _flush(self) -> None:
+        if self.baseline > 0:
+            tmp = f"{BASELINE_FILE}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"date": self.today, "baseline_equity": self.baseline}, f)
+            os.replace(tmp, BASELINE_FILE)
+        if self.tripped:
+            open(LOCK_FILE, "w").write(self.today)
+        elif os.path.exists(LOCK_FILE):
+            os.remove(LOCK_FILE)
@@ -0,0 +1,166 @@
+"""
+Bucle de riesgo por tick sobre el stream `!markPrice@arr@1s`.
+
+Un solo WebSocket trae el mark price de todo el mercado cada segundo. Las
+posiciones activas (TradeState de cada SLTPManager) se vuelcan a arrays de
+numpy y en cada tick se calcula de una vez el R no realizado, el R máximo y
+qué filas cruzan un umbral: break-even, activación del trailing, avance del
+trailing por vela (≥ min_move) o cambio material del callbackRate del
+trailing en el exchange (ya activado, solo si aprieta desde el pico). Son
+exactamente las filas en las que SLTPManager._evaluate actuaría; solo esas
+pasan por SLTPManager.evaluate, que aplica la lógica de siempre y mueve el
+stop (ManagedStop). En el resto se actualizan R máximo y pico. Los arrays se
+reconstruyen cuando cambia el conjunto de posiciones o tras una acción.
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import websocket
+
+from .execution import TRAILING_CALLBACK_MAX, TRAILING_CALLBACK_MIN, note_price
+
+log = logging.getLogger("risk_loop")
+
+MARK_PRICE_URL = "wss://fstream.binance.com/ws/!markPrice@arr@1s"
+
+
+def dynamic_atr_factor(base: np.ndarray, r: np.ndarray) -> np.ndarray:
+    """Versión vectorizada de SLTPManager._get_dynamic_atr_factor."""
+    return base * np.select([r >= 3.0, r >= 2.0, r >= 1.5], [0.5, 0.7, 0.8], default=1.0)
+
+
+class MarkPriceRiskLoop:
+    def __init__(self, managers: Dict[str, object], url: str = MARK_PRICE_URL):
+        self.managers = managers            # symbol -> SLTPManager (el dict vivo de la app)
+        self.url = url
+        self._key: tuple = ()
+        self._rows: List[object] = []
+        self._ws: Optional[websocket.WebSocketApp] = None
+        self._running = False
+        self._listeners: List[Callable[[Dict[str, float]], None]] = []
+        self.stats = {"ticks": 0, "actions": 0, "eval_us": 0.0}
+
+    def add_listener(self, fn: Callable[[Dict[str, float]], None]) -> None:
+        """fn(prices) en cada tick (p. ej. RiskGuard.on_prices para la equity)."""
+        self._listeners.append(fn)
+
+    # --- arrays ---------------------------------------------------------
+    def _rebuild(self) -> None:
+        pms = [pm for pm in list(self.managers.values()) if pm.state.active and pm.state.r_value > 0]
+        self._rows = pms
+        self._key = tuple((pm.symbol, id(pm.state)) for pm in pms)
+        st = [pm.state for pm in pms]
+        self.symbols = [pm.symbol for pm in pms]
+        self.sign = np.array([1.0 if s.side == "BUY" else -1.0 for s in st])
+        self.entry = np.array([s.entry_price for s in st])
+        self.r_value = np.array([s.r_value for s in st])
+        self.max_r = np.array([s.max_favorable_r for s in st])
+        self.be_done = np.array([s.break_even_moved for s in st], dtype=bool)
+        self.trail_on = np.array([s.trailing_active for s in st], dtype=bool)
+        self.last_trail = np.array([s.last_trail_price for s in st])
+        self.server = np.array([s.trail_order_id is not None for s in st], dtype=bool)
+        self.callback = np.array([s.trail_callback for s in st])
+        self.peak = np.array([s.trail_peak for s in st])
+        self.atr = np.array([pm.last_atr for pm in pms])
+        self.be_r = np.array([pm.break_even_r for pm in pms])
+        self.act_r = np.array([pm.trailing_activate_after_r for pm in pms])
+        self.atr_mult = np.array([pm.trailing_atr_mult for pm in pms])
+        self.min_move = np.array([pm.trailing_min_move for pm in pms])
+        self.cb_change = np.array([pm.trailing_callback_min_change for pm in pms])
+
+    def _stale(self) -> bool:
+        return self._key != tuple((pm.symbol, id(pm.state)) for pm in list(self.managers.values())
+                                  if pm.state.active and pm.state.r_value > 0)
+
+    # --- tick -----------------------------------------------------------
+    def on_prices(self, prices: Dict[str, float]) -> int:
+        """Evalúa todas las posiciones activas con `prices`; devuelve el nº de acciones."""
+        t0 = time.perf_counter()
+        self.stats["ticks"] += 1
+        if self._stale():
+            self._rebuild()
+        if not self._rows:
+            return 0
+        px = np.array([prices.get(s, np.nan) for s in self.symbols])
+        # El ATR cambia con cada vela cerrada (manage) sin que cambie el conjunto de posiciones
+        self.atr = np.array([pm.last_atr for pm in self._rows])
+        have = ~np.isnan(px)
+        r = self.sign * (px - self.entry) / self.r_value
+
+        new_max = have & (r > self.max_r)
+        self.max_r = np.where(new_max, r, self.max_r)
+
+        be = have & ~self.be_done & (r >= self.be_r)
+        # Por vela se activa con el R actual; en el exchange con el R máximo
+        activates = have & ~self.trail_on & (np.where(self.server, self.max_r, r) >= self.act_r)
+        dist = self.atr * dynamic_atr_factor(self.atr_mult, r)
+        ok = have & (self.atr > 0)
+        move = self.sign * ((px - self.sign * dist) - self.last_trail)
+        client_mv = ok & self.trail_on & ~self.server & ((self.last_trail == 0) | ((move > 0) & (move >= self.min_move)))
+
+        # Trailing en el exchange: pico desde la activación; ya activado solo se cambia si aprieta
+        armed = have & self.server & (self.max_r >= self.act_r)
+        new_peak = armed & ((self.peak == 0) | (self.sign * (px - self.peak) > 0))
+        self.peak = np.where(new_peak, px, self.peak)
+        rate = np.clip(np.round(100.0 * dist / np.where(have, px, 1.0), 1), TRAILING_CALLBACK_MIN, TRAILING_CALLBACK_MAX)
+        tighter = self.sign * (px * (1 - self.sign * rate / 100.0)
+                               - self.peak * (1 - self.sign * self.callback / 100.0)) > 0
+        server_mv = ok & self.server & (np.abs(rate - self.callback) >= self.cb_change) & ((self.peak == 0) | tighter)
+        fire = be | activates | client_mv | server_mv
+
+        for i in np.flatnonzero((new_max | new_peak) & ~fire):
+            st = self._rows[i].state
+            st.max_favorable_r = float(self.max_r[i])
+            st.trail_peak = float(self.peak[i])
+        fired = np.flatnonzero(fire)
+        for i in fired:
+            pm = self._rows[i]
+            try:
+                pm.evaluate(float(px[i]), float(self.atr[i]))
+            except Exception as e:
+                log.error(f"[{pm.symbol}] ❌ risk loop: {e}")
+        if len(fired):
+            self.stats["actions"] += len(fired)
+            self._rebuild()
+        self.stats["eval_us"] = (time.perf_counter() - t0) * 1e6
+        return len(fired)
+
+    # --- WebSocket ------------------------------------------------------
+    def _on_message(self, _ws, raw) -> None:
+        try:
+            data = json.loads(raw)
+            prices = {}
+            for m in data:
+                p = float(m["p"])
+                prices[m["s"]] = p
+                note_price(m["s"], p)
+            self.on_prices(prices)
+            for fn in list(self._listeners):
+                fn(prices)
+        except Exception as e:
+            log.error(f"Error en tick de mark price: {e}")
+
+    def _run(self) -> None:
+        while self._running:
+            self._ws = websocket.WebSocketApp(self.url, on_message=self._on_message,
+                                              on_error=lambda _ws, e: log.warning(f"markPrice WS: {e}"))
+            self._ws.run_forever(ping_interval=180, ping_timeout=10)
+            if self._running:
+                log.warning("markPrice WS cerrado; reconectando en 2s")
+                time.sleep(2)
+
+    def start(self) -> "MarkPriceRiskLoop":
+        self._running = True
+        threading.Thread(target=self._run, name="risk-loop", daemon=True).start()
+        log.info("✅ Risk loop por tick (!markPrice@arr@1s) iniciado")
+        return self
+
+    def stop(self) -> None:
+        self._running = False
+        if self._ws:
+            self._ws.close()
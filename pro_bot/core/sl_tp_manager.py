@@ -1,11 +1,18 @@
 
 import logging
+import threading
 from dataclasses import dataclass, field
 from typing import List, Optional
 from datetime import datetime, timedelta
+from decimal import Decimal
 from ..config import settings
-from .exchange import SymbolFilters
-from .execution import (enter_basic, stop_market, take_profit_market, last_price)
+from .exchange import get_filters
+from .client import get_client
+from .execution import (enter_basic, cached_price, create_order, stop_market_params, take_profit_market_params,
+                        place_batch_orders, trailing_callback_rate, trailing_stop_market_params)
+from .oco import OcoGroup, TpLeg, get_oco_engine
+from .rate_governor import PROTECT, lane
+from .stop_manager import ManagedStop
 
 log = logging.getLogger("sl_tp")
 
@@ -16,20 +23,28 @@ class TradeState:
     entry_price: float = 0.0
     qty: float = 0.0
     r_value: float = 0.0                # distance from entry to initial SL
-    sl_order_id: Optional[int] = None   # STOP_MARKET closePosition=true
+    sl_order_id: Optional[int] = None   # STOP_MARKET closePosition=true vivo (lo mantiene ManagedStop)
     tp_order_ids: List[Optional[int]] = field(default_factory=list)
     realized_partial: float = 0.0       # qty closed via TP
     break_even_moved: bool = False
     trailing_active: bool = False       # Nueva: flag para tracking del trailing
     last_trail_price: float = 0.0       # Nueva: último precio de trailing
     max_favorable_r: float = 0.0        # Nueva: máximo R alcanzado
+    trail_order_id: Optional[int] = None  # TRAILING_STOP_MARKET en el exchange (modo server)
+    trail_callback: float = 0.0         # callbackRate (%) de esa orden
+    trail_activation: Optional[str] = None
+    trail_qty: Optional[str] = None
+    trail_peak: float = 0.0             # mejor precio desde la activación (el que sigue el exchange)
 
 class SLTPManager:
     def __init__(self, cfg: dict, symbol: str):
         self.cfg = cfg
         self.symbol = symbol
         self.state = TradeState()
-        self.filters = SymbolFilters(self.symbol)
+        self.stop: Optional[ManagedStop] = None
+        self.last_atr = 0.0                  # último ATR de vela cerrada (lo usa el risk loop por tick)
+        self._lock = threading.RLock()       # manage (velas) y evaluate (mark price) en hilos distintos
+        self.filters = get_filters(self.symbol)
         self.risk = cfg.get("risk", {})
         
         # Sistema de cooldown para evitar overtrading
@@ -75,12 +90,15 @@ class SLTPManager:
         self.trailing_step_r = float(self.risk.get("trailing", {}).get("step_r", 0.25))  # Mover cada 0.25R
         self.trailing_min_move = float(self.risk.get("trailing", {}).get("min_move", 0.1))  # Mínimo movimiento
         self.break_even_r = float(self.risk.get("break_even_r", 0.75))  # Break-even más temprano
+        # server: TRAILING_STOP_MARKET en Binance; client (o si falla): stop movido por vela
+        self.trailing_mode = str(self.risk.get("trailing", {}).get("mode", "client")).lower()
+        self.trailing_callback_min_change = float(self.risk.get("trailing", {}).get("callback_min_change", 0.2))
         
         # Configuración de comisiones para break-even real
         self.commission_rate = float(self.risk.get("commission_rate", 0.0008))  # 0.08% total por defecto (conservador)
 
     def _round_qty(self, q: float) -> float:
-        return float(self.filters.round_qty_down(q))
+        return self.filters.qty_down(q)
     
     def is_in_cooldown(self) -> bool:
         """Verifica si el símbolo está en cooldown después de abrir/cerrar posición"""
@@ -114,12 +132,47 @@ class SLTPManager:
         from .execution import has_open_position
         
         # Si teníamos posición activa pero ya no hay posición abierta
-        if self.state.active and not has_open_position(self.symbol):
+        if not self.state.active or has_open_position(self.symbol):
+            return False
+        # Bajo el lock: evaluate (hilo del risk loop) no puede mover el stop a mitad del reset
+        with self._lock:
+            if not self.state.active:
+                return False
             log.info(f"[{self.symbol}] 🏁 Posición cerrada detectada - Activando cooldown")
+            get_oco_engine().close(self.symbol)   # sin stream: cancelar hermanas desde aquí
+            self._on_flat()
+        return True
+
+    def _on_flat(self):
+        """Posición plana (evento OCO o polling): cooldown y reset de estado."""
+        with self._lock:
+            if not self.state.active:
+                return
             self._set_cooldown_close()
-            self.state = TradeState()  # Reset estado
-            return True
-        return False
+            if self.stop:
+                self.stop.reset()
+                self.stop = None
+            self.state = TradeState()
+
+    def _on_tp_fill(self, delta: Decimal, realized: Decimal):
+        if self.state.active:
+            self.state.realized_partial = float(realized)
+
+    def _on_resize(self, remaining: Decimal):
+        """Tras el redimensionado OCO (hilo del pool): ajustar el trailing server a la posición restante."""
+        with self._lock:
+            s = self.state
+            if not s.active or s.trail_order_id is None or remaining <= 0:
+                return
+            qty = self.filters.fmt_qty_down(remaining)
+            if qty == s.trail_qty:
+                return
+            if s.trail_peak:
+                # Ya activada: una orden nueva olvidaría el pico; el stop único sigue desde él
+                self._hand_back_trailing()
+            else:
+                self._place_server_trailing(s.entry_price, 0.0, 0.0, activation=s.trail_activation,
+                                            qty=qty, rate=s.trail_callback)
     
     def _validate_tp_setup(self):
         """Validar que la configuración TP sea segura"""
@@ -157,12 +210,14 @@ class SLTPManager:
         # Validar configuración TP antes de abrir
         self._validate_tp_setup()
 
-        basic = enter_basic(self.symbol, direction)
+        # Sin TP/SL de enter_position: la única protección es el batch de abajo
+        basic = enter_basic(self.symbol, direction, protect=False)
         if not basic or not basic.get("success"):
             log.warning(f"[{self.symbol}] ❌ No se pudo abrir posición básica: {basic.get('error', 'Unknown error')}")
             return
 
-        entry_price = float(basic.get("entry_price", last_price(self.symbol)))
+        # avgPrice de la respuesta RESULT; si falta, el precio cacheado (sin REST entre fill y protección)
+        entry_price = float(basic.get("entry_price") or cached_price(self.symbol))
         qty = float(basic.get("filled_qty", basic.get("qty", 0.0)))
         side_open = basic.get("side", "BUY" if direction == "LONG" else "SELL")   # BUY for long, SELL for short
 
@@ -177,11 +232,11 @@ class SLTPManager:
             sl_price = entry_price + self.stop_loss_atr_mult * atr
             r_value = sl_price - entry_price
 
-        sl_resp = stop_market(self.symbol, side="SELL" if side_open == "BUY" else "BUY",
-                              stop_price=sl_price, qty=None, close_position=True)
-
-        tp_ids = []
-        tp_created_count = 0
+        side_close = "SELL" if side_open == "BUY" else "BUY"
+        fmt = self.filters.fmt_price_down
+        # SL + TP1..TP3 en una sola petición batch: la posición queda protegida en un round trip
+        legs = [stop_market_params(self.symbol, side=side_close, stop_price=fmt(sl_price), close_position=True)]
+        leg_tp = []                      # índice de pata por TP (None si se omite)
         
         # Calcular valor total de la posición en USDT
         position_value_usdt = qty * entry_price
@@ -190,19 +245,19 @@ class SLTPManager:
             # Validar allocation positiva
             if alloc <= 0:
                 log.warning(f"[{self.symbol}] ⚠️ TP{i} skipped: allocation = {alloc}")
-                tp_ids.append(None)
+                leg_tp.append(None)
                 continue
                 
             # Calcular y validar cantidad
             tp_qty = self._round_qty(qty * alloc)
             if tp_qty <= 0:
                 # Si la cantidad redondeada es 0, usar la cantidad mínima del símbolo
-                min_qty = self.filters.step_size
+                min_qty = float(max(self.filters.min_qty, self.filters.qty_step))
                 tp_qty = min_qty
                 log.warning(f"[{self.symbol}] ⚠️ TP{i} qty too small, using min_qty = {tp_qty} (original: {qty * alloc})")
                 if tp_qty > qty:
                     log.error(f"[{self.symbol}] ❌ TP{i} min_qty > total_qty, skipping")
-                    tp_ids.append(None)
+                    leg_tp.append(None)
                     continue
 
             # NUEVA LÓGICA: Calcular precio TP basado en % del valor de la posición
@@ -211,33 +266,44 @@ class SLTPManager:
             if direction == "LONG":
                 # Para LONG: tp_price = entry_price + (target_pnl_usdt / qty)
                 tp_price = entry_price + (target_pnl_usdt / qty)
-                side_close = "SELL"
             elif direction == "SHORT":
                 # Para SHORT: tp_price = entry_price - (target_pnl_usdt / qty)
                 tp_price = entry_price - (target_pnl_usdt / qty)
-                side_close = "BUY"
 
-            try:
-                # CRÍTICO: Solo TP3 puede usar close_position=True si es necesario
-                # TP1 y TP2 SIEMPRE deben ser parciales (close_position=False)
-                close_position = False  # Por defecto, NUNCA cerrar completamente
-                
-                # Opcional: permitir que TP3 cierre completamente si la cantidad es muy pequeña
-                if i == 3 and tp_qty >= qty * 0.9:  # Si TP3 es >90% de la posición
-                    close_position = True
-                    log.info(f"[{self.symbol}] 📋 TP{i} will close position (qty={tp_qty} >= 90% of {qty})")
-                
-                tp_resp = take_profit_market(self.symbol, side=side_close, stop_price=tp_price, qty=str(tp_qty), close_position=close_position)
-                order_id = tp_resp.get("orderId")
-                tp_ids.append(order_id)
+            # CRÍTICO: Solo TP3 puede usar close_position=True si es necesario
+            # TP1 y TP2 SIEMPRE deben ser parciales (close_position=False)
+            close_position = False  # Por defecto, NUNCA cerrar completamente
+            
+            # Opcional: permitir que TP3 cierre completamente si la cantidad es muy pequeña
+            if i == 3 and tp_qty >= qty * 0.9:  # Si TP3 es >90% de la posición
+                close_position = True
+                log.info(f"[{self.symbol}] 📋 TP{i} will close position (qty={tp_qty} >= 90% of {qty})")
+            
+            leg_tp.append((len(legs), pnl_percentage, tp_qty, tp_price, close_position))
+            legs.append(take_profit_market_params(self.symbol, side=side_close, stop_price=fmt(tp_price),
+                                                  qty=str(tp_qty), close_position=close_position))
+
+        results = place_batch_orders(legs)
+        sl_res = results[0]
+        if not sl_res.ok:
+            log.error(f"[{self.symbol}] ❌ SL no colocado: {sl_res.error}")
+
+        tp_ids = []
+        tp_created_count = 0
+        for i, leg in enumerate(leg_tp, 1):
+            if leg is None:
+                tp_ids.append(None)
+                continue
+            idx, pnl_percentage, tp_qty, tp_price, close_position = leg
+            res = results[idx]
+            tp_ids.append(res.order_id)
+            if res.ok:
                 tp_created_count += 1
-                
                 close_status = "PARTIAL" if not close_position else "FULL"
                 target_pnl_usdt = position_value_usdt * (pnl_percentage / 100.0)
-                log.info(f"[{self.symbol}] ✅ TP{i} @ {pnl_percentage}% pos (${target_pnl_usdt:.2f}): qty={tp_qty} price={tp_price:.4f} mode={close_status} id={order_id}")
-            except Exception as e:
-                log.error(f"[{self.symbol}] ❌ TP{i} failed: {e}")
-                tp_ids.append(None)
+                log.info(f"[{self.symbol}] ✅ TP{i} @ {pnl_percentage}% pos (${target_pnl_usdt:.2f}): qty={tp_qty} price={tp_price:.4f} mode={close_status} id={res.order_id}")
+            else:
+                log.error(f"[{self.symbol}] ❌ TP{i} failed: {res.error}")
         
         # Verificar que se crearon las 3 órdenes TP
         if tp_created_count < 3:
@@ -246,22 +312,65 @@ class SLTPManager:
             log.info(f"[{self.symbol}] 🎯 All {tp_created_count} TP orders created successfully")
 
         self.state = TradeState(active=True, side=side_open, entry_price=entry_price, qty=qty, r_value=r_value,
-                                sl_order_id=sl_resp.get("orderId"), tp_order_ids=tp_ids, realized_partial=0.0,
+                                sl_order_id=sl_res.order_id, tp_order_ids=tp_ids, realized_partial=0.0,
                                 break_even_moved=False, trailing_active=False, last_trail_price=0.0, max_favorable_r=0.0)
+        self.last_atr = atr              # el risk loop trailea por tick antes de la primera vela cerrada
+        self.stop = self._new_stop(side_close)
+        self.stop.adopt(sl_res.order_id, fmt(sl_price) if sl_res.ok else None)
+        tp_legs = [TpLeg(order_id=results[leg[0]].order_id, qty=Decimal(str(leg[2])),
+                         stop_price=legs[leg[0]]["stopPrice"], close_position=leg[4])
+                   for leg in leg_tp if leg is not None and results[leg[0]].ok]
+        get_oco_engine().register(OcoGroup(self.symbol, side_close, Decimal(str(qty)), tp_legs,
+                                           sl_order_id=sl_res.order_id, on_fill=self._on_tp_fill, on_resize=self._on_resize,
+                                           on_flat=self._on_flat, fmt_qty=self.filters.fmt_qty))
+
+        if self.trailing_mode == "server":
+            sign = 1 if direction == "LONG" else -1
+            activation_px = entry_price + sign * self.trailing_activate_after_r * r_value
+            self._place_server_trailing(activation_px, atr, self.trailing_activate_after_r,
+                                        activation=self.filters.fmt_price_down(activation_px))
         
         # Activar cooldown tras apertura
         self._set_cooldown_open()
         
         log.info(f"[{self.symbol}] 🚀 Abrir {direction}: entry={entry_price:.4f} qty={qty}, SL@{sl_price:.4f}, PosValue=${position_value_usdt:.2f}")
 
+    def _new_stop(self, side_close: str) -> ManagedStop:
+        # Redondear hacia el lado que deja el stop dentro del tick (LONG abajo, SHORT arriba)
+        fmt = self.filters.fmt_price_down if side_close == "SELL" else self.filters.fmt_price_up
+        return ManagedStop(self.symbol, side_close, fmt=fmt,
+                           on_change=self._on_stop_change)
+
+    def _on_stop_change(self, order_id: Optional[int], stop_price: Optional[str]) -> None:
+        if self.state.active:
+            self.state.sl_order_id = order_id
+            group = get_oco_engine().groups.get(self.symbol)
+            if group is not None:
+                group.sl_order_id = order_id
+
+    def _move_stop(self, price: float) -> None:
+        """Cancelar/reemplazar el stop único de la posición (asíncrono, coalescente)."""
+        if not self.state.active:
+            return      # posición ya cerrada: nunca colocar un stop huérfano
+        if self.stop is None:
+            self.stop = self._new_stop("SELL" if self.state.side == "BUY" else "BUY")
+            self.stop.adopt(self.state.sl_order_id, None)
+        self.stop.move_to(price)
+
     def manage(self, last_close: float, atr: float):
         # Verificar si la posición se cerró para activar cooldown
         if self._check_position_closed():
             return
-            
-        if not self.state.active:
-            return
+        self.last_atr = atr
+        self.evaluate(last_close, atr)
 
+    def evaluate(self, last_close: float, atr: float):
+        """Break-even, trailing y R máximo para un precio (vela cerrada o mark price)."""
+        with self._lock:
+            if self.state.active:
+                self._evaluate(last_close, atr)
+
+    def _evaluate(self, last_close: float, atr: float):
         s = self.state
         if s.side == "BUY":
             direction = "LONG"
@@ -293,12 +402,83 @@ class SLTPManager:
                 be_price_with_commission = s.entry_price - commission_offset
                 new_sl = be_price_with_commission + 1e-6
                 
-            stop_market(self.symbol, side="SELL" if s.side == "BUY" else "BUY", stop_price=new_sl, qty=None, close_position=True)
+            self._move_stop(new_sl)
             s.break_even_moved = True
             log.info(f"[{self.symbol}] 📍 Break-even: SL @ {new_sl:.4f} (entrada: {s.entry_price:.4f}, comisiones: +{commission_offset:.4f}, R: {r_unreal:.2f})")
 
-        # 2. TRAILING STOP INTELIGENTE
-        self._update_trailing_stop(last_close, atr, r_unreal, direction)
+        # 2. TRAILING STOP INTELIGENTE (en el exchange si hay orden trailing; si no, por vela)
+        if s.trail_order_id is not None:
+            self._update_server_trailing(last_close, atr, r_unreal)
+        else:
+            self._update_trailing_stop(last_close, atr, r_unreal, direction)
+
+    def _place_server_trailing(self, price: float, atr: float, current_r: float,
+                               activation: Optional[str] = None, qty: Optional[str] = None,
+                               rate: Optional[float] = None) -> bool:
+        """(Re)coloca el TRAILING_STOP_MARKET con el callbackRate del régimen ATR actual."""
+        s = self.state
+        if rate is None:
+            rate = trailing_callback_rate(atr * self._get_dynamic_atr_factor(current_r), price)
+        side_close = "SELL" if s.side == "BUY" else "BUY"
+        qty = qty or self.filters.fmt_qty_down(s.qty - s.realized_partial)
+        try:
+            with lane(PROTECT):
+                if s.trail_order_id is not None:
+                    get_client().client.futures_cancel_order(symbol=self.symbol, orderId=s.trail_order_id)
+                resp = create_order(**trailing_stop_market_params(self.symbol, side_close, qty, rate, activation))
+        except Exception as e:
+            log.warning(f"[{self.symbol}] ⚠️ Trailing server no colocado ({e}); se usa trailing por vela")
+            s.trail_order_id = None
+            return False
+        s.trail_order_id, s.trail_callback, s.trail_activation, s.trail_qty = resp.get("orderId"), rate, activation, qty
+        # Sin activationPrice el exchange empieza a seguir desde el precio actual
+        s.trail_peak = price if activation is None else 0.0
+        log.info(f"[{self.symbol}] 🛰️ Trailing server: callback {rate:.1f}% activación {activation or 'inmediata'} id={s.trail_order_id}")
+        return True
+
+    def _server_trail_stop(self, peak: float, rate: float) -> float:
+        """Stop efectivo de un TRAILING_STOP_MARKET que sigue desde `peak` con `rate` (%)."""
+        return peak * (1 - rate / 100.0) if self.state.side == "BUY" else peak * (1 + rate / 100.0)
+
+    def _update_server_trailing(self, last_close: float, atr: float, current_r: float):
+        """Solo re-coloca si el régimen ATR cambia el callbackRate de forma material."""
+        s = self.state
+        long_side = s.side == "BUY"
+        if s.max_favorable_r >= self.trailing_activate_after_r:
+            s.trailing_active = True
+            if not s.trail_peak or (last_close > s.trail_peak if long_side else last_close < s.trail_peak):
+                s.trail_peak = last_close
+        rate = trailing_callback_rate(atr * self._get_dynamic_atr_factor(current_r), last_close)
+        if abs(rate - s.trail_callback) < self.trailing_callback_min_change:
+            return
+        activation = s.trail_activation
+        if s.trail_peak:
+            # Ya activada: la orden nueva arranca desde el precio actual y olvida el pico,
+            # así que solo se cambia si su stop queda más ajustado que el vigente
+            current = self._server_trail_stop(s.trail_peak, s.trail_callback)
+            new = self._server_trail_stop(last_close, rate)
+            if (new <= current) if long_side else (new >= current):
+                return
+            activation = None
+        log.info(f"[{self.symbol}] 🔄 callbackRate {s.trail_callback:.1f}% → {rate:.1f}% (R: {current_r:.2f})")
+        self._place_server_trailing(last_close, atr, current_r, activation=activation, rate=rate)
+
+    def _hand_back_trailing(self) -> None:
+        """Cancela el trailing server y sigue con el stop único desde el stop que tenía el exchange."""
+        s = self.state
+        stop_px = self._server_trail_stop(s.trail_peak, s.trail_callback)
+        try:
+            with lane(PROTECT):
+                get_client().client.futures_cancel_order(symbol=self.symbol, orderId=s.trail_order_id)
+        except Exception as e:
+            log.warning(f"[{self.symbol}] ⚠️ No se pudo cancelar el trailing server {s.trail_order_id}: {e}")
+            return
+        s.trail_order_id, s.trail_qty = None, None
+        s.trailing_active, s.last_trail_price = True, stop_px
+        current = float(self.stop.stop_price) if self.stop is not None and self.stop.stop_price else None
+        if current is None or ((stop_px > current) if s.side == "BUY" else (stop_px < current)):
+            self._move_stop(stop_px)
+        log.info(f"[{self.symbol}] 🔁 Trailing server → stop gestionado @ {stop_px:.4f} (pico {s.trail_peak:.4f})")
 
     def _update_trailing_stop(self, last_close: float, atr: float, current_r: float, direction: str):
         """Sistema de trailing stop optimizado y progresivo"""
@@ -323,7 +503,7 @@ class SLTPManager:
             if s.last_trail_price == 0.0 or new_trail_price > s.last_trail_price:
                 # Verificar que el movimiento sea significativo
                 if s.last_trail_price == 0.0 or abs(new_trail_price - s.last_trail_price) >= self.trailing_min_move:
-                    stop_market(self.symbol, side="SELL", stop_price=new_trail_price, qty=None, close_position=True)
+                    self._move_stop(new_trail_price)
                     s.last_trail_price = new_trail_price
                     log.info(f"[{self.symbol}] 📈 Trailing LONG → SL: {new_trail_price:.4f} (R: {current_r:.2f}, ATR: {atr_factor:.1f}x)")
         else:
@@ -331,7 +511,7 @@ class SLTPManager:
             # Solo mover si el nuevo precio es inferior al anterior (más favorable)
             if s.last_trail_price == 0.0 or new_trail_price < s.last_trail_price:
                 if s.last_trail_price == 0.0 or abs(s.last_trail_price - new_trail_price) >= self.trailing_min_move:
-                    stop_market(self.symbol, side="BUY", stop_price=new_trail_price, qty=None, close_position=True)
+                    self._move_stop(new_trail_price)
                     s.last_trail_price = new_trail_price
                     log.info(f"[{self.symbol}] 📉 Trailing SHORT → SL: {new_trail_price:.4f} (R: {current_r:.2f}, ATR: {atr_factor:.1f}x)")
 
@@ -0,0 +1,160 @@
+"""
+Un solo stop gestionado por posición (STOP_MARKET closePosition=true).
+
+Binance no permite modificar órdenes STOP_MARKET (PUT /fapi/v1/order solo
+vale para LIMIT) y rechaza un segundo stop closePosition en la misma
+dirección (-4130), así que cada movimiento es cancelar + colocar. Los
+movimientos no bloquean al llamador: se guarda el objetivo más reciente y un
+único worker por símbolo lo aplica; si llegan varios mientras hay uno en
+vuelo, se coalescen y solo se envía el último. Si la colocación del nuevo
+stop falla tras cancelar el anterior, se reintenta y, en último caso, se
+restaura el precio previo para no dejar la posición desprotegida.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from .client import get_client
+from .execution import create_order, has_open_position, stop_market_params
+from .rate_governor import PROTECT, lane
+
+log = logging.getLogger("stop_mgr")
+
+UNKNOWN_ORDER = -2011
+MAX_INFLIGHT_SYMBOLS = 4
+
+_executor = ThreadPoolExecutor(max_workers=MAX_INFLIGHT_SYMBOLS, thread_name_prefix="stop-mgr")
+
+
+def _cancel(symbol: str, order_id: int) -> None:
+    get_client().client.futures_cancel_order(symbol=symbol, orderId=order_id)
+
+
+def _place(symbol: str, side: str, stop_price: str) -> dict:
+    return create_order(**stop_market_params(symbol, side=side, stop_price=stop_price, close_position=True))
+
+
+class ManagedStop:
+    def __init__(self, symbol: str, close_side: str, fmt: Callable[[float], str] = str,
+                 on_change: Optional[Callable[[Optional[int], Optional[str]], None]] = None,
+                 retries: int = 2, cancel=_cancel, place=_place, position_open=has_open_position):
+        self.symbol = symbol
+        self.close_side = close_side
+        self.fmt = fmt
+        self.on_change = on_change
+        self.retries = retries
+        self._cancel = cancel
+        self._place = place
+        self._position_open = position_open
+        self.order_id: Optional[int] = None
+        self.stop_price: Optional[str] = None
+        self._target: Optional[str] = None
+        self._inflight = False
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self.stats = {"requested": 0, "replaced": 0, "coalesced": 0, "failed": 0}
+
+    def adopt(self, order_id: Optional[int], stop_price: Optional[str]) -> None:
+        """Registra el stop colocado en la apertura (batch SL+TP)."""
+        with self._lock:
+            self.order_id = order_id
+            self.stop_price = stop_price
+
+    def move_to(self, price: float) -> bool:
+        """Pide mover el stop a `price`. Devuelve False si ya está ahí o pendiente de ir ahí."""
+        target = self.fmt(price)
+        with self._lock:
+            if target == (self._target or self.stop_price):
+                return False
+            self.stats["requested"] += 1
+            if self._inflight:
+                if self._target is not None:
+                    self.stats["coalesced"] += 1
+                self._target = target
+                return True
+            self._target = target
+            self._inflight = True
+            self._idle.clear()
+        _executor.submit(self._drain)
+        return True
+
+    def reset(self) -> None:
+        """Posición cerrada: olvidar el stop (el exchange ya lo canceló o lo hará el OCO)."""
+        with self._lock:
+            self._target = None
+            self.order_id = None
+            self.stop_price = None
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        return self._idle.wait(timeout)
+
+    # --- worker -----------------------------------------------------------
+    def _drain(self) -> None:
+        try:
+            while True:
+                with self._lock:
+                    target, self._target = self._target, None
+                    if target is None or target == self.stop_price:
+                        self._inflight = False
+                        self._idle.set()
+                        return
+                with lane(PROTECT):
+                    self._replace(target)
+        except Exception as e:
+            log.error(f"[{self.symbol}] ❌ stop manager: {e}")
+            with self._lock:
+                self._inflight = False
+                self._idle.set()
+
+    def _replace(self, target: str) -> None:
+        prev_id, prev_price = self.order_id, self.stop_price
+        if prev_id is not None:
+            try:
+                self._cancel(self.symbol, prev_id)
+            except Exception as e:
+                if getattr(e, "code", None) != UNKNOWN_ORDER:
+                    # El stop anterior sigue vivo: no colocar otro encima
+                    self.stats["failed"] += 1
+                    log.warning(f"[{self.symbol}] ⚠️ No se pudo cancelar stop {prev_id}: {e}")
+                    return
+                if not self._position_open(self.symbol):
+                    log.info(f"[{self.symbol}] Stop {prev_id} ya no existe y no hay posición; nada que mover")
+                    self.reset()
+                    self._notify()
+                    return
+        self._set(None, None)
+        resp = self._try_place(target)
+        if resp is None and prev_price is not None:
+            log.critical(f"[{self.symbol}] 🚨 Stop @ {target} no colocado; restaurando {prev_price}")
+            resp = self._try_place(prev_price)
+            target = prev_price
+        if resp is None:
+            self.stats["failed"] += 1
+            log.critical(f"[{self.symbol}] 🚨 POSICIÓN SIN STOP")
+            return
+        self._set(resp.get("orderId"), target)
+        self.stats["replaced"] += 1
+        log.info(f"[{self.symbol}] 🔁 Stop {prev_id} → {self.order_id} @ {target}")
+
+    def _try_place(self, price: str) -> Optional[dict]:
+        for attempt in range(self.retries + 1):
+            try:
+                return self._place(self.symbol, self.close_side, price)
+            except Exception as e:
+                log.warning(f"[{self.symbol}] stop @ {price} intento {attempt + 1} falló: {e}")
+        return None
+
+    def _set(self, order_id: Optional[int], price: Optional[str]) -> None:
+        with self._lock:
+            self.order_id, self.stop_price = order_id, price
+        self._notify()
+
+    def _notify(self) -> None:
+        if self.on_change:
+            try:
+                self.on_change(self.order_id, self.stop_price)
+            except Exception as e:
+                log.debug(f"on_change: {e}")
@@ -2,6 +2,7 @@
 import logging
 from typing import List, Dict, Any
 from .client import get_client
+from .exchange_info import get_exchange_info
 
 log = logging.getLogger("symbols")
 
@@ -24,15 +25,7 @@ def _fapi_ticker_24hr_raw():
         return []
 
 def _usdt_perpetual_symbols() -> Dict[str, Any]:
-    info = get_client().client.futures_exchange_info()
-    out = {}
-    for sym in info.get("symbols", []):
-        try:
-            if sym.get("contractType") == "PERPETUAL" and sym.get("quoteAsset") == "USDT" and sym.get("status") == "TRADING":
-                out[sym["symbol"]] = sym
-        except Exception:
-            continue
-    return out
+    return get_exchange_info().usdt_perpetuals()
 
 def top_usdtm_symbols_by_quote_volume(n: int = 20) -> List[str]:
     perps = _usdt_perpetual_symbols()
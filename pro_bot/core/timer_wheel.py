@@ -0,0 +1,84 @@
+"""
+Rueda de temporizadores (hashed timer wheel) con reloj explícito.
+
+El tiempo no se lee del sistema: avanza solo cuando se llama advance(now)
+con el timestamp de la vela, así que funciona igual en vivo que en un
+replay/backtest a máxima velocidad. schedule y cancel son O(1); cada
+temporizador se examina al pasar por su slot y expira en O(1) amortizado.
+"""
+
+from typing import Any, List, Optional
+
+
+class Timer:
+    __slots__ = ("deadline", "payload", "cancelled")
+
+    def __init__(self, deadline: int, payload: Any):
+        self.deadline = deadline
+        self.payload = payload
+        self.cancelled = False
+
+
+class TimerWheel:
+    """
+    Args:
+        tick: resolución del slot (misma unidad que los timestamps, p.ej. ms)
+        slots: número de slots; deadlines a más de una vuelta esperan en su slot
+    """
+
+    def __init__(self, tick: int = 60_000, slots: int = 256):
+        self.tick = int(tick)
+        self.n = int(slots)
+        self._slots: List[List[Timer]] = [[] for _ in range(self.n)]
+        self._cur: Optional[int] = None     # último tick procesado
+        self._now: Optional[int] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def schedule(self, deadline: int, payload: Any) -> Timer:
+        """Programa `payload` para expirar cuando now > deadline."""
+        t = Timer(int(deadline), payload)
+        tick = t.deadline // self.tick
+        if self._cur is not None and tick < self._cur:
+            tick = self._cur                # ya vencido: expira en el próximo advance
+        self._slots[tick % self.n].append(t)
+        self._size += 1
+        return t
+
+    @staticmethod
+    def cancel(timer: Optional[Timer]) -> None:
+        """Cancelación perezosa: se descarta al pasar por su slot."""
+        if timer is not None:
+            timer.cancelled = True
+
+    def advance(self, now: int) -> List[Any]:
+        """Avanza el reloj hasta `now` y devuelve los payloads expirados (deadline < now)."""
+        now = int(now)
+        if self._now is not None and now < self._now:
+            now = self._now                 # el reloj nunca retrocede
+        self._now = now
+        tick_now = now // self.tick
+        if self._cur is None:
+            self._cur = tick_now
+        # Un salto de más de una vuelta recorre cada slot una sola vez
+        span = min(tick_now - self._cur + 1, self.n)
+        expired = []
+        for k in range(span):
+            i = (self._cur + k) % self.n
+            slot = self._slots[i]
+            if not slot:
+                continue
+            keep = []
+            for t in slot:
+                if t.cancelled:
+                    self._size -= 1
+                elif t.deadline < now:
+                    expired.append(t.payload)
+                    self._size -= 1
+                else:
+                    keep.append(t)
+            self._slots[i] = keep
+        self._cur = tick_now
+        return expired
@@ -1,15 +1,11 @@
 import logging
 from typing import List, Optional, Set
 from .client import get_client
+from .exchange_info import get_exchange_info
 log = logging.getLogger("symbols")
 
 def usdt_perpetual_set() -> Set[str]:
-    info = get_client().exchange_info()
-    perps = set()
-    for s in info["symbols"]:
-        if s.get("contractType") == "PERPETUAL" and s.get("quoteAsset") == "USDT" and s.get("status") == "TRADING":
-            perps.add(s["symbol"])
-    return perps
+    return set(get_exchange_info().usdt_perpetuals())
 
 def top_usdtm_by_quote_volume(n: int = 20, allow: Optional[Set[str]] = None) -> List[str]:
     cli = get_client().client
@@ -2,19 +2,13 @@
 import logging
 from typing import List
 from .client import get_client
+from .exchange_info import get_exchange_info
 
 log = logging.getLogger("universe")
 
 def fetch_top_usdt_perpetuals_by_volume(max_symbols: int = 320) -> List[str]:
     cli = get_client().client
-    info = cli.futures_exchange_info()
-    usdt_perp = set()
-    for s in info["symbols"]:
-        try:
-            if s.get("contractType") == "PERPETUAL" and s.get("quoteAsset") == "USDT" and s.get("status") == "TRADING":
-                usdt_perp.add(s["symbol"])
-        except Exception:
-            continue
+    usdt_perp = set(get_exchange_info().usdt_perpetuals())
 
     tickers = cli.futures_ticker()
     scored = []
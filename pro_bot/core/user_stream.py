@@ -0,0 +1,440 @@
+"""
+Estado local de posiciones y órdenes desde el user-data stream de Futuros.
+
+AccountState es un libro en memoria (posiciones por símbolo, órdenes abiertas
+por orderId, índice de LIMIT pendientes por símbolo) que se mantiene con los
+eventos ACCOUNT_UPDATE / ORDER_TRADE_UPDATE. Todas las consultas son O(1)
+(salvo listar símbolos). UserDataStream gestiona el listenKey (creación,
+keepalive cada 30 min, renovación si expira), el WebSocket, un snapshot REST
+al arrancar y tras cada reconexión, y una reconciliación REST periódica.
+
+Cada entrada guarda su tiempo de actualización (T del evento o updateTime del
+snapshot): un snapshot nunca pisa un evento más reciente y un evento antiguo
+nunca pisa un snapshot más nuevo. Modo de posición ONE_WAY (ps = BOTH).
+"""
+
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional
+
+import websocket
+
+from ..config import settings
+from .account_config import get_account_config
+from .client import get_client
+
+log = logging.getLogger("user_stream")
+
+FUTURES_WS_URL = "wss://fstream.binance.com/ws/"
+KEEPALIVE_SECONDS = 30 * 60
+RECONCILE_SECONDS = 5 * 60
+OPEN_ORDER_STATUSES = ("NEW", "PARTIALLY_FILLED")
+
+
+@dataclass
+class PositionState:
+    symbol: str
+    amount: Decimal
+    entry_price: Decimal
+    unrealized_pnl: Decimal
+    update_time: int
+    mark_price: Decimal = Decimal("0")
+    leverage: int = 0
+    liquidation_price: Decimal = Decimal("0")
+
+    @property
+    def side(self) -> str:
+        return "LONG" if self.amount > 0 else "SHORT"
+
+
+@dataclass
+class OrderState:
+    order_id: int
+    symbol: str
+    side: str
+    type: str
+    status: str
+    orig_qty: Decimal
+    executed_qty: Decimal
+    price: Decimal
+    stop_price: Decimal
+    reduce_only: bool
+    close_position: bool
+    client_order_id: str
+    update_time: int
+
+
+class AccountState:
+    """
+    Libro local thread-safe. Los listeners reciben (evento, payload):
+      ("position", (symbol, cantidad_anterior, cantidad_nueva))
+      ("order", OrderState)         # también órdenes ya cerradas (FILLED, CANCELED...)
+      ("balance", {asset: wallet})
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.positions: Dict[str, PositionState] = {}
+        self.orders: Dict[int, OrderState] = {}
+        self._pending_limit: Dict[str, int] = {}     # symbol -> nº de LIMIT abiertas
+        self.balances: Dict[str, Decimal] = {}
+        # Lápidas (momento del cierre) para que un snapshot anterior no resucite nada
+        self._closed_pos: Dict[str, int] = {}
+        self._closed_orders: Dict[int, int] = {}
+        self.synced = False                           # snapshot aplicado y stream vivo
+        self.last_event_ms = 0
+        self._listeners: List[Callable] = []
+
+    # --- listeners ------------------------------------------------------
+    def add_listener(self, fn: Callable) -> None:
+        self._listeners.append(fn)
+
+    def _emit(self, event: str, payload) -> None:
+        for fn in list(self._listeners):
+            try:
+                fn(event, payload)
+            except Exception as e:
+                log.error(f"❌ Error en listener de {event}: {e}")
+
+    # --- consultas O(1) -------------------------------------------------
+    def has_position(self, symbol: str) -> bool:
+        return symbol in self.positions
+
+    def position(self, symbol: str) -> Optional[PositionState]:
+        return self.positions.get(symbol)
+
+    def open_count(self) -> int:
+        return len(self.positions)
+
+    def open_symbols(self) -> List[str]:
+        return sorted(self.positions)
+
+    def has_pending_limit(self, symbol: str) -> bool:
+        return self._pending_limit.get(symbol, 0) > 0
+
+    def pending_limit_symbols(self) -> List[str]:
+        return sorted(s for s, n in self._pending_limit.items() if n > 0)
+
+    def open_orders(self, symbol: Optional[str] = None) -> List[OrderState]:
+        with self._lock:
+            return [o for o in self.orders.values() if symbol is None or o.symbol == symbol]
+
+    # --- mutaciones -----------------------------------------------------
+    def _set_position(self, symbol: str, amount: Decimal, entry: Decimal, upnl: Decimal, ts: int,
+                      **extra) -> Optional[tuple]:
+        old = self.positions.get(symbol)
+        if old is not None and old.update_time > ts:
+            return None
+        if amount != 0 and self._closed_pos.get(symbol, -1) > ts:
+            return None
+        old_amt = old.amount if old else Decimal("0")
+        if amount == 0:
+            if self.positions.pop(symbol, None) is not None:
+                self._closed_pos[symbol] = ts
+        else:
+            pos = PositionState(symbol, amount, entry, upnl, ts)
+            if old is not None:
+                pos.mark_price, pos.leverage, pos.liquidation_price = old.mark_price, old.leverage, old.liquidation_price
+            for k, v in extra.items():
+                setattr(pos, k, v)
+            self.positions[symbol] = pos
+        return (symbol, old_amt, amount) if old_amt != amount else None
+
+    def _index_order(self, order: OrderState, sign: int) -> None:
+        if order.type == "LIMIT" and order.status == "NEW":
+            n = self._pending_limit.get(order.symbol, 0) + sign
+            if n > 0:
+                self._pending_limit[order.symbol] = n
+            else:
+                self._pending_limit.pop(order.symbol, None)
+
+    def _set_order(self, order: OrderState) -> bool:
+        if self._closed_orders.get(order.order_id, -1) > order.update_time:
+            return False
+        old = self.orders.get(order.order_id)
+        if old is not None:
+            if old.update_time > order.update_time:
+                return False
+            self._index_order(old, -1)
+            del self.orders[order.order_id]
+        if order.status in OPEN_ORDER_STATUSES:
+            self.orders[order.order_id] = order
+            self._index_order(order, +1)
+        else:
+            self._closed_orders[order.order_id] = order.update_time
+        return True
+
+    def on_account_update(self, msg: dict) -> None:
+        ts = int(msg.get("T") or msg.get("E") or 0)
+        data = msg.get("a", {})
+        changes = []
+        with self._lock:
+            self.last_event_ms = max(self.last_event_ms, int(msg.get("E", 0)))
+            for b in data.get("B", []):
+                self.balances[b["a"]] = Decimal(b.get("wb", "0"))
+            for p in data.get("P", []):
+                if p.get("ps", "BOTH") != "BOTH":
+                    continue
+                ch = self._set_position(p["s"], Decimal(p.get("pa", "0")), Decimal(p.get("ep", "0")),
+                                        Decimal(p.get("up", "0")), ts)
+                if ch:
+                    changes.append(ch)
+        if data.get("B"):
+            self._emit("balance", dict(self.balances))
+        for ch in changes:
+            self._emit("position", ch)
+
+    def on_order_update(self, msg: dict) -> None:
+        o = msg.get("o", {})
+        order = OrderState(
+            order_id=int(o["i"]), symbol=o["s"], side=o.get("S", ""), type=o.get("o", ""),
+            status=o.get("X", ""), orig_qty=Decimal(o.get("q", "0")), executed_qty=Decimal(o.get("z", "0")),
+            price=Decimal(o.get("p", "0")), stop_price=Decimal(o.get("sp", "0")),
+            reduce_only=bool(o.get("R", False)), close_position=bool(o.get("cp", False)),
+            client_order_id=o.get("c", ""), update_time=int(o.get("T") or msg.get("T") or msg.get("E") or 0),
+        )
+        with self._lock:
+            self.last_event_ms = max(self.last_event_ms, int(msg.get("E", 0)))
+            applied = self._set_order(order)
+        if applied:
+            self._emit("order", order)
+
+    def apply_snapshot(self, positions: List[dict], orders: List[dict], as_of_ms: int) -> int:
+        """
+        Aplica un snapshot REST (futures_position_information + futures_get_open_orders).
+        Las entradas locales más nuevas que `as_of_ms` se conservan. Devuelve
+        el número de correcciones (útil para medir deriva en reconciliación).
+        """
+        fixes = 0
+        changes = []
+        with self._lock:
+            seen = set()
+            for p in positions:
+                if p.get("positionSide", "BOTH") != "BOTH":
+                    continue
+                sym = p["symbol"]
+                amt = Decimal(p.get("positionAmt", "0"))
+                if amt == 0:
+                    continue
+                seen.add(sym)
+                ch = self._set_position(
+                    sym, amt, Decimal(p.get("entryPrice", "0")), Decimal(p.get("unRealizedProfit", "0")),
+                    int(p.get("updateTime") or 0) or as_of_ms,
+                    mark_price=Decimal(p.get("markPrice", "0")), leverage=int(p.get("leverage", 0) or 0),
+                    liquidation_price=Decimal(p.get("liquidationPrice", "0")))
+                if ch:
+                    changes.append(ch)
+                    fixes += 1
+            for sym in [s for s in self.positions if s not in seen]:
+                if self.positions[sym].update_time <= as_of_ms:
+                    ch = self._set_position(sym, Decimal("0"), Decimal("0"), Decimal("0"), as_of_ms)
+                    if ch:
+                        changes.append(ch)
+                        fixes += 1
+
+            rest_orders = {}
+            for o in orders:
+                rest_orders[int(o["orderId"])] = OrderState(
+                    order_id=int(o["orderId"]), symbol=o["symbol"], side=o.get("side", ""), type=o.get("type", ""),
+                    status=o.get("status", ""), orig_qty=Decimal(o.get("origQty", "0")),
+                    executed_qty=Decimal(o.get("executedQty", "0")), price=Decimal(o.get("price", "0")),
+                    stop_price=Decimal(o.get("stopPrice", "0")), reduce_only=bool(o.get("reduceOnly", False)),
+                    close_position=bool(o.get("closePosition", False)), client_order_id=o.get("clientOrderId", ""),
+                    update_time=int(o.get("updateTime") or 0) or as_of_ms)
+            for oid, order in rest_orders.items():
+                known = oid in self.orders
+                if self._set_order(order) and not known:
+                    fixes += 1
+            for oid in [i for i, o in self.orders.items() if i not in rest_orders and o.update_time <= as_of_ms]:
+                self._index_order(self.orders.pop(oid), -1)
+                fixes += 1
+            # El REST ya refleja todo lo cerrado antes de as_of: lápidas innecesarias
+            self._closed_pos = {k: t for k, t in self._closed_pos.items() if t > as_of_ms}
+            self._closed_orders = {k: t for k, t in self._closed_orders.items() if t > as_of_ms}
+        for ch in changes:
+            self._emit("position", ch)
+        return fixes
+
+
+class UserDataStream:
+    """listenKey + WebSocket + snapshot/reconciliación REST sobre un AccountState."""
+
+    def __init__(self, state: AccountState, keepalive_s: float = KEEPALIVE_SECONDS,
+                 reconcile_s: float = RECONCILE_SECONDS, ws_url: str = FUTURES_WS_URL):
+        self.state = state
+        self.keepalive_s = keepalive_s
+        self.reconcile_s = reconcile_s
+        self.ws_url = ws_url
+        self.listen_key: Optional[str] = None
+        self._ws: Optional[websocket.WebSocketApp] = None
+        self._running = False
+        self._connected = threading.Event()
+        self.stats = {"events": 0, "reconnects": 0, "reconciliations": 0, "reconcile_fixes": 0}
+
+    @property
+    def cli(self):
+        return get_client().client
+
+    def _server_ms(self) -> int:
+        return int(time.time() * 1000) + int(getattr(self.cli, "_timestamp_offset", 0) or 0)
+
+    # --- REST -----------------------------------------------------------
+    def snapshot(self) -> int:
+        as_of = self._server_ms()
+        positions = self.cli.futures_position_information()
+        orders = self.cli.futures_get_open_orders()
+        fixes = self.state.apply_snapshot(positions, orders, as_of)
+        log.info(f"📸 Snapshot cuenta: {self.state.open_count()} posiciones, {len(self.state.orders)} órdenes abiertas")
+        return fixes
+
+    def _new_listen_key(self) -> str:
+        resp = self.cli.futures_stream_get_listen_key()
+        return resp["listenKey"] if isinstance(resp, dict) else resp
+
+    # --- WebSocket ------------------------------------------------------
+    def _on_open(self, _ws):
+        self._connected.set()
+        log.info("🔌 User-data stream conectado")
+
+    def _on_message(self, _ws, raw):
+        try:
+            msg = json.loads(raw)
+            event = msg.get("e")
+            self.stats["events"] += 1
+            if event == "ACCOUNT_UPDATE":
+                self.state.on_account_update(msg)
+            elif event == "ORDER_TRADE_UPDATE":
+                self.state.on_order_update(msg)
+            elif event == "ACCOUNT_CONFIG_UPDATE":
+                get_account_config().on_config_update(msg)
+            elif event == "listenKeyExpired":
+                log.warning("⚠️ listenKey expirado; reconectando")
+                self.listen_key = None
+                _ws.close()
+        except Exception as e:
+            log.error(f"❌ Error procesando evento de usuario: {e}")
+
+    def _on_close(self, _ws, *_args):
+        self._connected.clear()
+        self.state.synced = False
+
+    def _on_error(self, _ws, error):
+        log.warning(f"⚠️ User-data stream error: {error}")
+
+    def _run_ws(self):
+        backoff = 1
+        while self._running:
+            try:
+                if not self.listen_key:
+                    self.listen_key = self._new_listen_key()
+                self._ws = websocket.WebSocketApp(
+                    self.ws_url + self.listen_key,
+                    on_open=self._on_open, on_message=self._on_message,
+                    on_close=self._on_close, on_error=self._on_error)
+                self._ws.run_forever(ping_interval=60, ping_timeout=20)
+            except Exception as e:
+                log.error(f"❌ User-data stream caído: {e}")
+            self.state.synced = False
+            if self._running:
+                self.stats["reconnects"] += 1
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                # Tras reconectar hay que resincronizar (pudieron perderse eventos)
+                threading.Thread(target=self._resync, daemon=True).start()
+
+    def _resync(self):
+        if self._connected.wait(timeout=30):
+            try:
+                self.snapshot()
+                self.state.synced = True
+            except Exception as e:
+                log.error(f"❌ Resync de cuenta fallido: {e}")
+
+    def _maintenance(self):
+        next_keepalive = time.monotonic() + self.keepalive_s
+        next_reconcile = time.monotonic() + self.reconcile_s
+        while self._running:
+            time.sleep(1)
+            now = time.monotonic()
+            if now >= next_keepalive:
+                next_keepalive = now + self.keepalive_s
+                try:
+                    if self.listen_key:
+                        self.cli.futures_stream_keepalive(listenKey=self.listen_key)
+                except Exception as e:
+                    log.warning(f"⚠️ Keepalive listenKey falló ({e}); se renovará")
+                    self.listen_key = None
+                    if self._ws:
+                        self._ws.close()
+            if now >= next_reconcile:
+                next_reconcile = now + self.reconcile_s
+                try:
+                    fixes = self.snapshot()
+                    self.stats["reconciliations"] += 1
+                    self.stats["reconcile_fixes"] += fixes
+                    if fixes:
+                        log.warning(f"🔧 Reconciliación corrigió {fixes} entradas del estado local")
+                    if self._connected.is_set():
+                        self.state.synced = True
+                except Exception as e:
+                    log.warning(f"⚠️ Reconciliación fallida: {e}")
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self.listen_key = self._new_listen_key()
+        threading.Thread(target=self._run_ws, name="user-stream", daemon=True).start()
+        self._connected.wait(timeout=10)
+        # Snapshot después de abrir el stream: ningún evento queda entre ambos
+        self.snapshot()
+        self.state.synced = self._connected.is_set()
+        threading.Thread(target=self._maintenance, name="user-stream-maint", daemon=True).start()
+        log.info(f"✅ User-data stream listo (synced={self.state.synced})")
+
+    def stop(self) -> None:
+        self._running = False
+        self.state.synced = False
+        if self._ws:
+            self._ws.close()
+        try:
+            if self.listen_key:
+                self.cli.futures_stream_close(listenKey=self.listen_key)
+        except Exception:
+            pass
+
+
+_state = AccountState()
+_stream: Optional[UserDataStream] = None
+_stream_lock = threading.Lock()
+
+
+def get_account_state() -> AccountState:
+    return _state
+
+
+def live_account_state() -> Optional[AccountState]:
+    """El estado local si está sincronizado; None -> usar REST."""
+    return _state if _state.synced else None
+
+
+def start_user_stream() -> Optional[UserDataStream]:
+    """Arranca (una vez por proceso) el user-data stream si USER_STREAM está activo."""
+    global _stream
+    if not settings.user_stream:
+        return None
+    with _stream_lock:
+        if _stream is None:
+            stream = UserDataStream(_state)
+            try:
+                stream.start()
+            except Exception as e:
+                log.error(f"❌ No se pudo iniciar el user-data stream (se usará REST): {e}")
+                stream.stop()
+                return None
+            _stream = stream
+        return _stream
@@ -0,0 +1,358 @@
+"""
+Transporte de órdenes por la WebSocket API de Futuros (ws-fapi).
+
+Una conexión persistente (websocket-client en un hilo) por proceso. Cada
+petición lleva un id y se resuelve con un Future, así que sirve igual desde
+hilos (place_order) que desde asyncio (place_order_async). Las peticiones se
+firman con HMAC como en REST (parámetros ordenados alfabéticamente).
+
+Si el socket no está conectado o la petición vence, se cae a REST. Si la
+orden ya salió (vencida o con el socket caído después del envío) se consulta
+por su newClientOrderId y solo se reenvía si el exchange responde -2013. Se activa con ORDER_TRANSPORT=ws; WS_API_URL permite apuntar a
+LocalWsApiServer (servidor local de pruebas y benchmarks de latencia).
+"""
+
+import asyncio
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Dict, Optional
+
+import websocket
+
+from ..config import settings
+from . import client as sync_client
+from .client import find_order, get_client
+from .rate_governor import RateLimitShed, classify, endpoint_weight, get_governor
+
+log = logging.getLogger("ws_api")
+
+REQUEST_TIMEOUT_SECONDS = 3.0
+
+
+class WsApiError(Exception):
+    """Error devuelto por el exchange (la orden fue rechazada: no se reintenta por REST)."""
+
+    def __init__(self, code: Optional[int], msg: str):
+        super().__init__(f"APIError(code={code}): {msg}")
+        self.code = code
+        self.msg = msg
+
+
+class WsDisconnected(ConnectionError):
+    """El socket cayó con la petición ya enviada: la orden pudo llegar al exchange."""
+
+
+class WsOrderTransport:
+    def __init__(self, url: Optional[str] = None, api_key: Optional[str] = None,
+                 api_secret: Optional[str] = None, timeout: float = REQUEST_TIMEOUT_SECONDS):
+        self.url = url or settings.ws_api_url
+        self.api_key = api_key if api_key is not None else settings.api_key
+        self.api_secret = (api_secret if api_secret is not None else settings.api_secret).encode()
+        self.timeout = timeout
+        self._ws: Optional[websocket.WebSocketApp] = None
+        self._connected = threading.Event()
+        self._running = False
+        self._pending: Dict[str, Future] = {}
+        self._ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+        self.time_offset = 0
+        self.stats = {"ws": 0, "rest_fallback": 0, "timeouts": 0, "reconnects": 0}
+
+    # --- conexión -------------------------------------------------------
+    def start(self, wait: float = 5.0) -> bool:
+        if self._running:
+            return self._connected.is_set()
+        self._running = True
+        if sync_client.client_singleton is not None:
+            self.time_offset = int(getattr(sync_client.client_singleton.client, "_timestamp_offset", 0) or 0)
+        threading.Thread(target=self._run, name="ws-api", daemon=True).start()
+        return self._connected.wait(timeout=wait)
+
+    def stop(self) -> None:
+        self._running = False
+        if self._ws:
+            self._ws.close()
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def _run(self) -> None:
+        backoff = 1
+        while self._running:
+            self._ws = websocket.WebSocketApp(
+                self.url, on_open=lambda _ws: self._connected.set(),
+                on_message=self._on_message, on_close=self._on_close,
+                on_error=lambda _ws, e: log.warning(f"⚠️ WS API error: {e}"))
+            self._ws.run_forever(ping_interval=30, ping_timeout=10)
+            self._connected.clear()
+            if self._running:
+                self.stats["reconnects"] += 1
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _on_close(self, _ws, *_args) -> None:
+        self._connected.clear()
+        # Las peticiones en vuelo no tendrán respuesta por este socket
+        for fut in list(self._pending.values()):
+            if not fut.done():
+                fut.set_exception(WsDisconnected("WS API desconectado"))
+        self._pending.clear()
+
+    def _on_message(self, _ws, raw) -> None:
+        try:
+            msg = json.loads(raw)
+        except ValueError:
+            return
+        fut = self._pending.pop(str(msg.get("id")), None)
+        if fut is None or fut.done():
+            return
+        for limit in msg.get("rateLimits", []) or []:
+            if limit.get("rateLimitType") == "REQUEST_WEIGHT" and limit.get("intervalNum") == 1:
+                get_governor().observe(200, {"X-MBX-USED-WEIGHT-1M": limit.get("count", 0)})
+        if msg.get("status") == 200:
+            fut.set_result(msg.get("result"))
+        else:
+            err = msg.get("error") or {}
+            fut.set_exception(WsApiError(err.get("code"), err.get("msg", str(msg))))
+
+    # --- peticiones -----------------------------------------------------
+    def _signed(self, params: dict) -> dict:
+        params = {k: str(v) for k, v in params.items() if v is not None}
+        params["apiKey"] = self.api_key
+        params["timestamp"] = str(int(time.time() * 1000) + self.time_offset)
+        params.setdefault("recvWindow", str(settings.recv_window))
+        payload = "&".join(f"{k}={params[k]}" for k in sorted(params))
+        params["signature"] = hmac.new(self.api_secret, payload.encode(), hashlib.sha256).hexdigest()
+        return params
+
+    def submit(self, method: str, params: dict) -> Future:
+        """Envía una petición firmada y devuelve el Future de su respuesta."""
+        if not self.connected:
+            raise ConnectionError("WS API no conectado")
+        req_id = f"{next(self._ids)}"
+        fut: Future = Future()
+        self._pending[req_id] = fut
+        try:
+            with self._send_lock:
+                self._ws.send(json.dumps({"id": req_id, "method": method, "params": self._signed(params)}))
+        except Exception as e:
+            self._pending.pop(req_id, None)
+            # Un envío a medias puede haber llegado: mismo trato que un socket caído
+            raise WsDisconnected(f"envío fallido: {e}") from e
+        return fut
+
+    def _expire(self, fut: Future) -> None:
+        for k, v in list(self._pending.items()):
+            if v is fut:
+                self._pending.pop(k, None)
+
+    # --- órdenes con fallback REST --------------------------------------
+    @staticmethod
+    def _prepare(params: dict) -> dict:
+        params = dict(params)
+        params.pop("recvWindow", None)
+        params.setdefault("newClientOrderId", f"ws{uuid.uuid4().hex[:30]}")
+        return params
+
+    @staticmethod
+    def _acquire(params: dict) -> None:
+        weight, orders = endpoint_weight("POST", "/fapi/v1/order", params)
+        get_governor().acquire(classify("POST", "/fapi/v1/order", params), weight, orders)
+
+    def _rest_fallback(self, params: dict, maybe_sent: bool) -> dict:
+        cli = get_client().client
+        self.stats["rest_fallback"] += 1
+        if maybe_sent:
+            # La orden pudo llegar al exchange: solo se reenvía si no existe (-2013);
+            # si la consulta falla por otra causa el error sube sin reenviar
+            found = find_order(cli, params["symbol"], params["newClientOrderId"])
+            if found is not None:
+                log.info(f"[{params['symbol']}] orden {params['newClientOrderId']} ya estaba en el exchange")
+                return found
+        return cli.futures_create_order(recvWindow=settings.recv_window, **params)
+
+    def place_order(self, params: dict) -> dict:
+        params = self._prepare(params)
+        try:
+            self._acquire(params)
+            fut = self.submit("order.place", params)
+            result = fut.result(timeout=self.timeout)
+            self.stats["ws"] += 1
+            return result
+        except (WsApiError, RateLimitShed):
+            raise
+        except FutureTimeout:
+            self.stats["timeouts"] += 1
+            self._expire(fut)
+            log.warning(f"[{params.get('symbol')}] ⏱️ WS API sin respuesta en {self.timeout}s; fallback REST")
+            return self._rest_fallback(params, maybe_sent=True)
+        except WsDisconnected as e:
+            log.warning(f"[{params.get('symbol')}] WS API caído con la orden enviada ({e}); fallback REST")
+            return self._rest_fallback(params, maybe_sent=True)
+        except Exception as e:
+            log.warning(f"[{params.get('symbol')}] WS API no disponible ({e}); fallback REST")
+            return self._rest_fallback(params, maybe_sent=False)
+
+    async def place_order_async(self, params: dict) -> dict:
+        params = self._prepare(params)
+        try:
+            weight, orders = endpoint_weight("POST", "/fapi/v1/order", params)
+            await get_governor().acquire_async(classify("POST", "/fapi/v1/order", params), weight, orders)
+            fut = self.submit("order.place", params)
+            result = await asyncio.wait_for(asyncio.wrap_future(fut), timeout=self.timeout)
+            self.stats["ws"] += 1
+            return result
+        except (WsApiError, RateLimitShed):
+            raise
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            self._expire(fut)
+            log.warning(f"[{params.get('symbol')}] ⏱️ WS API sin respuesta en {self.timeout}s; fallback REST")
+            return await asyncio.to_thread(self._rest_fallback, params, True)
+        except WsDisconnected as e:
+            log.warning(f"[{params.get('symbol')}] WS API caído con la orden enviada ({e}); fallback REST")
+            return await asyncio.to_thread(self._rest_fallback, params, True)
+        except Exception as e:
+            log.warning(f"[{params.get('symbol')}] WS API no disponible ({e}); fallback REST")
+            return await asyncio.to_thread(self._rest_fallback, params, False)
+
+
+_transport: Optional[WsOrderTransport] = None
+_transport_lock = threading.Lock()
+
+
+def get_ws_transport() -> Optional[WsOrderTransport]:
+    """Transporte WS si ORDER_TRANSPORT=ws (se conecta en el primer uso); None -> REST."""
+    global _transport
+    if settings.order_transport != "ws":
+        return None
+    with _transport_lock:
+        if _transport is None:
+            _transport = WsOrderTransport()
+            if not _transport.start():
+                log.warning("⚠️ WS API no conectó a tiempo; se usará REST hasta que conecte")
+        return _transport
+
+
+class LocalWsApiServer:
+    """
+    Servidor local que imita ws-fapi (order.place) para pruebas y benchmarks.
+    Verifica la firma HMAC, responde con una orden FILLED tras `latency_ms` y
+    puede dejar sin respuesta las órdenes cuyo símbolo esté en `drop_symbols`;
+    drop_connections() corta las conexiones abiertas desde el lado servidor.
+    """
+
+    def __init__(self, api_secret: str = "secret", latency_ms: float = 0.0, port: int = 0):
+        self.api_secret = api_secret.encode()
+        self.latency_ms = latency_ms
+        self.port = port
+        self.drop_symbols = set()
+        self.orders: Dict[str, dict] = {}
+        self._sockets = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}/ws-fapi/v1"
+
+    async def _handle(self, request):
+        from aiohttp import web
+
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._sockets.add(ws)
+        try:
+            await self._serve(ws)
+        finally:
+            self._sockets.discard(ws)
+        return ws
+
+    async def _serve(self, ws):
+        from aiohttp import WSMsgType
+
+        async for m in ws:
+            if m.type != WSMsgType.TEXT:
+                continue
+            req = json.loads(m.data)
+            params = dict(req.get("params", {}))
+            sig = params.pop("signature", "")
+            payload = "&".join(f"{k}={params[k]}" for k in sorted(params))
+            if hmac.new(self.api_secret, payload.encode(), hashlib.sha256).hexdigest() != sig:
+                await ws.send_json({"id": req["id"], "status": 400,
+                                    "error": {"code": -1022, "msg": "Signature for this request is not valid."}})
+                continue
+            if params.get("symbol") in self.drop_symbols:
+                continue
+            if self.latency_ms:
+                await asyncio.sleep(self.latency_ms / 1000)
+            order = {"orderId": len(self.orders) + 1, "symbol": params.get("symbol"),
+                     "clientOrderId": params.get("newClientOrderId"), "status": "FILLED",
+                     "type": params.get("type"), "side": params.get("side"),
+                     "origQty": params.get("quantity", "0"), "executedQty": params.get("quantity", "0"),
+                     "avgPrice": "0", "updateTime": int(time.time() * 1000)}
+            self.orders[order["clientOrderId"]] = order
+            await ws.send_json({"id": req["id"], "status": 200, "result": order,
+                                "rateLimits": [{"rateLimitType": "REQUEST_WEIGHT", "interval": "MINUTE",
+                                                "intervalNum": 1, "limit": 2400, "count": len(self.orders)}]})
+
+    def drop_connections(self) -> None:
+        async def _close():
+            for ws in list(self._sockets):
+                await ws.close()
+        asyncio.run_coroutine_threadsafe(_close(), self._loop).result(timeout=5)
+
+    def start(self) -> "LocalWsApiServer":
+        from aiohttp import web
+
+        async def _main():
+            app = web.Application()
+            app.router.add_get("/ws-fapi/v1", self._handle)
+            self._runner = web.AppRunner(app)
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, "127.0.0.1", self.port)
+            await site.start()
+            self.port = site._server.sockets[0].getsockname()[1]
+            self._ready.set()
+
+        def _thread():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(_main())
+            self._loop.run_forever()
+
+        threading.Thread(target=_thread, name="ws-api-stub", daemon=True).start()
+        self._ready.wait(timeout=5)
+        return self
+
+    def stop(self) -> None:
+        if self._loop:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(timeout=5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+if __name__ == "__main__":
+    # Benchmark local: latencia de ida y vuelta de order.place contra el servidor simulado
+    import statistics
+
+    srv = LocalWsApiServer().start()
+    tr = WsOrderTransport(url=srv.url, api_key="key", api_secret="secret")
+    tr.start()
+    lat = []
+    for i in range(500):
+        t = time.perf_counter()
+        tr.place_order({"symbol": "BTCUSDT", "side": "BUY", "type": "MARKET", "quantity": "0.001"})
+        lat.append((time.perf_counter() - t) * 1000)
+    lat.sort()
+    print(f"order.place x{len(lat)}: p50={statistics.median(lat):.3f}ms p99={lat[int(len(lat) * 0.99)]:.3f}ms")
+    tr.stop()
+    srv.stop()
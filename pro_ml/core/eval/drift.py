@@ -0,0 +1,268 @@
+"""
+Monitor de drift de features con histogramas de memoria fija.
+
+En entrenamiento se guardan en metadata.joblib histogramas de referencia por
+feature (bordes por cuantiles + frecuencias). En vivo cada (símbolo,
+timeframe) mantiene un histograma con los mismos bordes y decaimiento
+exponencial: cada actualización es O(1) (búsqueda en ~20 bordes y una suma),
+sin guardar muestras. Un hilo en segundo plano calcula cada `interval`
+segundos PSI y KS contra la referencia y escribe outputs/drift/report.json,
+fuera del camino de inferencia; train_batch_binance con DRIFTED_ONLY=1
+reentrena solo los símbolos marcados.
+
+La referencia es siempre la del artefacto de entrenamiento (historia
+completa). Las features con ventana más larga que el buffer live (rv con
+vol_ewm_span, ofi con ofi_window de la config de entrenamiento) no son
+comparables mientras el buffer no cubra esa ventana: no se acumulan y el
+informe las marca como `insufficient_history` con las velas necesarias.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+log = logging.getLogger("drift")
+
+DRIFT_FEATURES = ("ret1", "rv", "ofi", "qi", "rsi", "atr")
+INSUFFICIENT_HISTORY = "insufficient_history"
+
+
+def drift_columns(columns) -> List[str]:
+    """Columnas monitorizadas: DRIFT_FEATURES y sus variantes fusionadas (<feat>_<tf>)."""
+    return [c for c in columns if c in DRIFT_FEATURES or c.rsplit("_", 1)[0] in DRIFT_FEATURES]
+
+
+def feature_warmup(cfg: dict) -> Dict[str, int]:
+    """Velas necesarias para que una feature live sea comparable con la de entrenamiento."""
+    f = (cfg or {}).get("features", {}) or {}
+    return {"rv": int(f.get("vol_ewm_span", 0)), "ofi": int(f.get("ofi_window", 0))}
+
+
+def _needed_bars(feature: str, warmup: Dict[str, int]) -> int:
+    """Velas 1m de buffer que necesita `feature` (las fusionadas <feat>_<tf> escalan por tf)."""
+    if feature in warmup:
+        return warmup[feature]
+    base, _, tf = feature.rpartition("_")
+    if base in warmup and tf[:-1].isdigit() and tf[-1] in "mh":
+        return warmup[base] * int(tf[:-1]) * (60 if tf[-1] == "h" else 1)
+    return 0
+
+
+def reference_histograms(X, bins: int = 20) -> Dict[str, dict]:
+    """
+    Histogramas de referencia para metadata.joblib:
+      {feature: {"edges": [bordes interiores], "freq": [frecuencias]}}
+    Bordes por cuantiles (len(freq) == len(edges) + 1; extremos abiertos).
+    """
+    out = {}
+    for col in drift_columns(X.columns):
+        x = np.asarray(X[col], dtype=np.float64)
+        x = x[np.isfinite(x)]
+        if len(x) == 0:
+            continue
+        edges = np.unique(np.quantile(x, np.linspace(0, 1, bins + 1)[1:-1]))
+        counts = np.bincount(np.searchsorted(edges, x, side="right"), minlength=len(edges) + 1)
+        out[col] = {"edges": edges.tolist(), "freq": (counts / counts.sum()).tolist()}
+    return out
+
+
+def psi(ref, cur, eps: float = 1e-4) -> float:
+    """Population Stability Index entre dos vectores de frecuencias."""
+    r = np.clip(np.asarray(ref, dtype=np.float64), eps, None)
+    c = np.clip(np.asarray(cur, dtype=np.float64), eps, None)
+    r, c = r / r.sum(), c / c.sum()
+    return float(np.sum((c - r) * np.log(c / r)))
+
+
+def ks(ref, cur) -> float:
+    """Estadístico KS sobre las CDF discretizadas en los mismos bins."""
+    r = np.cumsum(ref) / np.sum(ref)
+    c = np.cumsum(cur) / np.sum(cur)
+    return float(np.max(np.abs(r - c)))
+
+
+class StreamingHistogram:
+    """
+    Histograma con decaimiento exponencial (vida media en muestras).
+    En lugar de multiplicar todos los bins por el factor de decaimiento en
+    cada muestra, cada muestra nueva pesa más (2**(n/half_life)); se
+    renormaliza de vez en cuando para no desbordar.
+    """
+
+    def __init__(self, edges, half_life: float = 1440.0):
+        self.edges = list(edges)
+        self.counts = [0.0] * (len(self.edges) + 1)
+        self.half_life = float(half_life)
+        self._weight = 1.0
+        self._step = 2.0 ** (1.0 / self.half_life)
+        self.n = 0
+
+    def update(self, x: float) -> None:
+        if not math.isfinite(x):
+            return
+        self.counts[bisect_right(self.edges, x)] += self._weight
+        self._weight *= self._step
+        self.n += 1
+        if self._weight > 1e12:
+            self.counts = [c / self._weight for c in self.counts]
+            self._weight = 1.0
+
+    def frequencies(self) -> np.ndarray:
+        c = np.asarray(self.counts, dtype=np.float64)
+        total = c.sum()
+        return c / total if total > 0 else c
+
+
+class DriftMonitor:
+    """
+    Histogramas en vivo por (símbolo, timeframe) contra la referencia del
+    modelo que puntúa esas filas.
+    """
+
+    def __init__(self, interval: float = 300.0, half_life: float = 1440.0, min_samples: int = 200,
+                 psi_threshold: float = 0.2, ks_threshold: float = 0.1,
+                 report_path: str = "outputs/drift/report.json", warmup: Optional[Dict[str, int]] = None):
+        self.interval = interval
+        self.half_life = half_life
+        self.min_samples = min_samples
+        self.psi_threshold = psi_threshold
+        self.ks_threshold = ks_threshold
+        self.report_path = report_path
+        self._refs: Dict[Tuple[str, str], Dict[str, dict]] = {}
+        self._hists: Dict[Tuple[str, str], Dict[str, StreamingHistogram]] = {}
+        self._needs: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._history: Dict[Tuple[str, str], int] = {}                # velas del último buffer live
+        self.warmup = warmup or {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_report: Dict[str, dict] = {}
+
+    @classmethod
+    def from_config(cls, cfg: dict, feature_cfg: Optional[dict] = None) -> "DriftMonitor":
+        """feature_cfg: configuración de features con la que se calculan las filas live."""
+        d = ((cfg or {}).get("serving", {}) or {}).get("drift", {}) or {}
+        return cls(interval=d.get("interval_s", 300), half_life=d.get("half_life", 1440),
+                   min_samples=d.get("min_samples", 200), psi_threshold=d.get("psi_threshold", 0.2),
+                   ks_threshold=d.get("ks_threshold", 0.1),
+                   report_path=d.get("report_path", "outputs/drift/report.json"),
+                   warmup=feature_warmup(feature_cfg or cfg))
+
+    def set_reference(self, symbol: str, timeframe: str, reference: Optional[Dict[str, dict]]) -> None:
+        key = (symbol, timeframe)
+        if not reference or self._refs.get(key) is reference:
+            return
+        # Modelo nuevo (o primera vez): histogramas en vivo con los bordes de su referencia
+        with self._lock:
+            self._refs[key] = reference
+            self._hists[key] = {f: StreamingHistogram(r["edges"], self.half_life) for f, r in reference.items()}
+            self._needs[key] = {f: n for f in reference if (n := _needed_bars(f, self.warmup))}
+
+    def update(self, symbol: str, timeframe: str, row, history: Optional[int] = None) -> None:
+        """
+        Añade una fila de features (Series o dict). O(1) por feature.
+        `history`: velas del buffer live con el que se calculó la fila.
+        """
+        key = (symbol, timeframe)
+        hists = self._hists.get(key)
+        if not hists:
+            return
+        needs = self._needs.get(key, {})
+        with self._lock:
+            if history is not None:
+                self._history[key] = history
+            for f, h in hists.items():
+                if history is not None and history < needs.get(f, 0):
+                    continue
+                v = row.get(f)
+                if v is not None:
+                    h.update(float(v))
+
+    def scores(self, symbol: str, timeframe: str) -> Optional[dict]:
+        key = (symbol, timeframe)
+        hists = self._hists.get(key)
+        if not hists:
+            return None
+        out = {}
+        needs = self._needs.get(key, {})
+        history = self._history.get(key)
+        for f, h in hists.items():
+            if history is not None and history < needs.get(f, 0):
+                out[f] = {"status": INSUFFICIENT_HISTORY, "needed_bars": needs[f], "history": history, "n": h.n}
+                continue
+            if h.n < self.min_samples:
+                continue
+            ref = self._refs[key][f]["freq"]
+            with self._lock:
+                cur = h.frequencies()
+            out[f] = {"psi": psi(ref, cur), "ks": ks(ref, cur), "n": h.n}
+        return out
+
+    def evaluate(self) -> Dict[str, dict]:
+        """PSI/KS de todas las claves y escritura del informe."""
+        report = {}
+        for symbol, timeframe in list(self._hists):
+            feats = self.scores(symbol, timeframe)
+            if not feats:
+                continue
+            drifted = sorted(f for f, s in feats.items()
+                             if "psi" in s and (s["psi"] >= self.psi_threshold or s["ks"] >= self.ks_threshold))
+            insufficient = sorted(f for f, s in feats.items() if s.get("status") == INSUFFICIENT_HISTORY)
+            report[f"{symbol} {timeframe}"] = {
+                "symbol": symbol, "timeframe": timeframe, "drifted": bool(drifted),
+                "drifted_features": drifted, INSUFFICIENT_HISTORY: insufficient,
+                "features": feats, "ts": int(time.time()),
+            }
+            if drifted:
+                log.warning(f"🌊 Drift en {symbol} {timeframe}: {', '.join(drifted)}")
+        self.last_report = report
+        self._write(report)
+        return report
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.evaluate()
+            except Exception as e:
+                log.error(f"❌ Error evaluando drift: {e}")
+
+    def start(self) -> "DriftMonitor":
+        """Evaluación periódica (PSI/KS + informe) en un hilo aparte."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="drift-monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _write(self, report: Dict[str, dict]) -> None:
+        if not self.report_path or not report:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.report_path) or ".", exist_ok=True)
+            tmp = f"{self.report_path}.tmp"
+            with open(tmp, "w") as fh:
+                json.dump(report, fh, indent=2)
+            os.replace(tmp, self.report_path)
+        except OSError as e:
+            log.error(f"❌ No se pudo escribir el informe de drift: {e}")
+
+    def drifted_symbols(self) -> List[str]:
+        return sorted({r["symbol"] for r in self.last_report.values() if r["drifted"]})
+
+
+def load_drifted_symbols(report_path: str = "outputs/drift/report.json") -> List[str]:
+    """Símbolos marcados con drift en el último informe (vacío si no existe)."""
+    if not os.path.exists(report_path):
+        return []
+    with open(report_path) as fh:
+        report = json.load(fh)
+    return sorted({r["symbol"] for r in report.values() if r.get("drifted")})
@@ -0,0 +1,221 @@
+"""
+Métricas de calidad del modelo en vivo (ventana móvil, memoria fija).
+
+Cada predicción live queda pendiente hasta que se resuelve su etiqueta de
+triple barrera con las velas siguientes, igual que triple_barrier_labels en
+entrenamiento: primera barrera tocada por el cierre o, al vencer
+labeling.horizon_min minutos (convertidos a velas del timeframe con
+horizon_bars), cierre final > cierre inicial.
+
+Las predicciones resueltas alimentan RollingBinaryMetrics por (símbolo,
+timeframe): AUC, Brier y hit-rate sobre las últimas `window` etiquetas.
+El AUC se mantiene con dos árboles de Fenwick (positivos/negativos por bin de
+probabilidad), así que cada alta o baja es O(log bins) y la memoria no crece.
+"""
+
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from ..labeling.triple_barrier import horizon_bars
+
+
+class _Fenwick:
+    """Árbol de Fenwick de conteos (índices 0..n-1)."""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.tree = [0] * (n + 1)
+
+    def add(self, i: int, delta: int) -> None:
+        i += 1
+        while i <= self.n:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        """Suma de los índices 0..i (i=-1 -> 0)."""
+        s = 0
+        i += 1
+        while i > 0:
+            s += self.tree[i]
+            i -= i & -i
+        return s
+
+
+class RollingBinaryMetrics:
+    """
+    AUC / Brier / hit-rate sobre las últimas `window` observaciones.
+    AUC con probabilidades discretizadas en `bins` (empates dentro del bin = 0.5).
+    """
+
+    def __init__(self, window: int = 500, bins: int = 256):
+        self.window = window
+        self.bins = bins
+        self._ring = deque()             # (bin, label, sq_err, hit) en orden de llegada
+        self._pos = _Fenwick(bins)
+        self._neg = _Fenwick(bins)
+        self._pos_bin = [0] * bins
+        self._neg_bin = [0] * bins
+        self.n_pos = 0
+        self.n_neg = 0
+        self._concordant = 0.0           # pares (pos, neg) con p_pos > p_neg (+0.5 empates)
+        self._sq_err = 0.0
+        self._hits = 0
+        self._calls = 0                  # predicciones con señal LONG/SHORT
+        self.total = 0
+
+    def _bin(self, p: float) -> int:
+        return min(max(int(p * self.bins), 0), self.bins - 1)
+
+    def _apply(self, b: int, label: int, sign: int) -> None:
+        # Pares que forma (o deja de formar) la observación con las del otro signo
+        if label:
+            pairs = self._neg.prefix(b - 1) + 0.5 * self._neg_bin[b]
+            self._pos.add(b, sign)
+            self._pos_bin[b] += sign
+            self.n_pos += sign
+        else:
+            pairs = (self.n_pos - self._pos.prefix(b)) + 0.5 * self._pos_bin[b]
+            self._neg.add(b, sign)
+            self._neg_bin[b] += sign
+            self.n_neg += sign
+        self._concordant += sign * pairs
+
+    def update(self, p: float, label: int, hit: Optional[bool] = None) -> None:
+        """Añade una predicción resuelta; hit=None si la señal era NEUTRAL."""
+        label = int(label)
+        if len(self._ring) >= self.window:
+            ob, ol, oe, oh = self._ring.popleft()
+            self._apply(ob, ol, -1)
+            self._sq_err -= oe
+            if oh is not None:
+                self._calls -= 1
+                self._hits -= int(oh)
+        b = self._bin(p)
+        err = (p - label) ** 2
+        self._apply(b, label, +1)
+        self._sq_err += err
+        if hit is not None:
+            self._calls += 1
+            self._hits += int(hit)
+        self._ring.append((b, label, err, hit))
+        self.total += 1
+
+    @property
+    def auc(self) -> Optional[float]:
+        if self.n_pos == 0 or self.n_neg == 0:
+            return None
+        return self._concordant / (self.n_pos * self.n_neg)
+
+    @property
+    def brier(self) -> Optional[float]:
+        return self._sq_err / len(self._ring) if self._ring else None
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        return self._hits / self._calls if self._calls else None
+
+    def summary(self) -> dict:
+        return {"n": len(self._ring), "total": self.total, "auc": self.auc,
+                "brier": self.brier, "hit_rate": self.hit_rate}
+
+
+class OnlineEvaluator:
+    """
+    Une cada predicción con su resultado de triple barrera y mantiene
+    RollingBinaryMetrics por (símbolo, timeframe).
+
+    Uso por vela cerrada (mismo orden en el que se predice):
+      ev.on_bar(symbol, tf, close)                      # resuelve pendientes
+      ev.record(symbol, tf, p, close, scale, signal)    # nueva predicción
+    """
+
+    def __init__(self, horizon_min: int = 15, pt_mult: float = 1.5, sl_mult: float = 1.0,
+                 use_atr: bool = True, window: int = 500, bins: int = 256):
+        self.horizon_min = int(horizon_min)
+        self._horizons: Dict[str, int] = {}             # timeframe -> velas
+        self.pt_mult = pt_mult
+        self.sl_mult = sl_mult
+        self.scale_column = "atr" if use_atr else "rv"
+        self.window = window
+        self.bins = bins
+        # Como mucho `horizon` predicciones pendientes por clave (una por vela)
+        self._pending: Dict[Tuple[str, str], deque] = {}
+        self._metrics: Dict[Tuple[str, str], RollingBinaryMetrics] = {}
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "OnlineEvaluator":
+        lab = (cfg or {}).get("labeling", {}) or {}
+        oe = ((cfg or {}).get("serving", {}) or {}).get("online_eval", {}) or {}
+        return cls(horizon_min=lab.get("horizon_min", 15), pt_mult=lab.get("pt_mult", 1.5),
+                   sl_mult=lab.get("sl_mult", 1.0), use_atr=lab.get("use_atr", True),
+                   window=oe.get("window", 500), bins=oe.get("bins", 256))
+
+    def horizon(self, timeframe: str) -> int:
+        """Horizonte en velas de `timeframe` (horizon_min está en minutos)."""
+        bars = self._horizons.get(timeframe)
+        if bars is None:
+            bars = self._horizons[timeframe] = horizon_bars(self.horizon_min, timeframe)
+        return bars
+
+    def record(self, symbol: str, timeframe: str, p: float, close: float, scale: float,
+               signal: Optional[str] = None) -> None:
+        """
+        Registra una predicción hecha al cierre `close`. `scale` es la columna
+        scale_column (atr o rv) de esa fila, como en triple_barrier_labels.
+        """
+        if not np.isfinite(close) or close <= 0:
+            return
+        scale = float(scale) if np.isfinite(scale) else 0.0
+        up = close * (1 + self.pt_mult * (scale / (close + 1e-12)))
+        dn = close * (1 - self.sl_mult * (scale / (close + 1e-12)))
+        pend = self._pending.setdefault((symbol, timeframe), deque(maxlen=self.horizon(timeframe) + 1))
+        pend.append([float(p), close, up, dn, 0, signal])
+
+    def on_bar(self, symbol: str, timeframe: str, close: float) -> int:
+        """Avanza una vela para las predicciones pendientes. Devuelve cuántas se resolvieron."""
+        pend = self._pending.get((symbol, timeframe))
+        if not pend:
+            return 0
+        resolved = 0
+        horizon = self.horizon(timeframe)
+        keep = deque(maxlen=pend.maxlen)
+        for item in pend:
+            p, c0, up, dn, bars, signal = item
+            bars += 1
+            if close >= up:
+                label = 1
+            elif close <= dn:
+                label = 0
+            elif bars >= horizon:
+                label = int(close > c0)
+            else:
+                item[4] = bars
+                keep.append(item)
+                continue
+            self._resolve(symbol, timeframe, p, label, signal)
+            resolved += 1
+        self._pending[(symbol, timeframe)] = keep
+        return resolved
+
+    def _resolve(self, symbol: str, timeframe: str, p: float, label: int, signal: Optional[str]) -> None:
+        m = self._metrics.get((symbol, timeframe))
+        if m is None:
+            m = self._metrics[(symbol, timeframe)] = RollingBinaryMetrics(self.window, self.bins)
+        if signal == "LONG":
+            hit = label == 1
+        elif signal == "SHORT":
+            hit = label == 0
+        else:
+            hit = None
+        m.update(p, label, hit)
+
+    def metrics(self, symbol: str, timeframe: str) -> Optional[dict]:
+        m = self._metrics.get((symbol, timeframe))
+        return m.summary() if m else None
+
+    def summary(self) -> Dict[str, dict]:
+        """{'BTCUSDT 1m': {n, total, auc, brier, hit_rate}, ...}"""
+        return {f"{s} {tf}": m.summary() for (s, tf), m in self._metrics.items()}
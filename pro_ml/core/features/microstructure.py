@@ -28,20 +28,67 @@ def build_features(df: pd.DataFrame, cfg: dict)->pd.DataFrame:
     out["rsi"]=rsi(out["close"], cfg["features"]["rsi_len"])
     tr=true_range(out); atr=tr.rolling(cfg["features"]["atr_len"]).mean()
     out["atr"]=atr.bfill().fillna(0)
-    feats=["ret1","rv","ofi","qi","mp","mp_diff","rsi","atr"]
+    feats=list(FEATURE_COLUMNS)
     out[feats]=out[feats].shift(1); out=out.dropna(); return out
 
-def create_features_from_klines(df: pd.DataFrame)->pd.DataFrame:
+FEATURE_COLUMNS=("ret1","rv","ofi","qi","mp","mp_diff","rsi","atr")
+FUSED_TIMEFRAMES=("1m","3m","5m")
+
+def tf_minutes(tf: str)->int:
+    """ "1m" -> 1, "5m" -> 5, "1h" -> 60 """
+    unit={"m":1,"h":60,"d":1440}[tf[-1]]
+    return int(tf[:-1])*unit
+
+def fused_feature_columns(timeframes=FUSED_TIMEFRAMES)->list:
+    return [f"{c}_{tf}" for tf in timeframes for c in FEATURE_COLUMNS]
+
+def resample_ohlcv(df: pd.DataFrame, minutes: int)->pd.DataFrame:
+    """Agrega velas 1m a velas de `minutes` (índice = apertura de la vela)."""
+    rs=df[["open","high","low","close","volume"]].resample(f"{minutes}min", label="left", closed="left")
+    out=rs.agg({"open":"first","high":"max","low":"min","close":"last","volume":"sum"})
+    return out.dropna(subset=["close"])
+
+def build_fused_features(df: pd.DataFrame, cfg: dict, timeframes=FUSED_TIMEFRAMES)->pd.DataFrame:
     """
-    Crear features a partir de klines usando configuración por defecto
+    Vector de features multitimeframe construido desde un único buffer 1m.
+    Para cada timeframe se agregan las velas 1m, se calculan las features
+    normales y se alinean a cada fila 1m con un asof hacia atrás. Como
+    build_features desplaza las features una vela, la fila de 3m/5m con
+    apertura T solo usa velas cerradas en T: nunca hay lookahead aunque la
+    vela superior actual esté incompleta.
+    Devuelve OHLCV 1m + atr/rv 1m (para etiquetado y SL) + columnas <feature>_<tf>.
     """
-    # Configuración por defecto para features
-    default_cfg = {
-        "features": {
-            "vol_ewm_span": 720,
-            "ofi_window": 120,
-            "rsi_len": 14,
-            "atr_len": 14
-        }
+    base=build_features(df, cfg)
+    out=base[["open","high","low","close","volume","atr","rv"]].copy()
+    for tf in timeframes:
+        mins=tf_minutes(tf)
+        feats=base if mins==1 else build_features(resample_ohlcv(df, mins), cfg)
+        cols=list(FEATURE_COLUMNS)
+        part=feats[cols].rename(columns={c: f"{c}_{tf}" for c in cols})
+        out=pd.merge_asof(out.sort_index(), part.sort_index(), left_index=True, right_index=True, direction="backward")
+    return out.dropna()
+
+DEFAULT_FEATURE_CFG={
+    "features": {
+        "vol_ewm_span": 720,
+        "ofi_window": 120,
+        "rsi_len": 14,
+        "atr_len": 14
     }
-    return build_features(df, default_cfg)
+}
+
+def feature_config(cfg: dict=None)->dict:
+    """Sección `features` de ml.yaml (la del entrenamiento) sobre los valores por defecto"""
+    return {"features": {**DEFAULT_FEATURE_CFG["features"], **((cfg or {}).get("features") or {})}}
+
+def create_features_from_klines(df: pd.DataFrame, cfg: dict=None)->pd.DataFrame:
+    """
+    Crear features a partir de klines (cfg: la de entrenamiento; por defecto DEFAULT_FEATURE_CFG)
+    """
+    return build_features(df, cfg or DEFAULT_FEATURE_CFG)
+
+def create_fused_features_from_klines(df: pd.DataFrame, timeframes=FUSED_TIMEFRAMES, cfg: dict=None)->pd.DataFrame:
+    """
+    Vector fusionado 1m/3m/5m desde klines 1m (cfg: la de entrenamiento; por defecto DEFAULT_FEATURE_CFG)
+    """
+    return build_fused_features(df, cfg or DEFAULT_FEATURE_CFG, timeframes)
@@ -1,11 +1,18 @@
+import math
 import numpy as np, pandas as pd
-def triple_barrier_labels(df: pd.DataFrame, horizon_min:int, pt_mult:float, sl_mult:float, use_atr:bool=True):
+from ..features.microstructure import tf_minutes
+def horizon_bars(horizon_min:int, timeframe:str="1m")->int:
+    """labeling.horizon_min (minutos) -> nº de velas de `timeframe` ("fused" y desconocidos: velas 1m)."""
+    try: minutes=tf_minutes(timeframe or "1m")
+    except (KeyError, ValueError, IndexError): minutes=1
+    return max(1, math.ceil(int(horizon_min)/minutes))
+def triple_barrier_labels(df: pd.DataFrame, horizon_bars:int, pt_mult:float, sl_mult:float, use_atr:bool=True):
     close=df["close"]; scale=df["atr"] if use_atr else df["rv"]
     pt=close*(1+pt_mult*(scale/(close+1e-12)))
     sl=close*(1-sl_mult*(scale/(close+1e-12)))
     idx=df.index; y=np.zeros(len(df),dtype=int); t1=[]
     for i,_ in enumerate(idx):
-        end_i=i+horizon_min
+        end_i=i+horizon_bars
         if end_i>=len(df): t1.append(idx[-1]); y[i]=0; continue
         c0=close.iloc[i]; up,dn=pt.iloc[i], sl.iloc[i]; path=close.iloc[i+1:end_i+1]
         hit_up=(path>=up).idxmax() if (path>=up).any() else None
@@ -1,66 +1,66 @@
-import os
-import joblib
+from typing import Optional
+
+import numpy as np
 import pandas as pd
 
+from pro_ml.core.live.registry import ModelEntry, ModelRegistry
+from pro_ml.core.live.shadow import ShadowScorer
+
 
 class LiveModel:
     """
-    Carga bajo demanda y en caché el modelo por símbolo desde:
+    Carga bajo demanda y en caché el modelo por símbolo y timeframe. La
+    resolución la hace ModelRegistry con fallback:
+      outputs/models/<SYMBOL>/<TF>/best_model.joblib
       outputs/models/<SYMBOL>/best_model.joblib
-      outputs/models/<SYMBOL>/metadata.joblib
+      outputs/models/best_model.joblib            (global)
+    (cada uno con su metadata.joblib)
+
+    Si existe best_model.mmap (y no es más antiguo que el joblib) se mapea en
+    memoria en lugar de deserializar el joblib.
 
     Uso:
       lm = LiveModel(prob_long=0.57, prob_short=0.43)
       decision, p = lm.decide("BTCUSDT", latest_features_row)
+      probs = lm.predict_proba("BTCUSDT", feats_df.iloc[-3:], timeframe="3m")   # sin umbrales
+
+    predict_proba no lee ni modifica prob_long/prob_short, así que es seguro
+    usarlo desde varios hilos con umbrales distintos (ver thresholds.py).
+
+    Con `shadow` (ShadowScorer) las mismas filas se puntúan en segundo plano
+    con el modelo sombra del símbolo, sin añadir latencia (ver shadow.py).
     """
-    def __init__(self, base_dir: str = "outputs/models", prob_long: float = 0.57, prob_short: float = 0.43):
+    def __init__(self, base_dir: str = "outputs/models", prob_long: float = 0.57, prob_short: float = 0.43,
+                 use_mmap: bool = True, shadow: Optional[ShadowScorer] = None):
         self.base_dir = base_dir
         self.prob_long = prob_long
         self.prob_short = prob_short
-        self._models = {}          # symbol -> model
-        self._cols_by_symbol = {}  # symbol -> feature list
-
-    def _paths(self, symbol: str):
-        sd = os.path.join(self.base_dir, symbol.upper())
-        return (
-            os.path.join(sd, "best_model.joblib"),
-            os.path.join(sd, "metadata.joblib"),
-        )
-
-    def load_for(self, symbol: str):
-        symbol = symbol.upper()
-        if symbol in self._models:
-            return
+        self.registry = ModelRegistry(base_dir=base_dir, use_mmap=use_mmap)
+        self.shadow = shadow
 
-        mpath, meta_path = self._paths(symbol)
-        if not os.path.exists(mpath) or not os.path.exists(meta_path):
-            raise FileNotFoundError(f"Modelo no encontrado para {symbol}: {mpath} / {meta_path}")
+    def load_for(self, symbol: str, timeframe: Optional[str] = None) -> ModelEntry:
+        return self.registry.resolve(symbol, timeframe)
 
-        model = joblib.load(mpath)
-        meta = joblib.load(meta_path)
-        cols = meta.get("features")
-        if cols is None:
-            raise ValueError(f"Metadata inválida: 'features' no encontrado para {symbol}")
-
-        self._models[symbol] = model
-        self._cols_by_symbol[symbol] = list(cols)
+    def predict_proba(self, symbol: str, rows, timeframe: Optional[str] = None) -> np.ndarray:
+        """
+        Probabilidades crudas (clase 1) para una fila (Series) o varias
+        (DataFrame) de features. No aplica umbrales.
+        Alinea columnas del modelo y rellena faltantes con 0.
+        """
+        entry = self.load_for(symbol, timeframe)
+        rows = rows.to_frame().T if isinstance(rows, pd.Series) else rows
+        X = rows.reindex(columns=entry.features).fillna(0.0).astype(float)
+        p = np.asarray(entry.model.predict_proba(X)[:, 1], dtype=np.float64)
+        if self.shadow is not None:
+            self.shadow.submit(symbol, timeframe, rows, p)
+        return p
 
-    def decide(self, symbol: str, latest_features_row: pd.Series):
+    def decide(self, symbol: str, latest_features_row: pd.Series, timeframe: Optional[str] = None):
         """
         Devuelve ('LONG'|'SHORT'|'NEUTRAL', prob) para un símbolo.
         Alinea columnas del modelo y rellena faltantes con 0.
         """
-        symbol = symbol.upper()
-        self.load_for(symbol)
-
-        cols = self._cols_by_symbol[symbol]
-        x = latest_features_row.reindex(cols)
-        # Si faltan columnas, rellena con 0
-        x = x.fillna(0.0)
-        X = x.to_frame().T
-
-        model = self._models[symbol]
-        p = float(model.predict_proba(X)[:, 1][0])
+        p = float(self.predict_proba(symbol, latest_features_row, timeframe)[0])
 
         if p >= self.prob_long:
             return "LONG", p
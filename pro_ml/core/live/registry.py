@@ -1,23 +1,125 @@
 
 import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
 import joblib
 
+from pro_ml.core.models.mmap_artifact import ARTIFACT_NAME, artifact_is_fresh, load_artifact
+
+
+@dataclass
+class ModelEntry:
+    """Modelo cargado (joblib o mmap) más su lista de features."""
+    path: str
+    model: object
+    features: List[str]
+    meta: dict = field(default_factory=dict)
+
+
 class ModelRegistry:
-    def __init__(self, base_dir='outputs/models', default_model='best_model.joblib', default_meta='metadata.joblib'):
+    """
+    Resuelve el modelo para (símbolo, timeframe) con una cadena de fallback:
+      1. outputs/models/<SYMBOL>/<TF>/
+      2. outputs/models/<SYMBOL>/            (o el legado <SYMBOL>_best_model.joblib)
+      3. outputs/models/                     (modelo global)
+
+    Cada fichero se carga una sola vez y se comparte entre todas las claves que
+    resuelven a él. La resolución se cachea por clave, de modo que en el hot
+    path get/resolve es un lookup O(1) en un dict.
+    """
+    def __init__(self, base_dir='outputs/models', default_model='best_model.joblib', default_meta='metadata.joblib',
+                 use_mmap: bool = True, miss_ttl: float = 60.0):
         self.base_dir = base_dir
-        self.default_model = os.path.join(base_dir, default_model)
-        self.default_meta  = os.path.join(base_dir, default_meta)
-        self.cache = {}  # symbol -> (model, meta)
-        self.global_pair = (joblib.load(self.default_model), joblib.load(self.default_meta))
-
-    def get(self, symbol: str):
-        if symbol in self.cache:
-            return self.cache[symbol]
-        model_p = os.path.join(self.base_dir, f"{symbol}_best_model.joblib")
-        meta_p  = os.path.join(self.base_dir, f"{symbol}_metadata.joblib")
-        if os.path.exists(model_p) and os.path.exists(meta_p):
-            pair = (joblib.load(model_p), joblib.load(meta_p))
-        else:
-            pair = self.global_pair
-        self.cache[symbol] = pair
-        return pair
+        self.default_model = default_model
+        self.default_meta = default_meta
+        self.use_mmap = use_mmap
+        self.miss_ttl = miss_ttl
+        self.cache: Dict[Tuple[str, Optional[str]], ModelEntry] = {}   # (symbol, tf) -> entry
+        self._by_path: Dict[str, ModelEntry] = {}                         # realpath modelo -> entry
+        self._misses: Dict[Tuple[str, Optional[str]], float] = {}        # (symbol, tf) -> reintentar después de
+        self._lock = threading.Lock()
+
+    def _candidates(self, symbol: str, timeframe: Optional[str]) -> List[Tuple[str, str, str]]:
+        sd = os.path.join(self.base_dir, symbol)
+        dirs = []
+        if timeframe:
+            dirs.append(os.path.join(sd, timeframe))
+        dirs.append(sd)
+        out = [(os.path.join(d, self.default_model), os.path.join(d, self.default_meta), os.path.join(d, ARTIFACT_NAME))
+               for d in dirs]
+        # Nombres planos que genera tools/train_batch.py
+        out.append((os.path.join(self.base_dir, f"{symbol}_best_model.joblib"),
+                    os.path.join(self.base_dir, f"{symbol}_metadata.joblib"), ""))
+        out.append((os.path.join(self.base_dir, self.default_model),
+                    os.path.join(self.base_dir, self.default_meta),
+                    os.path.join(self.base_dir, ARTIFACT_NAME)))
+        return out
+
+    def _load(self, model_p: str, meta_p: str, artifact_p: str) -> ModelEntry:
+        if self.use_mmap and artifact_p and artifact_is_fresh(artifact_p, model_p):
+            key = os.path.realpath(artifact_p)
+            entry = self._by_path.get(key)
+            if entry is None:
+                model = load_artifact(artifact_p)
+                # metadata.joblib (si existe) aporta referencias de drift, métricas...
+                meta = joblib.load(meta_p) if os.path.exists(meta_p) else {}
+                meta.update({"features": list(model.features), "artifact_sha256": model.content_hash})
+                entry = ModelEntry(path=key, model=model, features=list(model.features), meta=meta)
+                self._by_path[key] = entry
+            return entry
+
+        key = os.path.realpath(model_p)
+        entry = self._by_path.get(key)
+        if entry is None:
+            meta = joblib.load(meta_p)
+            cols = meta.get("features")
+            if cols is None:
+                raise ValueError(f"Metadata inválida: 'features' no encontrado en {meta_p}")
+            entry = ModelEntry(path=key, model=joblib.load(model_p), features=list(cols), meta=meta)
+            self._by_path[key] = entry
+        return entry
+
+    def resolve(self, symbol: str, timeframe: Optional[str] = None) -> ModelEntry:
+        key = (symbol.upper(), timeframe)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                return entry
+            if self._misses.get(key, 0.0) > time.monotonic():
+                raise FileNotFoundError(f"Modelo no encontrado para {key[0]} {timeframe or ''}".strip())
+
+            for model_p, meta_p, artifact_p in self._candidates(key[0], timeframe):
+                has_joblib = os.path.exists(model_p) and os.path.exists(meta_p)
+                if has_joblib or (self.use_mmap and artifact_p and os.path.exists(artifact_p)):
+                    entry = self._load(model_p, meta_p, artifact_p)
+                    self.cache[key] = entry
+                    self._misses.pop(key, None)
+                    return entry
+
+            self._misses[key] = time.monotonic() + self.miss_ttl
+        raise FileNotFoundError(f"Modelo no encontrado para {key[0]} {timeframe or ''} en {self.base_dir}".strip())
+
+    def get(self, symbol: str, timeframe: Optional[str] = None):
+        """Compatibilidad: devuelve (model, meta)."""
+        entry = self.resolve(symbol, timeframe)
+        return entry.model, entry.meta
+
+    def resolved_path(self, symbol: str, timeframe: Optional[str] = None) -> Optional[str]:
+        try:
+            return self.resolve(symbol, timeframe).path
+        except FileNotFoundError:
+            return None
+
+    def invalidate(self) -> None:
+        """Olvida resoluciones y modelos cargados (p.ej. tras reentrenar)."""
+        with self._lock:
+            self.cache = {}
+            self._by_path = {}
+            self._misses = {}
@@ -0,0 +1,197 @@
+"""
+Evaluación en sombra de modelos candidatos.
+
+Un modelo sombra vive en outputs/models/<SYMBOL>/[<TF>/]shadow/ (lo escribe
+train_batch_binance con SHADOW=1). LiveModel entrega a ShadowScorer las mismas
+filas de features que acaba de puntuar; un hilo de fondo puntúa el modelo
+sombra y guarda ambas probabilidades en ficheros .npz columnares:
+
+  outputs/shadow/<SYMBOL>/<ts_primera_fila>_<n>.npz  ->  ts, tf, live_p, shadow_p
+
+El hot path solo hace un put_nowait en una cola acotada: si la cola está
+llena la muestra se descarta y se cuenta, nunca se bloquea la decisión.
+Comparar después con `python -m pro_ml.tools.shadow_report`.
+"""
+
+import logging
+import os
+import queue
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from pro_ml.core.live.registry import ModelEntry
+from pro_ml.core.models.mmap_artifact import ARTIFACT_NAME, artifact_is_fresh, load_artifact
+
+log = logging.getLogger("shadow")
+
+SHADOW_DIR = "shadow"
+
+
+def index_to_ms(index) -> np.ndarray:
+    """Índice de filas -> timestamps epoch ms (UTC). Índices no temporales -> ahora."""
+    if isinstance(index, pd.DatetimeIndex):
+        idx = index.tz_convert("UTC").tz_localize(None) if index.tz is not None else index
+        return idx.as_unit("ms").asi8.astype(np.int64)
+    now = pd.Timestamp.now(tz="UTC").value // 10**6
+    return np.full(len(index), now, dtype=np.int64)
+
+
+class ShadowScorer:
+    """
+    Puntúa modelos sombra fuera del hot path.
+
+    Args:
+        base_dir: directorio de modelos (outputs/models)
+        log_dir: destino de los .npz con live_p/shadow_p
+        maxsize: tamaño de la cola; al llenarse se descarta (stats['dropped'])
+        flush_rows: filas acumuladas por símbolo antes de escribir un chunk
+    """
+
+    def __init__(self, base_dir: str = "outputs/models", log_dir: str = "outputs/shadow",
+                 maxsize: int = 1024, flush_rows: int = 256, use_mmap: bool = True):
+        self.base_dir = base_dir
+        self.log_dir = log_dir
+        self.flush_rows = flush_rows
+        self.use_mmap = use_mmap
+        self.queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self.stats = {"submitted": 0, "dropped": 0, "scored": 0, "written": 0, "errors": 0}
+
+        # Solo los usa el hilo de fondo
+        self._models: Dict[Tuple[str, Optional[str]], Optional[ModelEntry]] = {}
+        self._buffers: Dict[str, List[tuple]] = {}
+        self._chunks = 0
+        # Símbolos sin modelo sombra: el hot path los descarta sin encolar
+        self._absent = set()
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="shadow-scorer", daemon=True)
+        self._thread.start()
+
+    # --- hot path -------------------------------------------------------
+    def submit(self, symbol: str, timeframe: Optional[str], rows: pd.DataFrame, live_p: np.ndarray) -> bool:
+        """Encola filas ya puntuadas por el modelo live. Nunca bloquea."""
+        symbol = symbol.upper()
+        if not self._running or symbol in self._absent:
+            return False
+        try:
+            self.queue.put_nowait((symbol, timeframe, rows, live_p))
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+        self.stats["submitted"] += 1
+        return True
+
+    # --- hilo de fondo --------------------------------------------------
+    def _shadow_dirs(self, symbol: str, timeframe: Optional[str]) -> List[str]:
+        sd = os.path.join(self.base_dir, symbol)
+        dirs = [os.path.join(sd, timeframe, SHADOW_DIR)] if timeframe else []
+        return dirs + [os.path.join(sd, SHADOW_DIR)]
+
+    def _load(self, symbol: str, timeframe: Optional[str]) -> Optional[ModelEntry]:
+        key = (symbol, timeframe)
+        if key in self._models:
+            return self._models[key]
+        entry = None
+        for d in self._shadow_dirs(symbol, timeframe):
+            model_p = os.path.join(d, "best_model.joblib")
+            meta_p = os.path.join(d, "metadata.joblib")
+            artifact_p = os.path.join(d, ARTIFACT_NAME)
+            try:
+                if self.use_mmap and artifact_is_fresh(artifact_p, model_p):
+                    model = load_artifact(artifact_p)
+                    entry = ModelEntry(path=artifact_p, model=model, features=list(model.features))
+                elif os.path.exists(model_p) and os.path.exists(meta_p):
+                    meta = joblib.load(meta_p)
+                    entry = ModelEntry(path=model_p, model=joblib.load(model_p), features=list(meta["features"]), meta=meta)
+            except Exception as e:
+                log.warning(f"⚠️ No se pudo cargar modelo sombra en {d}: {e}")
+            if entry is not None:
+                log.info(f"👥 Modelo sombra para {symbol} {timeframe or ''}: {entry.path}")
+                break
+        self._models[key] = entry
+        if entry is None and not self._has_shadow_dir(symbol):
+            self._absent.add(symbol)
+        return entry
+
+    def _has_shadow_dir(self, symbol: str) -> bool:
+        sd = os.path.join(self.base_dir, symbol)
+        if not os.path.isdir(sd):
+            return False
+        return os.path.isdir(os.path.join(sd, SHADOW_DIR)) or any(
+            os.path.isdir(os.path.join(sd, d, SHADOW_DIR)) for d in os.listdir(sd))
+
+    def _score(self, symbol, timeframe, rows, live_p) -> None:
+        entry = self._load(symbol, timeframe)
+        if entry is None or not set(entry.features).issubset(rows.columns):
+            return
+        X = rows.reindex(columns=entry.features).fillna(0.0).astype(float)
+        shadow_p = np.asarray(entry.model.predict_proba(X)[:, 1], dtype=np.float32)
+        buf = self._buffers.setdefault(symbol, [])
+        buf.append((index_to_ms(rows.index), timeframe or "", np.asarray(live_p, dtype=np.float32), shadow_p))
+        self.stats["scored"] += len(shadow_p)
+        if sum(len(b[0]) for b in buf) >= self.flush_rows:
+            self._flush_symbol(symbol)
+
+    def _flush_symbol(self, symbol: str) -> None:
+        buf = self._buffers.pop(symbol, None)
+        if not buf:
+            return
+        ts = np.concatenate([b[0] for b in buf])
+        tf = np.concatenate([np.full(len(b[0]), b[1], dtype="U8") for b in buf])
+        live_p = np.concatenate([b[2] for b in buf])
+        shadow_p = np.concatenate([b[3] for b in buf])
+        out_dir = os.path.join(self.log_dir, symbol)
+        os.makedirs(out_dir, exist_ok=True)
+        self._chunks += 1
+        path = os.path.join(out_dir, f"{int(ts[0])}_{self._chunks:06d}.npz")
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(tmp, ts=ts, tf=tf, live_p=live_p, shadow_p=shadow_p)
+        os.replace(tmp, path)
+        self.stats["written"] += len(ts)
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    break
+                if item == "flush":
+                    for sym in list(self._buffers):
+                        self._flush_symbol(sym)
+                    continue
+                if item == "reload":
+                    self._models = {}
+                    continue
+                self._score(*item)
+            except Exception as e:
+                self.stats["errors"] += 1
+                log.error(f"❌ Error en evaluación sombra: {e}")
+            finally:
+                self.queue.task_done()
+        for sym in list(self._buffers):
+            self._flush_symbol(sym)
+
+    # --- control --------------------------------------------------------
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Espera a que se procese lo encolado y escribe los buffers a disco."""
+        self.queue.put("flush", timeout=timeout)
+        self.queue.join()
+
+    def reload(self) -> None:
+        """Olvida modelos sombra cargados (p.ej. tras reentrenar con SHADOW=1)."""
+        self._absent = set()
+        self.queue.put("reload")
+
+    def close(self, timeout: float = 5.0) -> None:
+        if not self._running:
+            return
+        self._running = False
+        self.queue.put(None)
+        self._thread.join(timeout)
+
+    def get_statistics(self) -> dict:
+        return dict(self.stats, queued=self.queue.qsize())
@@ -0,0 +1,176 @@
+"""
+Umbrales de decisión separados del scoring del modelo.
+
+LiveModel solo devuelve probabilidades; una ThresholdTable inmutable las
+convierte en señales y confianza por (símbolo, timeframe) con operaciones
+vectorizadas. ThresholdStore recarga la tabla desde configs/ml.yaml cuando
+cambia el fichero, sustituyendo la referencia de forma atómica: los lectores
+concurrentes siempre ven una tabla completa y nunca una mezcla.
+"""
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+
+import numpy as np
+import yaml
+
+log = logging.getLogger("thresholds")
+
+SIGNAL_LONG = "LONG"
+SIGNAL_SHORT = "SHORT"
+SIGNAL_NEUTRAL = "NEUTRAL"
+
+
+@dataclass(frozen=True)
+class Thresholds:
+    prob_long: float
+    prob_short: float
+
+
+def classify(probs, prob_long, prob_short) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Señal y confianza vectorizadas. prob_long/prob_short pueden ser escalares o
+    arrays del mismo tamaño que probs (una fila por clave).
+
+    Confianza:
+      LONG    -> (p - long) / (1 - long)
+      SHORT   -> (short - p) / short
+      NEUTRAL -> 1 - distancia al centro / distancia máxima al centro
+    """
+    p = np.asarray(probs, dtype=np.float64)
+    pl = np.asarray(prob_long, dtype=np.float64)
+    ps = np.asarray(prob_short, dtype=np.float64)
+
+    is_long = p >= pl
+    is_short = ~is_long & (p <= ps)
+    signals = np.where(is_long, SIGNAL_LONG, np.where(is_short, SIGNAL_SHORT, SIGNAL_NEUTRAL))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        conf_long = (p - pl) / (1.0 - pl)
+        conf_short = (ps - p) / ps
+        center = (pl + ps) / 2.0
+        max_dist = np.maximum(np.abs(pl - center), np.abs(ps - center))
+        conf_neutral = 1.0 - np.abs(p - center) / max_dist
+    confidence = np.where(is_long, conf_long, np.where(is_short, conf_short, conf_neutral))
+    confidence = np.clip(np.nan_to_num(confidence, nan=0.0), 0.0, 1.0)
+    return signals, confidence
+
+
+class ThresholdTable:
+    """
+    Tabla inmutable de umbrales. Orden de resolución:
+      (símbolo, timeframe) -> (símbolo, *) -> (*, timeframe) -> serving por defecto
+    """
+
+    def __init__(self, default: Thresholds,
+                 by_timeframe: Optional[Mapping[str, Thresholds]] = None,
+                 by_symbol: Optional[Mapping[Tuple[str, Optional[str]], Thresholds]] = None):
+        self.default = default
+        self._by_timeframe = MappingProxyType(dict(by_timeframe or {}))
+        self._by_symbol = MappingProxyType(dict(by_symbol or {}))
+
+    def get(self, symbol: Optional[str], timeframe: Optional[str] = None) -> Thresholds:
+        sym = symbol.upper() if symbol else None
+        if sym is not None:
+            th = self._by_symbol.get((sym, timeframe)) or self._by_symbol.get((sym, None))
+            if th is not None:
+                return th
+        return self._by_timeframe.get(timeframe, self.default)
+
+    def classify(self, probs, symbol: Optional[str], timeframe: Optional[str] = None):
+        th = self.get(symbol, timeframe)
+        return classify(probs, th.prob_long, th.prob_short)
+
+    def classify_keys(self, probs, symbols, timeframes):
+        """Clasifica filas de distintas claves en una sola pasada vectorizada."""
+        ths = [self.get(s, tf) for s, tf in zip(symbols, timeframes)]
+        return classify(probs, [t.prob_long for t in ths], [t.prob_short for t in ths])
+
+    @staticmethod
+    def _parse(node: dict, fallback: Thresholds) -> Thresholds:
+        return Thresholds(
+            prob_long=float(node.get("prob_long", fallback.prob_long)),
+            prob_short=float(node.get("prob_short", fallback.prob_short)),
+        )
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "ThresholdTable":
+        """
+        Construye la tabla desde la sección `serving` de ml.yaml:
+
+          serving:
+            prob_long: 0.57
+            prob_short: 0.43
+            timeframes:
+              3m: {prob_long: 0.55, prob_short: 0.45}
+            symbols:
+              BTCUSDT: {prob_long: 0.60, 5m: {prob_long: 0.58}}
+        """
+        serv = (cfg or {}).get("serving", {}) or {}
+        default = Thresholds(float(serv.get("prob_long", 0.57)), float(serv.get("prob_short", 0.43)))
+
+        by_tf: Dict[str, Thresholds] = {}
+        for tf, node in (serv.get("timeframes") or {}).items():
+            by_tf[str(tf)] = cls._parse(node or {}, default)
+
+        by_sym: Dict[Tuple[str, Optional[str]], Thresholds] = {}
+        for sym, node in (serv.get("symbols") or {}).items():
+            node = node or {}
+            sym = str(sym).upper()
+            base = cls._parse(node, default) if ("prob_long" in node or "prob_short" in node) else None
+            if base is not None:
+                by_sym[(sym, None)] = base
+            for tf, tf_node in node.items():
+                if isinstance(tf_node, dict):
+                    parent = base or by_tf.get(str(tf), default)
+                    by_sym[(sym, str(tf))] = cls._parse(tf_node, parent)
+
+        return cls(default, by_tf, by_sym)
+
+
+class ThresholdStore:
+    """
+    Referencia recargable a la ThresholdTable actual.
+    current() comprueba el mtime del YAML como mucho cada `check_interval` s.
+    """
+
+    def __init__(self, cfg_path: str = "configs/ml.yaml", check_interval: float = 5.0):
+        self.cfg_path = cfg_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._next_check = 0.0
+        self._table = ThresholdTable(Thresholds(0.57, 0.43))
+        self.reload()
+
+    def reload(self) -> bool:
+        """Recarga la tabla; si el YAML es inválido se mantiene la anterior."""
+        try:
+            mtime = os.path.getmtime(self.cfg_path)
+            with open(self.cfg_path, "r") as f:
+                cfg = yaml.safe_load(f) or {}
+            table = ThresholdTable.from_config(cfg)
+        except Exception as e:
+            log.warning(f"⚠️ No se pudieron cargar umbrales desde {self.cfg_path}: {e}")
+            return False
+        with self._lock:
+            self._table = table
+            self._mtime = mtime
+        log.info(f"🎚️ Umbrales cargados desde {self.cfg_path}")
+        return True
+
+    def current(self) -> ThresholdTable:
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            try:
+                if os.path.getmtime(self.cfg_path) != self._mtime:
+                    self.reload()
+            except OSError:
+                pass
+        return self._table
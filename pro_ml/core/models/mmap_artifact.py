@@ -0,0 +1,275 @@
+"""
+Artefacto de modelo mapeable en memoria (best_model.mmap).
+
+Guarda los árboles de XGBoost y los calibradores isotónicos de un
+CalibratedClassifierCV como arrays numéricos planos dentro de un único
+fichero binario. Al cargarlo con mmap no se deserializa nada: los arrays
+apuntan directamente a las páginas del fichero, que el sistema operativo
+comparte entre todos los procesos del bot que usan el mismo modelo.
+
+Formato:
+  MAGIC (8 bytes) | uint64 largo de cabecera | cabecera JSON | padding | datos
+La cabecera incluye versión, hash sha256 de la sección de datos, la lista de
+features de metadata.joblib y la tabla de arrays (dtype, shape, offset).
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, List
+
+import numpy as np
+
+MAGIC = b"PBMMAP01"
+VERSION = 1
+ARTIFACT_NAME = "best_model.mmap"
+_ALIGN = 64
+
+
+def _pad(n: int) -> int:
+    return (-n) % _ALIGN
+
+
+def _base_margin(learner: dict) -> float:
+    raw = str(learner["learner_model_param"]["base_score"]).strip("[]")
+    base_score = float(raw)
+    # binary:logistic guarda base_score en espacio de probabilidad
+    base_score = min(max(base_score, 1e-7), 1 - 1e-7)
+    return float(np.log(base_score / (1.0 - base_score)))
+
+
+def _flatten_booster(booster) -> Dict[str, np.ndarray]:
+    """Convierte un Booster binario en arrays globales de nodos."""
+    learner = json.loads(booster.save_raw("json"))["learner"]
+    objective = learner["objective"]["name"]
+    if objective != "binary:logistic":
+        raise ValueError(f"Objetivo no soportado para artefacto mmap: {objective}")
+
+    left, right, feat, thr, dflt, roots = [], [], [], [], [], []
+    offset = 0
+    for tree in learner["gradient_booster"]["model"]["trees"]:
+        if any(tree.get("split_type", [])):
+            raise ValueError("Splits categóricos no soportados en artefacto mmap")
+        lc = np.asarray(tree["left_children"], dtype=np.int32)
+        rc = np.asarray(tree["right_children"], dtype=np.int32)
+        is_leaf = lc == -1
+        roots.append(offset)
+        left.append(np.where(is_leaf, -1, lc + offset).astype(np.int32))
+        right.append(np.where(is_leaf, -1, rc + offset).astype(np.int32))
+        feat.append(np.where(is_leaf, 0, tree["split_indices"]).astype(np.int32))
+        # En hojas split_conditions contiene el valor de la hoja
+        thr.append(np.asarray(tree["split_conditions"], dtype=np.float32))
+        dflt.append(np.asarray(tree["default_left"], dtype=np.uint8))
+        offset += len(lc)
+
+    return {
+        "left": np.concatenate(left),
+        "right": np.concatenate(right),
+        "feature": np.concatenate(feat),
+        "threshold": np.concatenate(thr),
+        "default_left": np.concatenate(dflt),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "_base_margin": _base_margin(learner),
+    }
+
+
+def _members(model) -> List[tuple]:
+    """(booster, calibrador|None) por cada clasificador del modelo."""
+    calibrated = getattr(model, "calibrated_classifiers_", None)
+    if calibrated:
+        out = []
+        for cc in calibrated:
+            cal = cc.calibrators[0]
+            if not hasattr(cal, "X_thresholds_"):
+                raise ValueError("Solo se soporta calibración isotónica en artefacto mmap")
+            out.append((cc.estimator.get_booster(), cal))
+        return out
+    if hasattr(model, "get_booster"):
+        return [(model.get_booster(), None)]
+    raise ValueError(f"Modelo no soportado para artefacto mmap: {type(model).__name__}")
+
+
+def export_artifact(model, features: List[str], path: str) -> str:
+    """
+    Escribe el artefacto mmap del modelo en `path` (escritura atómica).
+    Devuelve el hash sha256 de la sección de datos.
+    """
+    arrays: Dict[str, np.ndarray] = {}
+    members = []
+    for i, (booster, cal) in enumerate(_members(model)):
+        flat = _flatten_booster(booster)
+        base_margin = flat.pop("_base_margin")
+        for k, v in flat.items():
+            arrays[f"m{i}.{k}"] = v
+        if cal is not None:
+            arrays[f"m{i}.cal_x"] = np.asarray(cal.X_thresholds_, dtype=np.float64)
+            arrays[f"m{i}.cal_y"] = np.asarray(cal.y_thresholds_, dtype=np.float64)
+        members.append({"base_margin": base_margin, "calibrated": cal is not None})
+
+    table = {}
+    blobs = []
+    pos = 0
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        blob = arr.astype(arr.dtype.newbyteorder("<"), copy=False).tobytes()
+        table[name] = {"dtype": arr.dtype.newbyteorder("<").str, "shape": list(arr.shape), "offset": pos}
+        blobs.append(blob)
+        blobs.append(b"\0" * _pad(len(blob)))
+        pos += len(blob) + _pad(len(blob))
+    data = b"".join(blobs)
+    content_hash = hashlib.sha256(data).hexdigest()
+
+    header = json.dumps({
+        "version": VERSION,
+        "content_hash": content_hash,
+        "features": list(features),
+        "objective": "binary:logistic",
+        "members": members,
+        "arrays": table,
+    }).encode("utf-8")
+    prefix_len = len(MAGIC) + 8 + len(header)
+    header += b" " * _pad(prefix_len)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(MAGIC)
+        fh.write(struct.pack("<Q", len(header)))
+        fh.write(header)
+        fh.write(data)
+    os.replace(tmp, path)
+    return content_hash
+
+
+def read_header(path: str) -> dict:
+    """Lee solo la cabecera (features, hash...) sin mapear los datos."""
+    with open(path, "rb") as fh:
+        if fh.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"No es un artefacto mmap: {path}")
+        (hlen,) = struct.unpack("<Q", fh.read(8))
+        return json.loads(fh.read(hlen).decode("utf-8"))
+
+
+class MappedModel:
+    """
+    Modelo respaldado por un fichero mmap de solo lectura.
+    Expone predict_proba(X) con la misma semántica que el joblib original.
+    """
+
+    def __init__(self, path: str, verify: bool = False):
+        self.path = path
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"No es un artefacto mmap: {path}")
+        (hlen,) = struct.unpack_from("<Q", self._mm, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.header = json.loads(bytes(self._mm[start:start + hlen]).decode("utf-8"))
+        if self.header.get("version") != VERSION:
+            raise ValueError(f"Versión de artefacto no soportada: {self.header.get('version')}")
+        self._data_start = start + hlen
+        self.features: List[str] = list(self.header["features"])
+        self.content_hash: str = self.header["content_hash"]
+        if verify:
+            self.verify()
+
+        self._members = []
+        for i, m in enumerate(self.header["members"]):
+            arr = {k: self._array(f"m{i}.{k}") for k in ("left", "right", "feature", "threshold", "default_left", "roots")}
+            if m.get("calibrated"):
+                arr["cal_x"] = self._array(f"m{i}.cal_x")
+                arr["cal_y"] = self._array(f"m{i}.cal_y")
+            arr["base_margin"] = float(m["base_margin"])
+            self._members.append(arr)
+
+    def _array(self, name: str) -> np.ndarray:
+        spec = self.header["arrays"][name]
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"])) if spec["shape"] else 1
+        arr = np.frombuffer(self._mm, dtype=dtype, count=count, offset=self._data_start + spec["offset"])
+        return arr.reshape(spec["shape"])
+
+    def verify(self) -> None:
+        """Recalcula el hash de la sección de datos (lee todo el fichero)."""
+        digest = hashlib.sha256(memoryview(self._mm)[self._data_start:]).hexdigest()
+        if digest != self.content_hash:
+            raise ValueError(f"Hash inválido en {self.path}: {digest} != {self.content_hash}")
+
+    def _to_matrix(self, X) -> np.ndarray:
+        if hasattr(X, "columns"):
+            X = X.reindex(columns=self.features)
+            X = X.to_numpy(dtype=np.float32, na_value=np.nan)
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return X
+
+    @staticmethod
+    def _margin(m: dict, X: np.ndarray) -> np.ndarray:
+        n = X.shape[0]
+        rows = np.arange(n)[:, None]
+        node = np.broadcast_to(m["roots"], (n, len(m["roots"]))).copy()
+        left, right = m["left"], m["right"]
+        while True:
+            lc = left[node]
+            active = lc != -1
+            if not active.any():
+                break
+            fv = X[rows, m["feature"][node]]
+            go_left = np.where(np.isnan(fv), m["default_left"][node] == 1, fv < m["threshold"][node])
+            node = np.where(active, np.where(go_left, lc, right[node]), node)
+        return m["base_margin"] + m["threshold"][node].sum(axis=1, dtype=np.float64)
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = self._to_matrix(X)
+        p = np.zeros(X.shape[0], dtype=np.float64)
+        for m in self._members:
+            # XGBoost entrega probabilidades float32 al calibrador
+            pm = (1.0 / (1.0 + np.exp(-self._margin(m, X)))).astype(np.float32)
+            if "cal_x" in m:
+                pm = np.interp(pm, m["cal_x"], m["cal_y"])
+            p += pm
+        p /= len(self._members)
+        return np.column_stack([1.0 - p, p])
+
+
+def load_artifact(path: str, verify: bool = False) -> MappedModel:
+    return MappedModel(path, verify=verify)
+
+
+def artifact_is_fresh(artifact_path: str, model_path: str) -> bool:
+    """True si el artefacto existe y no es más antiguo que el joblib."""
+    if not os.path.exists(artifact_path):
+        return False
+    if not os.path.exists(model_path):
+        return True
+    return os.path.getmtime(artifact_path) >= os.path.getmtime(model_path)
+
+
+def convert_dir(base_dir: str = "outputs/models", force: bool = False) -> int:
+    """Genera best_model.mmap para cada outputs/models/<SYMBOL>/ existente."""
+    import joblib
+
+    done = 0
+    for root, _dirs, files in os.walk(base_dir):
+        if "best_model.joblib" not in files or "metadata.joblib" not in files:
+            continue
+        mpath = os.path.join(root, "best_model.joblib")
+        apath = os.path.join(root, ARTIFACT_NAME)
+        if not force and artifact_is_fresh(apath, mpath):
+            continue
+        try:
+            meta = joblib.load(os.path.join(root, "metadata.joblib"))
+            digest = export_artifact(joblib.load(mpath), meta["features"], apath)
+            print(f"[{root}] artefacto mmap -> {apath} sha256={digest[:12]}")
+            done += 1
+        except Exception as e:
+            print(f"[{root}] no se pudo exportar artefacto mmap: {e}")
+    return done
+
+
+if __name__ == "__main__":
+    convert_dir(sys.argv[1] if len(sys.argv) > 1 else "outputs/models",
+                force=os.getenv("FORCE_EXPORT", "0") in ("1", "true", "True", "YES", "yes"))
@@ -4,7 +4,9 @@ ML Inference Engine para multitimeframe - Usando LiveModel existente
 """
 
 import logging
+import os
 import numpy as np
+import yaml
 import pandas as pd
 from typing import Dict, List, Optional, Any
 from pathlib import Path
@@ -20,27 +22,40 @@ live_model_module = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(live_model_module)
 LiveModel = live_model_module.LiveModel
 
-from pro_ml.core.features.microstructure import create_features_from_klines
+from pro_ml.core.features.microstructure import (
+    DEFAULT_FEATURE_CFG, FUSED_TIMEFRAMES, create_features_from_klines, create_fused_features_from_klines,
+    feature_config, fused_feature_columns, tf_minutes,
+)
+from pro_ml.core.eval.drift import DriftMonitor
+from pro_ml.core.eval.online import OnlineEvaluator
+from pro_ml.core.live.shadow import ShadowScorer
+from pro_ml.core.live.thresholds import ThresholdStore
 
 log = logging.getLogger("ml_inference")
 
 class MLInferenceEngine:
     """Engine de inferencia ML para múltiples timeframes"""
     
-    def __init__(self, base_model_dir: str = "outputs/models"):
+    SIGNAL_MAP = {'LONG': 'BUY', 'SHORT': 'SELL', 'NEUTRAL': 'HOLD'}
+    FUSED_TIMEFRAME = 'fused'  # subdirectorio del modelo y clave de umbrales
+    
+    def __init__(self, base_model_dir: str = "outputs/models", cfg_path: str = "configs/ml.yaml"):
         """
         Args:
             base_model_dir: Directorio base donde están los modelos por símbolo
+            cfg_path: YAML con los umbrales por timeframe (serving.timeframes)
         """
         self.base_model_dir = base_model_dir
+        self.cfg_path = cfg_path
         self.live_model = None
+        self.shadow = None
+        self.online = None
+        self.drift = None
+        self.feature_cfg = DEFAULT_FEATURE_CFG  # se sustituye por la de ml.yaml en initialize()
         
-        # Configuración de probabilidades por timeframe
-        self.timeframe_config = {
-            '1m': {'prob_long': 0.57, 'prob_short': 0.43},
-            '3m': {'prob_long': 0.55, 'prob_short': 0.45}, 
-            '5m': {'prob_long': 0.53, 'prob_short': 0.47}
-        }
+        # Umbrales por (símbolo, timeframe): tabla inmutable recargable en caliente.
+        # El LiveModel solo puntúa; nunca se modifican sus prob_long/prob_short.
+        self.thresholds = ThresholdStore(cfg_path)
         
         # Cache de features por símbolo/timeframe
         self.feature_cache = {}
@@ -59,11 +74,36 @@ class MLInferenceEngine:
     async def initialize(self):
         """Inicializar el engine"""
         try:
+            with open(self.cfg_path, "r") as f:
+                cfg = yaml.safe_load(f) or {}
+                
+            # Métricas online: cada predicción se une a su etiqueta de triple barrera
+            self.online = OnlineEvaluator.from_config(cfg)
+            
+            # Features live con la misma configuración que el entrenamiento (ml.yaml)
+            self.feature_cfg = feature_config(cfg)
+            
+            # Drift de features contra los histogramas de referencia del modelo
+            # (PSI/KS corre en su propio hilo)
+            self.drift = DriftMonitor.from_config(cfg, self.feature_cfg).start()
+            
+            # Evaluación en sombra opcional (serving.shadow en ml.yaml o SHADOW_EVAL=1)
+            shadow_cfg = (cfg.get('serving', {}) or {}).get('shadow', {}) or {}
+            shadow_on = os.getenv("SHADOW_EVAL", str(shadow_cfg.get('enabled', False)))
+            if shadow_on in ("1", "true", "True", "YES", "yes"):
+                self.shadow = ShadowScorer(
+                    base_dir=self.base_model_dir,
+                    log_dir=shadow_cfg.get('log_dir', 'outputs/shadow'),
+                    maxsize=int(shadow_cfg.get('queue_size', 1024)),
+                )
+                log.info(f"👥 Shadow evaluation enabled -> {self.shadow.log_dir}")
+            
             # Crear el LiveModel con configuración base
             self.live_model = LiveModel(
                 base_dir=self.base_model_dir,
                 prob_long=0.55,
-                prob_short=0.45
+                prob_short=0.45,
+                shadow=self.shadow
             )
             
             log.info("✅ LiveModel initialized successfully")
@@ -79,7 +119,8 @@ class MLInferenceEngine:
                     model_file = symbol_dir / "best_model.joblib"
                     meta_file = symbol_dir / "metadata.joblib"
                     status = "✅" if model_file.exists() and meta_file.exists() else "❌"
-                    log.info(f"  {status} {symbol_dir.name}")
+                    variants = sorted(d.name for d in symbol_dir.iterdir() if (d / "best_model.joblib").exists())
+                    log.info(f"  {status} {symbol_dir.name}" + (f" (variantes: {', '.join(variants)})" if variants else ""))
             else:
                 log.warning(f"⚠️ Model directory {model_dir} does not exist")
                 
@@ -109,74 +150,41 @@ class MLInferenceEngine:
             if features is None or features.empty:
                 return None
                 
-            # Obtener la última fila de features
-            latest_features = features.iloc[-1]
+            # Probabilidad cruda del modelo (sin umbrales); el registro resuelve
+            # <SYMBOL>/<TF>/ -> <SYMBOL>/ -> modelo global
+            probability = float(self.live_model.predict_proba(symbol, features.iloc[[-1]], timeframe)[0])
             
-            # Obtener configuración específica del timeframe
-            tf_config = self.timeframe_config.get(timeframe, {
-                'prob_long': 0.55, 
-                'prob_short': 0.45
-            })
+            # Umbrales del timeframe desde la tabla inmutable actual
+            signals, confidences = self.thresholds.current().classify([probability], symbol, timeframe)
+            signal = str(signals[0])
+            confidence = float(confidences[0])
+            self._track_outcome(symbol, timeframe, features.iloc[-1], probability, signal)
+            self._track_drift(symbol, timeframe, features.iloc[-1], len(kline_buffer))
             
-            # Actualizar probabilidades del modelo temporalmente
-            original_long = self.live_model.prob_long
-            original_short = self.live_model.prob_short
+            # Mapear señales
+            mapped_signal = self.SIGNAL_MAP[signal]
             
-            self.live_model.prob_long = tf_config['prob_long']
-            self.live_model.prob_short = tf_config['prob_short']
+            # Actualizar estadísticas
+            self.stats['predictions_made'] += 1
+            if timeframe not in self.stats['by_timeframe']:
+                self.stats['by_timeframe'][timeframe] = 0
+            self.stats['by_timeframe'][timeframe] += 1
             
-            try:
-                # Hacer la predicción
-                signal, probability = self.live_model.decide(symbol, latest_features)
-                
-                # Mapear señales
-                if signal == "LONG":
-                    mapped_signal = "BUY"
-                elif signal == "SHORT":
-                    mapped_signal = "SELL"
-                else:
-                    mapped_signal = "HOLD"
-                    
-                # Calcular confianza basada en qué tan lejos está la probabilidad del umbral
-                if signal == "LONG":
-                    confidence = min(1.0, (probability - tf_config['prob_long']) / (1.0 - tf_config['prob_long']))
-                elif signal == "SHORT":
-                    confidence = min(1.0, (tf_config['prob_short'] - probability) / tf_config['prob_short'])
-                else:
-                    # Para NEUTRAL, confianza basada en qué tan cerca está del centro
-                    center = (tf_config['prob_long'] + tf_config['prob_short']) / 2
-                    distance_from_center = abs(probability - center)
-                    max_distance = max(abs(tf_config['prob_long'] - center), abs(tf_config['prob_short'] - center))
-                    confidence = 1.0 - (distance_from_center / max_distance)
-                    
-                confidence = max(0.0, min(1.0, confidence))
-                
-                # Actualizar estadísticas
-                self.stats['predictions_made'] += 1
-                if timeframe not in self.stats['by_timeframe']:
-                    self.stats['by_timeframe'][timeframe] = 0
-                self.stats['by_timeframe'][timeframe] += 1
-                
-                if symbol not in self.stats['by_symbol']:
-                    self.stats['by_symbol'][symbol] = 0
-                self.stats['by_symbol'][symbol] += 1
-                
-                self.stats['signal_distribution'][mapped_signal] += 1
-                
-                log.debug(f"🎯 {symbol} {timeframe}: {mapped_signal} (p={probability:.3f}, conf={confidence:.3f})")
-                
-                return {
-                    'signal': mapped_signal,
-                    'confidence': confidence,
-                    'probability': probability,
-                    'timeframe': timeframe,
-                    'symbol': symbol
-                }
-                
-            finally:
-                # Restaurar probabilidades originales
-                self.live_model.prob_long = original_long
-                self.live_model.prob_short = original_short
+            if symbol not in self.stats['by_symbol']:
+                self.stats['by_symbol'][symbol] = 0
+            self.stats['by_symbol'][symbol] += 1
+            
+            self.stats['signal_distribution'][signal] += 1
+            
+            log.debug(f"🎯 {symbol} {timeframe}: {mapped_signal} (p={probability:.3f}, conf={confidence:.3f})")
+            
+            return {
+                'signal': mapped_signal,
+                'confidence': confidence,
+                'probability': probability,
+                'timeframe': timeframe,
+                'symbol': symbol
+            }
                 
         except FileNotFoundError:
             # Modelo no existe para este símbolo
@@ -186,6 +194,114 @@ class MLInferenceEngine:
             log.error(f"❌ Error in prediction for {symbol} {timeframe}: {e}")
             return None
             
+    async def predict_fused(self, symbol: str, kline_buffer: List[Dict],
+                            timeframes=FUSED_TIMEFRAMES) -> Optional[Dict]:
+        """
+        Una sola predicción por símbolo con el vector fusionado 1m/3m/5m
+        construido desde el buffer 1m. Usa el modelo <SYMBOL>/fused/ (o el que
+        resuelva el registro) solo si fue entrenado con columnas fusionadas.
+        
+        Returns:
+            Dict con 'signal', 'confidence', 'probability' o None si no se puede predecir
+        """
+        timeframe = self.FUSED_TIMEFRAME
+        try:
+            # El timeframe mayor necesita suficientes velas agregadas
+            if len(kline_buffer) < 20 * max(tf_minutes(tf) for tf in timeframes):
+                return None
+                
+            entry = self.live_model.load_for(symbol, timeframe)
+            expected = fused_feature_columns(timeframes)
+            if not set(expected).issubset(entry.features):
+                log.debug(f"📭 {symbol}: el modelo {entry.path} no usa features fusionadas")
+                return None
+                
+            df = self._klines_to_df(kline_buffer)
+            if df is None:
+                return None
+            features = create_fused_features_from_klines(df, timeframes, self.feature_cfg)
+            if features.empty:
+                return None
+                
+            probability = float(self.live_model.predict_proba(symbol, features.iloc[[-1]], timeframe)[0])
+            signals, confidences = self.thresholds.current().classify([probability], symbol, timeframe)
+            signal = str(signals[0])
+            confidence = float(confidences[0])
+            self._track_outcome(symbol, timeframe, features.iloc[-1], probability, signal)
+            self._track_drift(symbol, timeframe, features.iloc[-1], len(kline_buffer))
+            mapped_signal = self.SIGNAL_MAP[signal]
+            
+            self.stats['predictions_made'] += 1
+            self.stats['by_timeframe'][timeframe] = self.stats['by_timeframe'].get(timeframe, 0) + 1
+            self.stats['by_symbol'][symbol] = self.stats['by_symbol'].get(symbol, 0) + 1
+            self.stats['signal_distribution'][signal] += 1
+            
+            log.debug(f"🎯 {symbol} {timeframe}: {mapped_signal} (p={probability:.3f}, conf={confidence:.3f})")
+            
+            return {
+                'signal': mapped_signal,
+                'confidence': confidence,
+                'probability': probability,
+                'timeframe': timeframe,
+                'symbol': symbol
+            }
+            
+        except FileNotFoundError:
+            log.debug(f"📭 No fused model found for {symbol}")
+            return None
+        except Exception as e:
+            log.error(f"❌ Error in fused prediction for {symbol}: {e}")
+            return None
+            
+    def _track_outcome(self, symbol: str, timeframe: str, row: pd.Series, probability: float, signal: str):
+        """Resuelve predicciones pendientes con la vela actual y registra la nueva"""
+        if self.online is None:
+            return
+        close = float(row.get('close', np.nan))
+        self.online.on_bar(symbol, timeframe, close)
+        self.online.record(symbol, timeframe, probability, close,
+                           float(row.get(self.online.scale_column, 0.0)), signal)
+        
+    def _track_drift(self, symbol: str, timeframe: str, row: pd.Series, history: int):
+        """Actualiza los histogramas en vivo (la evaluación corre en el hilo del monitor)"""
+        if self.drift is None:
+            return
+        entry = self.live_model.load_for(symbol, timeframe)
+        # Un modelo entrenado en otro timeframe no tiene una referencia comparable
+        if entry.meta.get('timeframe', timeframe) != timeframe:
+            return
+        self.drift.set_reference(symbol, timeframe, entry.meta.get('reference_hist'))
+        self.drift.update(symbol, timeframe, row, history=history)
+        
+    def _klines_to_df(self, kline_buffer: List[Dict]) -> Optional[pd.DataFrame]:
+        """Convertir klines (formato websocket) a DataFrame indexado por apertura"""
+        df_data = []
+        for kline in kline_buffer:
+            df_data.append({
+                'timestamp': int(kline.get('t', 0)),  # Timestamp de apertura
+                'open': float(kline.get('o', 0)),
+                'high': float(kline.get('h', 0)),
+                'low': float(kline.get('l', 0)),
+                'close': float(kline.get('c', 0)),
+                'volume': float(kline.get('v', 0)),
+                'close_time': int(kline.get('T', 0)),
+                'quote_volume': float(kline.get('q', 0)),
+                'trades': int(kline.get('n', 0)),
+                'taker_buy_base': float(kline.get('V', 0)),
+                'taker_buy_quote': float(kline.get('Q', 0))
+            })
+            
+        if not df_data:
+            return None
+            
+        df = pd.DataFrame(df_data)
+        
+        # Convertir timestamp a datetime si es necesario
+        if 'timestamp' in df.columns:
+            df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms')
+            df.set_index('datetime', inplace=True)
+        return df
+        
     def _create_features_from_klines(self, kline_buffer: List[Dict]) -> Optional[pd.DataFrame]:
         """
         Crear features a partir de los klines usando el módulo existente
@@ -197,35 +313,12 @@ class MLInferenceEngine:
             DataFrame con features o None si hay error
         """
         try:
-            # Convertir klines a DataFrame
-            df_data = []
-            for kline in kline_buffer:
-                df_data.append({
-                    'timestamp': int(kline.get('t', 0)),  # Timestamp de apertura
-                    'open': float(kline.get('o', 0)),
-                    'high': float(kline.get('h', 0)),
-                    'low': float(kline.get('l', 0)),
-                    'close': float(kline.get('c', 0)),
-                    'volume': float(kline.get('v', 0)),
-                    'close_time': int(kline.get('T', 0)),
-                    'quote_volume': float(kline.get('q', 0)),
-                    'trades': int(kline.get('n', 0)),
-                    'taker_buy_base': float(kline.get('V', 0)),
-                    'taker_buy_quote': float(kline.get('Q', 0))
-                })
-                
-            if not df_data:
+            df = self._klines_to_df(kline_buffer)
+            if df is None:
                 return None
                 
-            df = pd.DataFrame(df_data)
-            
-            # Convertir timestamp a datetime si es necesario
-            if 'timestamp' in df.columns:
-                df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms')
-                df.set_index('datetime', inplace=True)
-                
             # Usar la función existente para crear features
-            features_df = create_features_from_klines(df)
+            features_df = create_features_from_klines(df, self.feature_cfg)
             
             return features_df
             
@@ -243,7 +336,10 @@ class MLInferenceEngine:
                 key=lambda x: x[1], 
                 reverse=True
             ))[:5]),
-            'signal_distribution': dict(self.stats['signal_distribution'])
+            'signal_distribution': dict(self.stats['signal_distribution']),
+            'shadow': self.shadow.get_statistics() if self.shadow else None,
+            'online_metrics': self.online.summary() if self.online else {},
+            'drifted_symbols': self.drift.drifted_symbols() if self.drift else []
         }
         
     def log_statistics(self):
@@ -260,6 +356,19 @@ class MLInferenceEngine:
             sig_stats = ", ".join([f"{sig}:{count}" for sig, count in stats['signal_distribution'].items()])
             log.info(f"  └─ Signals: {sig_stats}")
             
+        # Peores modelos por AUC online (ventana móvil)
+        scored = [(k, m) for k, m in stats['online_metrics'].items() if m['auc'] is not None]
+        for key, m in sorted(scored, key=lambda x: x[1]['auc'])[:3]:
+            hit = f"{m['hit_rate']:.2f}" if m['hit_rate'] is not None else "-"
+            log.info(f"  └─ Online {key}: auc={m['auc']:.3f} brier={m['brier']:.3f} hit={hit} (n={m['n']})")
+            
+        if stats['drifted_symbols']:
+            log.info(f"  └─ Drift: {', '.join(stats['drifted_symbols'])}")
+            
+        if stats['shadow']:
+            sh = stats['shadow']
+            log.info(f"  └─ Shadow: scored={sh['scored']} dropped={sh['dropped']} written={sh['written']}")
+            
     async def cleanup(self):
         """Limpieza del engine"""
         log.info("🧹 Cleaning up ML Inference Engine...")
@@ -270,4 +379,8 @@ class MLInferenceEngine:
         # Limpiar cache
         self.feature_cache.clear()
         
+        # Escribir lo pendiente de la evaluación en sombra
+        if self.shadow:
+            self.shadow.close()
+        
         log.info("✅ ML Inference Engine cleanup completed")
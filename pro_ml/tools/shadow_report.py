@@ -0,0 +1,118 @@
+"""
+Informe live vs sombra a partir de los .npz de ShadowScorer.
+
+Para cada símbolo con registros en outputs/shadow/<SYMBOL>/ se descargan las
+velas del periodo, se etiquetan con triple barrera (misma config que el
+entrenamiento) y se calcula evaluate_probs para las probabilidades live y
+sombra sobre las mismas filas. Solo cuentan filas cuyo horizonte ya venció.
+
+Uso:
+  python -m pro_ml.tools.shadow_report                 # todos los símbolos
+  SYMBOLS=BTCUSDT,ETHUSDT python -m pro_ml.tools.shadow_report
+"""
+
+import glob
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import yaml
+from dotenv import load_dotenv
+load_dotenv()
+
+from pro_ml.core.eval.metrics import evaluate_probs
+from pro_ml.core.features.microstructure import FUSED_TIMEFRAMES, build_features, build_fused_features
+from pro_ml.core.labeling.triple_barrier import horizon_bars, triple_barrier_labels
+from pro_ml.core.live.shadow import index_to_ms
+
+FUSED = "fused"
+
+
+def load_shadow_log(log_dir: str, symbol: str) -> pd.DataFrame:
+    """Concatena los chunks .npz de un símbolo (ts, tf, live_p, shadow_p)."""
+    parts = []
+    for path in sorted(glob.glob(os.path.join(log_dir, symbol, "*.npz"))):
+        with np.load(path) as z:
+            parts.append(pd.DataFrame({k: z[k] for k in ("ts", "tf", "live_p", "shadow_p")}))
+    if not parts:
+        return pd.DataFrame(columns=["ts", "tf", "live_p", "shadow_p"])
+    # La misma fila puede llegar dos veces (p.ej. reprocesos): se queda la última
+    return pd.concat(parts, ignore_index=True).drop_duplicates(subset=["ts", "tf"], keep="last")
+
+
+def realized_labels(cfg: dict, symbol: str, timeframe: str) -> pd.Series:
+    """Etiquetas triple barrera (índice epoch ms) de las filas con horizonte vencido."""
+    from pro_ml.core.data.loader_binance import DataLoader
+    from pro_ml.core.data.resampling import ensure_uniform
+
+    cfg = yaml.safe_load(yaml.safe_dump(cfg))
+    cfg["datasource"]["symbol"] = symbol
+    if timeframe and timeframe != FUSED:
+        cfg["datasource"]["timeframe"] = timeframe
+        cfg["datasource"].setdefault("binance", {})["interval"] = timeframe
+
+    raw = DataLoader(cfg, symbol=symbol).load()
+    raw = ensure_uniform(raw, freq=cfg["datasource"].get("timeframe", "1m"))
+    if raw.empty:
+        return pd.Series(dtype=int)
+    if timeframe == FUSED:
+        tfs = (cfg.get("multitimeframe") or {}).get("timeframes", list(FUSED_TIMEFRAMES))
+        feats = build_fused_features(raw, cfg, tfs)
+    else:
+        feats = build_features(raw, cfg)
+
+    horizon = horizon_bars(cfg["labeling"]["horizon_min"], cfg["datasource"].get("timeframe", "1m"))
+    lab = triple_barrier_labels(feats, horizon, cfg["labeling"]["pt_mult"], cfg["labeling"]["sl_mult"],
+                                cfg["labeling"]["use_atr"])
+    lab = lab.iloc[:max(len(lab) - horizon, 0)]
+    return pd.Series(lab["label"].to_numpy(), index=index_to_ms(lab.index))
+
+
+def compare(log: pd.DataFrame, labels: pd.Series) -> Optional[dict]:
+    """evaluate_probs live y sombra sobre las filas etiquetadas del log."""
+    df = log.join(labels.rename("label"), on="ts", how="inner")
+    if df.empty or df["label"].nunique() < 2:
+        return None
+    y = df["label"].to_numpy()
+    return {
+        "n": len(df),
+        "live": evaluate_probs(y, df["live_p"].to_numpy(dtype=float)),
+        "shadow": evaluate_probs(y, df["shadow_p"].to_numpy(dtype=float)),
+    }
+
+
+def main():
+    cfg = yaml.safe_load(open(os.getenv("ML_CFG", "configs/ml.yaml")))
+    log_dir = ((cfg.get("serving") or {}).get("shadow") or {}).get("log_dir", "outputs/shadow")
+
+    symbols_env = os.getenv("SYMBOLS", "").strip()
+    if symbols_env:
+        symbols = [x.strip().upper() for x in symbols_env.split(",") if x.strip()]
+    else:
+        symbols = sorted(d for d in os.listdir(log_dir) if os.path.isdir(os.path.join(log_dir, d))) \
+            if os.path.isdir(log_dir) else []
+    if not symbols:
+        print(f"Sin registros de sombra en {log_dir}")
+        return
+
+    print(f"{'symbol':<12}{'tf':<7}{'n':>7}  {'auc live':>9}{'auc shd':>9}  {'brier live':>11}{'brier shd':>10}")
+    for sym in symbols:
+        log = load_shadow_log(log_dir, sym)
+        for tf, part in log.groupby("tf"):
+            try:
+                res = compare(part, realized_labels(cfg, sym, tf or None))
+            except Exception as e:
+                print(f"[{sym} {tf}] ERROR: {e}")
+                continue
+            if res is None:
+                print(f"{sym:<12}{tf or '-':<7}{'sin etiquetas suficientes':>30}")
+                continue
+            lv, sh = res["live"], res["shadow"]
+            mark = "  <- sombra mejor" if sh["auc"] > lv["auc"] and sh["brier"] < lv["brier"] else ""
+            print(f"{sym:<12}{tf or '-':<7}{res['n']:>7}  {lv['auc']:>9.4f}{sh['auc']:>9.4f}  "
+                  f"{lv['brier']:>11.4f}{sh['brier']:>10.4f}{mark}")
+
+
+if __name__ == "__main__":
+    main()
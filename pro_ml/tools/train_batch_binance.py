@@ -4,42 +4,63 @@ load_dotenv()
 
 from pro_ml.core.data.loader_binance import DataLoader
 from pro_ml.core.data.resampling import ensure_uniform
-from pro_ml.core.features.microstructure import build_features
-from pro_ml.core.labeling.triple_barrier import triple_barrier_labels
+from pro_ml.core.features.microstructure import (
+    FUSED_TIMEFRAMES, build_features, build_fused_features, fused_feature_columns,
+)
+from pro_ml.core.labeling.triple_barrier import horizon_bars, triple_barrier_labels
 from pro_ml.core.models.xgb_optuna import XGBOptuna
 from pro_ml.core.eval.metrics import evaluate_probs
+from pro_ml.core.eval.drift import load_drifted_symbols, reference_histograms
+from pro_ml.core.models.mmap_artifact import ARTIFACT_NAME, export_artifact
+from pro_ml.core.live.shadow import SHADOW_DIR
 from pro_bot.core.top_symbols import top_usdtm_by_quote_volume
 
 def ensure_dir(p): os.makedirs(p, exist_ok=True)
 
-def train_one(base_cfg, symbol, force=False):
-    out_dir = f"outputs/models/{symbol}"
+FUSED = "fused"
+
+def train_one(base_cfg, symbol, force=False, timeframe=None, shadow=False):
+    # timeframe=None -> modelo por símbolo; "3m" -> variante outputs/models/<SYMBOL>/3m/
+    # timeframe="fused" -> vector 1m/3m/5m concatenado desde datos 1m (outputs/models/<SYMBOL>/fused/)
+    # shadow=True -> candidato en .../shadow/ evaluado en sombra junto al modelo live
+    out_dir = f"outputs/models/{symbol}" + (f"/{timeframe}" if timeframe else "") + (f"/{SHADOW_DIR}" if shadow else "")
+    tag = f"{symbol}" + (f" {timeframe}" if timeframe else "") + (" shadow" if shadow else "")
     model_p = f"{out_dir}/best_model.joblib"
     meta_p  = f"{out_dir}/metadata.joblib"
 
     if (not force) and os.path.exists(model_p) and os.path.exists(meta_p):
-        print(f"[{symbol}] ya tiene modelo, skip (usa FORCE_RETRAIN=1 para forzar)")
+        print(f"[{tag}] ya tiene modelo, skip (usa FORCE_RETRAIN=1 para forzar)")
         return
 
     cfg = yaml.safe_load(open("configs/ml.yaml"))
     cfg["datasource"]["symbol"] = symbol
+    if timeframe and timeframe != FUSED:
+        cfg["datasource"]["timeframe"] = timeframe
+        cfg["datasource"].setdefault("binance", {})["interval"] = timeframe
 
     dl = DataLoader(cfg, symbol=symbol)
     raw = dl.load()
     raw = ensure_uniform(raw, freq=cfg["datasource"].get("timeframe","1m"))
     if raw.empty:
-        print(f"[{symbol}] sin datos, skip"); return
+        print(f"[{tag}] sin datos, skip"); return
 
-    feats = build_features(raw, cfg)
+    if timeframe == FUSED:
+        fused_tfs = (cfg.get("multitimeframe") or {}).get("timeframes", list(FUSED_TIMEFRAMES))
+        feats = build_fused_features(raw, cfg, fused_tfs)
+    else:
+        feats = build_features(raw, cfg)
     lab = triple_barrier_labels(
         feats,
-        cfg["labeling"]["horizon_min"],
+        horizon_bars(cfg["labeling"]["horizon_min"], cfg["datasource"].get("timeframe", "1m")),
         cfg["labeling"]["pt_mult"],
         cfg["labeling"]["sl_mult"],
         cfg["labeling"]["use_atr"]
     )
 
-    cols = [c for c in feats.columns if c not in ["t1","label"]]
+    if timeframe == FUSED:
+        cols = fused_feature_columns(fused_tfs)
+    else:
+        cols = [c for c in feats.columns if c not in ["t1","label"]]
     X, y, t1 = lab[cols], lab["label"], lab["t1"]
 
     modeler = XGBOptuna(cfg)
@@ -49,12 +70,23 @@ def train_one(base_cfg, symbol, force=False):
 
     ensure_dir(out_dir)
     joblib.dump(model, model_p)
-    joblib.dump({"features": cols, "best_params": best_params, "metrics": metrics}, meta_p)
-    print(f"[{symbol}] saved -> {out_dir}  metrics={metrics}")
+    meta = {"features": cols, "best_params": best_params, "metrics": metrics,
+            "timeframe": timeframe or cfg["datasource"].get("timeframe","1m"),
+            # Histogramas de referencia para el monitor de drift en vivo
+            "reference_hist": reference_histograms(X)}
+    # Artefacto mmap junto al joblib (arranque rápido y páginas compartidas)
+    try:
+        meta["artifact_sha256"] = export_artifact(model, cols, f"{out_dir}/{ARTIFACT_NAME}")
+    except Exception as e:
+        print(f"[{tag}] WARNING: no se pudo exportar artefacto mmap: {e}")
+    joblib.dump(meta, meta_p)
+    print(f"[{tag}] saved -> {out_dir}  metrics={metrics}")
 
 def main():
     # FORCE_RETRAIN=1 para reentrenar aunque ya exista modelo
     force = os.getenv("FORCE_RETRAIN","0") in ("1","true","True","YES","yes")
+    # SHADOW=1 guarda los modelos como candidatos sombra sin tocar los live
+    shadow = os.getenv("SHADOW","0") in ("1","true","True","YES","yes")
 
     symbols_env = os.getenv("SYMBOLS","").strip()
     if symbols_env:
@@ -66,6 +98,15 @@ def main():
     else:
         symbols = []
 
+    # DRIFTED_ONLY=1 reentrena (forzado) solo los símbolos con drift en outputs/drift/report.json
+    if os.getenv("DRIFTED_ONLY","0") in ("1","true","True","YES","yes"):
+        drifted = load_drifted_symbols(os.getenv("DRIFT_REPORT","outputs/drift/report.json"))
+        symbols = [s for s in symbols if s in drifted] if symbols else drifted
+        if not symbols:
+            print("Sin símbolos con drift; nada que reentrenar")
+            return
+        force = True
+
     if not symbols:
         topn_raw = os.getenv("TOPN","20").split("#",1)[0].strip()  # quita comentarios inline
         try:
@@ -74,14 +115,21 @@ def main():
             topn = 20
         symbols = top_usdtm_by_quote_volume(topn)
 
+    # TIMEFRAMES=3m,5m entrena además variantes por timeframe (<SYMBOL>/<TF>/)
+    timeframes = [tf.strip() for tf in os.getenv("TIMEFRAMES","").split(",") if tf.strip()]
+    # FUSED=1 entrena además el modelo del vector multitimeframe fusionado (<SYMBOL>/fused/)
+    if os.getenv("FUSED","0") in ("1","true","True","YES","yes") and FUSED not in timeframes:
+        timeframes.append(FUSED)
+
     print("Training symbols:", symbols)
     base_cfg = yaml.safe_load(open("configs/ml.yaml"))
     for sym in symbols:
-        try:
-            print(f"=== [{sym}] training ===")
-            train_one(base_cfg, sym, force=force)
-        except Exception as e:
-            print(f"[{sym}] ERROR: {e}")
+        for tf in [None] + timeframes:
+            try:
+                print(f"=== [{sym}{' ' + tf if tf else ''}] training ===")
+                train_one(base_cfg, sym, force=force, timeframe=tf, shadow=shadow)
+            except Exception as e:
+                print(f"[{sym}{' ' + tf if tf else ''}] ERROR: {e}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para la caché de configuración de cuenta (leverage / tipo de margen)
+"""
+
+from pro_bot.core.account_config import AccountConfigCache
+
+# Fila real de GET /fapi/v3/positionRisk: sin leverage ni marginType
+V3_POSITION = {"symbol": "BTCUSDT", "positionSide": "BOTH", "positionAmt": "0.010", "entryPrice": "60000.0",
+               "breakEvenPrice": "60030.0", "markPrice": "60100.0", "unRealizedProfit": "1.0",
+               "liquidationPrice": "0", "isolatedMargin": "0", "notional": "601.0", "marginAsset": "USDT",
+               "isolatedWallet": "0", "initialMargin": "120.2", "maintMargin": "2.4",
+               "positionInitialMargin": "120.2", "openOrderInitialMargin": "0", "adl": 1,
+               "bidNotional": "0", "askNotional": "0", "updateTime": 1720736417660}
+
+
+class _Cli:
+    def __init__(self):
+        self.calls = []
+
+    def futures_symbol_config(self, **params):
+        return [{"symbol": "BTCUSDT", "marginType": "CROSSED", "isAutoAddMargin": "false",
+                 "leverage": 5, "maxNotionalValue": "1000000"},
+                {"symbol": "ETHUSDT", "marginType": "ISOLATED", "isAutoAddMargin": "false",
+                 "leverage": 20, "maxNotionalValue": "500000"}]
+
+    def futures_account_config(self, **params):
+        return {"feeTier": 0, "canTrade": True, "dualSidePosition": False, "multiAssetsMargin": False}
+
+    def futures_change_leverage(self, **params):
+        self.calls.append(("leverage", params["symbol"]))
+
+    def futures_change_margin_type(self, **params):
+        self.calls.append(("margin", params["symbol"]))
+
+
+def test_v3_rows_do_not_load():
+    print("🧪 Prueba de filas positionRisk v3")
+    cache = AccountConfigCache()
+    assert cache.apply_symbol_config([V3_POSITION]) == 0 and not cache.loaded
+    print("✅ v3 no marca la caché como cargada")
+
+
+def test_symbol_config_skips_calls():
+    print("🧪 Prueba de carga desde symbolConfig")
+    cli = _Cli()
+    cache = AccountConfigCache()
+    cache.cli = cli
+    cache.ensure_loaded()
+    print(f"1️⃣  leverage={cache.leverage} margen={cache.margin_type} dual={cache.dual_side}")
+    assert cache.loaded and cache.dual_side is False
+    assert not cache.ensure_leverage("BTCUSDT", 5) and not cache.ensure_margin_type("BTCUSDT", "CROSSED")
+    assert not cache.ensure_position_mode(False)
+    assert cache.configure_symbols(["BTCUSDT", "ETHUSDT"], "CROSSED") == 1
+    print(f"2️⃣  Llamadas al exchange: {cli.calls}")
+    assert cli.calls == [("margin", "ETHUSDT")]
+    print("✅ symbolConfig OK")
+
+
+if __name__ == "__main__":
+    test_v3_rows_do_not_load()
+    test_symbol_config_skips_calls()
+    print("🎉 Pruebas de config de cuenta completadas")
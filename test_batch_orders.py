@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el envío de SL/TP en batch (petición firmada y fallback por pata)
+"""
+
+import asyncio
+import time
+from decimal import Decimal
+from urllib.parse import parse_qsl
+
+from binance.client import Client
+from binance.exceptions import BinanceAPIException
+
+from pro_bot.core import execution
+from pro_bot.core.async_client import AsyncAPIError
+
+
+class _Resp:
+    status_code = 200
+    headers = {}
+    text = "[]"
+
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class _Client:
+    def __init__(self, cli):
+        self.client = cli
+
+
+def test_batch_query_string():
+    print("🧪 Prueba de la query firmada de batchOrders")
+    cli = Client("key", "secret", ping=False)
+    sent = []
+
+    def post(uri, headers=None, data=None, **kwargs):
+        sent.append((uri, data, kwargs))
+        return _Resp([{"orderId": 1}, {"orderId": 2}])
+
+    cli.session.post = post
+    get_client = execution.get_client
+    execution.get_client = lambda: _Client(cli)
+    try:
+        legs = [execution.stop_market_params("BTCUSDT", "SELL", 90.0, close_position=True),
+                execution.take_profit_market_params("BTCUSDT", "SELL", 110.0, close_position=True)]
+        res = execution.place_batch_orders(legs)
+    finally:
+        execution.get_client = get_client
+
+    uri, data, kwargs = sent[0]
+    query = data or kwargs.get("params") or ""
+    query = query if isinstance(query, str) else "&".join(f"{k}={v}" for k, v in query)
+    keys = [k for k, _ in parse_qsl(query)]
+    print(f"1️⃣  {uri.rsplit('/', 1)[-1]}: parámetros {keys}")
+    assert uri.endswith("/batchOrders") and len(sent) == 1
+    # recvWindow solo una vez (el de la librería), nunca metido dentro de batchOrders
+    assert keys.count("batchOrders") == 1 and keys.count("timestamp") == 1 and keys.count("recvWindow") <= 1
+    batch = dict(parse_qsl(query))["batchOrders"]
+    assert batch.startswith("[") and batch.endswith("]") and "recvWindow" not in batch and "&" not in batch
+    assert all(r.ok for r in res) and [r.order_id for r in res] == [1, 2]
+    print("✅ batchOrders OK")
+
+
+class _FlakyCli:
+    """Cliente síncrono falso: el primer lote llega al exchange pero la respuesta se pierde."""
+
+    def __init__(self):
+        self.book = {}          # newClientOrderId -> orden
+        self.batches = []
+        self.lookups = []
+
+    def futures_place_batch_order(self, batchOrders):
+        self.batches.append([o["newClientOrderId"] for o in batchOrders])
+        out = []
+        for o in batchOrders:
+            # La primera pata del primer lote se crea; el resto no llega
+            if len(self.batches) > 1 or not out:
+                self.book[o["newClientOrderId"]] = {"orderId": 100 + len(self.book), **o}
+            out.append(self.book.get(o["newClientOrderId"]))
+        if len(self.batches) == 1:
+            raise TimeoutError("read timeout")
+        return out
+
+    def futures_get_order(self, symbol, origClientOrderId):
+        self.lookups.append(origClientOrderId)
+        if origClientOrderId not in self.book:
+            raise BinanceAPIException(_Resp({"code": -2013, "msg": "Order does not exist."}), 400,
+                                      '{"code": -2013, "msg": "Order does not exist."}')
+        return self.book[origClientOrderId]
+
+
+def test_batch_retry_without_duplicates():
+    print("🧪 Prueba de reintento del batch sin duplicar patas")
+    cli = _FlakyCli()
+    get_client = execution.get_client
+    execution.get_client = lambda: _Client(cli)
+    legs = [execution.stop_market_params("BTCUSDT", "SELL", 90.0, close_position=True),
+            execution.take_profit_market_params("BTCUSDT", "SELL", 110.0, qty="0.005")]
+    try:
+        res = execution.place_batch_orders(legs)
+    finally:
+        execution.get_client = get_client
+
+    ids = [l["newClientOrderId"] for l in legs]
+    print(f"1️⃣  lotes={cli.batches} búsquedas={len(cli.lookups)} ids={[r.order_id for r in res]}")
+    # Los ids se fijan en las dicts originales y no cambian entre reintentos
+    assert cli.batches == [ids, [ids[1]]] and cli.lookups == ids
+    # La pata que sí llegó se adopta; solo la que no existía (-2013) se reenvía
+    assert all(r.ok for r in res) and [r.order_id for r in res] == [100, 101] and len(cli.book) == 2
+    # TP por cantidad: reduceOnly para no abrir posición contraria
+    assert legs[1]["reduceOnly"] == "true" and "reduceOnly" not in legs[0]
+    print("✅ Reintento sin duplicados OK")
+
+
+class _AsyncClient:
+    """Cliente async mínimo: la orden MARKET se llena y el batch de SL/TP revienta."""
+
+    def __init__(self):
+        self.orders = []
+
+    async def change_leverage(self, symbol, leverage):
+        return {"leverage": leverage}
+
+    async def create_order(self, **params):
+        self.orders.append(params)
+        return {"orderId": len(self.orders), "avgPrice": "100", "executedQty": params.get("quantity", "0")}
+
+    async def place_batch_orders(self, legs):
+        self.batch_ids = [l["newClientOrderId"] for l in legs]
+        raise TimeoutError("batchOrders timeout")
+
+    async def get_order(self, symbol, orig_client_order_id):
+        raise AsyncAPIError(400, -2013, "Order does not exist.")
+
+
+def test_async_entry_batch_failure():
+    print("🧪 Prueba de entrada async con batch SL/TP fallido tras el fill")
+    aclient = _AsyncClient()
+    plan = {"qty": Decimal("0.01"), "qty_str": "0.01", "leverage": 5, "side": "BUY",
+            "tp": Decimal("110"), "sl": Decimal("90")}
+    legs = [execution.stop_market_params("BTCUSDT", "SELL", 90.0, close_position=True),
+            execution.take_profit_market_params("BTCUSDT", "SELL", 110.0, close_position=True)]
+    reconciled = []
+    saved = (execution.get_async_client, execution._plan_entry, execution.tp_sl_legs, execution._post_trade_reconcile)
+
+    async def get_async_client():
+        return aclient
+
+    execution.get_async_client = get_async_client
+    execution._plan_entry = lambda *a, **k: dict(plan)
+    execution.tp_sl_legs = lambda *a, **k: [dict(l) for l in legs]
+    execution._post_trade_reconcile = lambda sym, qty: reconciled.append((sym, qty))
+    execution.note_price("BTCUSDT", 100.0)
+    try:
+        res = asyncio.run(execution.enter_position_async("LONG", "BTCUSDT"))
+    finally:
+        (execution.get_async_client, execution._plan_entry, execution.tp_sl_legs,
+         execution._post_trade_reconcile) = saved
+    for _ in range(100):
+        if reconciled:
+            break
+        time.sleep(0.01)
+    types = [o["type"] for o in aclient.orders]
+    print(f"1️⃣  success={res['success']} órdenes={types} reconciliado={reconciled}")
+    assert res["success"] and res["filled_qty"] == 0.01
+    assert types == ["MARKET", "STOP_MARKET", "TAKE_PROFIT_MARKET"]
+    # Reenvío con el mismo newClientOrderId que el lote (tras confirmar -2013)
+    assert [o["newClientOrderId"] for o in aclient.orders[1:]] == aclient.batch_ids
+    assert reconciled == [("BTCUSDT", 0.01)]
+    print("✅ Protección por pata tras fallo del batch OK")
+
+
+if __name__ == "__main__":
+    test_batch_query_string()
+    test_batch_retry_without_duplicates()
+    test_async_entry_batch_failure()
+    print("🎉 Pruebas de batch completadas")
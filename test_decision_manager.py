@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el MultitimeframeDecisionManager guiado por tiempo de vela
+"""
+
+import asyncio
+import threading
+import time
+
+from pro_bot.core.multitimeframe_manager import MultitimeframeDecisionManager, SignalDeduplicator
+from pro_bot.core.pretrade_gate import REASON_POSITION_OPEN
+from pro_bot.core.timer_wheel import TimerWheel
+
+MIN = 60_000
+T0 = 1_760_000_000_000 - (1_760_000_000_000 % (5 * MIN))
+
+
+def test_timer_wheel():
+    print("🧪 Prueba de TimerWheel")
+    wheel = TimerWheel(tick=MIN, slots=8)
+    a = wheel.schedule(T0 + 2 * MIN, "a")
+    wheel.schedule(T0 + 20 * MIN, "b")   # más de una vuelta
+    wheel.schedule(T0 + 3 * MIN, "c")
+    wheel.cancel(a)
+    assert wheel.advance(T0) == []
+    assert wheel.advance(T0 + 5 * MIN) == ["c"]
+    assert wheel.advance(T0 + 20 * MIN) == []          # deadline < now estricto
+    assert wheel.advance(T0 + 500 * MIN) == ["b"]      # salto largo
+    assert len(wheel) == 0
+    print("✅ TimerWheel OK")
+
+
+def test_bar_time_confirmation():
+    print("🧪 Prueba de confirmación por tiempo de vela")
+    mgr = MultitimeframeDecisionManager(["1m", "3m", "5m"], min_confirmations=2, decision_window=300)
+
+    assert mgr.add_decision("BTCUSDT", "5m", "BUY", 0.7, 100.0, bar_time=T0) is None
+    confirmed = mgr.add_decision("BTCUSDT", "1m", "BUY", 0.5, 102.0, bar_time=T0 + MIN)
+    print(f"1️⃣  {confirmed}")
+    assert confirmed["signal"] == "BUY" and confirmed["confirmations"] == 2
+    assert abs(confirmed["avg_price"] - 101.0) < 1e-9
+    assert sorted(confirmed["confirming_tfs"]) == ["1m", "5m"]
+
+    # Reemplazar el voto de 1m por HOLD retira su confirmación
+    assert mgr.add_decision("BTCUSDT", "1m", "HOLD", 0.5, 101.0, bar_time=T0 + 2 * MIN) is None
+
+    # Misma dirección en el mismo episodio: se suprime
+    assert mgr.add_decision("BTCUSDT", "3m", "BUY", 0.6, 101.0, bar_time=T0 + 3 * MIN) is None
+    assert mgr.get_statistics()["suppressed_signals"] == 1
+
+    # El voto de 5m caduca por tiempo de vela (>300 s después), no por reloj de pared
+    assert mgr.add_decision("BTCUSDT", "1m", "HOLD", 0.5, 101.0, bar_time=T0 + 6 * MIN) is None
+    status = mgr.get_current_status("BTCUSDT")
+    print(f"2️⃣  {status['summary']}")
+    assert "5m" not in status["timeframes"] and mgr.stats["expired_decisions"] == 1
+    print("✅ Confirmación por tiempo de vela OK")
+
+
+def test_signal_episodes():
+    print("🧪 Prueba de deduplicación por episodio")
+    mgr = MultitimeframeDecisionManager(["1m", "3m", "5m"], min_confirmations=2, rearm_seconds=600)
+    emitted = []
+    for bar in range(1, 31):
+        t = T0 + bar * MIN
+        signal = "BUY" if bar < 20 else "SELL"
+        for tf in ("1m", "3m"):
+            res = mgr.add_decision("ETHUSDT", tf, signal, 0.6, 10.0, bar_time=t)
+            if res:
+                emitted.append((bar, res["signal"]))
+        if bar == 5:
+            mgr.rearm("ETHUSDT")   # posición cerrada
+    print(f"1️⃣  Emitidas: {emitted} | suprimidas={mgr.dedup.suppressed}")
+    # Episodio inicial, rearme por cierre (6), por tiempo (16), giro a SELL (20) y rearme por tiempo (30)
+    assert emitted == [(1, "BUY"), (6, "BUY"), (16, "BUY"), (20, "SELL"), (30, "SELL")]
+
+    # Entrada rechazada: solo se reabre el episodio de esa dirección
+    dedup = SignalDeduplicator(rearm_seconds=0)
+    assert dedup.admit("BTCUSDT", "BUY", T0)
+    assert not dedup.rearm("BTCUSDT", "SELL") and not dedup.admit("BTCUSDT", "BUY", T0 + MIN)
+    assert dedup.rearm("BTCUSDT", "BUY") and dedup.admit("BTCUSDT", "BUY", T0 + 2 * MIN)
+    print("✅ Deduplicación por episodio OK")
+
+
+def test_replay_speed_and_owner():
+    print("🧪 Prueba de replay y propietario único")
+    mgr = MultitimeframeDecisionManager(["1m", "3m", "5m"], min_confirmations=2)
+    symbols = [f"S{i}USDT" for i in range(50)]
+    start = time.perf_counter()
+    n = 0
+    for bar in range(2000):
+        t = T0 + (bar + 1) * MIN
+        for sym in symbols:
+            mgr.add_decision(sym, "1m", "BUY" if bar % 7 else "SELL", 0.6, 1.0, bar_time=t)
+            n += 1
+            if bar % 5 == 4:
+                mgr.add_decision(sym, "5m", "BUY", 0.6, 1.0, bar_time=t)
+                n += 1
+    elapsed = time.perf_counter() - start
+    print(f"1️⃣  {n} decisiones en {elapsed:.2f}s ({n / elapsed:,.0f}/s)")
+
+    errors = []
+    th = threading.Thread(target=lambda: errors.append(
+        _raises(lambda: mgr.add_decision("BTCUSDT", "1m", "BUY", 0.6, 1.0))))
+    th.start(); th.join()
+    assert errors == [True]
+    print("✅ Replay y propietario único OK")
+
+
+def _raises(fn):
+    try:
+        fn()
+    except RuntimeError:
+        return True
+    return False
+
+
+class _Engine:
+    """TradingEngine falso: sin get_position (no debe haber REST por señal)."""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.entries = []
+
+    async def enter_long_position(self, symbol):
+        self.entries.append(symbol)
+        return self.results.pop(0)
+
+
+def test_confirmed_signal_without_rest():
+    print("🧪 Prueba de ejecución de señales confirmadas (sin REST de posición)")
+    from pro_bot.app.main_multitimeframe import MultitimeframeTradingBot
+    bot = MultitimeframeTradingBot.__new__(MultitimeframeTradingBot)   # sin cliente Binance
+    bot.timeframes = ["1m", "3m", "5m"]
+    bot.decision_manager = MultitimeframeDecisionManager(bot.timeframes, min_confirmations=2, rearm_seconds=0)
+    bot.fused_dedup = SignalDeduplicator(0)
+    bot._awaiting_close = set()
+    bot.stats = {"trades_executed": 0}
+    bot.trading_engine = _Engine([
+        {"success": False, "reason": REASON_POSITION_OPEN},
+        {"success": False, "reason": "kill switch activo"},
+        {"success": True},
+    ])
+    sig = {"symbol": "ETHUSDT", "signal": "BUY", "avg_price": 10.0, "confirmations": 2, "confirming_tfs": ["1m", "3m"]}
+    dedup = bot.decision_manager.dedup
+
+    # Posición ya abierta según la puerta: el episodio queda consumido hasta el cierre
+    assert dedup.admit("ETHUSDT", "BUY", T0)
+    asyncio.run(bot._execute_confirmed_signal(dict(sig)))
+    assert "ETHUSDT" in bot._awaiting_close and not dedup.admit("ETHUSDT", "BUY", T0 + MIN)
+
+    # Rechazo por otro motivo: se rearma esa dirección
+    bot._awaiting_close.clear()
+    asyncio.run(bot._execute_confirmed_signal(dict(sig)))
+    assert not bot._awaiting_close and dedup.admit("ETHUSDT", "BUY", T0 + 2 * MIN)
+
+    asyncio.run(bot._execute_confirmed_signal(dict(sig)))
+    print(f"1️⃣  Entradas intentadas: {len(bot.trading_engine.entries)}, ejecutadas: {bot.stats['trades_executed']}")
+    assert bot.stats["trades_executed"] == 1 and "ETHUSDT" in bot._awaiting_close
+    print("✅ Señales confirmadas OK")
+
+
+if __name__ == "__main__":
+    test_timer_wheel()
+    test_bar_time_confirmation()
+    test_signal_episodes()
+    test_replay_speed_and_owner()
+    test_confirmed_signal_without_rest()
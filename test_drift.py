@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para DriftMonitor: warmup desde la config de entrenamiento e informe insufficient_history
+"""
+
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from pro_ml.core.eval.drift import INSUFFICIENT_HISTORY, DriftMonitor, reference_histograms
+from pro_ml.core.features.microstructure import feature_config
+
+
+def test_insufficient_history_reported():
+    print("🧪 Prueba de features sin historia suficiente en el informe de drift")
+    with open("configs/ml.yaml") as f:
+        cfg = yaml.safe_load(f)
+    rng = np.random.default_rng(5)
+    X = pd.DataFrame({"ret1_1m": rng.normal(0, 1, 2000), "rv_1m": rng.normal(0, 1, 2000),
+                      "rv_5m": rng.normal(0, 1, 2000), "ofi_1m": rng.normal(0, 1, 2000)})
+    with tempfile.TemporaryDirectory() as tmp:
+        report_path = os.path.join(tmp, "report.json")
+        mon = DriftMonitor.from_config(cfg, feature_config(cfg))
+        mon.report_path, mon.min_samples = report_path, 50
+        assert mon.warmup == {"rv": cfg["features"]["vol_ewm_span"], "ofi": cfg["features"]["ofi_window"]}
+        mon.set_reference("BTCUSDT", "fused", reference_histograms(X))
+
+        # Buffer live de 100 velas (modo vote): ret1 se compara; rv y ofi (ventana mayor) no
+        for row in X.iloc[:600].to_dict("records"):
+            mon.update("BTCUSDT", "fused", row, history=100)
+        report = mon.evaluate()["BTCUSDT fused"]
+        feats = report["features"]
+        print(f"1️⃣  Comparables: {[f for f, s in feats.items() if 'psi' in s]}, sin historia: {report[INSUFFICIENT_HISTORY]}")
+        assert report[INSUFFICIENT_HISTORY] == ["ofi_1m", "rv_1m", "rv_5m"]
+        assert feats["rv_5m"]["needed_bars"] == 5 * cfg["features"]["vol_ewm_span"] and feats["rv_1m"]["n"] == 0
+        assert "psi" in feats["ret1_1m"] and "ofi_1m" not in report["drifted_features"]
+        with open(report_path) as f:
+            assert json.load(f)["BTCUSDT fused"][INSUFFICIENT_HISTORY] == report[INSUFFICIENT_HISTORY]
+
+        # Con un buffer que cubre la ventana, rv_1m y ofi_1m se acumulan
+        for row in X.iloc[:600].to_dict("records"):
+            mon.update("BTCUSDT", "fused", row, history=cfg["features"]["vol_ewm_span"])
+        report = mon.evaluate()["BTCUSDT fused"]
+        print(f"2️⃣  Con {cfg['features']['vol_ewm_span']} velas: sin historia {report[INSUFFICIENT_HISTORY]}")
+        assert report[INSUFFICIENT_HISTORY] == ["rv_5m"] and "psi" in report["features"]["rv_1m"]
+    print("✅ Informe de drift OK")
+
+
+if __name__ == "__main__":
+    test_insufficient_history_reported()
+    print("🎉 Pruebas de drift completadas")
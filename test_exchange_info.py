@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para ExchangeInfoService: refresco en segundo plano pasado el TTL,
+arranque en frío desde disco y caché negativa de símbolos desconocidos
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from pro_bot.core.exchange_info import DISK_MAX_AGE_SECONDS, ExchangeInfoService
+
+
+class _Fetch:
+    """futures_exchange_info falso: cuenta descargas y sirve la lista de símbolos actual."""
+
+    def __init__(self, *symbols):
+        self.symbols = list(symbols)
+        self.calls = 0
+        self.done = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.done.set()
+        return {"symbols": [{"symbol": s, "status": "TRADING"} for s in self.symbols]}
+
+
+def test_ttl_background_refresh():
+    print("🧪 Prueba de refresco en segundo plano pasado el TTL")
+    with tempfile.TemporaryDirectory() as tmp:
+        fetch = _Fetch("BTCUSDT")
+        svc = ExchangeInfoService(ttl=60, path=os.path.join(tmp, "ei.json"), fetch=fetch)
+        assert svc.symbol("BTCUSDT")["symbol"] == "BTCUSDT"
+        svc.symbol("BTCUSDT")
+        assert svc.stats == {"downloads": 1, "disk_loads": 0}
+
+        # TTL vencido: se sirve la copia actual y un hilo descarga la nueva
+        fetch.symbols.append("ETHUSDT")
+        fetch.done.clear()
+        svc.fetched_at -= 120
+        assert svc.symbol("BTCUSDT")["symbol"] == "BTCUSDT"
+        assert fetch.done.wait(2)
+        for _ in range(200):
+            if svc.stats["downloads"] == 2 and not svc._refreshing:
+                break
+            time.sleep(0.005)
+        print(f"1️⃣  Tras el TTL: {svc.stats}, símbolos {sorted(s['symbol'] for s in svc.symbols())}")
+        assert svc.stats["downloads"] == 2 and "ETHUSDT" in svc._by_symbol
+        assert time.time() - svc.fetched_at < 5
+    print("✅ Refresco por TTL OK")
+
+
+def test_disk_cold_start():
+    print("🧪 Prueba de arranque en frío desde disco")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ei.json")
+        ExchangeInfoService(path=path, fetch=_Fetch("BTCUSDT", "ETHUSDT")).ensure()
+
+        # Proceso nuevo: la copia en disco basta, sin descarga
+        fetch = _Fetch("BTCUSDT")
+        svc = ExchangeInfoService(path=path, fetch=fetch)
+        assert svc.symbol("ETHUSDT")["symbol"] == "ETHUSDT"
+        print(f"1️⃣  Desde disco: {svc.stats}")
+        assert fetch.calls == 0 and svc.stats == {"downloads": 0, "disk_loads": 1}
+
+        # Copia en disco demasiado antigua: descarga síncrona y se reescribe
+        with open(path) as f:
+            doc = json.load(f)
+        doc["fetched_at"] = time.time() - DISK_MAX_AGE_SECONDS - 60
+        with open(path, "w") as f:
+            json.dump(doc, f)
+        svc = ExchangeInfoService(path=path, fetch=fetch)
+        svc.ensure()
+        print(f"2️⃣  Copia caducada: {svc.stats}")
+        assert svc.stats == {"downloads": 1, "disk_loads": 0} and "ETHUSDT" not in svc._by_symbol
+        with open(path) as f:
+            assert time.time() - json.load(f)["fetched_at"] < 5
+    print("✅ Arranque en frío OK")
+
+
+def test_unknown_symbol_negative_cache():
+    print("🧪 Prueba de caché negativa de símbolos desconocidos")
+    fetch = _Fetch("BTCUSDT")
+    svc = ExchangeInfoService(path=None, fetch=fetch, missing_ttl=0.2)
+    svc.ensure()
+
+    # Primer fallo: una descarga síncrona y KeyError
+    for i in range(5):
+        try:
+            svc.symbol("NEWUSDT")
+            assert False, "debería lanzar KeyError"
+        except KeyError:
+            pass
+    # Las consultas siguientes dentro del TTL negativo no vuelven a descargar
+    print(f"1️⃣  5 consultas de un símbolo desconocido: {fetch.calls} descargas")
+    assert fetch.calls == 2
+
+    # Pasado el TTL negativo se vuelve a mirar y un listado nuevo aparece
+    fetch.symbols.append("NEWUSDT")
+    time.sleep(0.25)
+    assert svc.symbol("NEWUSDT")["symbol"] == "NEWUSDT"
+    assert fetch.calls == 3
+    svc.symbol("NEWUSDT")
+    assert fetch.calls == 3
+    print("✅ Caché negativa OK")
+
+
+if __name__ == "__main__":
+    test_ttl_background_refresh()
+    test_disk_cold_start()
+    test_unknown_symbol_negative_cache()
+    print("🎉 Pruebas de ExchangeInfoService completadas")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Script de prueba del vector fusionado 1m/3m/5m: el vector live llega al modelo
+con las mismas columnas, en el mismo orden y con los mismos valores que en el
+entrenamiento (train_batch_binance con FUSED=1)
+"""
+
+import asyncio
+import os
+import tempfile
+
+import joblib
+import numpy as np
+import yaml
+
+from pro_ml.core.features.microstructure import build_fused_features, fused_feature_columns
+from pro_ml.live.inference_multi import MLInferenceEngine
+
+TIMEFRAMES = ["1m", "3m", "5m"]
+T0 = 1_700_000_040_000 - 1_700_000_040_000 % 300_000     # alineado a 5m
+
+
+class _Recorder:
+    """Modelo falso: guarda la matriz X que recibe."""
+    seen = []
+
+    def predict_proba(self, X):
+        _Recorder.seen.append(X.copy())
+        return np.column_stack([np.full(len(X), 0.5), np.full(len(X), 0.5)])
+
+
+def _klines(n=400, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    out = []
+    for k, c in enumerate(close):
+        o = close[k - 1] if k else c
+        out.append({"t": T0 + 60_000 * k, "T": T0 + 60_000 * (k + 1) - 1, "o": o, "c": c,
+                    "h": max(o, c) * 1.0005, "l": min(o, c) * 0.9995, "v": float(rng.uniform(1, 10))})
+    return out
+
+
+def _engine(base):
+    cols = fused_feature_columns(TIMEFRAMES)
+    d = os.path.join(base, "BTCUSDT", "fused")
+    os.makedirs(d)
+    joblib.dump(_Recorder(), os.path.join(d, "best_model.joblib"))
+    # Mismo orden que train_batch_binance: fused_feature_columns(timeframes)
+    joblib.dump({"features": cols, "timeframe": "fused"}, os.path.join(d, "metadata.joblib"))
+    eng = MLInferenceEngine(base_model_dir=base)
+    asyncio.run(eng.initialize())
+    eng.drift.stop()
+    return eng, cols
+
+
+def test_live_matches_training():
+    print("🧪 Prueba de columnas del vector fusionado live vs entrenamiento")
+    buf = _klines()
+    with tempfile.TemporaryDirectory() as base:
+        eng, cols = _engine(base)
+        with open("configs/ml.yaml") as f:
+            train_cfg = yaml.safe_load(f)
+        # Las features live usan la config de entrenamiento (ml.yaml), no DEFAULT_FEATURE_CFG
+        assert eng.feature_cfg["features"] == train_cfg["features"]
+        train = build_fused_features(eng._klines_to_df(buf), train_cfg, TIMEFRAMES)
+        X_train = train[cols]
+
+        for n in (len(buf), 333):      # buffer completo y buffer a mitad de una vela 5m
+            _Recorder.seen.clear()
+            pred = asyncio.run(eng.predict_fused("BTCUSDT", buf[:n], timeframes=TIMEFRAMES))
+            assert pred is not None and len(_Recorder.seen) == 1
+            X_live = _Recorder.seen[0]
+            ts = X_live.index[-1]
+            print(f"{'1️⃣' if n == len(buf) else '2️⃣'}  {n} velas: {len(X_live.columns)} columnas, fila {ts}")
+            assert list(X_live.columns) == cols
+            # Sin lookahead: la fila live coincide con la de entrenamiento del mismo minuto
+            np.testing.assert_allclose(X_live.iloc[-1].to_numpy(), X_train.loc[ts].to_numpy(), rtol=1e-9)
+    print("✅ Vector fusionado OK")
+
+
+if __name__ == "__main__":
+    test_live_matches_training()
+    print("🎉 Pruebas del vector fusionado completadas")
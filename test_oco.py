@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el motor OCO (eventos del user-data stream simulados)
+"""
+
+import time
+from decimal import Decimal
+
+from pro_bot.core.oco import OcoEngine, OcoGroup, TpLeg
+from pro_bot.core.user_stream import AccountState
+
+
+def _order(oid, status, filled, t):
+    return {"E": t, "T": t, "o": {"i": oid, "s": "BTCUSDT", "o": "TAKE_PROFIT_MARKET", "X": status,
+                                  "q": "0.5", "z": filled, "T": t}}
+
+
+def _pos(amount, t):
+    return {"E": t, "T": t, "a": {"P": [{"s": "BTCUSDT", "pa": amount, "ep": "100", "up": "0", "ps": "BOTH"}]}}
+
+
+def _wait(cond, timeout=3.0):
+    end = time.time() + timeout
+    while not cond() and time.time() < end:
+        time.sleep(0.01)
+
+
+def test_oco():
+    print("🧪 Prueba de OcoEngine")
+    st = AccountState()
+    calls = []
+    eng = OcoEngine(st, cancel_all=lambda s: calls.append(("cancel_all", s)),
+                    cancel=lambda s, oid: calls.append(("cancel", oid)),
+                    place=lambda p: calls.append(("place", p["quantity"])) or {"orderId": 99})
+    fills, flat = [], []
+    st.on_account_update(_pos("1.0", 1))
+    eng.register(OcoGroup("BTCUSDT", "SELL", Decimal("1.0"),
+                          [TpLeg(11, Decimal("0.5"), "110"), TpLeg(12, Decimal("0.25"), "120"),
+                           TpLeg(13, Decimal("0.25"), "130")],
+                          sl_order_id=10, on_fill=lambda d, r: fills.append(r), on_flat=lambda: flat.append(1)))
+
+    # TP1 parcial + reducción manual de la posición: la TP más lejana se recorta
+    st.on_order_update(_order(11, "PARTIALLY_FILLED", "0.2", 2))
+    st.on_account_update(_pos("0.6", 3))
+    st.on_order_update(_order(11, "FILLED", "0.5", 4))
+    _wait(lambda: ("place", "0.05") in calls)
+    print(f"1️⃣  Realizado: {fills} llamadas: {calls}")
+    assert fills == [Decimal("0.2"), Decimal("0.5")]
+    assert ("cancel", 13) in calls and ("place", "0.05") in calls
+
+    # SL ejecutado: posición plana -> cancelar hermanas una sola vez
+    st.on_order_update({"E": 5, "T": 5, "o": {"i": 10, "s": "BTCUSDT", "o": "STOP_MARKET", "X": "FILLED", "T": 5}})
+    st.on_account_update(_pos("0", 6))
+    _wait(lambda: flat)
+    print(f"2️⃣  Tras SL: {calls[-1]} on_flat={len(flat)}")
+    assert calls.count(("cancel_all", "BTCUSDT")) == 1 and flat == [1] and "BTCUSDT" not in eng.groups
+    print("✅ OcoEngine OK")
+
+
+if __name__ == "__main__":
+    test_oco()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para las métricas online (AUC/Brier/hit-rate en ventana móvil)
+"""
+
+import numpy as np
+from sklearn.metrics import brier_score_loss, roc_auc_score
+
+from pro_ml.core.eval.online import OnlineEvaluator, RollingBinaryMetrics
+
+
+def test_rolling_metrics():
+    print("🧪 Prueba de RollingBinaryMetrics")
+    rng = np.random.default_rng(1)
+    n, window, bins = 3000, 500, 1024
+    y = rng.integers(0, 2, n)
+    p = np.clip(0.5 + 0.2 * (y - 0.5) + rng.normal(0, 0.2, n), 0, 1)
+
+    m = RollingBinaryMetrics(window=window, bins=bins)
+    for pi, yi in zip(p, y):
+        m.update(pi, yi, hit=(pi >= 0.5) == yi)
+
+    w = slice(n - window, n)
+    binned = np.minimum((p[w] * bins).astype(int), bins - 1)
+    print(f"1️⃣  AUC online={m.auc:.6f} sklearn={roc_auc_score(y[w], binned):.6f}")
+    assert abs(m.auc - roc_auc_score(y[w], binned)) < 1e-9
+    assert abs(m.brier - brier_score_loss(y[w], p[w])) < 1e-9
+    assert abs(m.hit_rate - ((p[w] >= 0.5) == y[w]).mean()) < 1e-9
+    print("✅ RollingBinaryMetrics OK")
+
+
+def test_online_evaluator():
+    print("🧪 Prueba de OnlineEvaluator")
+    ev = OnlineEvaluator(horizon_min=3, pt_mult=1.0, sl_mult=1.0, window=100)
+    # Predicción LONG a 100 con atr=1 -> barrera superior 101
+    ev.record("BTCUSDT", "1m", 0.8, close=100.0, scale=1.0, signal="LONG")
+    assert ev.on_bar("BTCUSDT", "1m", 100.5) == 0
+    assert ev.on_bar("BTCUSDT", "1m", 101.2) == 1
+    # Sin barreras: al vencer el horizonte cuenta cierre final > inicial
+    ev.record("BTCUSDT", "1m", 0.3, close=100.0, scale=10.0, signal="SHORT")
+    for close in (99.0, 99.5, 99.8):
+        ev.on_bar("BTCUSDT", "1m", close)
+    stats = ev.metrics("BTCUSDT", "1m")
+    print(f"1️⃣  {stats}")
+    assert stats["n"] == 2 and stats["auc"] == 1.0 and stats["hit_rate"] == 1.0
+
+    # horizon_min son minutos: en 5m el mismo horizonte son 3 velas
+    ev = OnlineEvaluator(horizon_min=15, window=100)
+    assert (ev.horizon("1m"), ev.horizon("3m"), ev.horizon("5m"), ev.horizon("fused")) == (15, 5, 3, 15)
+    ev.record("ETHUSDT", "5m", 0.6, close=100.0, scale=10.0, signal="LONG")
+    assert [ev.on_bar("ETHUSDT", "5m", 100.5) for _ in range(3)] == [0, 0, 1]
+    print("✅ OnlineEvaluator OK")
+
+
+if __name__ == "__main__":
+    test_rolling_metrics()
+    test_online_evaluator()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para PortfolioRisk: covarianza EWMA incremental y puerta de riesgo marginal
+"""
+
+import time
+
+import numpy as np
+
+from pro_bot.core import execution
+from pro_bot.core.execution import PositionInfo
+from pro_bot.core.portfolio import PortfolioRisk
+from pro_bot.core.user_stream import AccountState
+
+SYMS = ["BTCUSDT", "ETHUSDT", "SOLUSDT", "XAUUSDT"]
+
+
+def _market(n=400, seed=7):
+    """BTC como factor; ETH y SOL con beta alta, XAU independiente."""
+    rng = np.random.default_rng(seed)
+    f = rng.normal(0, 0.002, n)
+    rets = {"BTCUSDT": f, "ETHUSDT": 1.2 * f + rng.normal(0, 0.0008, n),
+            "SOLUSDT": 1.5 * f + rng.normal(0, 0.001, n), "XAUUSDT": rng.normal(0, 0.002, n)}
+    return {s: 100.0 * np.exp(np.concatenate([[0.0], np.cumsum(r)])) for s, r in rets.items()}
+
+
+def _portfolio(prices, synced=True):
+    st = AccountState()
+    st.synced = synced
+    pf = PortfolioRisk(halflife_bars=120, min_bars=60, max_corr=0.7, max_beta_equity=3.0, account_state=st)
+    pf.seed({s: [(60 * k, float(p)) for k, p in enumerate(px)] for s, px in prices.items()})
+    return st, pf
+
+
+def test_incremental_covariance():
+    print("🧪 Prueba de covarianza EWMA incremental")
+    prices = _market()
+    _st, pf = _portfolio(prices)
+    r = np.column_stack([np.diff(np.log(prices[s])) for s in pf.symbols])
+    cov = np.zeros((len(SYMS), len(SYMS)))
+    for row in r:
+        cov = pf.lam * cov + (1 - pf.lam) * np.outer(row, row)
+    n = len(pf.symbols)
+    err = np.abs(pf.cov[:n, :n] - cov).max()
+    print(f"1️⃣  {pf.stats['bars']} velas, error máx frente a recálculo completo: {err:.2e}")
+    assert pf.stats["bars"] == len(r) and err < 1e-15
+    print("✅ Covarianza OK")
+
+
+def test_entry_gate():
+    print("🧪 Prueba de la puerta de riesgo marginal")
+    _st, pf = _portfolio(_market())
+    # Sin posiciones no se bloquea nada
+    assert pf.check_entry("ETHUSDT", "LONG", 100.0)[0]
+
+    pf.state.on_account_update({"E": 1, "T": 1, "a": {"P": [
+        {"s": "BTCUSDT", "pa": "1", "ep": "100", "up": "0", "ps": "BOTH"}]}})
+    exp = pf.exposures()
+    print(f"1️⃣  Exposición: neta={exp['net']:.1f} beta={exp['beta']:.1f} vol={exp['vol']:.3f}")
+
+    ok, reason = pf.check_entry("ETHUSDT", "LONG", 100.0)
+    print(f"2️⃣  LONG ETH con LONG BTC abierto: {ok} ({reason})")
+    assert not ok and "correlación" in reason
+    assert pf.check_entry("ETHUSDT", "SHORT", 100.0)[0]
+    assert pf.check_entry("XAUUSDT", "LONG", 100.0)[0]
+
+    # Beta: SOL (β≈1.5) LONG suma ~150 USDT a los ~92 de BTC
+    pf.max_corr = 1.0
+    m = pf.marginal_risk("SOLUSDT", "LONG", 100.0)
+    print(f"3️⃣  SOL LONG: beta {m['beta_now']:.1f} -> {m['beta_after']:.1f}, vol {m['vol_now']:.3f} -> {m['vol_after']:.3f}")
+    assert 200.0 < m["beta_after"] < 300.0 and m["vol_after"] > m["vol_now"]
+    assert pf.check_entry("SOLUSDT", "LONG", 100.0, equity=100.0)[0]
+    pf.max_beta_equity = 2.0
+    assert not pf.check_entry("SOLUSDT", "LONG", 100.0, equity=100.0)[0]
+    assert pf.check_entry("SOLUSDT", "SHORT", 100.0, equity=100.0)[0]      # reduce la exposición beta
+    assert pf.check_entry("SOLUSDT", "LONG", 100.0)[0]      # sin equity ni max_beta_usdt: sin tope
+    pf.max_beta_usdt = 200.0
+    assert not pf.check_entry("SOLUSDT", "LONG", 100.0)[0]
+
+    t0 = time.perf_counter()
+    for _ in range(10000):
+        pf.check_entry("XAUUSDT", "LONG", 100.0)
+    us = (time.perf_counter() - t0) / 10000 * 1e6
+    print(f"⏱️  check_entry: {us:.1f}µs")
+    print("✅ Puerta de cartera OK")
+
+
+def test_beta_mixed_notionals():
+    print("🧪 Prueba de tope beta con nocionales distintos")
+    _st, pf = _portfolio(_market())
+    pf.max_corr = 1.0
+    pf.max_beta_equity = 1.5
+    # LONG BTC de ~100 USDT con 1000 de equity: un LONG SOL de 5 USDT no debe bloquearse
+    pf.state.on_account_update({"E": 1, "T": 1, "a": {"P": [
+        {"s": "BTCUSDT", "pa": "1", "ep": "100", "up": "0", "ps": "BOTH"}]}})
+    ok, reason = pf.check_entry("SOLUSDT", "LONG", 5.0, equity=1000.0)
+    print(f"1️⃣  LONG SOL 5 USDT con LONG BTC ~100: {ok}")
+    assert ok
+    # Con una cartera grande frente a la equity sí bloquea, sea cual sea el nocional
+    pf.state.on_account_update({"E": 2, "T": 2, "a": {"P": [
+        {"s": "BTCUSDT", "pa": "20", "ep": "100", "up": "0", "ps": "BOTH"}]}})
+    ok, reason = pf.check_entry("SOLUSDT", "LONG", 5.0, equity=1000.0)
+    print(f"2️⃣  LONG SOL 5 USDT con LONG BTC ~1800: {ok} ({reason})")
+    assert not ok and "beta" in reason
+    assert pf.check_entry("SOLUSDT", "LONG", 500.0, equity=100000.0)[0]
+    print("✅ Tope beta OK")
+
+
+def _position(symbol, amt, price):
+    return PositionInfo(symbol=symbol, positionAmt=amt, entryPrice=price, markPrice=price, unrealizedProfit=0.0,
+                        leverage=5, liquidationPrice=0.0, side="LONG" if amt > 0 else "SHORT")
+
+
+def test_positions_from_cache_without_stream():
+    print("🧪 Prueba de la puerta de cartera sin user-data stream (USER_STREAM=false)")
+    _st, pf = _portfolio(_market(), synced=False)
+    saved = (execution._open_positions_cache, execution._last_cache_refresh)
+    try:
+        # Cache aún sin refrescar: no hay posiciones conocidas y la puerta no bloquea
+        execution._open_positions_cache, execution._last_cache_refresh = {}, 0.0
+        assert pf.check_entry("ETHUSDT", "LONG", 100.0)[0]
+
+        # Refresco REST con un LONG BTC abierto: la cantidad entra sin eventos del stream
+        execution._open_positions_cache = {"BTCUSDT": _position("BTCUSDT", 1.0, 100.0)}
+        execution._last_cache_refresh = 1000.0
+        ok, reason = pf.check_entry("ETHUSDT", "LONG", 100.0)
+        print(f"1️⃣  LONG ETH con LONG BTC en el cache: {ok} ({reason})")
+        assert not ok and "correlación" in reason
+        assert pf.qty[pf.index["BTCUSDT"]] == 1.0
+
+        # Cierre visto en el siguiente refresco
+        execution._open_positions_cache, execution._last_cache_refresh = {}, 1030.0
+        assert pf.check_entry("ETHUSDT", "LONG", 100.0)[0]
+        assert not pf.qty.any()
+
+        # Con el stream sincronizado el cache se ignora
+        execution._open_positions_cache = {"BTCUSDT": _position("BTCUSDT", 1.0, 100.0)}
+        execution._last_cache_refresh = 1060.0
+        pf.state.synced = True
+        assert pf.check_entry("ETHUSDT", "LONG", 100.0)[0]
+    finally:
+        execution._open_positions_cache, execution._last_cache_refresh = saved
+    print("✅ Cartera desde el cache OK")
+
+
+if __name__ == "__main__":
+    test_incremental_covariance()
+    test_entry_gate()
+    test_beta_mixed_notionals()
+    test_positions_from_cache_without_stream()
+    print("🎉 Pruebas de PortfolioRisk completadas")
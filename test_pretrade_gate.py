@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el estado local de cuenta y la puerta pre-trade
+"""
+
+import threading
+import time
+
+from pro_bot.core import execution, user_stream
+from pro_bot.core.pretrade_gate import PreTradeGate
+from pro_bot.core.user_stream import AccountState
+
+
+def test_account_state():
+    print("🧪 Prueba de AccountState")
+    st = AccountState()
+    st.apply_snapshot([{"symbol": "BTCUSDT", "positionAmt": "0.01", "entryPrice": "100", "updateTime": 10}],
+                      [{"orderId": 1, "symbol": "ETHUSDT", "type": "LIMIT", "status": "NEW", "updateTime": 10}], 20)
+    assert st.open_symbols() == ["BTCUSDT"] and st.has_pending_limit("ETHUSDT")
+
+    st.on_order_update({"E": 30, "T": 30, "o": {"i": 1, "s": "ETHUSDT", "o": "LIMIT", "X": "FILLED", "T": 30}})
+    st.on_account_update({"E": 31, "T": 31, "a": {"P": [
+        {"s": "BTCUSDT", "pa": "0", "ep": "0", "up": "0", "ps": "BOTH"},
+        {"s": "ETHUSDT", "pa": "1", "ep": "5", "up": "0", "ps": "BOTH"}]}})
+    print(f"1️⃣  Tras eventos: {st.open_symbols()} pendientes={st.pending_limit_symbols()}")
+    assert st.open_symbols() == ["ETHUSDT"] and not st.has_pending_limit("ETHUSDT")
+
+    # Un snapshot anterior a los eventos no los deshace
+    stale = st.apply_snapshot([{"symbol": "BTCUSDT", "positionAmt": "0.01", "updateTime": 10}],
+                              [{"orderId": 1, "symbol": "ETHUSDT", "type": "LIMIT", "status": "NEW", "updateTime": 10}], 25)
+    assert stale == 0 and st.open_symbols() == ["ETHUSDT"] and not st.has_pending_limit("ETHUSDT")
+    print("✅ AccountState OK")
+
+
+def test_gate_concurrency():
+    print("🧪 Prueba de PreTradeGate con workers concurrentes")
+    # Estado local en lugar del global del proceso (no se filtra a otras pruebas)
+    saved = user_stream._state
+    user_stream._state = AccountState()
+    try:
+        _gate_concurrency(user_stream._state)
+    finally:
+        user_stream._state = saved
+
+
+def _gate_concurrency(st):
+    st.apply_snapshot([{"symbol": "AUSDT", "positionAmt": "1", "updateTime": 1}], [], 2)
+    st.synced = True
+    gate = PreTradeGate(max_open=3)
+
+    barrier = threading.Barrier(20)
+    granted = []
+
+    def worker(sym):
+        barrier.wait()
+        if gate.try_reserve(sym)[0]:
+            granted.append(sym)
+
+    threads = [threading.Thread(target=worker, args=(f"S{i}USDT",)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"1️⃣  Reservas concedidas: {len(granted)} (límite 3, 1 posición abierta)")
+    assert len(granted) == 2
+    assert gate.check("AUSDT") == (False, "ya hay posición abierta")
+
+    # Entrada fallida libera el hueco; la abierta lo mantiene hasta que llega la posición
+    gate.release(granted[0], opened=False)
+    gate.release(granted[1], opened=True)
+    assert gate.try_reserve("NEWUSDT")[0] and not gate.try_reserve("OTHERUSDT")[0]
+    st.on_account_update({"E": 5, "T": 5, "a": {"P": [{"s": granted[1], "pa": "2", "ep": "1", "up": "0"}]}})
+    assert granted[1] not in gate._reserved
+    gate.register_cooldown("NEWUSDT", lambda: (True, "apertura hace 4.0m"))
+    gate.release("NEWUSDT")
+    assert gate.check("NEWUSDT")[1].startswith("cooldown")
+    print("✅ PreTradeGate OK")
+
+
+def test_cache_refresher_without_stream():
+    print("🧪 Prueba del refresco del cache de posiciones sin user-data stream")
+    calls = []
+    saved = (execution._refresh_caches_once, execution.start_user_stream, execution._refresher)
+    execution._refresh_caches_once = lambda: calls.append(time.monotonic())
+    execution.start_user_stream = lambda: None
+    execution._refresher = None
+    try:
+        t = execution.start_positions_cache_refresher(poll_interval=3600)
+        for _ in range(200):
+            if len(calls) >= 2:
+                break
+            time.sleep(0.01)
+        # Refresco síncrono + primera vuelta del hilo; arrancarlo otra vez no duplica el hilo
+        assert execution.start_positions_cache_refresher(poll_interval=3600) is t
+        print(f"1️⃣  Hilo {t.name} vivo={t.is_alive()} daemon={t.daemon}, refrescos={len(calls)}")
+        assert t.is_alive() and t.daemon and len(calls) == 2
+    finally:
+        execution._refresh_caches_once, execution.start_user_stream, execution._refresher = saved
+    print("✅ Refresco del cache OK")
+
+
+if __name__ == "__main__":
+    test_account_state()
+    test_gate_concurrency()
+    test_cache_refresher_without_stream()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para RateGovernor con reloj inyectado: topes por carril,
+descarte, prioridad entre carriles, cabeceras del servidor, baneo 429/418 y acquire_async
+"""
+
+import asyncio
+import threading
+import time
+
+from pro_bot.core.rate_governor import (ENTRY, MARKET_DATA, POSITION, PROTECT, RateGovernor,
+                                        RateLimitShed)
+
+
+class _Clock:
+    """Reloj falso: el tiempo solo avanza cuando la prueba lo mueve."""
+
+    def __init__(self, t=0.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def _shed(gov, lane_id, weight=1, orders=0, max_wait=0.0):
+    try:
+        gov.acquire(lane_id, weight, orders, max_wait=max_wait)
+    except RateLimitShed:
+        return True
+    return False
+
+
+def test_lane_caps_and_shedding():
+    print("🧪 Prueba de topes por carril y descarte")
+    clock = _Clock(10.0)
+    gov = RateGovernor(weight_limit=100, order_limit=10, clock=clock)
+
+    # MARKET_DATA llega hasta el 60 % del límite; a partir de ahí se descarta
+    gov.acquire(MARKET_DATA, 60)
+    assert _shed(gov, MARKET_DATA)
+    # ENTRY espera como mucho 2 s: faltan 50 s para el minuto -> descarte con su espera por defecto
+    gov.acquire(POSITION, 15)
+    gov.acquire(ENTRY, 15)
+    try:
+        gov.acquire(ENTRY, 1)
+        assert False, "debería descartarse"
+    except RateLimitShed:
+        pass
+    # PROTECT usa el 100 % y nunca se descarta por defecto
+    gov.acquire(PROTECT, 10)
+    assert gov.used_weight == 100
+    print(f"1️⃣  Uso {gov.used_weight}/{gov.weight_limit}: {gov.summary()['lanes']}")
+    assert gov.stats["market_data"]["shed"] == 1 and gov.stats["entry"]["shed"] == 1
+    assert gov.stats["protect"] == {"granted": 1, "shed": 0, "waited_s": 0.0}
+
+    # Tope de órdenes por carril (ENTRY 90 % de 10 -> 9)
+    clock.t = 60.0
+    gov.acquire(ENTRY, 1, orders=9)
+    assert _shed(gov, ENTRY, orders=1)
+    gov.acquire(PROTECT, 1, orders=1)
+
+    # Minuto nuevo: el uso vuelve a cero y todo sale sin esperar
+    clock.t = 120.0
+    gov.acquire(MARKET_DATA, 60)
+    assert gov.summary()["used_weight"] == 60 and gov.used_orders == 0
+    print("✅ Topes y descarte OK")
+
+
+def test_lower_lane_does_not_overtake():
+    print("🧪 Prueba de prioridad: un carril bajo no adelanta a uno alto en espera")
+    clock = _Clock(30.0)
+    gov = RateGovernor(weight_limit=100, order_limit=10, clock=clock)
+    gov.observe(200, {"X-MBX-ORDER-COUNT-1M": "10"})
+
+    # PROTECT espera por el tope de órdenes (sin límite de espera)
+    done = threading.Event()
+    t = threading.Thread(target=lambda: (gov.acquire(PROTECT, 1, orders=1), done.set()), daemon=True)
+    t.start()
+    for _ in range(200):
+        if gov._waiting[PROTECT]:
+            break
+        time.sleep(0.005)
+    assert gov._waiting[PROTECT] == 1 and not done.is_set()
+
+    # MARKET_DATA tiene peso de sobra pero no sale mientras PROTECT espera
+    assert _shed(gov, MARKET_DATA, max_wait=0.01)
+    assert gov.used_weight == 0
+
+    # Al cambiar de minuto sale primero PROTECT y después ya pasa el resto
+    clock.t = 60.0
+    gov.observe(200, {})
+    assert done.wait(2)
+    t.join(2)
+    gov.acquire(MARKET_DATA, 1, max_wait=0.0)
+    print(f"1️⃣  Tras el minuto: peso {gov.used_weight}, órdenes {gov.used_orders}")
+    assert gov._waiting == [0, 0, 0, 0] and gov.used_orders == 1 and gov.used_weight == 2
+    print("✅ Prioridad entre carriles OK")
+
+
+def test_observe_headers_and_ban():
+    print("🧪 Prueba de cabeceras del servidor y baneo 429/418")
+    clock = _Clock(5.0)
+    gov = RateGovernor(weight_limit=100, order_limit=10, clock=clock)
+    gov.acquire(POSITION, 5)
+
+    # El uso es el máximo entre la estimación local y la cabecera
+    gov.observe(200, {"X-MBX-USED-WEIGHT-1M": "40", "X-MBX-ORDER-COUNT-1M": "3"})
+    assert (gov.used_weight, gov.used_orders) == (40, 3)
+    gov.observe(200, {"x-mbx-used-weight-1m": "12"})
+    assert gov.used_weight == 40
+    # Con la cabecera, MARKET_DATA (60 %) ya no cabe con peso 25
+    assert _shed(gov, MARKET_DATA, weight=25)
+
+    # 429 con Retry-After: bloquea todos los carriles, también PROTECT
+    gov.observe(429, {"Retry-After": "7"})
+    assert gov.summary()["banned_for_s"] == 7.0
+    assert _shed(gov, PROTECT)
+    clock.t = 11.0
+    assert _shed(gov, PROTECT)
+    clock.t = 12.0
+    gov.acquire(PROTECT, 1, max_wait=0.0)
+
+    # 418 sin Retry-After: 60 s por defecto; un baneo más corto no lo acorta
+    gov.observe(418, {})
+    gov.observe(429, {"Retry-After": "1"})
+    print(f"1️⃣  Tras 418: {gov.summary()['banned_for_s']:.0f}s bloqueado")
+    assert gov.banned_until == 72.0
+    # Mismo minuto: las cabeceras nunca rebajan el uso; minuto nuevo: se reinicia
+    clock.t = 72.0
+    gov.observe(200, {"X-MBX-USED-WEIGHT-1M": "3"})
+    assert gov.used_weight == 3 and gov.used_orders == 0
+    print("✅ Cabeceras y baneo OK")
+
+
+def test_acquire_async():
+    print("🧪 Prueba de acquire_async sin bloquear el event loop")
+    clock = _Clock(59.9)
+    gov = RateGovernor(weight_limit=100, order_limit=10, clock=clock)
+    gov.observe(200, {"X-MBX-USED-WEIGHT-1M": "90"})
+    ticks = []
+
+    async def advance():
+        # El loop sigue libre mientras ENTRY espera: este tick corre y mueve el reloj
+        ticks.append(gov._waiting[ENTRY])
+        clock.t = 60.0
+
+    async def main():
+        waiter = asyncio.create_task(gov.acquire_async(ENTRY, 5))
+        await asyncio.sleep(0)
+        await advance()
+        await waiter
+        # ENTRY con 30 s hasta el minuto y 2 s de espera máxima: descarte inmediato
+        clock.t = 90.0
+        gov.observe(200, {"X-MBX-USED-WEIGHT-1M": "90"})
+        try:
+            await gov.acquire_async(ENTRY, 5)
+            assert False, "debería descartarse"
+        except RateLimitShed:
+            pass
+        await gov.acquire_async(PROTECT, 5, max_wait=0.0)
+
+    asyncio.run(main())
+    print(f"1️⃣  En espera durante el tick: {ticks}, stats entry={gov.stats['entry']}")
+    assert ticks == [1] and gov._waiting == [0, 0, 0, 0]
+    assert gov.stats["entry"]["granted"] == 1 and gov.stats["entry"]["shed"] == 1
+    assert gov.stats["entry"]["waited_s"] > 0 and gov.used_weight == 95
+    print("✅ acquire_async OK")
+
+
+if __name__ == "__main__":
+    test_lane_caps_and_shedding()
+    test_lower_lane_does_not_overtake()
+    test_observe_headers_and_ban()
+    test_acquire_async()
+    print("🎉 Pruebas de RateGovernor completadas")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para ModelRegistry: cadena de fallback, modelos compartidos y TTL de fallos
+"""
+
+import os
+import tempfile
+import time
+
+import joblib
+
+from pro_ml.core.live.registry import ModelRegistry
+
+
+def _save(d, name, model="best_model.joblib", meta="metadata.joblib"):
+    os.makedirs(d, exist_ok=True)
+    joblib.dump({"name": name}, os.path.join(d, model))
+    joblib.dump({"features": [f"{name}_f1", f"{name}_f2"]}, os.path.join(d, meta))
+
+
+def test_fallback_chain():
+    print("🧪 Prueba de la cadena de fallback")
+    with tempfile.TemporaryDirectory() as base:
+        _save(os.path.join(base, "BTCUSDT", "3m"), "btc3m")
+        _save(os.path.join(base, "BTCUSDT"), "btc")
+        _save(base, "eth", model="ETHUSDT_best_model.joblib", meta="ETHUSDT_metadata.joblib")
+        _save(base, "global")
+        reg = ModelRegistry(base_dir=base, use_mmap=False)
+
+        assert reg.resolve("BTCUSDT", "3m").model["name"] == "btc3m"
+        assert reg.resolve("btcusdt", "5m").model["name"] == "btc"        # sin carpeta 5m: símbolo
+        assert reg.resolve("BTCUSDT").model["name"] == "btc"
+        assert reg.resolve("ETHUSDT", "1m").model["name"] == "eth"        # nombre plano de train_batch
+        assert reg.resolve("SOLUSDT", "1m").model["name"] == "global"
+        model, meta = reg.get("BTCUSDT", "3m")
+        assert meta["features"] == ["btc3m_f1", "btc3m_f2"]
+        print(f"1️⃣  {len(reg.cache)} claves resueltas")
+
+        # Claves que caen en el mismo fichero comparten la entrada (se carga una vez)
+        assert reg.resolve("BTCUSDT", "5m") is reg.resolve("BTCUSDT", "15m") is reg.resolve("BTCUSDT")
+        assert reg.resolve("SOLUSDT", "1m") is reg.resolve("XRPUSDT", "5m")
+        assert len(reg._by_path) == 4
+    print("✅ Fallback OK")
+
+
+def test_miss_ttl():
+    print("🧪 Prueba del TTL de modelos no encontrados")
+    with tempfile.TemporaryDirectory() as base:
+        reg = ModelRegistry(base_dir=base, use_mmap=False, miss_ttl=0.2)
+        for _ in range(2):
+            try:
+                reg.resolve("BTCUSDT", "1m")
+                assert False, "debería fallar"
+            except FileNotFoundError:
+                pass
+        assert reg.resolved_path("BTCUSDT", "1m") is None
+
+        # Dentro del TTL no se vuelve a mirar el disco aunque el modelo aparezca
+        _save(os.path.join(base, "BTCUSDT"), "btc")
+        assert reg.resolved_path("BTCUSDT", "1m") is None
+        time.sleep(0.25)
+        assert reg.resolve("BTCUSDT", "1m").model["name"] == "btc"
+        print("1️⃣  Modelo visible tras vencer el TTL")
+
+        # invalidate() olvida resoluciones y modelos compartidos
+        _save(os.path.join(base, "BTCUSDT", "1m"), "btc1m")
+        assert reg.resolve("BTCUSDT", "1m").model["name"] == "btc"
+        reg.invalidate()
+        assert reg.resolve("BTCUSDT", "1m").model["name"] == "btc1m"
+    print("✅ TTL OK")
+
+
+if __name__ == "__main__":
+    test_fallback_chain()
+    test_miss_ttl()
+    print("🎉 Pruebas de ModelRegistry completadas")
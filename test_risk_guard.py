@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para RiskGuard alimentado por streams (sin REST ni disco en la ruta caliente)
+"""
+
+import json
+import tempfile
+import os
+from contextlib import contextmanager
+
+from pro_bot.core import risk_guard
+from pro_bot.core.account_config import get_account_config
+from pro_bot.core.user_stream import AccountState
+
+
+class _Cli:
+    """Cliente falso: symbolConfig para la caché de cuenta."""
+
+    def futures_symbol_config(self, **params):
+        return [{"symbol": "BTCUSDT", "marginType": "CROSSED", "leverage": 10}]
+
+    def futures_account_config(self, **params):
+        return {"dualSidePosition": False}
+
+
+def _account(wallet, unrealized=0.0):
+    return lambda: {"wallet": wallet, "unrealized": unrealized, "available": wallet + unrealized}
+
+
+def _no_account():
+    raise ConnectionError("sin red")
+
+
+_PATCHED = ("RUNTIME_DIR", "BASELINE_FILE", "LOCK_FILE", "_get_account_usdt", "live_account_state")
+
+
+@contextmanager
+def _guard(wallet=1000.0, account=None, baseline=None):
+    """RiskGuard sobre un directorio temporal; restaura los globales de risk_guard y la caché de cuenta al salir."""
+    saved = {name: getattr(risk_guard, name) for name in _PATCHED}
+    cfg = get_account_config()
+    saved_cfg = (cfg.cli, dict(cfg.leverage), dict(cfg.margin_type), cfg.dual_side, cfg.loaded)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            risk_guard.RUNTIME_DIR = tmp
+            risk_guard.BASELINE_FILE = os.path.join(tmp, "equity_baseline.json")
+            risk_guard.LOCK_FILE = os.path.join(tmp, "kill_switch.lock")
+            if baseline is not None:
+                with open(risk_guard.BASELINE_FILE, "w") as f:
+                    json.dump({"date": risk_guard._today_key(), "baseline_equity": baseline}, f)
+            risk_guard._get_account_usdt = account or _account(wallet)
+            cfg.cli = _Cli()
+            st = AccountState()
+            yield st, risk_guard.RiskGuard(max_daily_dd=0.03, account_state=st, persist=False)
+    finally:
+        for name, value in saved.items():
+            setattr(risk_guard, name, value)
+        cfg.cli, cfg.leverage, cfg.margin_type, cfg.dual_side, cfg.loaded = saved_cfg
+
+
+def test_drawdown_from_stream():
+    print("🧪 Prueba de equity y kill switch por stream")
+    with _guard() as (st, guard):
+        assert guard.baseline == 1000.0 and guard.can_trade()
+
+        st.on_account_update({"E": 10, "T": 10, "a": {"P": [
+            {"s": "BTCUSDT", "pa": "1", "ep": "100", "up": "0", "ps": "BOTH"}]}})
+        guard.on_prices({"BTCUSDT": 90.0, "ETHUSDT": 5.0})
+        print(f"1️⃣  Equity {guard.equity:.2f} DD {guard.drawdown:.2%}")
+        assert guard.equity == 990.0 and guard.can_trade()
+
+        guard.on_prices({"BTCUSDT": 60.0})
+        print(f"2️⃣  Equity {guard.equity:.2f} DD {guard.drawdown:.2%} tripped={guard.is_tripped()}")
+        assert guard.is_tripped() and not guard.can_trade()
+
+        # Cierre con pérdida realizada: la equity pasa al wallet
+        st.on_account_update({"E": 20, "T": 20, "a": {"B": [{"a": "USDT", "wb": "960"}], "P": [
+            {"s": "BTCUSDT", "pa": "0", "ep": "0", "up": "0", "ps": "BOTH"}]}})
+        assert guard.equity == 960.0 and guard.unrealized == 0.0
+    print("✅ Drawdown por stream OK")
+
+
+def test_margin_check():
+    print("🧪 Prueba de margen libre en memoria")
+    with _guard(wallet=100.0) as (st, guard):
+        st.apply_snapshot([{"symbol": "BTCUSDT", "positionAmt": "1", "entryPrice": "400", "markPrice": "400",
+                            "leverage": "5", "updateTime": 1}], [], 2)
+        print(f"1️⃣  Margen usado {guard.used_margin():.2f}, libre {guard.available_margin():.2f}")
+        assert guard.used_margin() == 80.0
+        assert guard.has_margin_for(notional=50.0, leverage=5)
+        assert not guard.has_margin_for(notional=500.0, leverage=5)
+    print("✅ Margen OK")
+
+
+def test_rest_without_risk_loop():
+    print("🧪 Prueba de on_loop con stream vivo y sin risk loop")
+    with _guard() as (st, guard):
+        st.synced = True
+        risk_guard.live_account_state = lambda: st
+        # Sin mark prices el PnL no realizado solo llega por REST
+        risk_guard._get_account_usdt = _account(1000.0, -50.0)
+        guard.on_loop()
+        print(f"1️⃣  Sin risk loop: equity {guard.equity:.2f} tripped={guard.is_tripped()}")
+        assert guard.equity == 950.0 and guard.is_tripped()
+
+        # Con mark prices recientes no se vuelve a REST
+        guard.on_prices({})
+        risk_guard._get_account_usdt = _account(0.0)
+        guard.on_loop()
+        assert guard.equity == 950.0
+    print("✅ REST sin risk loop OK")
+
+
+def test_margin_leverage_from_config():
+    print("🧪 Prueba de leverage de symbolConfig en el margen usado")
+    with _guard(wallet=100.0) as (st, guard):
+        # Fila de positionRisk v3: sin leverage
+        st.apply_snapshot([{"symbol": "BTCUSDT", "positionAmt": "1", "entryPrice": "400", "markPrice": "400",
+                            "updateTime": 1}], [], 2)
+        print(f"1️⃣  Margen usado {guard.used_margin():.2f} (leverage {get_account_config().leverage['BTCUSDT']})")
+        assert guard.used_margin() == 40.0
+    print("✅ Leverage de la caché OK")
+
+
+def test_baseline_waits_for_equity():
+    print("🧪 Prueba de equity base sin lectura inicial")
+    with _guard(account=_no_account) as (st, guard):
+        # REST caído al arrancar: la base queda sin fijar y no se guarda
+        guard._flush()
+        print(f"1️⃣  Sin lectura: base {guard.baseline}, fichero={os.path.exists(risk_guard.BASELINE_FILE)}")
+        assert guard.baseline == 0.0 and not os.path.exists(risk_guard.BASELINE_FILE)
+
+        # Un evento de posición sin balance no es una equity válida
+        st.on_account_update({"E": 10, "T": 10, "a": {"P": [
+            {"s": "BTCUSDT", "pa": "1", "ep": "100", "up": "-5", "ps": "BOTH"}]}})
+        assert guard.baseline == 0.0
+
+        # Primer on_loop bueno: fija y persiste la base; a partir de ahí el kill switch funciona
+        risk_guard._get_account_usdt = _account(1000.0)
+        guard.on_loop()
+        guard._flush()
+        with open(risk_guard.BASELINE_FILE) as f:
+            assert json.load(f)["baseline_equity"] == 1000.0
+        risk_guard._get_account_usdt = _account(1000.0, -40.0)
+        guard.on_loop()
+        print(f"2️⃣  Base {guard.baseline:.2f}, DD {guard.drawdown:.2%}, tripped={guard.is_tripped()}")
+        assert guard.baseline == 1000.0 and guard.is_tripped()
+
+    # Base guardada <= 0 (versiones anteriores): se ignora y se fija con el balance del stream
+    with _guard(account=_no_account, baseline=0.0) as (st, guard):
+        assert guard.baseline == 0.0
+        st.on_account_update({"E": 10, "T": 10, "a": {"B": [{"a": "USDT", "wb": "500"}]}})
+        print(f"3️⃣  Base guardada 0 -> base del stream {guard.baseline:.2f}")
+        assert guard.baseline == 500.0 and guard.can_trade()
+    with _guard(baseline=800.0) as (st, guard):
+        assert guard.baseline == 800.0
+    print("✅ Equity base OK")
+
+
+if __name__ == "__main__":
+    test_drawdown_from_stream()
+    test_margin_check()
+    test_rest_without_risk_loop()
+    test_margin_leverage_from_config()
+    test_baseline_waits_for_equity()
+    print("🎉 Pruebas de RiskGuard completadas")
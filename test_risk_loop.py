@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para MarkPriceRiskLoop: las comprobaciones vectorizadas (break-even,
+activación del trailing, paso por vela y callbackRate del exchange) disparan exactamente
+en las filas en las que SLTPManager._evaluate actuaría
+"""
+
+import copy
+import random
+import threading
+
+import numpy as np
+
+from pro_bot.core.risk_loop import MarkPriceRiskLoop
+from pro_bot.core.sl_tp_manager import SLTPManager, TradeState
+
+
+def _manager(symbol, state, atr):
+    """SLTPManager falso: _evaluate real, con stop y trailing del exchange registrados en memoria."""
+    pm = SLTPManager.__new__(SLTPManager)
+    pm.symbol, pm.state, pm.last_atr, pm.stop = symbol, state, atr, None
+    pm._lock = threading.RLock()
+    pm.break_even_r, pm.trailing_activate_after_r = 0.75, 1.0
+    pm.trailing_atr_mult, pm.trailing_min_move, pm.trailing_callback_min_change = 0.8, 0.1, 0.2
+    pm.actions, pm.evaluated = [], 0
+
+    def move_stop(price):
+        pm.actions.append(("stop", price))
+
+    def place_server_trailing(price, atr, current_r, activation=None, qty=None, rate=None):
+        pm.actions.append(("trail", rate))
+        pm.state.trail_callback = rate
+        pm.state.trail_peak = price if activation is None else 0.0
+        return True
+
+    evaluate = pm.evaluate
+
+    def counted(last_close, atr):
+        pm.evaluated += 1
+        evaluate(last_close, atr)
+
+    pm._move_stop, pm._place_server_trailing, pm.evaluate = move_stop, place_server_trailing, counted
+    return pm
+
+
+def _acts(pm, price):
+    """¿Actuaría _evaluate con este precio? Se prueba sobre una copia y se devuelve su estado."""
+    ref = _manager(pm.symbol, copy.deepcopy(pm.state), pm.last_atr)
+    before = (ref.state.break_even_moved, ref.state.trailing_active)
+    ref._evaluate(price, ref.last_atr)
+    acted = bool(ref.actions) or (ref.state.break_even_moved, ref.state.trailing_active) != before
+    return acted, ref.state
+
+
+def _fields(s):
+    return (s.break_even_moved, s.trailing_active, s.last_trail_price, s.trail_callback)
+
+
+def test_loop_fires_exactly_when_evaluate_acts():
+    print("🧪 Prueba de equivalencia risk loop vectorizado vs SLTPManager._evaluate")
+    rng = random.Random(45)
+    managers, prices = {}, {}
+    for k in range(40):
+        sym = f"S{k}USDT"
+        side = rng.choice(("BUY", "SELL"))
+        entry = rng.uniform(10, 1000)
+        r_value = entry * rng.uniform(0.005, 0.02)
+        server = k % 2 == 0
+        state = TradeState(active=True, side=side, entry_price=entry, qty=1.0, r_value=r_value,
+                           trail_order_id=1000 + k if server else None,
+                           trail_callback=0.8 if server else 0.0, trail_activation="x" if server else None)
+        managers[sym] = _manager(sym, state, atr=r_value * rng.uniform(0.2, 1.0))
+        prices[sym] = entry
+    loop = MarkPriceRiskLoop(managers, url="ws://unused")
+
+    fired_total = {"be": 0, "activate": 0, "client": 0, "server": 0}
+    for tick in range(300):
+        for sym, pm in managers.items():
+            # Paseo aleatorio con sesgo a favor para cruzar los umbrales; a veces falta el precio
+            s = pm.state
+            drift = (1 if s.side == "BUY" else -1) * s.r_value * 0.02
+            prices[sym] += drift + rng.gauss(0, s.r_value * 0.15)
+            pm.last_atr = max(1e-6, pm.last_atr * rng.uniform(0.9, 1.1))
+        tick_prices = {sym: px for sym, px in prices.items() if rng.random() > 0.05}
+
+        expected, ref_states = set(), {}
+        for sym, pm in managers.items():
+            if sym in tick_prices:
+                acted, ref_states[sym] = _acts(pm, tick_prices[sym])
+                if acted:
+                    expected.add(sym)
+        before = {sym: pm.evaluated for sym, pm in managers.items()}
+        snap = {sym: copy.deepcopy(pm.state) for sym, pm in managers.items()}
+
+        n = loop.on_prices(tick_prices)
+        fired = {sym for sym, pm in managers.items() if pm.evaluated > before[sym]}
+        assert fired == expected, (tick, sorted(fired ^ expected))
+        assert n == len(fired)
+
+        # Las filas sin acción quedan con el mismo R máximo y pico que dejaría _evaluate
+        for sym, ref in ref_states.items():
+            live = managers[sym].state
+            assert np.isclose(live.max_favorable_r, ref.max_favorable_r, rtol=1e-9), (tick, sym)
+            assert live.trail_peak == ref.trail_peak and _fields(live) == _fields(ref), (tick, sym)
+        for sym in fired:
+            s0, s1 = snap[sym], managers[sym].state
+            fired_total["be"] += s1.break_even_moved and not s0.break_even_moved
+            fired_total["activate"] += s1.trailing_active and not s0.trailing_active
+            fired_total["client"] += s1.trail_order_id is None and s1.last_trail_price != s0.last_trail_price
+            fired_total["server"] += s1.trail_callback != s0.trail_callback
+
+    print(f"1️⃣  {loop.stats['ticks']} ticks, {loop.stats['actions']} acciones: {fired_total}")
+    # Se han ejercitado todas las ramas
+    assert all(v > 0 for v in fired_total.values())
+    print("✅ Risk loop equivalente a _evaluate OK")
+
+
+if __name__ == "__main__":
+    test_loop_fires_exactly_when_evaluate_acts()
+    print("🎉 Pruebas del risk loop completadas")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para ShadowScorer: cola acotada sin bloqueo, descarte con la cola llena y escritura .npz
+"""
+
+import glob
+import os
+import tempfile
+import threading
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from pro_ml.core.live.shadow import SHADOW_DIR, ShadowScorer
+
+FEATURES = ["f1", "f2"]
+
+
+class _GatedModel:
+    """Modelo sombra falso: p = f1, y espera a `gate` antes de puntuar."""
+    gate = threading.Event()
+
+    def predict_proba(self, X):
+        _GatedModel.gate.wait(5)
+        p = X["f1"].to_numpy()
+        return np.column_stack([1 - p, p])
+
+
+def _save_shadow(base, symbol):
+    d = os.path.join(base, symbol, SHADOW_DIR)
+    os.makedirs(d)
+    joblib.dump(_GatedModel(), os.path.join(d, "best_model.joblib"))
+    joblib.dump({"features": FEATURES}, os.path.join(d, "metadata.joblib"))
+
+
+def _rows(k):
+    idx = pd.date_range("2026-01-01", periods=1, freq="min") + pd.Timedelta(minutes=k)
+    return pd.DataFrame({"f1": [k / 10.0], "f2": [1.0]}, index=idx)
+
+
+def test_queue_drop_and_flush():
+    print("🧪 Prueba de cola del ShadowScorer (descarte y flush)")
+    with tempfile.TemporaryDirectory() as base, tempfile.TemporaryDirectory() as logs:
+        _save_shadow(base, "BTCUSDT")
+        _GatedModel.gate.clear()
+        sc = ShadowScorer(base_dir=base, log_dir=logs, maxsize=2, flush_rows=1000, use_mmap=False)
+        try:
+            # La primera fila ocupa el hilo (modelo bloqueado); luego se llena la cola
+            assert sc.submit("btcusdt", None, _rows(0), np.array([0.5]))
+            for _ in range(200):
+                if sc.queue.qsize() == 0:
+                    break
+                time.sleep(0.01)
+            assert sc.submit("BTCUSDT", None, _rows(1), np.array([0.6]))
+            assert sc.submit("BTCUSDT", None, _rows(2), np.array([0.7]))
+            # Cola llena: se descarta sin bloquear el hot path
+            assert not sc.submit("BTCUSDT", None, _rows(3), np.array([0.8]))
+            print(f"1️⃣  Con la cola llena: {sc.get_statistics()}")
+            assert sc.stats["dropped"] == 1 and sc.stats["submitted"] == 3
+
+            # Nada se escribe hasta flush (flush_rows alto)
+            _GatedModel.gate.set()
+            sc.flush(timeout=5)
+            files = glob.glob(os.path.join(logs, "BTCUSDT", "*.npz"))
+            assert len(files) == 1
+            data = np.load(files[0])
+            print(f"2️⃣  {os.path.basename(files[0])}: live={data['live_p'].tolist()} shadow={data['shadow_p'].tolist()}")
+            np.testing.assert_allclose(data["live_p"], [0.5, 0.6, 0.7], rtol=1e-6)
+            np.testing.assert_allclose(data["shadow_p"], [0.0, 0.1, 0.2], rtol=1e-6)
+            assert data["ts"].tolist() == [int(_rows(k).index[0].value // 10**6) for k in range(3)]
+            assert sc.stats["scored"] == 3 and sc.stats["written"] == 3 and sc.stats["errors"] == 0
+        finally:
+            _GatedModel.gate.set()
+            sc.close()
+    print("✅ Cola y flush OK")
+
+
+def test_absent_symbol_and_close():
+    print("🧪 Prueba de símbolo sin modelo sombra y cierre")
+    with tempfile.TemporaryDirectory() as base, tempfile.TemporaryDirectory() as logs:
+        _save_shadow(base, "BTCUSDT")
+        _GatedModel.gate.set()
+        sc = ShadowScorer(base_dir=base, log_dir=logs, flush_rows=1000, use_mmap=False)
+        assert sc.submit("ETHUSDT", "1m", _rows(0), np.array([0.5]))
+        sc.flush(timeout=5)
+        # Sin directorio shadow el hot path ya no encola
+        assert not sc.submit("ETHUSDT", "1m", _rows(1), np.array([0.5]))
+        assert sc.stats["dropped"] == 0
+
+        # close() escribe lo pendiente
+        assert sc.submit("BTCUSDT", "1m", _rows(0), np.array([0.5]))
+        sc.close()
+        files = glob.glob(os.path.join(logs, "BTCUSDT", "*.npz"))
+        print(f"1️⃣  Tras close: {len(files)} fichero(s)")
+        assert len(files) == 1 and np.load(files[0])["tf"].tolist() == ["1m"]
+        assert not sc.submit("BTCUSDT", "1m", _rows(1), np.array([0.5]))
+    print("✅ Símbolo ausente y cierre OK")
+
+
+if __name__ == "__main__":
+    test_queue_drop_and_flush()
+    test_absent_symbol_and_close()
+    print("🎉 Pruebas de ShadowScorer completadas")
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para SLTPManager de punta a punta contra un exchange simulado:
+apertura con SL+TP en batch como única protección, movimiento del stop gestionado
+y trailing en el exchange (modo server)
+"""
+
+import time
+from decimal import Decimal
+
+from pro_bot.core import exchange, exchange_info, execution, sl_tp_manager, stop_manager
+from pro_bot.core.exchange_info import ExchangeInfoService
+from pro_bot.core.oco import OcoEngine
+from pro_bot.core.pretrade_gate import PreTradeGate
+from pro_bot.core.user_stream import AccountState
+
+FIXTURE = {"symbols": [{
+    "symbol": sym, "contractType": "PERPETUAL", "quoteAsset": "USDT", "status": "TRADING",
+    "filters": [{"filterType": "PRICE_FILTER", "tickSize": "0.10"},
+                {"filterType": "LOT_SIZE", "stepSize": "0.001", "minQty": "0.001"},
+                {"filterType": "MIN_NOTIONAL", "notional": "5"}]}
+    for sym in ("BTCUSDT", "ETHUSDT")]}
+
+CFG = {"risk": {"stop_loss_atr_mult": 2.0, "break_even_r": 0.75, "cooldown_minutes": 0,
+                "trailing": {"activate_after_r": 1.0, "atr_mult": 0.8}}}
+CFG_SERVER = {"risk": dict(CFG["risk"], trailing=dict(CFG["risk"]["trailing"], mode="server"))}
+
+
+class _ApiError(Exception):
+    def __init__(self, code, msg):
+        super().__init__(f"APIError(code={code}): {msg}")
+        self.code = code
+        self.msg = msg
+
+
+class _Exchange:
+    """Exchange falso: MARKET se llena al precio; un solo closePosition por tipo y lado (-4130)."""
+
+    def __init__(self, price=100.0):
+        self.price = price
+        self.open = {}
+        self.next_id = 1
+        self.rejected = []
+
+    def _add(self, params):
+        p = dict(params)
+        if p.get("closePosition") == "true" and any(
+                o["type"] == p["type"] and o["side"] == p["side"] and o.get("closePosition") == "true"
+                for o in self.open.values()):
+            self.rejected.append(p["type"])
+            raise _ApiError(-4130, "An open stop or take profit order with GTE and closePosition "
+                                   "in the direction is existing.")
+        self.next_id += 1
+        self.open[self.next_id] = p
+        return {"orderId": self.next_id, **p}
+
+    def futures_create_order(self, **params):
+        if params["type"] == "MARKET":
+            self.next_id += 1
+            return {"orderId": self.next_id, "status": "FILLED", "avgPrice": str(self.price),
+                    "executedQty": params["quantity"]}
+        return self._add(params)
+
+    def futures_place_batch_order(self, batchOrders):
+        out = []
+        for o in batchOrders:
+            try:
+                out.append(self._add(o))
+            except _ApiError as e:
+                out.append({"code": e.code, "msg": e.msg})
+        return out
+
+    def futures_cancel_order(self, symbol, orderId):
+        if self.open.pop(orderId, None) is None:
+            raise _ApiError(-2011, "Unknown order sent.")
+        return {"orderId": orderId}
+
+    def futures_cancel_all_open_orders(self, symbol):
+        self.open.clear()
+
+    def of_type(self, order_type):
+        return [(oid, o) for oid, o in self.open.items() if o["type"] == order_type]
+
+
+class _Client:
+    def __init__(self, cli):
+        self.client = cli
+
+
+def _wait(cond, timeout=3.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return cond()
+
+
+def _trailing(ex):
+    legs = ex.of_type("TRAILING_STOP_MARKET")
+    assert len(legs) <= 1, legs
+    return legs[0] if legs else (None, None)
+
+
+class _Patched:
+    """Sustituye cliente, filtros, plan de entrada, puerta pre-trade y OCO; restaura todo al salir."""
+
+    def __init__(self, ex):
+        self.ex = ex
+        self.gate = PreTradeGate(max_open=5)
+        self.engine = OcoEngine(state=AccountState(), cancel_all=ex.futures_cancel_all_open_orders,
+                                cancel=lambda s, oid: ex.futures_cancel_order(symbol=s, orderId=oid),
+                                place=lambda params: ex.futures_create_order(**params))
+
+    def _plan(self, sym, direction, px, tp_rr, sl_rr, set_leverage=True):
+        side = "BUY" if direction == "LONG" else "SELL"
+        sign = 1 if direction == "LONG" else -1
+        return {"qty": Decimal("1.000"), "qty_str": "1.000", "leverage": 5, "side": side,
+                "tp": px + sign * 3, "sl": px - sign * 2}
+
+    def __enter__(self):
+        client = lambda: _Client(self.ex)
+        self.saved = (exchange_info._service, dict(exchange._filters_cache), execution.get_client,
+                      stop_manager.get_client, sl_tp_manager.get_client, sl_tp_manager.get_oco_engine,
+                      execution._plan_entry, execution._post_trade_reconcile, execution.get_gate)
+        exchange_info._service = ExchangeInfoService(path=None, fetch=lambda: FIXTURE)
+        exchange._filters_cache.clear()
+        execution.get_client = stop_manager.get_client = sl_tp_manager.get_client = client
+        sl_tp_manager.get_oco_engine = lambda: self.engine
+        execution._plan_entry = self._plan
+        execution._post_trade_reconcile = lambda sym, qty: self.gate.release(sym)
+        execution.get_gate = lambda: self.gate
+        for sym in ("BTCUSDT", "ETHUSDT"):
+            execution.note_price(sym, self.ex.price)
+        return self
+
+    def __exit__(self, *exc):
+        (exchange_info._service, filters, execution.get_client, stop_manager.get_client,
+         sl_tp_manager.get_client, sl_tp_manager.get_oco_engine, execution._plan_entry,
+         execution._post_trade_reconcile, execution.get_gate) = self.saved
+        exchange._filters_cache.clear()
+        exchange._filters_cache.update(filters)
+        self.engine._pool.shutdown(wait=True)
+        return False
+
+
+def test_open_trade_single_protection():
+    print("🧪 Prueba de apertura de SLTPManager con el batch como única protección")
+    ex = _Exchange(price=100.0)
+    with _Patched(ex) as p:
+        mgr = sl_tp_manager.SLTPManager(CFG, "BTCUSDT")
+        mgr.open_trade("LONG", atr=1.0)
+
+        stops, tps = ex.of_type("STOP_MARKET"), ex.of_type("TAKE_PROFIT_MARKET")
+        print(f"1️⃣  Stops {[o['stopPrice'] for _, o in stops]} | TPs {[o.get('quantity') for _, o in tps]} "
+              f"| rechazos {ex.rejected}")
+        # Un solo STOP_MARKET (el del batch), adoptado por el stop gestionado y el OCO
+        assert ex.rejected == [] and len(stops) == 1 and stops[0][1]["stopPrice"] == "98.0"
+        assert mgr.stop.order_id == stops[0][0] == mgr.state.sl_order_id
+        assert p.engine.groups["BTCUSDT"].sl_order_id == stops[0][0]
+        assert [o["quantity"] for _, o in tps] == ["0.5", "0.25", "0.25"]
+        # El risk loop puede trailear por tick antes de la primera vela cerrada
+        assert mgr.last_atr == 1.0
+        assert all(o["reduceOnly"] == "true" for _, o in tps)
+
+        # Break-even: cancelar/reemplazar el stop adoptado sin dejar la posición sin stop
+        mgr.evaluate(101.6, 1.0)
+        assert mgr.stop.wait_idle(5)
+        stops = ex.of_type("STOP_MARKET")
+        print(f"2️⃣  Tras break-even: stop {stops[0][1]['stopPrice']} id={mgr.stop.order_id} stats={mgr.stop.stats}")
+        assert len(stops) == 1 and stops[0][1]["stopPrice"] == "100.0"
+        assert mgr.stop.order_id == stops[0][0] == mgr.state.sl_order_id
+        assert mgr.stop.stats["failed"] == 0 and ex.rejected == []
+
+        # enter_basic por sí solo sigue protegiendo la entrada con su TP/SL
+        res = execution.enter_basic("ETHUSDT", "SHORT")
+        eth = [o["type"] for o in ex.open.values() if o["symbol"] == "ETHUSDT"]
+        assert res["success"] and sorted(eth) == ["STOP_MARKET", "TAKE_PROFIT_MARKET"]
+    print("✅ Protección única OK")
+
+
+def test_server_trailing_never_loosens():
+    print("🧪 Prueba del trailing en el exchange: nunca afloja tras activarse y pasa al stop único")
+    ex = _Exchange(price=100.0)
+    with _Patched(ex) as p:
+        mgr = sl_tp_manager.SLTPManager(CFG_SERVER, "BTCUSDT")
+        mgr.open_trade("LONG", atr=1.0)
+        oid, o = _trailing(ex)
+        assert (o["activationPrice"], o["callbackRate"], o["quantity"]) == ("102.0", "0.8", "1.000")
+
+        # Antes de activarse: un cambio de régimen re-coloca conservando la activación
+        mgr.evaluate(101.0, 2.0)
+        oid, o = _trailing(ex)
+        assert (o["activationPrice"], o["callbackRate"]) == ("102.0", "1.6") and mgr.state.trail_peak == 0.0
+
+        # Activada (R=2): el callback nuevo da un stop más alto que el vigente desde el pico -> se cambia
+        mgr.evaluate(104.0, 2.0)
+        oid, o = _trailing(ex)
+        assert "activationPrice" not in o and o["callbackRate"] == "1.2" and mgr.state.trail_peak == 104.0
+
+        # Retroceso con ATR alto: re-colocar desde 103 dejaría el stop en ~99.8 (< 102.7 desde el pico)
+        mgr.evaluate(103.0, 4.0)
+        same_id, o = _trailing(ex)
+        print(f"1️⃣  Tras el retroceso: trailing {same_id} callback {o['callbackRate']}% pico {mgr.state.trail_peak}")
+        assert same_id == oid and o["callbackRate"] == "1.2" and mgr.state.trail_peak == 104.0
+
+        # Nuevo pico y callback más estrecho: se aprieta
+        mgr.evaluate(106.0, 1.0)
+        oid, o = _trailing(ex)
+        assert o["callbackRate"] == "0.5" and mgr.state.trail_peak == 106.0
+        assert mgr.stop.wait_idle(5) and ex.of_type("STOP_MARKET")[0][1]["stopPrice"] == "100.0"
+
+        # TP1 se llena: la cantidad del trailing ya no vale y, activado, pasa al stop único desde el pico
+        tp1 = p.engine.groups["BTCUSDT"].legs[0].order_id
+        p.engine.state.on_order_update({"e": "ORDER_TRADE_UPDATE", "E": 100, "T": 100, "o": {
+            "s": "BTCUSDT", "i": tp1, "S": "SELL", "o": "TAKE_PROFIT_MARKET", "X": "FILLED", "q": "0.5",
+            "z": "0.5", "p": "0", "sp": "150", "R": True, "cp": False, "c": "tp1", "T": 100}})
+        assert _wait(lambda: _trailing(ex)[0] is None and mgr.stop.wait_idle(0)
+                     and ex.of_type("STOP_MARKET")[0][1]["stopPrice"] == "105.4")
+        print(f"2️⃣  Tras TP1: stop único @ {mgr.stop.stop_price}, trailing server {mgr.state.trail_order_id}")
+        assert mgr.state.trail_order_id is None and mgr.state.trailing_active
+        assert len(ex.of_type("STOP_MARKET")) == 1 and ex.rejected == []
+    print("✅ Trailing server sin aflojar OK")
+
+
+def test_server_trailing_resized_before_activation():
+    print("🧪 Prueba del redimensionado del trailing server antes de activarse")
+    ex = _Exchange(price=100.0)
+    with _Patched(ex) as p:
+        mgr = sl_tp_manager.SLTPManager(CFG_SERVER, "BTCUSDT")
+        mgr.open_trade("LONG", atr=1.0)
+        oid, _ = _trailing(ex)
+
+        # Cierre parcial fuera de las TP: la posición baja a 0.4 y el OCO recorta las TP
+        for ts, amount in ((100, "1"), (200, "0.4")):
+            p.engine.state.on_account_update({"e": "ACCOUNT_UPDATE", "E": ts, "T": ts, "a": {"B": [], "P": [
+                {"s": "BTCUSDT", "pa": amount, "ep": "100", "up": "0", "ps": "BOTH"}]}})
+        assert _wait(lambda: _trailing(ex)[1] is not None and _trailing(ex)[1]["quantity"] == "0.400")
+        new_id, o = _trailing(ex)
+        tps = sorted(q["quantity"] for _, q in ex.of_type("TAKE_PROFIT_MARKET"))
+        print(f"1️⃣  Trailing {oid} → {new_id}: qty {o['quantity']} | TPs {tps}")
+        # Misma activación y callback: solo cambia la cantidad
+        assert new_id != oid and (o["activationPrice"], o["callbackRate"]) == ("102.0", "0.8")
+        assert mgr.state.trail_qty == "0.400" and tps == ["0.400"]
+    print("✅ Redimensionado del trailing OK")
+
+
+if __name__ == "__main__":
+    test_open_trade_single_protection()
+    test_server_trailing_never_loosens()
+    test_server_trailing_resized_before_activation()
+    print("🎉 Pruebas de SLTPManager completadas")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el stop único por posición (cancelar/reemplazar coalescente)
+"""
+
+import threading
+import time
+
+from pro_bot.core.stop_manager import ManagedStop
+
+
+class FakeBook:
+    """Libro de órdenes simulado: un stop closePosition por dirección."""
+
+    def __init__(self, latency=0.02):
+        self.latency = latency
+        self.open = {}
+        self.next_id = 100
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def cancel(self, symbol, order_id):
+        time.sleep(self.latency)
+        with self.lock:
+            self.calls.append(("cancel", order_id))
+            self.open.pop(order_id)
+
+    def place(self, symbol, side, price):
+        time.sleep(self.latency)
+        with self.lock:
+            assert not self.open, "-4130: ya existe un stop closePosition"
+            self.next_id += 1
+            self.open[self.next_id] = price
+            self.calls.append(("place", price))
+            return {"orderId": self.next_id}
+
+
+def test_coalesced_moves():
+    print("🧪 Prueba de ManagedStop")
+    book = FakeBook()
+    book.open[1] = "95.0"
+    seen = []
+    stop = ManagedStop("BTCUSDT", "SELL", fmt=lambda p: f"{p:.1f}", on_change=lambda oid, px: seen.append(oid),
+                       cancel=book.cancel, place=book.place, position_open=lambda s: True)
+    stop.adopt(1, "95.0")
+
+    for i in range(20):
+        stop.move_to(96 + i * 0.5)
+    assert stop.wait_idle(5)
+    places = [c for c in book.calls if c[0] == "place"]
+    print(f"1️⃣  20 movimientos → {len(places)} reemplazos (coalescidos {stop.stats['coalesced']})")
+    assert len(places) < 20 and stop.stop_price == "105.5"
+    assert list(book.open.items()) == [(stop.order_id, "105.5")] and seen[-1] == stop.order_id
+
+    # Fallo al colocar: se restaura el precio previo
+    def place_rejecting(symbol, side, price):
+        if price == "110.0":
+            raise RuntimeError("-2021 Order would immediately trigger")
+        return book.place(symbol, side, price)
+
+    stop._place = place_rejecting
+    stop.move_to(110)
+    assert stop.wait_idle(5)
+    print(f"2️⃣  Tras fallo: stop @ {stop.stop_price}, abiertos={book.open}")
+    assert stop.stop_price == "105.5" and len(book.open) == 1
+    print("✅ ManagedStop OK")
+
+
+if __name__ == "__main__":
+    test_coalesced_moves()
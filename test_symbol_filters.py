@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Script de prueba (propiedades) del redondeo con enteros de SymbolFilters
+frente al camino Decimal original, sobre un exchangeInfo de muestra.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
+
+from pro_bot.core import exchange
+from pro_bot.core.exchange import SymbolFilters
+from pro_bot.core.exchange_info import get_exchange_info
+from pro_bot.core.risk import decide_qty_for_margin
+
+# Formas de filtros presentes en exchangeInfo de Futuros USDⓈ-M (tick/step de 10 a 1e-7)
+SAMPLE = [
+    ("BTCUSDT", "0.10", "0.001", "0.001", "100"),
+    ("ETHUSDT", "0.01", "0.001", "0.001", "20"),
+    ("BNBUSDT", "0.010", "0.01", "0.01", "5"),
+    ("XRPUSDT", "0.0001", "0.1", "0.1", "5"),
+    ("DOGEUSDT", "0.000010", "1", "1", "5"),
+    ("1000PEPEUSDT", "0.0000001", "1", "1", "5"),
+    ("SHIBUSDT", "0.000001", "1", "1", "5"),
+    ("YFIUSDT", "1", "0.001", "0.001", "5"),
+    ("BTCDOMUSDT", "0.1", "0.001", "0.001", "5"),
+    ("ADAUSDT", "0.00010", "1", "1", "5"),
+    ("SOLUSDT", "0.0100", "1", "1", "5"),
+    ("LINKUSDT", "0.001", "0.01", "0.01", "5"),
+]
+
+
+def _fixture() -> dict:
+    return {"symbols": [{
+        "symbol": sym, "contractType": "PERPETUAL", "quoteAsset": "USDT", "status": "TRADING",
+        "filters": [{"filterType": "PRICE_FILTER", "tickSize": tick},
+                    {"filterType": "LOT_SIZE", "stepSize": step, "minQty": min_qty},
+                    {"filterType": "MIN_NOTIONAL", "notional": notional}]}
+        for sym, tick, step, min_qty, notional in SAMPLE]}
+
+
+@contextmanager
+def _sample_exchange_info():
+    """Carga el exchangeInfo de muestra en el servicio compartido y deja el anterior al salir."""
+    svc = get_exchange_info()
+    saved = (svc._raw, svc._by_symbol, svc.fetched_at, svc._missing)
+    try:
+        svc._apply(_fixture(), time.time())
+        yield svc
+    finally:
+        svc._raw, svc._by_symbol, svc.fetched_at, svc._missing = saved
+        exchange._filters_cache.clear()
+
+
+def _ref_floor(x, step):
+    return (Decimal(str(x)) / step).to_integral_value(rounding=ROUND_FLOOR) * step
+
+
+def _ref_ceil(x, step):
+    return (Decimal(str(x)) / step).to_integral_value(rounding=ROUND_CEILING) * step
+
+
+def _samples(rng, step: Decimal):
+    s = float(step)
+    for _ in range(400):
+        k = rng.randint(1, 10 ** 6)
+        yield k * s                                   # múltiplo "exacto" en float
+        yield k * s + rng.uniform(-s, s)              # entre ticks
+        yield rng.uniform(1e-6, 1e5)
+        yield 10 ** rng.uniform(-7, 5)
+        yield (k * s) * (1 + rng.choice((1e-12, -1e-12, 1e-16)))
+        yield k * s * 1.0008 - 2.5 * s * rng.random()  # estilo SL/TP (entrada ± ATR)
+
+
+def test_integer_rounding_matches_decimal():
+    print("🧪 Prueba de propiedades: redondeo entero vs Decimal")
+    with _sample_exchange_info():
+        rng = random.Random(20261019)
+        checked = 0
+        for sym, *_ in SAMPLE:
+            f = SymbolFilters(sym)
+            for x in _samples(rng, f.price_step):
+                lo, hi = _ref_floor(x, f.price_step), _ref_ceil(x, f.price_step)
+                assert f.round_price_down(x) == lo and f.round_price_up(x) == hi, (sym, x)
+                assert f.fmt_price_down(x) == f.fmt_price(lo) and f.fmt_price_up(x) == f.fmt_price(hi), (sym, x)
+                assert f.price_down(x) == float(lo), (sym, x)
+                checked += 1
+            for x in _samples(rng, f.qty_step):
+                lo, hi = _ref_floor(x, f.qty_step), _ref_ceil(x, f.qty_step)
+                assert f.round_qty_down(x) == lo and f.round_qty_up(x) == hi, (sym, x)
+                assert f.fmt_qty_down(x) == f.fmt_qty(lo) and f.qty_down(x) == float(lo), (sym, x)
+                checked += 1
+        print(f"1️⃣  {checked} valores en {len(SAMPLE)} símbolos coinciden con Decimal")
+
+        f = SymbolFilters("1000PEPEUSDT")
+        xs = [rng.uniform(0.001, 0.02) for _ in range(20000)]
+        t = time.perf_counter()
+        for x in xs:
+            f.fmt_price(_ref_floor(x, f.price_step))
+        t_dec = time.perf_counter() - t
+        t = time.perf_counter()
+        for x in xs:
+            f.fmt_price_down(x)
+        t_int = time.perf_counter() - t
+        print(f"2️⃣  fmt precio: Decimal {t_dec / len(xs) * 1e6:.2f}µs vs enteros {t_int / len(xs) * 1e6:.2f}µs")
+    print("✅ SymbolFilters OK")
+
+
+def _ref_qty(f, price):
+    """decide_qty_for_margin original con Decimal: MIN_NOTIONAL * 1.01 / precio al step hacia arriba, >= min_qty."""
+    required = f.min_notional * Decimal("1.01")
+    qty = (required / Decimal(str(price)) / f.qty_step).to_integral_value(rounding=ROUND_CEILING) * f.qty_step
+    return max(qty, f.ensure_min_qty(Decimal("0")))
+
+
+def test_decide_qty_matches_decimal():
+    print("🧪 Prueba de propiedades: decide_qty_for_margin con enteros vs Decimal")
+    rng = random.Random(47)
+    checked = 0
+    with _sample_exchange_info():
+        for sym, *_ in SAMPLE:
+            f = SymbolFilters(sym)
+            for _ in range(300):
+                # Precios en tick, de muy por debajo a muy por encima de MIN_NOTIONAL / min_qty
+                ticks = int(10 ** rng.uniform(0, 8))
+                price = float(ticks * f.price_step)
+                qty, lev = decide_qty_for_margin(sym, price, set_leverage=False)
+                ref = _ref_qty(f, price)
+                assert qty == ref and f.fmt_qty(qty) == f.fmt_qty(ref), (sym, price, qty, ref)
+                assert qty * Decimal(str(price)) >= f.min_notional and lev >= 1
+                checked += 1
+        assert decide_qty_for_margin("BTCUSDT", 0.0, set_leverage=False)[0] == 0
+    print(f"1️⃣  {checked} precios en {len(SAMPLE)} símbolos coinciden con Decimal")
+    print("✅ decide_qty_for_margin OK")
+
+
+if __name__ == "__main__":
+    test_integer_rounding_matches_decimal()
+    test_decide_qty_matches_decimal()
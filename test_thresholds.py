@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para ThresholdTable/ThresholdStore: resolución por (símbolo, timeframe) y recarga en caliente
+"""
+
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from pro_ml.core.live.thresholds import ThresholdStore, ThresholdTable
+
+CFG = {"serving": {
+    "prob_long": 0.57, "prob_short": 0.43,
+    "timeframes": {"3m": {"prob_long": 0.55, "prob_short": 0.45}, "5m": {"prob_long": 0.53}},
+    "symbols": {"BTCUSDT": {"prob_long": 0.60, "5m": {"prob_long": 0.58}},
+                "ETHUSDT": {"3m": {"prob_short": 0.40}}},
+}}
+
+YAML = """serving:
+  prob_long: {long}
+  prob_short: 0.43
+  timeframes:
+    3m: {{prob_long: 0.55, prob_short: 0.45}}
+"""
+
+
+def _pair(th):
+    return round(th.prob_long, 4), round(th.prob_short, 4)
+
+
+def test_resolution():
+    print("🧪 Prueba de resolución de umbrales")
+    t = ThresholdTable.from_config(CFG)
+    # (símbolo, timeframe) -> (símbolo, *) -> (*, timeframe) -> serving
+    assert _pair(t.get("BTCUSDT", "5m")) == (0.58, 0.43)
+    assert _pair(t.get("btcusdt", "3m")) == (0.60, 0.43)
+    assert _pair(t.get("ETHUSDT", "3m")) == (0.55, 0.40)     # hereda del timeframe, no del default
+    assert _pair(t.get("ETHUSDT", "5m")) == (0.53, 0.43)
+    assert _pair(t.get("SOLUSDT", "3m")) == (0.55, 0.45)
+    assert _pair(t.get(None, "5m")) == (0.53, 0.43)
+    # Timeframe desconocido: default de serving (antes 0.55/0.45 fijo)
+    assert _pair(t.get("SOLUSDT", "15m")) == (0.57, 0.43)
+    assert _pair(ThresholdTable.from_config({}).get("SOLUSDT", "15m")) == (0.57, 0.43)
+    print("1️⃣  Orden de resolución OK")
+
+    signals, conf = t.classify_keys([0.59, 0.59, 0.44, 0.50], ["BTCUSDT", "SOLUSDT", "SOLUSDT", "SOLUSDT"],
+                                    ["5m", "3m", "3m", "1m"])
+    print(f"2️⃣  Señales {list(signals)} confianza {np.round(conf, 3).tolist()}")
+    assert list(signals) == ["LONG", "LONG", "SHORT", "NEUTRAL"]
+    assert abs(conf[0] - (0.59 - 0.58) / 0.42) < 1e-12 and abs(conf[3] - 1.0) < 1e-12
+    assert ((conf >= 0) & (conf <= 1)).all()
+    print("✅ Resolución OK")
+
+
+def test_hot_reload():
+    print("🧪 Prueba de recarga en caliente por mtime")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ml.yaml")
+        with open(path, "w") as f:
+            f.write(YAML.format(long=0.57))
+        store = ThresholdStore(path, check_interval=0.0)
+        first = store.current()
+        assert _pair(first.get("BTCUSDT", "1m")) == (0.57, 0.43)
+        assert store.current() is first                        # mtime igual: misma tabla
+
+        with open(path, "w") as f:
+            f.write(YAML.format(long=0.61))
+        os.utime(path, (time.time() + 5, time.time() + 5))
+        second = store.current()
+        print(f"1️⃣  Tras editar el YAML: {_pair(second.get('BTCUSDT', '1m'))}")
+        assert second is not first and _pair(second.get("BTCUSDT", "1m")) == (0.61, 0.43)
+        assert _pair(first.get("BTCUSDT", "1m")) == (0.57, 0.43)   # la tabla anterior no cambia
+
+        # YAML inválido: se mantiene la última tabla buena
+        with open(path, "w") as f:
+            f.write("serving: {prob_long: [")
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        assert store.current() is second
+
+        # Con check_interval largo no se mira el fichero en cada llamada
+        with open(path, "w") as f:
+            f.write(YAML.format(long=0.62))
+        slow = ThresholdStore(path, check_interval=3600.0)
+        table = slow.current()
+        with open(path, "w") as f:
+            f.write(YAML.format(long=0.65))
+        os.utime(path, (time.time() + 20, time.time() + 20))
+        assert slow.current() is table and _pair(table.get("BTCUSDT", "1m")) == (0.62, 0.43)
+    print("✅ Recarga OK")
+
+
+if __name__ == "__main__":
+    test_resolution()
+    test_hot_reload()
+    print("🎉 Pruebas de umbrales completadas")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para AccountState: reproducción de eventos del user-data stream,
+orden snapshot/eventos, lápidas de cierre y reparto a los listeners
+"""
+
+from decimal import Decimal
+
+from pro_bot.core.user_stream import AccountState
+
+
+def _acct(ts, positions=(), balances=()):
+    return {"e": "ACCOUNT_UPDATE", "E": ts, "T": ts, "a": {
+        "B": [{"a": a, "wb": wb} for a, wb in balances],
+        "P": [{"s": s, "pa": pa, "ep": ep, "up": "0", "ps": "BOTH"} for s, pa, ep in positions]}}
+
+
+def _order(ts, oid, status, type_="LIMIT", symbol="BTCUSDT", z="0"):
+    return {"e": "ORDER_TRADE_UPDATE", "E": ts, "T": ts, "o": {
+        "s": symbol, "i": oid, "S": "BUY", "o": type_, "X": status, "q": "1", "z": z, "p": "100", "sp": "0",
+        "R": False, "cp": False, "c": f"cid{oid}", "T": ts}}
+
+
+def _snap_pos(symbol, amt, update_time, entry="100"):
+    return {"symbol": symbol, "positionAmt": amt, "entryPrice": entry, "markPrice": entry,
+            "unRealizedProfit": "0", "positionSide": "BOTH", "updateTime": update_time}
+
+
+def _snap_order(oid, update_time, status="NEW", symbol="BTCUSDT"):
+    return {"orderId": oid, "symbol": symbol, "side": "BUY", "type": "LIMIT", "status": status, "origQty": "1",
+            "executedQty": "0", "price": "100", "stopPrice": "0", "updateTime": update_time}
+
+
+def _recorder(state):
+    events = []
+    state.add_listener(lambda ev, payload: events.append((ev, payload)))
+    return events
+
+
+def test_stale_snapshot_after_event():
+    print("🧪 Prueba de snapshot antiguo tras un evento")
+    st = AccountState()
+    events = _recorder(st)
+    st.on_account_update(_acct(100, [("BTCUSDT", "1", "100")]))
+    assert events == [("position", ("BTCUSDT", Decimal("0"), Decimal("1")))]
+
+    # Snapshot pedido antes del evento (as_of 90): no conoce la posición y no la borra
+    assert st.apply_snapshot([], [], as_of_ms=90) == 0
+    assert st.has_position("BTCUSDT")
+
+    # Snapshot antiguo con otra cantidad: el evento más nuevo manda
+    st.apply_snapshot([_snap_pos("BTCUSDT", "3", 80)], [], as_of_ms=95)
+    assert st.position("BTCUSDT").amount == Decimal("1")
+
+    # Evento atrasado (T anterior) tampoco pisa al nuevo
+    st.on_account_update(_acct(50, [("BTCUSDT", "5", "90")]))
+    assert st.position("BTCUSDT").amount == Decimal("1") and len(events) == 1
+
+    # Snapshot posterior sin la posición: el stream perdió el cierre -> se corrige y se avisa
+    assert st.apply_snapshot([], [], as_of_ms=200) == 1
+    print(f"1️⃣  Eventos: {events}")
+    assert not st.has_position("BTCUSDT")
+    assert events[-1] == ("position", ("BTCUSDT", Decimal("1"), Decimal("0")))
+    print("✅ Orden snapshot/eventos OK")
+
+
+def test_position_close_tombstone():
+    print("🧪 Prueba de lápidas de cierre de posición")
+    st = AccountState()
+    events = _recorder(st)
+    st.on_account_update(_acct(100, [("ETHUSDT", "2", "10")]))
+    st.on_account_update(_acct(200, [("ETHUSDT", "0", "0")]))
+    assert not st.has_position("ETHUSDT")
+
+    # Snapshot tomado entre apertura y cierre (as_of 150) no resucita la posición
+    assert st.apply_snapshot([_snap_pos("ETHUSDT", "2", 100)], [], as_of_ms=150) == 0
+    assert not st.has_position("ETHUSDT")
+    # Snapshot sin updateTime usa as_of: igual de antiguo que la lápida -> ignorado
+    st.apply_snapshot([_snap_pos("ETHUSDT", "2", 0)], [], as_of_ms=180)
+    assert not st.has_position("ETHUSDT")
+
+    # Un snapshot posterior al cierre limpia la lápida y una reapertura real entra
+    st.apply_snapshot([], [], as_of_ms=300)
+    assert st._closed_pos == {}
+    st.on_account_update(_acct(400, [("ETHUSDT", "-1", "12")]))
+    print(f"1️⃣  Eventos: {[p for _e, p in events]}")
+    assert st.position("ETHUSDT").side == "SHORT"
+    assert [p[2] for _e, p in events] == [Decimal("2"), Decimal("0"), Decimal("-1")]
+    print("✅ Lápidas de posición OK")
+
+
+def test_order_book_and_tombstones():
+    print("🧪 Prueba del libro de órdenes y LIMIT pendientes")
+    st = AccountState()
+    events = _recorder(st)
+    st.on_order_update(_order(100, 1, "NEW"))
+    st.on_order_update(_order(100, 2, "NEW", type_="STOP_MARKET"))
+    assert st.has_pending_limit("BTCUSDT") and len(st.open_orders("BTCUSDT")) == 2
+
+    st.on_order_update(_order(110, 1, "PARTIALLY_FILLED", z="0.4"))
+    assert not st.has_pending_limit("BTCUSDT") and st.orders[1].executed_qty == Decimal("0.4")
+    st.on_order_update(_order(120, 1, "FILLED", z="1"))
+    assert 1 not in st.orders
+
+    # NEW atrasado y snapshot antiguo no reabren la orden llenada
+    st.on_order_update(_order(105, 1, "NEW"))
+    st.apply_snapshot([], [_snap_order(1, 100), _snap_order(2, 100)], as_of_ms=115)
+    assert 1 not in st.orders and 2 in st.orders
+
+    # Snapshot nuevo sin la orden 2 (cancelación perdida) la retira
+    assert st.apply_snapshot([], [], as_of_ms=300) == 1
+    print(f"1️⃣  Órdenes abiertas: {st.open_orders()} | eventos de orden: {len(events)}")
+    assert st.open_orders() == [] and st.pending_limit_symbols() == []
+    # Los listeners ven también los estados finales, no los eventos descartados
+    assert [(o.order_id, o.status) for _e, o in events] == [
+        (1, "NEW"), (2, "NEW"), (1, "PARTIALLY_FILLED"), (1, "FILLED")]
+    print("✅ Libro de órdenes OK")
+
+
+def test_listener_fanout():
+    print("🧪 Prueba de reparto a listeners")
+    st = AccountState()
+    seen = []
+
+    def broken(ev, payload):
+        raise RuntimeError("listener roto")
+
+    st.add_listener(lambda ev, p: seen.append(("a", ev)))
+    st.add_listener(broken)
+    st.add_listener(lambda ev, p: seen.append(("b", ev)))
+    st.on_account_update(_acct(100, [("BTCUSDT", "1", "100"), ("ETHUSDT", "-2", "10")], [("USDT", "950")]))
+    print(f"1️⃣  Recibido: {seen}")
+    # Balance antes que posiciones; un listener que falla no corta a los demás
+    assert seen == [("a", "balance"), ("b", "balance"), ("a", "position"), ("b", "position"),
+                    ("a", "position"), ("b", "position")]
+    assert st.balances["USDT"] == Decimal("950") and st.open_symbols() == ["BTCUSDT", "ETHUSDT"]
+
+    # Cantidad sin cambios (solo PnL/entrada): sin evento de posición
+    seen.clear()
+    st.on_account_update(_acct(110, [("BTCUSDT", "1", "101")]))
+    assert seen == [] and st.position("BTCUSDT").entry_price == Decimal("101")
+    # Filas de modo hedge se ignoran
+    st.on_account_update({"E": 120, "T": 120, "a": {"P": [
+        {"s": "SOLUSDT", "pa": "1", "ep": "1", "up": "0", "ps": "LONG"}]}})
+    assert not st.has_position("SOLUSDT") and st.last_event_ms == 120
+    print("✅ Listeners OK")
+
+
+if __name__ == "__main__":
+    test_stale_snapshot_after_event()
+    test_position_close_tombstone()
+    test_order_book_and_tombstones()
+    test_listener_fanout()
+    print("🎉 Pruebas de AccountState completadas")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el transporte de órdenes por WebSocket API (servidor local)
+"""
+
+import asyncio
+import threading
+
+from binance.exceptions import BinanceAPIException
+
+from pro_bot.core import ws_api
+from pro_bot.core.ws_api import LocalWsApiServer, WsApiError, WsOrderTransport
+
+
+def test_ws_order_place():
+    print("🧪 Prueba de order.place contra LocalWsApiServer")
+    srv = LocalWsApiServer(api_secret="secret").start()
+    tr = WsOrderTransport(url=srv.url, api_key="key", api_secret="secret", timeout=1.0)
+    assert tr.start()
+    try:
+        order = tr.place_order({"symbol": "BTCUSDT", "side": "BUY", "type": "MARKET",
+                                "quantity": "0.001", "recvWindow": 5000})
+        print(f"1️⃣  Orden: id={order['orderId']} status={order['status']}")
+        assert order["status"] == "FILLED" and order["clientOrderId"].startswith("ws")
+
+        order = asyncio.run(tr.place_order_async({"symbol": "ETHUSDT", "side": "SELL",
+                                                  "type": "MARKET", "quantity": "0.01"}))
+        assert order["symbol"] == "ETHUSDT" and tr.stats["ws"] == 2
+
+        # Firma inválida: el rechazo del exchange se propaga, no se reenvía por REST
+        bad = WsOrderTransport(url=srv.url, api_key="key", api_secret="otra", timeout=1.0)
+        assert bad.start()
+        try:
+            bad.place_order({"symbol": "BTCUSDT", "side": "BUY", "type": "MARKET", "quantity": "0.001"})
+            raise AssertionError("debía fallar")
+        except WsApiError as e:
+            print(f"2️⃣  Rechazo propagado: {e}")
+            assert e.code == -1022 and bad.stats["rest_fallback"] == 0
+        finally:
+            bad.stop()
+    finally:
+        tr.stop()
+        srv.stop()
+    print("✅ WS API OK")
+
+
+class _Resp:
+    status_code = 400
+    text = '{"code": -2013, "msg": "Order does not exist."}'
+
+
+class _Rest:
+    """Cliente REST falso para el fallback: registra consultas y reenvíos."""
+
+    def __init__(self, lookup):
+        self.lookup = lookup        # "found" | "missing" | "error"
+        self.lookups, self.created = [], []
+
+    def futures_get_order(self, symbol, origClientOrderId):
+        self.lookups.append(origClientOrderId)
+        if self.lookup == "missing":
+            raise BinanceAPIException(_Resp(), 400, _Resp.text)
+        if self.lookup == "error":
+            raise TimeoutError("GET /fapi/v1/order timeout")
+        return {"orderId": 7, "clientOrderId": origClientOrderId, "status": "FILLED"}
+
+    def futures_create_order(self, **params):
+        self.created.append(params)
+        return {"orderId": 8, "clientOrderId": params["newClientOrderId"], "status": "FILLED"}
+
+
+class _Client:
+    def __init__(self, cli):
+        self.client = cli
+
+
+def test_disconnect_after_send():
+    print("🧪 Prueba de socket caído con la orden ya enviada")
+    srv = LocalWsApiServer(api_secret="secret").start()
+    srv.drop_symbols.add("BTCUSDT")          # el servidor se la traga: sin respuesta
+    saved = ws_api.get_client
+    outcomes = {}
+    try:
+        for lookup in ("found", "missing", "error"):
+            rest = _Rest(lookup)
+            ws_api.get_client = lambda: _Client(rest)
+            tr = WsOrderTransport(url=srv.url, api_key="key", api_secret="secret", timeout=5.0)
+            assert tr.start()
+            # El servidor corta la conexión con la petición en vuelo (antes del timeout)
+            threading.Timer(0.2, srv.drop_connections).start()
+            try:
+                order = tr.place_order({"symbol": "BTCUSDT", "side": "BUY", "type": "MARKET", "quantity": "0.001"})
+                outcomes[lookup] = order["orderId"]
+            except TimeoutError as e:
+                outcomes[lookup] = str(e)
+            finally:
+                tr.stop()
+            # Siempre se consulta por el newClientOrderId; solo -2013 reenvía, y con el mismo id
+            assert len(rest.lookups) == 1 and tr.stats["timeouts"] == 0 and tr.stats["rest_fallback"] == 1
+            assert [c["newClientOrderId"] for c in rest.created] == (rest.lookups if lookup == "missing" else [])
+    finally:
+        ws_api.get_client = saved
+        srv.stop()
+    print(f"1️⃣  Resultado por consulta: {outcomes}")
+    assert outcomes == {"found": 7, "missing": 8, "error": "GET /fapi/v1/order timeout"}
+    print("✅ Socket caído sin órdenes duplicadas OK")
+
+
+if __name__ == "__main__":
+    test_ws_order_place()
+    test_disconnect_after_send()